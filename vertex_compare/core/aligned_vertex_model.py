@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Aligned vertex model
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from array import array
+from bisect import bisect_right
+from typing import (
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    Qt,
+    QAbstractProxyModel,
+    QObject,
+    QModelIndex
+)
+from qgis.PyQt.QtGui import QColor
+
+from vertex_compare.core.vertex_diff import (
+    DiffRun,
+    VertexDiff,
+    VertexDiffer
+)
+from vertex_compare.core.vertex_model import VertexModel
+
+
+class AlignedVertexModel(QAbstractProxyModel):
+    """
+    A proxy model for showing the vertices from a VertexModel aligned to the vertices of
+    another feature, using the runs from a vertex diff.
+
+    Rows are mapped to source rows on demand by searching the diff runs, so no per-row
+    storage is required. Rows for vertices which only exist in the other feature are
+    shown as empty gaps.
+
+    The diff remains valid while the source model shows the same vertices, so resets of
+    the source model which only change its columns (e.g. showing transformed coordinates)
+    keep the alignment.
+    """
+
+    OPERATION_ROLE = Qt.UserRole + 10
+
+    FIRST = 0
+    SECOND = 1
+
+    INSERTED_COLOR = QColor(0, 150, 0, 60)
+    DELETED_COLOR = QColor(255, 0, 0, 60)
+    MOVED_COLOR = QColor(255, 150, 0, 80)
+    GAP_COLOR = QColor(128, 128, 128, 40)
+
+    def __init__(self, side: int = FIRST, parent: QObject = None):
+        """
+        Constructor for AlignedVertexModel.
+
+        :param side: whether the source model contains the FIRST or SECOND vertex array
+            from the diff
+        """
+        super().__init__(parent)
+        self.side = side
+        self.runs: Optional[List[DiffRun]] = None
+        # the source vertices which the diff was calculated for
+        self._diff_vertices = None
+        # aligned row and source row at which each run starts
+        self.row_starts = array('q')
+        self.source_starts = array('q')
+        self.row_count = 0
+
+    def setSourceModel(self, model: VertexModel):  # pylint: disable=missing-function-docstring
+        self.beginResetModel()
+        previous = self.sourceModel()
+        if previous is not None:
+            previous.modelAboutToBeReset.disconnect(self._source_about_to_be_reset)
+            previous.modelReset.disconnect(self._source_reset)
+            previous.dataChanged.disconnect(self._source_data_changed)
+
+        super().setSourceModel(model)
+        if model is not None:
+            model.modelAboutToBeReset.connect(self._source_about_to_be_reset)
+            model.modelReset.connect(self._source_reset)
+            model.dataChanged.connect(self._source_data_changed)
+
+        self.runs = None
+        self.endResetModel()
+
+    def set_diff(self, diff: Optional[VertexDiff]):
+        """
+        Sets the diff used to align the source vertices. If None, source
+        vertices are shown unaligned.
+        """
+        self.beginResetModel()
+        if diff is None:
+            self.runs = None
+            self._diff_vertices = None
+            self.row_starts = array('q')
+            self.source_starts = array('q')
+        else:
+            self.runs = diff.runs
+            self._diff_vertices = self.sourceModel().vertices if self.sourceModel() is not None else None
+            self.row_starts = array('q')
+            self.source_starts = array('q')
+            row = 0
+            for run in diff.runs:
+                self.row_starts.append(row)
+                self.source_starts.append(run.start1 if self.side == AlignedVertexModel.FIRST else run.start2)
+                row += max(run.end1 - run.start1, run.end2 - run.start2)
+            self.row_count = row
+        self.endResetModel()
+
+    def _source_about_to_be_reset(self):
+        """
+        Called when the source model is about to be reset
+        """
+        self.beginResetModel()
+
+    def _source_reset(self):
+        """
+        Called when the source model is reset, which invalidates the diff if the
+        source vertices have changed
+        """
+        if self.runs is not None and self.sourceModel().vertices is self._diff_vertices:
+            self.endResetModel()
+            return
+
+        self.runs = None
+        self._diff_vertices = None
+        self.row_starts = array('q')
+        self.source_starts = array('q')
+        self.endResetModel()
+
+    def _source_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: List[int] = None):
+        """
+        Called when data in the source model changes
+        """
+        if self.runs is None:
+            self.dataChanged.emit(self.index(top_left.row(), top_left.column()),
+                                  self.index(bottom_right.row(), bottom_right.column()),
+                                  roles or [])
+        else:
+            self.dataChanged.emit(self.index(0, top_left.column()),
+                                  self.index(self.rowCount() - 1, bottom_right.column()),
+                                  roles or [])
+
+    def _run_index(self, row: int) -> int:
+        """
+        Returns the index of the run containing an aligned row
+        """
+        return bisect_right(self.row_starts, row) - 1
+
+    def operation(self, row: int) -> Optional[str]:
+        """
+        Returns the diff operation for an aligned row, or None if no diff is set
+        """
+        if self.runs is None or row < 0 or row >= self.row_count:
+            return None
+        return self.runs[self._run_index(row)].operation
+
+    def source_row(self, row: int) -> Optional[int]:
+        """
+        Returns the source row for an aligned row, or None if the row is a gap
+        """
+        if self.runs is None:
+            return row
+
+        if row < 0 or row >= self.row_count:
+            return None
+
+        run_index = self._run_index(row)
+        run = self.runs[run_index]
+        offset = row - self.row_starts[run_index]
+        if self.side == AlignedVertexModel.FIRST:
+            return run.start1 + offset if offset < run.end1 - run.start1 else None
+        return run.start2 + offset if offset < run.end2 - run.start2 else None
+
+    def aligned_row(self, source_row: int) -> int:
+        """
+        Returns the aligned row for a source row
+        """
+        if self.runs is None:
+            return source_row
+
+        run_index = bisect_right(self.source_starts, source_row) - 1
+        if run_index < 0:
+            return -1
+        return self.row_starts[run_index] + source_row - self.source_starts[run_index]
+
+    def source_ranges(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Returns the ranges of source rows (excluding the end rows) for a range of aligned
+        rows, skipping any gaps
+        """
+        if self.runs is None:
+            start = max(start, 0)
+            end = min(end, self.rowCount())
+            return [(start, end)] if end > start else []
+
+        res = []
+        run_index = max(self._run_index(start), 0)
+        while run_index < len(self.runs) and self.row_starts[run_index] < end:
+            run = self.runs[run_index]
+            row_start = self.row_starts[run_index]
+            if self.side == AlignedVertexModel.FIRST:
+                source_start, source_count = run.start1, run.end1 - run.start1
+            else:
+                source_start, source_count = run.start2, run.end2 - run.start2
+
+            # rows beyond the run's source rows are gaps
+            first = max(start, row_start) - row_start
+            last = min(end, row_start + source_count) - row_start
+            if last > first:
+                if res and res[-1][1] == source_start + first:
+                    res[-1] = (res[-1][0], source_start + last)
+                else:
+                    res.append((source_start + first, source_start + last))
+            run_index += 1
+        return res
+
+    def mapToSource(self, proxy_index: QModelIndex) -> QModelIndex:  # pylint: disable=missing-function-docstring
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+
+        row = self.source_row(proxy_index.row())
+        if row is None:
+            return QModelIndex()
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index: QModelIndex) -> QModelIndex:  # pylint: disable=missing-function-docstring
+        if not source_index.isValid():
+            return QModelIndex()
+        return self.index(self.aligned_row(source_index.row()), source_index.column())
+
+    def index(self,  # pylint: disable=missing-function-docstring
+              row: int,
+              column: int,
+              parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if parent.isValid() or row < 0 or row >= self.rowCount() or column < 0 or column >= self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, _: QModelIndex = QModelIndex()) -> QModelIndex:  # pylint: disable=missing-function-docstring
+        return QModelIndex()
+
+    def rowCount(self,  # pylint: disable=missing-function-docstring
+                 parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+
+        if self.runs is None:
+            return self.sourceModel().rowCount()
+        return self.row_count
+
+    def columnCount(self,  # pylint: disable=missing-function-docstring
+                    parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def data(self,  # pylint: disable=missing-function-docstring
+             index: QModelIndex,
+             role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == AlignedVertexModel.OPERATION_ROLE:
+            return self.operation(index.row())
+
+        source_index = self.mapToSource(index)
+        if role == Qt.BackgroundRole:
+            operation = self.operation(index.row())
+            if operation is None or operation == VertexDiffer.EQUAL:
+                return None
+            if not source_index.isValid():
+                return AlignedVertexModel.GAP_COLOR
+            if operation == VertexDiffer.MOVE:
+                return AlignedVertexModel.MOVED_COLOR
+            if operation == VertexDiffer.INSERT:
+                return AlignedVertexModel.INSERTED_COLOR
+            return AlignedVertexModel.DELETED_COLOR
+
+        if not source_index.isValid():
+            return None
+        return self.sourceModel().data(source_index, role)
+
+    def headerData(self,  # pylint: disable=missing-function-docstring
+                   section: int,
+                   orientation: Qt.Orientation,
+                   role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and self.sourceModel() is not None:
+            return self.sourceModel().headerData(section, orientation, role)
+        return None
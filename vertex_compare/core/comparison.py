@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Headless vertex comparison API
+
+These functions don't depend on the plugin GUI, and can be used from scripts,
+the Python console or Processing algorithms.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from array import array
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional
+)
+
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsFeatureSource,
+    QgsFeedback
+)
+
+from vertex_compare.core.topology import uncommon_vertices
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import (
+    VertexDiff,
+    vertex_diff
+)
+
+
+class FeatureComparison(NamedTuple):
+    """
+    The result of comparing the vertices from two features.
+
+    Vertex numbers start at 1. If a feature could not be found, its feature ID
+    is None and it is treated as having no vertices.
+    """
+    fid1: Optional[int]
+    fid2: Optional[int]
+    vertex_count1: int
+    vertex_count2: int
+    uncommon1: List[int]
+    uncommon2: List[int]
+
+    def matches(self) -> bool:
+        """
+        Returns True if both features were found and every vertex from each feature
+        is coincident with a vertex from the other feature
+        """
+        return self.fid1 is not None and self.fid2 is not None and not self.uncommon1 and not self.uncommon2
+
+
+def feature_vertices(source: QgsFeatureSource, fids: Iterable[int]) -> Dict[int, VertexArray]:
+    """
+    Returns the vertices of the features with matching IDs from a source.
+
+    Features which don't exist are not included in the result, and features without
+    geometry have no vertices.
+    """
+    request = QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes()
+    return {f.id(): VertexArray.from_geometry(f.geometry()) for f in source.getFeatures(request)}
+
+
+def compare_vertices(fid1: Optional[int],
+                     vertices1: Optional[VertexArray],
+                     fid2: Optional[int],
+                     vertices2: Optional[VertexArray]) -> FeatureComparison:
+    """
+    Compares two vertex arrays, either of which may be None if the corresponding
+    feature could not be found
+    """
+    if vertices1 is None:
+        fid1 = None
+        vertices1 = VertexArray(array('d'), array('d'))
+    if vertices2 is None:
+        fid2 = None
+        vertices2 = VertexArray(array('d'), array('d'))
+
+    uncommon1, uncommon2 = uncommon_vertices(vertices1, vertices2)
+    return FeatureComparison(fid1, fid2, len(vertices1), len(vertices2), uncommon1, uncommon2)
+
+
+def compare_features(source: QgsFeatureSource,
+                     fid1: int,
+                     fid2: int,
+                     other_source: Optional[QgsFeatureSource] = None) -> FeatureComparison:
+    """
+    Compares the vertices from two features.
+
+    If other_source is specified then the second feature is taken from that source,
+    otherwise both features are taken from source.
+    """
+    if other_source is None:
+        vertices = feature_vertices(source, (fid1, fid2))
+        return compare_vertices(fid1, vertices.get(fid1), fid2, vertices.get(fid2))
+
+    return compare_vertices(fid1, feature_vertices(source, (fid1,)).get(fid1),
+                            fid2, feature_vertices(other_source, (fid2,)).get(fid2))
+
+
+def diff_features(source: QgsFeatureSource,
+                  fid1: int,
+                  fid2: int,
+                  other_source: Optional[QgsFeatureSource] = None,
+                  tolerance: float = 0) -> Optional[VertexDiff]:
+    """
+    Returns the sequence aligned difference between the vertices of two features, or
+    None if either feature could not be found.
+
+    If other_source is specified then the second feature is taken from that source,
+    otherwise both features are taken from source.
+    """
+    if other_source is None:
+        vertices = feature_vertices(source, (fid1, fid2))
+        vertices1 = vertices.get(fid1)
+        vertices2 = vertices.get(fid2)
+    else:
+        vertices1 = feature_vertices(source, (fid1,)).get(fid1)
+        vertices2 = feature_vertices(other_source, (fid2,)).get(fid2)
+
+    if vertices1 is None or vertices2 is None:
+        return None
+    return vertex_diff(vertices1, vertices2, tolerance)
+
+
+def _key_map(source: QgsFeatureSource, key_field: str) -> Dict[object, int]:
+    """
+    Returns a map of key field value to feature ID for a source
+    """
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([key_field],
+                                                                                                source.fields())
+    return {f[key_field]: f.id() for f in source.getFeatures(request)}
+
+
+def compare_sources(source: QgsFeatureSource,  # pylint: disable=too-many-locals
+                    reference: QgsFeatureSource,
+                    fids: Optional[Iterable[int]] = None,
+                    key_field: Optional[str] = None,
+                    feedback: Optional[QgsFeedback] = None,
+                    batch_size: int = 1000) -> Iterator[FeatureComparison]:
+    """
+    Compares features from source with the matching features from a reference source,
+    yielding a comparison for each feature from source.
+
+    Features are matched by feature ID, or by the value of key_field if set (in which case
+    the field must exist in both sources). If fids is specified, only those features
+    from source are compared.
+
+    Features are fetched in batches of batch_size, so sources of any size can be compared.
+    """
+    reference_ids = _key_map(reference, key_field) if key_field else None
+
+    request = QgsFeatureRequest()
+    if fids is not None:
+        request.setFilterFids(list(fids))
+    if key_field:
+        request.setSubsetOfAttributes([key_field], source.fields())
+    else:
+        request.setNoAttributes()
+
+    total = len(fids) if isinstance(fids, (list, tuple, set)) else source.featureCount()
+    done = 0
+
+    def _compare_batch(batch):
+        nonlocal done
+        reference_vertices = feature_vertices(reference, [fid2 for _, _, fid2 in batch if fid2 is not None])
+        for fid1, vertices1, fid2 in batch:
+            yield compare_vertices(fid1, vertices1, fid2, reference_vertices.get(fid2))
+
+        done += len(batch)
+        if feedback is not None and total > 0:
+            feedback.setProgress(100 * done / total)
+
+    batch = []
+    for feature in source.getFeatures(request):
+        if feedback is not None and feedback.isCanceled():
+            return
+
+        if reference_ids is not None:
+            fid2 = reference_ids.get(feature[key_field])
+        else:
+            fid2 = feature.id()
+        batch.append((feature.id(), VertexArray.from_geometry(feature.geometry()), fid2))
+
+        if len(batch) >= batch_size:
+            yield from _compare_batch(batch)
+            batch = []
+
+    if batch:
+        yield from _compare_batch(batch)
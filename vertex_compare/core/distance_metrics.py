@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Distance metrics between vertex arrays
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import heapq
+import math
+from typing import (
+    TYPE_CHECKING,
+    NamedTuple,
+    Optional
+)
+
+from vertex_compare.core.vertex_index import PointGridIndex
+
+if TYPE_CHECKING:
+    from qgis.core import QgsFeedback  # pylint: disable=ungrouped-imports
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+# number of vertices or cells to process between checks for cancellation
+CANCELLATION_CHECK_INTERVAL = 4096
+
+# number of vertices following the previous nearest vertex which are checked before searching the index
+NEIGHBOR_WINDOW = 4
+
+# maximum number of cells of the coupling grid which will be visited when calculating
+# the discrete Fréchet distance. Every visited cell is tracked in memory, so this limits the
+# calculation to a few seconds and a few hundred megabytes. Similar arrays visit around three
+# cells per vertex, so this allows for arrays of several hundred thousand vertices.
+DEFAULT_MAX_FRECHET_CELLS = 2000000
+
+
+class DistanceResult(NamedTuple):
+    """
+    A distance between two vertex arrays, and the indices (starting at 0) of the
+    pair of vertices at which the distance occurs
+    """
+    distance: float
+    index1: int
+    index2: int
+
+
+def directed_hausdorff_distance(vertices1: 'VertexArray',  # pylint: disable=too-many-locals
+                                vertices2: 'VertexArray',
+                                feedback: Optional['QgsFeedback'] = None) -> Optional[DistanceResult]:
+    """
+    Returns the directed Hausdorff distance from the first vertex array to the second, i.e. the
+    largest distance from a vertex in the first array to its nearest vertex in the second array.
+
+    Nearest vertices are found using a grid index of the second array. Since consecutive vertices
+    are usually close together, the vertices following the previous vertex's nearest vertex are
+    checked first, and the index is only searched if those vertices are all further away than the
+    largest distance found so far.
+
+    Returns None if either array is empty, or if the calculation is canceled via feedback.
+    """
+    count = len(vertices1)
+    count2 = len(vertices2)
+    if not count or not count2:
+        return None
+
+    index = PointGridIndex(vertices2)
+    x1 = vertices1.x
+    y1 = vertices1.y
+    x2 = vertices2.x
+    y2 = vertices2.y
+
+    best = DistanceResult(-1, 0, 0)
+    best_squared = -1.0
+    previous_nearest = None
+    for i in range(count):
+        if feedback is not None and i % CANCELLATION_CHECK_INTERVAL == 0:
+            if feedback.isCanceled():
+                return None
+            feedback.setProgress(100 * i / count)
+
+        x = x1[i]
+        y = y1[i]
+        if previous_nearest is not None and any(
+                (x2[j] - x) ** 2 + (y2[j] - y) ** 2 <= best_squared
+                for j in range(max(0, previous_nearest - 1), min(count2, previous_nearest + NEIGHBOR_WINDOW))):
+            # this vertex can't increase the distance
+            continue
+
+        nearest = index.nearest(x, y)
+        distance_squared = (x2[nearest] - x) ** 2 + (y2[nearest] - y) ** 2
+        previous_nearest = nearest
+        if distance_squared > best_squared:
+            best_squared = distance_squared
+            best = DistanceResult(math.sqrt(distance_squared), i, nearest)
+
+    return best
+
+
+def hausdorff_distance(vertices1: 'VertexArray',
+                       vertices2: 'VertexArray',
+                       feedback: Optional['QgsFeedback'] = None) -> Optional[DistanceResult]:
+    """
+    Returns the (symmetric) Hausdorff distance between two vertex arrays.
+
+    Returns None if either array is empty, or if the calculation is canceled via feedback.
+    """
+    forward = directed_hausdorff_distance(vertices1, vertices2, feedback)
+    if forward is None:
+        return None
+
+    # the arrays are deliberately swapped, for the distance from the second array to the first
+    reverse = directed_hausdorff_distance(vertices2, vertices1, feedback)  # pylint: disable=arguments-out-of-order
+    if reverse is None:
+        return None
+
+    if reverse.distance > forward.distance:
+        return DistanceResult(reverse.distance, reverse.index2, reverse.index1)
+    return forward
+
+
+def discrete_frechet_distance(vertices1: 'VertexArray',  # pylint: disable=too-many-locals, too-many-branches
+                              vertices2: 'VertexArray',
+                              max_cells: int = DEFAULT_MAX_FRECHET_CELLS,
+                              feedback: Optional['QgsFeedback'] = None) -> Optional[DistanceResult]:
+    """
+    Returns the discrete Fréchet distance between two vertex arrays, taking the vertices of
+    each array in order.
+
+    The distance is the smallest possible maximum distance of any coupling between the vertices,
+    found as the bottleneck shortest path through the grid of vertex pairs. Cells are only visited
+    if their distance is below the final result, so for similar arrays (e.g. two versions of the
+    same boundary) only a narrow band around the diagonal of the grid is visited, rather than all
+    len(vertices1) * len(vertices2) cells.
+
+    Returns None if either array is empty, if more than max_cells cells would need to be visited,
+    or if the calculation is canceled via feedback.
+    """
+    n = len(vertices1)
+    m = len(vertices2)
+    if not n or not m:
+        return None
+
+    x1 = vertices1.x
+    y1 = vertices1.y
+    x2 = vertices2.x
+    y2 = vertices2.y
+
+    def _cost(i: int, j: int) -> float:
+        return (x1[i] - x2[j]) ** 2 + (y1[i] - y2[j]) ** 2
+
+    # the largest cost along the best path found so far, and the cell at which it occurs
+    threshold = _cost(0, 0)
+    threshold_cell = 0
+    target = n * m - 1
+
+    visited = {0}
+    # cells with costs at or below the threshold are visited depth first, without the overhead of the heap
+    stack = [0]
+    # cells with costs above the threshold, which will be visited once the threshold increases
+    heap = []
+    furthest = 0
+    checked = 0
+    while True:
+        while stack:
+            cell = stack.pop()
+            if cell == target:
+                i, j = divmod(threshold_cell, m)
+                return DistanceResult(math.sqrt(threshold), i, j)
+
+            checked += 1
+            if checked % CANCELLATION_CHECK_INTERVAL == 0:
+                if len(visited) > max_cells:
+                    return None
+                if feedback is not None:
+                    if feedback.isCanceled():
+                        return None
+                    feedback.setProgress(100 * furthest / n)
+
+            i, j = divmod(cell, m)
+            furthest = max(furthest, i)
+            for next_i, next_j in ((i + 1, j + 1), (i + 1, j), (i, j + 1)):
+                if next_i >= n or next_j >= m:
+                    continue
+                next_cell = next_i * m + next_j
+                if next_cell in visited:
+                    continue
+                visited.add(next_cell)
+                cost = _cost(next_i, next_j)
+                if cost <= threshold:
+                    stack.append(next_cell)
+                else:
+                    heapq.heappush(heap, (cost, next_cell))
+
+        # all cells reachable within the threshold have been visited, so the threshold must increase
+        threshold, threshold_cell = heapq.heappop(heap)
+        stack.append(threshold_cell)
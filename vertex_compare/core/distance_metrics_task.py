@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Background distance metrics task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsGeometry,
+    QgsTask
+)
+
+from vertex_compare.core.distance_metrics import (
+    DistanceResult,
+    discrete_frechet_distance,
+    hausdorff_distance
+)
+from vertex_compare.core.vertex_array import VertexArray
+
+
+class _StepFeedback:
+    """
+    Reports the progress of one step of a task, scaled to the step's share of the total progress
+    """
+
+    def __init__(self, task: QgsTask, start: float, end: float):
+        self.task = task
+        self.start = start
+        self.end = end
+
+    def isCanceled(self) -> bool:  # pylint: disable=invalid-name
+        """
+        Returns True if the task has been canceled
+        """
+        return self.task.isCanceled()
+
+    def setProgress(self, progress: float):  # pylint: disable=invalid-name
+        """
+        Sets the progress of the step, from 0 to 100
+        """
+        self.task.setProgress(self.start + (self.end - self.start) * progress / 100)
+
+
+class DistanceMetricsTask(QgsTask):
+    """
+    A background task which calculates the Hausdorff and discrete Fréchet distances
+    between the geometries of two features.
+    """
+
+    def __init__(self, fid1: int, geometry1: QgsGeometry, fid2: int, geometry2: QgsGeometry):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Calculating distances between features'),
+                         QgsTask.CanCancel)
+        self.fid1 = fid1
+        self.fid2 = fid2
+        self.geometry1 = QgsGeometry(geometry1)
+        self.geometry2 = QgsGeometry(geometry2)
+
+        self.hausdorff: Optional[DistanceResult] = None
+        self.frechet: Optional[DistanceResult] = None
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        vertices1 = VertexArray.from_geometry(self.geometry1)
+        vertices2 = VertexArray.from_geometry(self.geometry2)
+
+        self.hausdorff = hausdorff_distance(vertices1, vertices2, _StepFeedback(self, 0, 30))
+        if self.isCanceled():
+            return False
+
+        # the Fréchet distance is None if it's too costly to calculate
+        self.frechet = discrete_frechet_distance(vertices1, vertices2, feedback=_StepFeedback(self, 30, 100))
+        return not self.isCanceled()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Edit session vertex change tracking
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    QObject,
+    QTimer,
+    pyqtSignal
+)
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import (
+    VertexDiff,
+    VertexDiffer,
+    vertex_diff
+)
+
+
+class EditChange(NamedTuple):
+    """
+    The changes made to a feature's vertices during an edit session.
+
+    vertices maps the vertex numbers (starting at 1) of added and moved vertices in
+    the edited geometry to the corresponding VertexDiffer operation. deleted contains the
+    committed vertex number and coordinates of each deleted vertex.
+    """
+    vertices: Dict[int, str]
+    deleted: List[Tuple[int, float, float]]
+
+    @staticmethod
+    def from_diff(diff: VertexDiff, committed: VertexArray) -> Optional['EditChange']:
+        """
+        Creates an edit change from the diff between committed and edited vertices,
+        or returns None if there are no changes
+        """
+        vertices = {}
+        deleted = []
+        for run in diff.runs:
+            if run.operation in (VertexDiffer.INSERT, VertexDiffer.MOVE):
+                vertices.update((i + 1, run.operation) for i in range(run.start2, run.end2))
+            elif run.operation == VertexDiffer.DELETE:
+                deleted.extend((i + 1, committed.x[i], committed.y[i]) for i in range(run.start1, run.end1))
+
+        if not vertices and not deleted:
+            return None
+        return EditChange(vertices, deleted)
+
+
+class EditChangeTracker(QObject):
+    """
+    Tracks the changes made to feature vertices while a layer is in edit mode, by comparing
+    the edited geometries from the edit buffer with the committed geometries from the provider.
+
+    Changes are updated incrementally, for the features reported by the layer's geometryChanged
+    signal only. Changed geometries are not compared immediately, but collected and compared
+    together once no further geometries have changed within the tracker's interval, so that
+    a burst of edits (e.g. dragging vertices) only updates the changes once. The changes
+    dictionary is replaced rather than modified whenever it changes, so references to it can
+    safely be used by render threads.
+    """
+
+    changed = pyqtSignal()
+
+    # default window in milliseconds in which changed geometries are collected before comparison
+    DEFAULT_INTERVAL = 200
+
+    def __init__(self, layer: QgsVectorLayer, parent: QObject = None, interval: int = DEFAULT_INTERVAL):
+        super().__init__(parent)
+        self.layer = layer
+        self.changes: Dict[int, EditChange] = {}
+        # committed vertices, retrieved from the provider on demand
+        self.committed: Dict[int, Optional[VertexArray]] = {}
+        # changed geometries which have not yet been compared with the committed geometries
+        self.pending: Dict[int, QgsGeometry] = {}
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+        layer.geometryChanged.connect(self._geometry_changed)
+        layer.featureAdded.connect(self._feature_added)
+        layer.featureDeleted.connect(self._feature_deleted)
+        layer.editingStarted.connect(self.reset)
+        layer.afterCommitChanges.connect(self.reset)
+        layer.afterRollBack.connect(self.reset)
+
+        self.reset()
+
+    def detach(self):
+        """
+        Disconnects from the layer's signals
+        """
+        self.timer.stop()
+        self.pending = {}
+        if sip.isdeleted(self.layer):  # pylint: disable=no-member
+            return
+
+        self.layer.geometryChanged.disconnect(self._geometry_changed)
+        self.layer.featureAdded.disconnect(self._feature_added)
+        self.layer.featureDeleted.disconnect(self._feature_deleted)
+        self.layer.editingStarted.disconnect(self.reset)
+        self.layer.afterCommitChanges.disconnect(self.reset)
+        self.layer.afterRollBack.disconnect(self.reset)
+
+    def reset(self):
+        """
+        Recalculates all changes from the layer's edit buffer
+        """
+        self.timer.stop()
+        self.pending = {}
+        had_changes = bool(self.changes)
+        self.changes = {}
+        self.committed = {}
+
+        edit_buffer = self.layer.editBuffer() if self.layer.isEditable() else None
+        if edit_buffer is not None:
+            changes = {}
+            for fid, feature in edit_buffer.addedFeatures().items():
+                change = self._added_change(feature.geometry())
+                if change is not None:
+                    changes[fid] = change
+            for fid, geometry in edit_buffer.changedGeometries().items():
+                if fid in changes:
+                    continue
+                change = self._calculate_change(fid, geometry)
+                if change is not None:
+                    changes[fid] = change
+            self.changes = changes
+
+        if had_changes or self.changes:
+            self.changed.emit()
+
+    def _committed_vertices(self, fid: int) -> Optional[VertexArray]:
+        """
+        Returns the committed vertices for a feature, or None if the feature
+        has not been committed
+        """
+        if fid not in self.committed:
+            vertices = None
+            if fid >= 0:
+                request = QgsFeatureRequest().setFilterFid(fid).setNoAttributes()
+                for feature in self.layer.dataProvider().getFeatures(request):
+                    vertices = VertexArray.from_geometry(feature.geometry())
+            self.committed[fid] = vertices
+
+        return self.committed[fid]
+
+    @staticmethod
+    def _added_change(geometry: QgsGeometry) -> Optional[EditChange]:
+        """
+        Returns the change for a feature which has been added in the edit session
+        """
+        count = len(VertexArray.from_geometry(geometry))
+        if not count:
+            return None
+        return EditChange({i + 1: VertexDiffer.INSERT for i in range(count)}, [])
+
+    def _calculate_change(self, fid: int, geometry: QgsGeometry) -> Optional[EditChange]:
+        """
+        Calculates the change for a single feature
+        """
+        committed = self._committed_vertices(fid)
+        if committed is None:
+            return self._added_change(geometry)
+
+        return EditChange.from_diff(vertex_diff(committed, VertexArray.from_geometry(geometry)), committed)
+
+    def _set_change(self, fid: int, change: Optional[EditChange]):
+        """
+        Stores the change for a feature, replacing the changes dictionary
+        """
+        if change is None and fid not in self.changes:
+            return
+
+        changes = dict(self.changes)
+        if change is None:
+            del changes[fid]
+        else:
+            changes[fid] = change
+        self.changes = changes
+        self.changed.emit()
+
+    def has_pending(self) -> bool:
+        """
+        Returns True if there are changed geometries waiting to be compared
+        """
+        return bool(self.pending)
+
+    def flush(self):
+        """
+        Immediately compares all pending changed geometries, updating the changes
+        """
+        self.timer.stop()
+        pending = self.pending
+        self.pending = {}
+
+        changes = dict(self.changes)
+        for fid, geometry in pending.items():
+            change = self._calculate_change(fid, geometry)
+            if change is None:
+                changes.pop(fid, None)
+            else:
+                changes[fid] = change
+
+        if changes != self.changes:
+            self.changes = changes
+            self.changed.emit()
+
+    def _geometry_changed(self, fid: int, geometry: QgsGeometry):
+        """
+        Triggered when the geometry of a feature is changed in the edit buffer
+        """
+        self.pending[fid] = QgsGeometry(geometry)
+        self.timer.start()
+
+    def _feature_added(self, fid: int):
+        """
+        Triggered when a feature is added to the edit buffer
+        """
+        request = QgsFeatureRequest().setFilterFid(fid).setNoAttributes()
+        for feature in self.layer.getFeatures(request):
+            self._set_change(fid, self._added_change(feature.geometry()))
+
+    def _feature_deleted(self, fid: int):
+        """
+        Triggered when a feature is deleted in the edit buffer
+        """
+        self.pending.pop(fid, None)
+        self._set_change(fid, None)
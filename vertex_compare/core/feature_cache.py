@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Feature geometry cache
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import threading
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    QObject
+)
+from qgis.core import (
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+
+class FeatureGeometryCache(QObject):
+    """
+    A least-recently-used cache of feature geometries, which can be shared between
+    multiple layers.
+
+    The cache size is bounded by the total number of vertices in the cached geometries.
+    Cached geometries are discarded whenever the corresponding feature is edited, so
+    layers must be registered via watch_layer() before their geometries are cached.
+
+    Geometries may be fetched in background threads, so each layer has a generation which
+    changes whenever geometries from the layer are discarded. Geometries fetched for an
+    earlier generation of a layer are not cached.
+    """
+
+    DEFAULT_MAX_VERTICES = 5000000
+
+    def __init__(self, max_vertices: int = DEFAULT_MAX_VERTICES, parent: QObject = None):
+        super().__init__(parent)
+        self.max_vertices = max_vertices
+        self.vertex_count = 0
+        self.cache: 'OrderedDict[Tuple[str, int], Tuple[QgsGeometry, int]]' = OrderedDict()
+        self.watched_layers: Dict[str, QgsVectorLayer] = {}
+        self._lock = threading.Lock()
+        # the generation at which each layer or (for clears) all layers were last invalidated
+        self._generation = 0
+        self._invalidated: Dict[str, int] = {}
+        self._cleared = 0
+
+    def watch_layer(self, layer: QgsVectorLayer):
+        """
+        Starts watching a layer for changes, allowing its geometries to be cached
+        """
+        if layer.id() in self.watched_layers:
+            return
+
+        self.watched_layers[layer.id()] = layer
+        layer.geometryChanged.connect(self._geometry_changed)
+        layer.featureDeleted.connect(self._feature_deleted)
+        layer.afterCommitChanges.connect(self._layer_changed)
+        layer.afterRollBack.connect(self._layer_changed)
+        layer.dataChanged.connect(self._layer_changed)
+
+    def unwatch_layer(self, layer: QgsVectorLayer):
+        """
+        Stops watching a layer, and discards all cached geometries from it
+        """
+        layer_id = layer.id()
+        if layer_id not in self.watched_layers:
+            return
+
+        del self.watched_layers[layer_id]
+        if not sip.isdeleted(layer):  # pylint: disable=no-member
+            layer.geometryChanged.disconnect(self._geometry_changed)
+            layer.featureDeleted.disconnect(self._feature_deleted)
+            layer.afterCommitChanges.disconnect(self._layer_changed)
+            layer.afterRollBack.disconnect(self._layer_changed)
+            layer.dataChanged.disconnect(self._layer_changed)
+
+        self.invalidate_layer(layer_id)
+
+    def is_watched(self, layer: QgsVectorLayer) -> bool:
+        """
+        Returns True if the specified layer is being watched by the cache
+        """
+        return layer.id() in self.watched_layers
+
+    def geometry(self, layer_id: str, fid: int) -> Optional[QgsGeometry]:
+        """
+        Returns the cached geometry for a feature, or None if it is not cached
+        """
+        with self._lock:
+            key = (layer_id, fid)
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+
+            self.cache.move_to_end(key)
+            return entry[0]
+
+    def generation(self, layer_id: str) -> int:
+        """
+        Returns the current generation of a layer
+        """
+        with self._lock:
+            return self._layer_generation(layer_id)
+
+    def insert(self, layer_id: str, fid: int, geometry: QgsGeometry, generation: Optional[int] = None):
+        """
+        Inserts a feature's geometry into the cache.
+
+        Geometries will only be cached for layers which are being watched. If generation is set
+        then the geometry is discarded if the layer has been invalidated since that generation.
+        """
+        if layer_id not in self.watched_layers:
+            return
+
+        vertex_count = geometry.constGet().nCoordinates() if not geometry.isNull() else 0
+        if vertex_count > self.max_vertices:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._layer_generation(layer_id):
+                return
+
+            key = (layer_id, fid)
+            self._remove(key)
+            self.cache[key] = (geometry, vertex_count)
+            self.vertex_count += vertex_count
+
+            while self.vertex_count > self.max_vertices and self.cache:
+                _, (_, evicted_count) = self.cache.popitem(last=False)
+                self.vertex_count -= evicted_count
+
+    def invalidate(self, layer_id: str, fid: int):
+        """
+        Discards the cached geometry for a single feature
+        """
+        with self._lock:
+            self._remove((layer_id, fid))
+            self._invalidate_generation(layer_id)
+
+    def invalidate_layer(self, layer_id: str):
+        """
+        Discards all cached geometries from a layer
+        """
+        with self._lock:
+            for key in [k for k in self.cache if k[0] == layer_id]:
+                self._remove(key)
+            self._invalidate_generation(layer_id)
+
+    def clear(self):
+        """
+        Discards all cached geometries
+        """
+        with self._lock:
+            self.cache.clear()
+            self.vertex_count = 0
+            self._generation += 1
+            self._cleared = self._generation
+            self._invalidated = {}
+
+    def _remove(self, key: Tuple[str, int]):
+        """
+        Removes an entry from the cache. The lock must be held by the caller.
+        """
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self.vertex_count -= entry[1]
+
+    def _layer_generation(self, layer_id: str) -> int:
+        """
+        Returns the current generation of a layer. The lock must be held by the caller.
+        """
+        return max(self._cleared, self._invalidated.get(layer_id, 0))
+
+    def _invalidate_generation(self, layer_id: str):
+        """
+        Starts a new generation for a layer. The lock must be held by the caller.
+        """
+        self._generation += 1
+        self._invalidated[layer_id] = self._generation
+
+    def _geometry_changed(self, fid: int, _):
+        """
+        Triggered when a feature's geometry is changed in a watched layer
+        """
+        self.invalidate(self.sender().id(), fid)
+
+    def _feature_deleted(self, fid: int):
+        """
+        Triggered when a feature is deleted from a watched layer
+        """
+        self.invalidate(self.sender().id(), fid)
+
+    def _layer_changed(self):
+        """
+        Triggered when edits to a watched layer are committed or rolled back, or the
+        layer's data is reloaded
+        """
+        self.invalidate_layer(self.sender().id())
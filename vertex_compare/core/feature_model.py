@@ -83,6 +83,67 @@ class FeatureModel(QAbstractItemModel):
 
         self.endInsertRows()
 
+    def add_feature_ids(self, layer: QgsVectorLayer, fids: List[int]):
+        """
+        Adds the specified feature ids to the model, fetching only the newly added features.
+
+        Feature ids which are already present in the model are ignored.
+        """
+        existing = set(self.fids)
+        fids = [fid for fid in fids if fid not in existing]
+        if layer is None or not fids:
+            return
+
+        context = QgsExpressionContext()
+        context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+
+        display_expression = QgsExpression(layer.displayExpression())
+        display_expression.prepare(context)
+
+        request = QgsFeatureRequest().setFilterFids(fids)
+        request.setSubsetOfAttributes(display_expression.referencedColumns(), layer.fields())
+
+        pending_features = list(layer.getFeatures(request))
+        if not pending_features:
+            return
+
+        self.beginInsertRows(QModelIndex(), len(self.features), len(self.features) + len(pending_features) - 1)
+        self.fids = self.fids + [f.id() for f in pending_features]
+        for f in pending_features:
+            self.features.append(f)
+            context.setFeature(f)
+            self.display_expressions.append(display_expression.evaluate(context))
+        self.endInsertRows()
+
+    def remove_feature_ids(self, fids: List[int]):
+        """
+        Removes the specified feature ids from the model.
+
+        Feature ids which are not present in the model are ignored.
+        """
+        to_remove = set(fids)
+        if not to_remove:
+            return
+
+        self.fids = [fid for fid in self.fids if fid not in to_remove]
+
+        # remove contiguous blocks of rows, working from the end so that row numbers remain valid
+        row = len(self.features) - 1
+        while row >= 0:
+            if self.features[row].id() not in to_remove:
+                row -= 1
+                continue
+
+            last = row
+            while row >= 0 and self.features[row].id() in to_remove:
+                row -= 1
+            first = row + 1
+
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.features[first:last + 1]
+            del self.display_expressions[first:last + 1]
+            self.endRemoveRows()
+
     def index(self,  # pylint: disable=missing-function-docstring
               row: int,
               column: int,
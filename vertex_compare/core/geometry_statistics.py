@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Geometry statistics
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import bisect
+import math
+import operator
+from typing import (
+    TYPE_CHECKING,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple
+)
+
+if TYPE_CHECKING:
+    from qgis.core import QgsFeedback  # pylint: disable=ungrouped-imports
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+# number of vertices to process between checks for cancellation
+CANCELLATION_CHECK_INTERVAL = 65536
+
+
+class GeometryStatistics(NamedTuple):
+    """
+    Summary statistics for the vertices of a geometry.
+
+    Segments join consecutive vertices from the same part and ring, so length is the
+    total length of lines, or the total perimeter (including interior rings) of polygons.
+    Duplicate vertices are vertices which are identical to the previous vertex from the
+    same ring.
+    """
+    vertex_count: int
+    part_count: int
+    ring_count: int
+    part_vertex_counts: List[int]
+    bounds: Optional[Tuple[float, float, float, float]]
+    length: float
+    segment_count: int
+    min_segment_length: Optional[float]
+    max_segment_length: Optional[float]
+    duplicate_vertex_count: int
+
+    def mean_segment_length(self) -> Optional[float]:
+        """
+        Returns the mean segment length, or None if there are no segments
+        """
+        return self.length / self.segment_count if self.segment_count else None
+
+
+def _ring_runs(vertices: 'VertexArray') -> List[Tuple[int, int, bool]]:
+    """
+    Returns the index ranges (start, end excluding the end index) of each ring of a vertex array,
+    and whether the ring starts a new part.
+
+    Part numbers increase through the array and ring numbers increase within each part, so the
+    end of each ring is found by a binary search instead of by visiting every vertex.
+    """
+    parts = vertices.parts
+    rings = vertices.rings
+    count = len(vertices)
+
+    runs = []
+    start = 0
+    previous_part = None
+    while start < count:
+        part = parts[start]
+        part_end = bisect.bisect_right(parts, part, start)
+        end = max(start + 1, bisect.bisect_right(rings, rings[start], start, part_end))
+        runs.append((start, end, part != previous_part))
+        previous_part = part
+        start = end
+    return runs
+
+
+def geometry_statistics(vertices: 'VertexArray',  # pylint: disable=too-many-locals
+                        feedback: Optional['QgsFeedback'] = None) -> Optional[GeometryStatistics]:
+    """
+    Calculates the statistics for a vertex array.
+
+    Segment lengths are calculated a block of vertices at a time using built-in functions
+    over array slices, rather than vertex by vertex.
+
+    Returns None if the calculation is canceled via feedback.
+    """
+    count = len(vertices)
+    if not count:
+        return GeometryStatistics(0, 0, 0, [], None, 0.0, 0, None, None, 0)
+
+    x = vertices.x
+    y = vertices.y
+
+    part_vertex_counts = []
+    length = 0.0
+    segment_count = 0
+    min_length = math.inf
+    max_length = -math.inf
+    duplicates = 0
+
+    runs = _ring_runs(vertices)
+    for start, end, new_part in runs:
+        if new_part:
+            part_vertex_counts.append(0)
+        part_vertex_counts[-1] += end - start
+
+        # segments join vertex i to vertex i + 1, for i in [start, end - 1)
+        for block_start in range(start, end - 1, CANCELLATION_CHECK_INTERVAL):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    return None
+                feedback.setProgress(100 * block_start / count)
+
+            block_end = min(block_start + CANCELLATION_CHECK_INTERVAL, end - 1)
+            segment_lengths = list(map(math.hypot,
+                                       map(operator.sub, x[block_start + 1:block_end + 1], x[block_start:block_end]),
+                                       map(operator.sub, y[block_start + 1:block_end + 1], y[block_start:block_end])))
+            length += sum(segment_lengths)
+            segment_count += len(segment_lengths)
+            block_min = min(segment_lengths)
+            block_max = max(segment_lengths)
+            min_length = min(min_length, block_min)
+            max_length = max(max_length, block_max)
+            duplicates += segment_lengths.count(0.0)
+
+    if feedback is not None and feedback.isCanceled():
+        return None
+
+    return GeometryStatistics(vertex_count=count,
+                              part_count=len(part_vertex_counts),
+                              ring_count=len(runs),
+                              part_vertex_counts=part_vertex_counts,
+                              bounds=(min(x), min(y), max(x), max(y)),
+                              length=length,
+                              segment_count=segment_count,
+                              min_segment_length=min_length if segment_count else None,
+                              max_segment_length=max_length if segment_count else None,
+                              duplicate_vertex_count=duplicates)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Geometry statistics cache
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import QObject
+from qgis.core import QgsVectorLayer
+
+from vertex_compare.core.geometry_statistics import GeometryStatistics
+
+
+class GeometryStatisticsCache(QObject):
+    """
+    A least-recently-used cache of the geometry statistics for features from a layer.
+
+    Cached statistics are discarded whenever the corresponding feature is edited, so
+    statistics are only cached for the layer set via set_layer().
+
+    Statistics are usually calculated in the background, so each feature has a generation
+    which changes whenever its statistics are discarded. Statistics calculated for an earlier
+    generation of a feature are not cached.
+    """
+
+    DEFAULT_MAX_ENTRIES = 1000
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, parent: QObject = None):
+        super().__init__(parent)
+        self.max_entries = max_entries
+        self.layer: Optional[QgsVectorLayer] = None
+        self.layer_id: Optional[str] = None
+        self.cache: 'OrderedDict[Tuple[str, int], GeometryStatistics]' = OrderedDict()
+        # the generation at which each feature or (for clears) all features were last invalidated
+        self._generation = 0
+        self._invalidated: Dict[int, int] = {}
+        self._cleared = 0
+
+    def set_layer(self, layer: Optional[QgsVectorLayer]):
+        """
+        Sets the layer to cache statistics for, discarding statistics from any previous layer
+        """
+        if layer == self.layer:
+            return
+
+        if self.layer is not None and not sip.isdeleted(self.layer):  # pylint: disable=no-member
+            self.layer.geometryChanged.disconnect(self._geometry_changed)
+            self.layer.featureDeleted.disconnect(self._feature_deleted)
+            self.layer.afterCommitChanges.disconnect(self.clear)
+            self.layer.afterRollBack.disconnect(self.clear)
+            self.layer.dataChanged.disconnect(self._data_changed)
+
+        self.clear()
+        self.layer = layer
+        self.layer_id = layer.id() if layer is not None else None
+        if layer is not None:
+            layer.geometryChanged.connect(self._geometry_changed)
+            layer.featureDeleted.connect(self._feature_deleted)
+            layer.afterCommitChanges.connect(self.clear)
+            layer.afterRollBack.connect(self.clear)
+            layer.dataChanged.connect(self._data_changed)
+
+    def statistics(self, layer_id: str, fid: int) -> Optional[GeometryStatistics]:
+        """
+        Returns the cached statistics for a feature, or None if they are not cached
+        """
+        key = (layer_id, fid)
+        res = self.cache.get(key)
+        if res is not None:
+            self.cache.move_to_end(key)
+        return res
+
+    def generation(self, fid: int) -> int:
+        """
+        Returns the current generation of a feature from the current layer
+        """
+        return max(self._cleared, self._invalidated.get(fid, 0))
+
+    def insert(self, layer_id: str, fid: int, statistics: GeometryStatistics, generation: Optional[int] = None):
+        """
+        Inserts a feature's statistics into the cache.
+
+        Statistics will only be cached for the current layer. If generation is set then the
+        statistics are discarded if the feature has been invalidated since that generation.
+        """
+        if layer_id != self.layer_id:
+            return
+        if generation is not None and generation != self.generation(fid):
+            return
+
+        key = (layer_id, fid)
+        self.cache[key] = statistics
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def invalidate(self, fid: int):
+        """
+        Discards the cached statistics for a feature from the current layer
+        """
+        self.cache.pop((self.layer_id, fid), None)
+        self._generation += 1
+        self._invalidated[fid] = self._generation
+
+    def clear(self):
+        """
+        Discards all cached statistics
+        """
+        self.cache.clear()
+        self._generation += 1
+        self._cleared = self._generation
+        self._invalidated = {}
+
+    def _data_changed(self):
+        """
+        Triggered when the layer's data is changed
+        """
+        if self.layer.isEditable():
+            # edits (including attribute edits, which don't affect the statistics) are handled
+            # per feature, and when the edit session ends
+            return
+        self.clear()
+
+    def _geometry_changed(self, fid: int, _):
+        """
+        Triggered when a feature's geometry is changed
+        """
+        self.invalidate(fid)
+
+    def _feature_deleted(self, fid: int):
+        """
+        Triggered when a feature is deleted
+        """
+        self.invalidate(fid)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Background geometry statistics task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsGeometry,
+    QgsTask
+)
+
+from vertex_compare.core.geometry_statistics import (
+    GeometryStatistics,
+    geometry_statistics
+)
+from vertex_compare.core.vertex_array import VertexArray
+
+
+class GeometryStatisticsTask(QgsTask):
+    """
+    A background task which calculates the statistics for a feature's geometry
+    """
+
+    def __init__(self, layer_id: str, fid: int, geometry: QgsGeometry, generation: Optional[int] = None):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Calculating geometry statistics'),
+                         QgsTask.CanCancel)
+        self.layer_id = layer_id
+        self.fid = fid
+        # the statistics cache generation of the feature when the task was created
+        self.generation = generation
+        self.geometry = QgsGeometry(geometry)
+
+        self.statistics: Optional[GeometryStatistics] = None
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        self.statistics = geometry_statistics(VertexArray.from_geometry(self.geometry), self)
+        return self.statistics is not None
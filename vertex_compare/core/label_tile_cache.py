@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Label tile cache
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import threading
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    Qt,
+    QPointF
+)
+from qgis.PyQt.QtGui import (
+    QImage,
+    QPainter
+)
+from qgis.core import (
+    QgsPointXY,
+    QgsRenderContext
+)
+
+TileIndex = Tuple[int, int]
+
+
+class LabelTileCache:
+    """
+    A cache of rendered vertex label images, split into tiles aligned to a fixed grid
+    in map units.
+
+    Tiles are keyed by the map scale, destination CRS and output DPI, so that tiles rendered
+    during one render can be reused (at a different pixel offset) when the map is panned.
+    Any change to the rendered content (selection, geometries or style) must be followed by
+    a call to clear().
+    """
+
+    # tile size, in pixels
+    TILE_SIZE = 256
+    # margin around tiles in pixels, allowing labels near tile edges to extend beyond the tile
+    MARGIN = 64
+    # maximum number of (non-empty) tiles to cache
+    MAX_TILES = 96
+
+    def __init__(self, max_tiles: int = MAX_TILES):
+        self.max_tiles = max_tiles
+        self.generation = 0
+        # empty tiles are stored as None, and don't count toward the cache size
+        self.tiles: 'OrderedDict[tuple, Optional[QImage]]' = OrderedDict()
+        self.image_count = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """
+        Discards all cached tiles. Tiles from renders which started before the
+        cache was cleared will not be added to the cache.
+        """
+        with self._lock:
+            self.generation += 1
+            self.tiles.clear()
+            self.image_count = 0
+
+    def tile(self, key: tuple) -> Tuple[bool, Optional[QImage]]:
+        """
+        Returns a tuple of (found, image) for the tile with matching key. The image will be
+        None for tiles which are empty.
+        """
+        with self._lock:
+            if key not in self.tiles:
+                return False, None
+
+            self.tiles.move_to_end(key)
+            return True, self.tiles[key]
+
+    def insert(self, generation: int, key: tuple, image: Optional[QImage]):
+        """
+        Inserts a tile into the cache, if the cache has not been cleared since
+        the specified generation
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            if key in self.tiles and self.tiles[key] is not None:
+                self.image_count -= 1
+
+            self.tiles[key] = image
+            if image is not None:
+                self.image_count += 1
+
+            while self.image_count > self.max_tiles or len(self.tiles) > self.max_tiles * 16:
+                _, evicted = self.tiles.popitem(last=False)
+                if evicted is not None:
+                    self.image_count -= 1
+
+
+class LabelTilePlan:
+    """
+    Determines which label tiles are used by a single render, reusing previously rendered
+    tiles from a cache where possible.
+
+    Only tiles which are completely visible are cached, since features which lie
+    outside the visible map extent are not rendered, and partially visible tiles
+    will be incomplete.
+    """
+
+    def __init__(self, cache: LabelTileCache, context: QgsRenderContext):
+        self.cache = cache
+        self.generation = cache.generation
+        self.map_to_pixel = context.mapToPixel()
+        self.device_pixel_ratio = context.devicePixelRatio()
+
+        # round the map units per pixel, so that minor floating point differences between renders
+        # at the same scale don't result in different tile grids
+        map_units_per_pixel = float(f'{self.map_to_pixel.mapUnitsPerPixel():.12g}')
+        self.tile_size = LabelTileCache.TILE_SIZE * map_units_per_pixel
+
+        crs = context.coordinateTransform().destinationCrs() if context.coordinateTransform().isValid() else None
+        self.render_key = (crs.authid() or crs.toWkt() if crs is not None else '',
+                           map_units_per_pixel,
+                           context.scaleFactor(),
+                           self.device_pixel_ratio)
+
+        extent = context.mapExtent()
+        min_x = math.floor(extent.xMinimum() / self.tile_size)
+        max_x = math.floor(extent.xMaximum() / self.tile_size)
+        min_y = math.floor(extent.yMinimum() / self.tile_size)
+        max_y = math.floor(extent.yMaximum() / self.tile_size)
+
+        self.cached_tiles: Dict[TileIndex, Optional[QImage]] = {}
+        self.visible_tiles = set()
+        for tile_x in range(min_x, max_x + 1):
+            for tile_y in range(min_y, max_y + 1):
+                if tile_x * self.tile_size < extent.xMinimum() or (tile_x + 1) * self.tile_size > extent.xMaximum():
+                    continue
+                if tile_y * self.tile_size < extent.yMinimum() or (tile_y + 1) * self.tile_size > extent.yMaximum():
+                    continue
+
+                index = (tile_x, tile_y)
+                self.visible_tiles.add(index)
+                found, image = cache.tile(self._key(index))
+                if found:
+                    self.cached_tiles[index] = image
+
+        self.new_tiles: Dict[TileIndex, Tuple[QImage, QPainter]] = {}
+
+    @staticmethod
+    def can_use_cache(context: QgsRenderContext) -> bool:
+        """
+        Returns True if the specified render context is compatible with label tile caching
+        """
+        if context.painter() is None or not context.painter().transform().isIdentity():
+            return False
+
+        return context.mapToPixel().mapRotation() == 0
+
+    def _key(self, index: TileIndex) -> tuple:
+        """
+        Returns the cache key for a tile
+        """
+        return self.render_key + index
+
+    def tile_index(self, x: float, y: float) -> TileIndex:
+        """
+        Returns the index of the tile containing a map point
+        """
+        return math.floor(x / self.tile_size), math.floor(y / self.tile_size)
+
+    def is_cached(self, index: TileIndex) -> bool:
+        """
+        Returns True if the tile was retrieved from the cache, and should not be rendered
+        """
+        return index in self.cached_tiles
+
+    def is_cacheable(self, index: TileIndex) -> bool:
+        """
+        Returns True if the tile should be rendered into a tile image for caching
+        """
+        return index in self.visible_tiles
+
+    def _tile_origin(self, index: TileIndex) -> QPointF:
+        """
+        Returns the position of the top-left corner of a tile (excluding the margin), in pixels
+        """
+        point = self.map_to_pixel.transform(QgsPointXY(index[0] * self.tile_size, (index[1] + 1) * self.tile_size))
+        return QPointF(point.x() - LabelTileCache.MARGIN, point.y() - LabelTileCache.MARGIN)
+
+    def painter_for_tile(self, index: TileIndex, reference_painter: QPainter) -> QPainter:
+        """
+        Returns a painter for rendering into a tile. Coordinates for the painter match
+        those of the destination painter.
+        """
+        if index in self.new_tiles:
+            return self.new_tiles[index][1]
+
+        size = int((LabelTileCache.TILE_SIZE + 2 * LabelTileCache.MARGIN) * self.device_pixel_ratio)
+        image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(self.device_pixel_ratio)
+        image.fill(Qt.transparent)
+
+        painter = QPainter(image)
+        painter.setRenderHints(reference_painter.renderHints())
+        origin = self._tile_origin(index)
+        painter.translate(-origin.x(), -origin.y())
+
+        self.new_tiles[index] = (image, painter)
+        return painter
+
+    def finish(self, painter: QPainter, store: bool):
+        """
+        Finishes the render, drawing all tiles onto the destination painter.
+
+        If store is True then newly rendered tiles will be added to the cache.
+        """
+        for image, tile_painter in self.new_tiles.values():
+            tile_painter.end()
+
+        if store:
+            for index in self.visible_tiles:
+                if index in self.cached_tiles:
+                    continue
+                image = self.new_tiles[index][0] if index in self.new_tiles else None
+                self.cache.insert(self.generation, self._key(index), image)
+
+        for index, image in self.cached_tiles.items():
+            if image is not None:
+                painter.drawImage(self._tile_origin(index), image)
+        for index, (image, _) in self.new_tiles.items():
+            painter.drawImage(self._tile_origin(index), image)
+
+        self.new_tiles = {}
+        self.cached_tiles = {}
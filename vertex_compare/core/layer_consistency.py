@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Layer-wide vertex consistency checks
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsFeatureSource,
+    QgsFeedback,
+    QgsRectangle,
+    QgsSpatialIndex
+)
+
+from vertex_compare.core.topology import (
+    Inconsistency,
+    check_pairs,
+    check_pairs_from_buffers,
+    vertex_buffers
+)
+from vertex_compare.core.vertex_array import VertexArray
+
+
+def python_executable() -> Optional[str]:
+    """
+    Returns the path to a Python interpreter which can be used for worker processes, or
+    None if no interpreter could be found.
+
+    When running inside QGIS, sys.executable is the QGIS application itself, so the
+    interpreter matching the embedded Python is located instead.
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+
+    version = f'{sys.version_info.major}.{sys.version_info.minor}'
+    candidates = [os.path.join(sys.exec_prefix, 'python.exe'),
+                  os.path.join(sys.exec_prefix, 'bin', f'python{version}'),
+                  os.path.join(sys.exec_prefix, 'bin', 'python3'),
+                  shutil.which(f'python{version}')]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+class LayerConsistencyChecker:
+    """
+    Checks all pairs of neighboring features from a line or polygon source for
+    inconsistent vertices along shared boundaries.
+
+    Candidate pairs are found using a spatial index of feature bounding boxes. The source
+    extent is split into a grid of tiles containing roughly chunk_size features each, and
+    each tile is processed in turn, so that only the geometries of features from a few
+    tiles (and their immediate neighbors) are held in memory at once.
+
+    Tiles can optionally be compared in a pool of worker processes. Features are always
+    read and decoded in the calling thread, and the decoded coordinates are passed to
+    workers as raw buffers. Results are identical to those from a single process run.
+    """
+
+    DEFAULT_CHUNK_SIZE = 10000
+
+    def __init__(self,
+                 source: QgsFeatureSource,
+                 tolerance: float = 0,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 workers: int = 1):
+        """
+        Constructor for LayerConsistencyChecker.
+
+        :param workers: number of worker processes to use for comparisons. If 1, all
+            comparisons are made in the calling thread.
+        """
+        self.source = source
+        self.tolerance = tolerance
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.index: Optional[QgsSpatialIndex] = None
+
+    def build_index(self, feedback: Optional[QgsFeedback] = None):
+        """
+        Builds the spatial index of feature bounding boxes
+        """
+        request = QgsFeatureRequest().setNoAttributes()
+        self.index = QgsSpatialIndex(self.source.getFeatures(request), feedback)
+
+    def tiles(self) -> List[Tuple[QgsRectangle, bool, bool]]:
+        """
+        Returns the tiles to process, in order, as tuples of the tile extent and
+        whether the tile is in the last column and last row of the grid
+        """
+        extent = self.source.sourceExtent()
+        tile_count = max(1, math.ceil(max(self.source.featureCount(), 0) / self.chunk_size))
+        side = math.ceil(math.sqrt(tile_count))
+
+        width = extent.width() / side
+        height = extent.height() / side
+        res = []
+        for row in range(side):
+            for column in range(side):
+                last_column = column == side - 1
+                last_row = row == side - 1
+                res.append((QgsRectangle(extent.xMinimum() + column * width,
+                                         extent.yMinimum() + row * height,
+                                         extent.xMaximum() if last_column else extent.xMinimum() + (column + 1) * width,
+                                         extent.yMaximum() if last_row else extent.yMinimum() + (row + 1) * height),
+                            last_column,
+                            last_row))
+        return res
+
+    def _fetch(self, request: QgsFeatureRequest) -> Dict[int, Tuple[VertexArray, QgsRectangle]]:
+        """
+        Fetches and decodes features matching a request
+        """
+        res = {}
+        for feature in self.source.getFeatures(request.setNoAttributes()):
+            if not feature.hasGeometry():
+                continue
+            geometry = feature.geometry()
+            res[feature.id()] = (VertexArray.from_geometry(geometry), geometry.boundingBox())
+        return res
+
+    def tile_pairs(self, tile: QgsRectangle, is_last_column: bool, is_last_row: bool) \
+            -> Tuple[Dict[int, VertexArray], List[Tuple[int, int]]]:
+        """
+        Returns the decoded vertices and candidate pairs for the features owned by a tile.
+
+        Features are owned by the tile containing the center of their bounding box, and
+        each pair is only returned by the tile which owns the pair's lower feature id.
+        """
+        owned = {}
+        for fid, (vertices, bbox) in self._fetch(QgsFeatureRequest().setFilterRect(tile)).items():
+            center = bbox.center()
+            if not tile.xMinimum() <= center.x() < tile.xMaximum() and not (is_last_column and center.x() == tile.xMaximum()):
+                continue
+            if not tile.yMinimum() <= center.y() < tile.yMaximum() and not (is_last_row and center.y() == tile.yMaximum()):
+                continue
+            owned[fid] = (vertices, bbox)
+
+        pairs = []
+        for fid, (_, bbox) in owned.items():
+            search = bbox.buffered(self.tolerance) if self.tolerance > 0 else bbox
+            pairs.extend((fid, other) for other in self.index.intersects(search) if other > fid)
+        pairs.sort()
+
+        vertices = {fid: v for fid, (v, _) in owned.items()}
+        missing = {other for _, other in pairs if other not in vertices}
+        if missing:
+            for fid, (v, _) in self._fetch(QgsFeatureRequest().setFilterFids(sorted(missing))).items():
+                vertices[fid] = v
+
+        # pairs may reference features without geometry
+        pairs = [(fid1, fid2) for fid1, fid2 in pairs if fid2 in vertices]
+        return vertices, pairs
+
+    def _create_executor(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Creates a process pool for comparisons, or returns None if comparisons
+        should be made in the calling thread
+        """
+        if self.workers <= 1:
+            return None
+
+        executable = python_executable()
+        if executable is None:
+            return None
+
+        # always spawn fresh interpreters -- forking the QGIS process is unsafe
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(executable)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def run(self,
+            callback: Callable[[Inconsistency], None],
+            feedback: Optional[QgsFeedback] = None):
+        """
+        Runs the check, calling callback for each inconsistent vertex found.
+
+        Results are reported tile by tile, and sorted by feature id, vertex number and
+        neighbor feature id within each tile.
+        """
+        if self.index is None:
+            self.build_index(feedback)
+
+        tiles = self.tiles()
+        executor = self._create_executor()
+        if executor is None:
+            for i, (tile, last_column, last_row) in enumerate(tiles):
+                if feedback is not None and feedback.isCanceled():
+                    return
+
+                vertices, pairs = self.tile_pairs(tile, last_column, last_row)
+                for result in check_pairs(vertices, pairs, self.tolerance):
+                    callback(result)
+
+                if feedback is not None:
+                    feedback.setProgress(100 * (i + 1) / len(tiles))
+            return
+
+        # limit the number of tiles in flight, so that memory use remains bounded
+        max_pending = 2 * self.workers
+        pending = deque()
+        completed = 0
+
+        def _report_oldest():
+            nonlocal completed
+            for result in pending.popleft().result():
+                callback(result)
+            completed += 1
+            if feedback is not None:
+                feedback.setProgress(100 * completed / len(tiles))
+
+        try:
+            for tile, last_column, last_row in tiles:
+                if feedback is not None and feedback.isCanceled():
+                    return
+
+                vertices, pairs = self.tile_pairs(tile, last_column, last_row)
+                buffers = {fid: vertex_buffers(vertices[fid]) for pair in pairs for fid in pair}
+                pending.append(executor.submit(check_pairs_from_buffers, buffers, pairs, self.tolerance))
+
+                # results are always reported in tile order
+                while len(pending) >= max_pending or (pending and pending[0].done()):
+                    _report_oldest()
+
+            while pending:
+                if feedback is not None and feedback.isCanceled():
+                    return
+                _report_oldest()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Background reference layer indexing task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsSpatialIndex,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource
+)
+
+
+class ReferenceIndexTask(QgsTask):
+    """
+    A background task which builds the spatial index of a reference layer's features.
+
+    The task must be created on the main thread, since it takes a copy of the layer's
+    feature source (including any unsaved edits).
+    """
+
+    def __init__(self, layer: QgsVectorLayer):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Indexing reference layer'),
+                         QgsTask.CanCancel)
+        self.source = QgsVectorLayerFeatureSource(layer)
+        # the index is bulk loaded, which can only be canceled via a feedback object
+        self.feedback = QgsFeedback()
+
+        self.index: Optional[QgsSpatialIndex] = None
+
+    def cancel(self):  # pylint: disable=missing-function-docstring
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        request = QgsFeatureRequest().setNoAttributes()
+        index = QgsSpatialIndex(self.source.getFeatures(request), self.feedback)
+        if self.feedback.isCanceled():
+            return False
+
+        self.index = index
+        return True
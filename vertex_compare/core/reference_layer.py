@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""Reference layer comparisons
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import threading
+from functools import partial
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional
+)
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    QObject,
+    pyqtSignal
+)
+from qgis.core import (
+    QgsAbstractFeatureSource,
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsUnitTypes,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.reference_index_task import ReferenceIndexTask
+from vertex_compare.core.topology import uncommon_reference_vertices
+from vertex_compare.core.vertex_array import VertexArray
+
+
+class TransformedVertexCache:
+    """
+    A thread-safe cache of the vertices of reference features, transformed to a single CRS.
+
+    A cache is discarded (rather than cleared) whenever the reference layer's features or CRS
+    change, so that renders which are still using the previous geometries never populate the
+    replacement cache.
+    """
+
+    def __init__(self):
+        self._vertices: Dict[int, Optional[VertexArray]] = {}
+        self._lock = threading.Lock()
+
+    def vertices(self, fid: int, geometry: QgsGeometry, transform: QgsCoordinateTransform) -> Optional[VertexArray]:
+        """
+        Returns the transformed vertices of a reference feature, or None if they could not
+        be transformed
+        """
+        with self._lock:
+            if fid in self._vertices:
+                return self._vertices[fid]
+
+        try:
+            vertices = VertexArray.from_geometry(geometry).transformed(transform)
+        except QgsCsException:
+            vertices = None
+
+        with self._lock:
+            return self._vertices.setdefault(fid, vertices)
+
+
+class ReferenceIndex:
+    """
+    The spatial index of a reference layer's features, along with the copy of the layer's
+    features which the index was built from.
+
+    Neither is modified after creation, so a reference index can be used from any thread.
+    """
+
+    def __init__(self, layer_id: str, index: QgsSpatialIndex, source: QgsAbstractFeatureSource):
+        self.layer_id = layer_id
+        self.index = index
+        self.source = source
+        # features are fetched by renders of all compared layers, so fetches are serialized
+        self._source_lock = threading.Lock()
+
+    def intersects(self, rect: QgsRectangle) -> List[int]:
+        """
+        Returns the ids of the reference features whose bounding boxes intersect a rectangle
+        """
+        return self.index.intersects(rect)
+
+    def geometries(self,
+                   fids: Iterable[int],
+                   cache: Optional[FeatureGeometryCache] = None,
+                   generation: Optional[int] = None) -> Dict[int, QgsGeometry]:
+        """
+        Returns the geometries of reference features.
+
+        If a cache is specified then previously fetched geometries will be retrieved from the
+        cache, and newly fetched geometries added to it (unless the cache has been invalidated
+        since generation).
+        """
+        res = {}
+        remaining = []
+        for fid in fids:
+            geometry = cache.geometry(self.layer_id, fid) if cache is not None else None
+            if geometry is not None:
+                res[fid] = geometry
+            else:
+                remaining.append(fid)
+
+        if remaining:
+            request = QgsFeatureRequest().setFilterFids(remaining).setNoAttributes()
+            with self._source_lock:
+                for f in self.source.getFeatures(request):
+                    res[f.id()] = f.geometry()
+                    if cache is not None:
+                        cache.insert(self.layer_id, f.id(), f.geometry(), generation)
+        return res
+
+
+class ReferenceCandidates:
+    """
+    Finds the reference features which may share vertices with a set of features.
+
+    Candidates are created on the main thread, but intersecting reference features are only
+    looked up and fetched when comparing features, from a background thread.
+    """
+
+    def __init__(self,
+                 index: ReferenceIndex,
+                 transform: QgsCoordinateTransform,
+                 tolerance: float,
+                 vertex_cache: TransformedVertexCache,
+                 cache: Optional[FeatureGeometryCache] = None,
+                 generation: Optional[int] = None):
+        self.index = index
+        self.transform = transform
+        self.tolerance = tolerance
+        self.vertex_cache = vertex_cache
+        self.cache = cache
+        self.generation = generation
+
+    def matches(self, geometries: Dict[int, QgsGeometry]) -> Dict[int, List[int]]:
+        """
+        Returns the ids of the reference features whose bounding boxes intersect each feature
+        """
+        res = {}
+        for fid, geometry in geometries.items():
+            if geometry.isNull():
+                continue
+            try:
+                rect = self.transform.transformBoundingBox(geometry.boundingBox(),
+                                                           QgsCoordinateTransform.ReverseTransform)
+            except QgsCsException:
+                continue
+            res[fid] = self.index.intersects(rect)
+        return res
+
+    def uncommon_vertices(self, geometries: Dict[int, QgsGeometry]) -> Dict[int, List[int]]:
+        """
+        Returns the vertex numbers (starting at 1) of the vertices from each feature which
+        are not coincident with a vertex from an intersecting reference feature.
+
+        Reference vertices are transformed to the features' CRS in batches, once per
+        reference feature, and reused by later renders until the reference layer changes.
+        This may be costly, so should be called from a background thread only.
+        """
+        matches = self.matches(geometries)
+        reference_fids = set()
+        for fids in matches.values():
+            reference_fids.update(fids)
+        reference_geometries = self.index.geometries(reference_fids, self.cache, self.generation)
+
+        res = {}
+        for fid, geometry in geometries.items():
+            references = [self.vertex_cache.vertices(reference_fid, reference_geometries[reference_fid],
+                                                     self.transform)
+                          for reference_fid in matches.get(fid, [])
+                          if reference_fid in reference_geometries]
+            res[fid] = uncommon_reference_vertices(VertexArray.from_geometry(geometry),
+                                                   [vertices for vertices in references if vertices is not None],
+                                                   self.tolerance)
+        return res
+
+
+class ReferenceLayer(QObject):
+    """
+    A reference layer, which features from other layers are compared against.
+
+    The spatial index of the reference layer is built in a background task when it is first
+    required, and is discarded whenever the reference layer's features change. The changed
+    signal is emitted once the index is ready. Coordinate transforms from the reference layer
+    to other CRSes, and the transformed reference vertices, are cached and reused.
+    """
+
+    # distance within which reprojected vertices are considered coincident, in meters
+    REPROJECTION_TOLERANCE_METERS = 0.001
+    # distance within which reprojected vertices are considered coincident, for geographic CRSes
+    REPROJECTION_TOLERANCE_DEGREES = 1e-8
+
+    changed = pyqtSignal()
+
+    def __init__(self, layer: QgsVectorLayer, parent: QObject = None):
+        super().__init__(parent)
+        self.layer = layer
+        self.index: Optional[ReferenceIndex] = None
+        self.index_task: Optional[ReferenceIndexTask] = None
+        self.transforms: Dict[str, QgsCoordinateTransform] = {}
+        self.vertex_caches: Dict[str, TransformedVertexCache] = {}
+
+        layer.geometryChanged.connect(self._features_changed)
+        layer.featureAdded.connect(self._features_changed)
+        layer.featureDeleted.connect(self._features_changed)
+        layer.afterRollBack.connect(self._features_changed)
+        layer.dataChanged.connect(self._features_changed)
+        layer.crsChanged.connect(self._crs_changed)
+
+    def detach(self):
+        """
+        Disconnects from the layer's signals
+        """
+        self._cancel_index_task()
+        if sip.isdeleted(self.layer):  # pylint: disable=no-member
+            return
+
+        self.layer.geometryChanged.disconnect(self._features_changed)
+        self.layer.featureAdded.disconnect(self._features_changed)
+        self.layer.featureDeleted.disconnect(self._features_changed)
+        self.layer.afterRollBack.disconnect(self._features_changed)
+        self.layer.dataChanged.disconnect(self._features_changed)
+        self.layer.crsChanged.disconnect(self._crs_changed)
+
+    def _features_changed(self, *_):
+        """
+        Triggered when the reference layer's features are changed
+        """
+        self._cancel_index_task()
+        self.index = None
+        self.vertex_caches = {}
+        self.changed.emit()
+
+    def _crs_changed(self):
+        """
+        Triggered when the reference layer's CRS is changed
+        """
+        self.transforms = {}
+        self.vertex_caches = {}
+        self.changed.emit()
+
+    def _cancel_index_task(self):
+        """
+        Cancels the current index task, if any
+        """
+        if self.index_task is not None:
+            self.index_task.cancel()
+            self.index_task = None
+
+    def _index_built(self, task: ReferenceIndexTask):
+        """
+        Triggered when a spatial index task has completed
+        """
+        if task is not self.index_task:
+            # superseded after the reference layer changed
+            return
+
+        self.index_task = None
+        self.index = ReferenceIndex(self.layer.id(), task.index, task.source)
+        self.changed.emit()
+
+    def _index_terminated(self, task: ReferenceIndexTask):
+        """
+        Triggered when a spatial index task was canceled or failed
+        """
+        if task is self.index_task:
+            self.index_task = None
+
+    def spatial_index(self) -> Optional[ReferenceIndex]:
+        """
+        Returns the spatial index of the reference layer's features, or None if the index
+        is not ready yet.
+
+        If required, a background task to build the index is started. This must be called
+        from the main thread.
+        """
+        if self.index is None and self.index_task is None:
+            self.index_task = ReferenceIndexTask(self.layer)
+            self.index_task.taskCompleted.connect(partial(self._index_built, self.index_task))
+            self.index_task.taskTerminated.connect(partial(self._index_terminated, self.index_task))
+            QgsApplication.taskManager().addTask(self.index_task)
+        return self.index
+
+    def transform(self, crs: QgsCoordinateReferenceSystem) -> QgsCoordinateTransform:
+        """
+        Returns the (cached) transform from the reference layer's CRS to another CRS
+        """
+        key = crs.toWkt()
+        if key not in self.transforms:
+            self.transforms[key] = QgsCoordinateTransform(self.layer.crs(), crs, QgsProject.instance())
+        return self.transforms[key]
+
+    def tolerance(self, crs: QgsCoordinateReferenceSystem) -> float:
+        """
+        Returns the distance within which vertices are considered coincident when comparing
+        features in another CRS against the reference layer
+        """
+        if crs == self.layer.crs():
+            return 0
+        if crs.isGeographic():
+            return ReferenceLayer.REPROJECTION_TOLERANCE_DEGREES
+        return ReferenceLayer.REPROJECTION_TOLERANCE_METERS * QgsUnitTypes.fromUnitToUnitFactor(
+            QgsUnitTypes.DistanceMeters, crs.mapUnits())
+
+    def vertex_cache(self, crs: QgsCoordinateReferenceSystem) -> TransformedVertexCache:
+        """
+        Returns the cache of reference vertices transformed to another CRS
+        """
+        key = crs.toWkt()
+        if key not in self.vertex_caches:
+            self.vertex_caches[key] = TransformedVertexCache()
+        return self.vertex_caches[key]
+
+    def candidates(self,
+                   crs: QgsCoordinateReferenceSystem,
+                   cache: Optional[FeatureGeometryCache] = None) -> Optional[ReferenceCandidates]:
+        """
+        Returns the candidates for comparing features in the specified CRS against the
+        reference layer.
+
+        Returns None if the reference layer's spatial index is still being built.
+
+        This must be called from the main thread.
+        """
+        index = self.spatial_index()
+        if index is None:
+            return None
+
+        return ReferenceCandidates(index=index,
+                                   transform=QgsCoordinateTransform(self.transform(crs)),
+                                   tolerance=self.tolerance(crs),
+                                   vertex_cache=self.vertex_cache(crs),
+                                   cache=cache,
+                                   generation=cache.generation(self.layer.id()) if cache is not None else None)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Layer repaint scheduler
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Dict
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    QObject,
+    QTimer
+)
+from qgis.core import (
+    QgsMapLayer
+)
+
+
+class RepaintScheduler(QObject):
+    """
+    Coalesces layer repaint requests.
+
+    All repaints requested for a layer within the scheduler's interval (by default, a
+    single event loop iteration) are collapsed into a single call to triggerRepaint()
+    """
+
+    def __init__(self, interval: int = 0, parent: QObject = None):
+        """
+        Constructor for RepaintScheduler.
+
+        :param interval: window in milliseconds in which repaint requests will be coalesced.
+            A value of 0 coalesces all requests made within the same event loop iteration.
+        """
+        super().__init__(parent)
+
+        self.pending_layers: Dict[str, QgsMapLayer] = {}
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def interval(self) -> int:
+        """
+        Returns the interval (in milliseconds) in which repaint requests are coalesced
+        """
+        return self.timer.interval()
+
+    def set_interval(self, interval: int):
+        """
+        Sets the interval (in milliseconds) in which repaint requests are coalesced
+        """
+        self.timer.setInterval(interval)
+
+    def schedule(self, layer: QgsMapLayer):
+        """
+        Schedules a repaint of the specified layer
+        """
+        if layer is None or sip.isdeleted(layer):  # pylint: disable=no-member
+            return
+
+        self.pending_layers[layer.id()] = layer
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def cancel(self, layer: QgsMapLayer):
+        """
+        Cancels any pending repaint for the specified layer
+        """
+        if layer is None or sip.isdeleted(layer):  # pylint: disable=no-member
+            return
+
+        self.pending_layers.pop(layer.id(), None)
+        if not self.pending_layers:
+            self.timer.stop()
+
+    def has_pending(self) -> bool:
+        """
+        Returns True if there are repaints waiting to be triggered
+        """
+        return bool(self.pending_layers)
+
+    def flush(self):
+        """
+        Immediately triggers all pending repaints
+        """
+        self.timer.stop()
+
+        layers = self.pending_layers
+        self.pending_layers = {}
+        for layer in layers.values():
+            if not sip.isdeleted(layer):  # pylint: disable=no-member
+                layer.triggerRepaint()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Selection snapshot
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import threading
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple
+)
+
+from qgis.core import (
+    QgsAbstractFeatureSource,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsVectorLayer,
+    QgsVectorLayerEditBuffer
+)
+
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+
+
+class PendingGeometries(NamedTuple):
+    """
+    The features of a selection snapshot which still need to be fetched from the layer's
+    data provider
+    """
+    layer_id: str
+    source: QgsAbstractFeatureSource
+    fids: List[int]
+    cache: Optional[FeatureGeometryCache]
+    generation: Optional[int]
+
+
+class SelectionSnapshot:
+    """
+    A lightweight snapshot of the geometries of a set of features from a layer.
+
+    Unlike QgsVectorLayerFeatureSource, which takes a copy of a layer's entire edit buffer,
+    only the (possibly edited) geometries of the requested features are captured. The cost
+    of creating a snapshot depends on the number of requested features only.
+
+    Snapshots created via deferred() only capture the cached and edited geometries. The
+    remaining geometries are read from the layer's data provider by fetch(), which can be
+    called from a render thread. Snapshots are never modified after they have been fetched,
+    so can be safely read from render threads.
+    """
+
+    def __init__(self,
+                 geometries: Optional[Dict[int, QgsGeometry]] = None,
+                 pending: Optional[PendingGeometries] = None):
+        self.geometries: Dict[int, QgsGeometry] = geometries or {}
+        self._pending = pending
+        self._fetch_lock = threading.Lock()
+
+    @staticmethod
+    def from_layer(layer: QgsVectorLayer,
+                   fids: Iterable[int],
+                   cache: Optional[FeatureGeometryCache] = None) -> 'SelectionSnapshot':
+        """
+        Creates a snapshot of the current geometries of the specified features from a layer.
+
+        If a cache is specified then previously fetched geometries will be retrieved from the
+        cache, and newly fetched geometries added to it.
+
+        All geometries are fetched immediately. Use deferred() instead to avoid reading
+        from the data provider in the calling thread.
+        """
+        snapshot = SelectionSnapshot.deferred(layer, fids, cache)
+        snapshot.fetch()
+        return snapshot
+
+    @staticmethod
+    def deferred(layer: QgsVectorLayer,
+                 fids: Iterable[int],
+                 cache: Optional[FeatureGeometryCache] = None) -> 'SelectionSnapshot':
+        """
+        Creates a snapshot of the current geometries of the specified features from a layer,
+        without reading any geometries from the layer's data provider. fetch() must be called
+        before the snapshot's geometries are used.
+
+        If a cache is specified then previously fetched geometries will be retrieved from the
+        cache, and newly fetched geometries added to it.
+
+        This reads the layer's edit buffer, so must be called from the main thread.
+        """
+        remaining = set(fids)
+        geometries = {}
+
+        if cache is not None:
+            for fid in remaining:
+                geometry = cache.geometry(layer.id(), fid)
+                if geometry is not None:
+                    geometries[fid] = geometry
+            remaining = remaining - set(geometries.keys())
+
+        edit_buffer = layer.editBuffer()
+        if edit_buffer is not None and remaining:
+            edited, deleted = SelectionSnapshot._edited_geometries(edit_buffer, remaining)
+            if cache is not None:
+                for fid, geometry in edited.items():
+                    cache.insert(layer.id(), fid, geometry)
+            geometries.update(edited)
+            remaining = remaining - deleted - set(edited.keys())
+
+        pending = None
+        if remaining:
+            # the unedited geometries can be fetched directly from the provider, later
+            pending = PendingGeometries(layer_id=layer.id(),
+                                        source=layer.dataProvider().featureSource(),
+                                        fids=list(remaining),
+                                        cache=cache,
+                                        generation=cache.generation(layer.id()) if cache is not None else None)
+        return SelectionSnapshot(geometries, pending)
+
+    @staticmethod
+    def _edited_geometries(edit_buffer: QgsVectorLayerEditBuffer,
+                           fids: Set[int]) -> Tuple[Dict[int, QgsGeometry], Set[int]]:
+        """
+        Returns the geometries of the specified features which were added or changed in an
+        edit buffer, and the set of deleted features
+        """
+        added = [fid for fid in fids if edit_buffer.isFeatureAdded(fid)]
+        changed = [fid for fid in fids if edit_buffer.isFeatureGeometryChanged(fid)]
+        deleted = {fid for fid in fids if edit_buffer.isFeatureDeleted(fid)}
+
+        # only retrieve the edit buffer maps if we actually need them
+        geometries = {}
+        if added:
+            added_features = edit_buffer.addedFeatures()
+            for fid in added:
+                geometries[fid] = QgsGeometry(added_features[fid].geometry())
+        if changed:
+            changed_geometries = edit_buffer.changedGeometries()
+            for fid in changed:
+                if fid in changed_geometries:
+                    geometries[fid] = QgsGeometry(changed_geometries[fid])
+
+        return geometries, deleted
+
+    def fetch(self):
+        """
+        Reads the geometries which were not captured when the snapshot was created from the
+        layer's data provider, if they have not already been fetched.
+
+        This may be costly, so should be called from a background thread where possible.
+        """
+        with self._fetch_lock:
+            pending = self._pending
+            if pending is None:
+                return
+
+            request = QgsFeatureRequest().setFilterFids(pending.fids).setNoAttributes()
+            for f in pending.source.getFeatures(request):
+                self.geometries[f.id()] = f.geometry()
+                if pending.cache is not None:
+                    pending.cache.insert(pending.layer_id, f.id(), f.geometry(), pending.generation)
+
+            self._pending = None
+
+    def fids(self) -> List[int]:
+        """
+        Returns the list of feature ids contained in the snapshot
+        """
+        return list(self.geometries.keys())
+
+    def geometry(self, fid: int) -> Optional[QgsGeometry]:
+        """
+        Returns the geometry for the specified feature, or None if the feature
+        is not contained in the snapshot
+        """
+        return self.geometries.get(fid)
+
+    def subset(self, fids: Iterable[int]) -> Dict[int, QgsGeometry]:
+        """
+        Returns a dictionary of the geometries for the specified features
+        """
+        return {fid: self.geometries[fid] for fid in fids if fid in self.geometries}
+
+    def __len__(self):
+        return len(self.geometries)
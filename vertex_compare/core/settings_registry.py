@@ -13,8 +13,12 @@ __copyright__ = 'Copyright 2020, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
+from typing import Any
+
 from qgis.PyQt.QtCore import (
-    Qt
+    Qt,
+    QObject,
+    pyqtSignal
 )
 from qgis.PyQt.QtGui import (
     QColor
@@ -35,91 +39,223 @@ from qgis.core import (
 )
 
 
-class SettingsRegistry:
+class SettingsRegistry(QObject):
     """
-    Plugin settings registry
+    Plugin settings registry.
+
+    Settings are read from QgsSettings on first access only, and are then held in memory.
+    Call reload() if the underlying QgsSettings are modified outside of the registry.
     """
 
+    # emitted with the setting key whenever a setting is changed. An empty key
+    # indicates that all settings may have changed.
+    setting_changed = pyqtSignal(str)
+
     LABEL_NONE = 1
     LABEL_SELECTED = 2
     LABEL_ALL = 3
 
+    LABELS = 'labels'
+    CENTER_ON_SELECTED = 'center_on_selected'
+    FLASH_FEATURE = 'flash_feature'
+    FLASH_VERTEX = 'flash_vertex'
+    LABEL_TIME_BUDGET = 'label_time_budget'
+    LABEL_VERTEX_BUDGET = 'label_vertex_budget'
+
+    VERTEX_CACHE_ENABLED = 'vertex_cache_enabled'
+    VERTEX_CACHE_SIZE = 'vertex_cache_size'
+    STORE_TOPOLOGY = 'store_topology'
+
+    DEFAULT_LABEL_VERTEX_BUDGET = 20000
+    DEFAULT_VERTEX_CACHE_SIZE = 1024
+    MARKER_SYMBOL = 'marker_symbol'
+    VERTEX_FONT_KEY = 'vertex_font'
+    NUMBER_FORMAT_KEY = 'number_format'
+
     VERTEX_SYMBOL = None
     VERTEX_FONT = None
     NUMBER_FORMAT = None
 
+    VALUES = {}
+
+    @staticmethod
+    def _value(key: str, default: Any, value_type: type) -> Any:
+        """
+        Returns the value of a simple setting, reading it from QgsSettings only if it
+        is not already cached
+        """
+        if key in SettingsRegistry.VALUES:
+            return SettingsRegistry.VALUES[key]
+
+        settings = QgsSettings()
+        value = settings.value(f'vertex_compare/{key}', default, value_type, QgsSettings.Plugins)
+        SettingsRegistry.VALUES[key] = value
+        return value
+
+    @staticmethod
+    def _set_value(key: str, value: Any):
+        """
+        Sets the value of a simple setting, storing it in QgsSettings and notifying listeners
+        if it has changed
+        """
+        settings = QgsSettings()
+        settings.setValue(f'vertex_compare/{key}', value, QgsSettings.Plugins)
+        if key in SettingsRegistry.VALUES and SettingsRegistry.VALUES[key] == value:
+            return
+
+        SettingsRegistry.VALUES[key] = value
+        SETTINGS_REGISTRY.setting_changed.emit(key)
+
+    @staticmethod
+    def reload():
+        """
+        Discards all cached settings, so that they will be re-read from QgsSettings
+        on next access
+        """
+        SettingsRegistry.VALUES = {}
+        SettingsRegistry.VERTEX_SYMBOL = None
+        SettingsRegistry.VERTEX_FONT = None
+        SettingsRegistry.NUMBER_FORMAT = None
+        SETTINGS_REGISTRY.setting_changed.emit('')
+
     @staticmethod
     def label_filtering() -> int:
         """
         Returns the current vertex label filtering
         """
-        settings = QgsSettings()
-        current_filter = settings.value('vertex_compare/labels',
-                                        SettingsRegistry.LABEL_ALL,
-                                        int, QgsSettings.Plugins)
-        return current_filter
+        return SettingsRegistry._value(SettingsRegistry.LABELS, SettingsRegistry.LABEL_ALL, int)
 
     @staticmethod
     def set_label_filtering(filtering: int):
         """
         Sets the current vertex label filtering
         """
-        settings = QgsSettings()
-        settings.setValue('vertex_compare/labels', filtering, QgsSettings.Plugins)
+        SettingsRegistry._set_value(SettingsRegistry.LABELS, filtering)
 
     @staticmethod
     def center_on_selected() -> bool:
         """
         Returns the center on selected setting
         """
-        settings = QgsSettings()
-        return settings.value('vertex_compare/center_on_selected',
-                              False,
-                              bool, QgsSettings.Plugins)
+        return SettingsRegistry._value(SettingsRegistry.CENTER_ON_SELECTED, False, bool)
 
     @staticmethod
     def set_center_on_selected(center: bool):
         """
         Sets whether the map should be centered on the selected vertex automatically
         """
-        settings = QgsSettings()
-        settings.setValue('vertex_compare/center_on_selected', center, QgsSettings.Plugins)
+        SettingsRegistry._set_value(SettingsRegistry.CENTER_ON_SELECTED, center)
 
     @staticmethod
     def flash_feature() -> bool:
         """
         Returns the whether features should be flashed when active feature changes
         """
-        settings = QgsSettings()
-        return settings.value('vertex_compare/flash_feature',
-                              False,
-                              bool, QgsSettings.Plugins)
+        return SettingsRegistry._value(SettingsRegistry.FLASH_FEATURE, False, bool)
 
     @staticmethod
     def set_flash_feature(flash: bool):
         """
         Sets whether features should be flashed when active feature changes
         """
-        settings = QgsSettings()
-        settings.setValue('vertex_compare/flash_feature', flash, QgsSettings.Plugins)
+        SettingsRegistry._set_value(SettingsRegistry.FLASH_FEATURE, flash)
 
     @staticmethod
     def flash_vertex() -> bool:
         """
         Returns the whether vertices should be flashed when active vertex changes
         """
-        settings = QgsSettings()
-        return settings.value('vertex_compare/flash_vertex',
-                              True,
-                              bool, QgsSettings.Plugins)
+        return SettingsRegistry._value(SettingsRegistry.FLASH_VERTEX, True, bool)
 
     @staticmethod
     def set_flash_vertex(flash: bool):
         """
         Sets whether whether vertices should be flashed when active vertex changes
         """
-        settings = QgsSettings()
-        settings.setValue('vertex_compare/flash_vertex', flash, QgsSettings.Plugins)
+        SettingsRegistry._set_value(SettingsRegistry.FLASH_VERTEX, flash)
+
+    @staticmethod
+    def label_time_budget() -> int:
+        """
+        Returns the maximum time (in milliseconds) to spend labeling vertices in a single render.
+
+        A value of 0 indicates that there is no limit.
+        """
+        return SettingsRegistry._value(SettingsRegistry.LABEL_TIME_BUDGET, 0, int)
+
+    @staticmethod
+    def set_label_time_budget(budget: int):
+        """
+        Sets the maximum time (in milliseconds) to spend labeling vertices in a single render.
+
+        Set to 0 to disable the limit.
+        """
+        SettingsRegistry._set_value(SettingsRegistry.LABEL_TIME_BUDGET, budget)
+
+    @staticmethod
+    def label_vertex_budget() -> int:
+        """
+        Returns the maximum number of vertices to label in the first pass when
+        labeling all vertices. Remaining vertices are labeled progressively in later
+        refinement passes.
+
+        A value of 0 indicates that all vertices should be labeled in a single pass.
+        """
+        return SettingsRegistry._value(SettingsRegistry.LABEL_VERTEX_BUDGET,
+                                       SettingsRegistry.DEFAULT_LABEL_VERTEX_BUDGET, int)
+
+    @staticmethod
+    def set_label_vertex_budget(budget: int):
+        """
+        Sets the maximum number of vertices to label in the first pass when
+        labeling all vertices.
+
+        Set to 0 to label all vertices in a single pass.
+        """
+        SettingsRegistry._set_value(SettingsRegistry.LABEL_VERTEX_BUDGET, budget)
+
+    @staticmethod
+    def vertex_cache_enabled() -> bool:
+        """
+        Returns True if decoded vertices from large features should be cached on disk
+        """
+        return SettingsRegistry._value(SettingsRegistry.VERTEX_CACHE_ENABLED, False, bool)
+
+    @staticmethod
+    def set_vertex_cache_enabled(enabled: bool):
+        """
+        Sets whether decoded vertices from large features should be cached on disk
+        """
+        SettingsRegistry._set_value(SettingsRegistry.VERTEX_CACHE_ENABLED, enabled)
+
+    @staticmethod
+    def vertex_cache_size() -> int:
+        """
+        Returns the maximum size of the on-disk vertex cache, in megabytes
+        """
+        return SettingsRegistry._value(SettingsRegistry.VERTEX_CACHE_SIZE,
+                                       SettingsRegistry.DEFAULT_VERTEX_CACHE_SIZE, int)
+
+    @staticmethod
+    def set_vertex_cache_size(size: int):
+        """
+        Sets the maximum size of the on-disk vertex cache, in megabytes
+        """
+        SettingsRegistry._set_value(SettingsRegistry.VERTEX_CACHE_SIZE, size)
+
+    @staticmethod
+    def store_topology() -> bool:
+        """
+        Returns True if vertex comparison results should be stored alongside the project
+        """
+        return SettingsRegistry._value(SettingsRegistry.STORE_TOPOLOGY, False, bool)
+
+    @staticmethod
+    def set_store_topology(store: bool):
+        """
+        Sets whether vertex comparison results should be stored alongside the project
+        """
+        SettingsRegistry._set_value(SettingsRegistry.STORE_TOPOLOGY, store)
 
     @staticmethod
     def default_vertex_symbol() -> QgsMarkerSymbol:
@@ -142,7 +278,7 @@ class SettingsRegistry:
             return SettingsRegistry.VERTEX_SYMBOL.clone()
 
         settings = QgsSettings()
-        symbol_doc = settings.value('vertex_compare/marker_symbol', '', str, QgsSettings.Plugins)
+        symbol_doc = settings.value(f'vertex_compare/{SettingsRegistry.MARKER_SYMBOL}', '', str, QgsSettings.Plugins)
         if not symbol_doc:
             SettingsRegistry.VERTEX_SYMBOL = SettingsRegistry.default_vertex_symbol()
         else:
@@ -165,7 +301,8 @@ class SettingsRegistry:
         doc.appendChild(elem)
 
         settings = QgsSettings()
-        settings.setValue('vertex_compare/marker_symbol', doc.toString(), QgsSettings.Plugins)
+        settings.setValue(f'vertex_compare/{SettingsRegistry.MARKER_SYMBOL}', doc.toString(), QgsSettings.Plugins)
+        SETTINGS_REGISTRY.setting_changed.emit(SettingsRegistry.MARKER_SYMBOL)
 
     @staticmethod
     def default_vertex_format() -> QgsTextFormat:
@@ -185,10 +322,10 @@ class SettingsRegistry:
         Returns the text format to use for vertices
         """
         if SettingsRegistry.VERTEX_FONT is not None:
-            return SettingsRegistry.VERTEX_FONT
+            return QgsTextFormat(SettingsRegistry.VERTEX_FONT)
 
         settings = QgsSettings()
-        format_doc = settings.value('vertex_compare/vertex_font', '', str, QgsSettings.Plugins)
+        format_doc = settings.value(f'vertex_compare/{SettingsRegistry.VERTEX_FONT_KEY}', '', str, QgsSettings.Plugins)
         if not format_doc:
             SettingsRegistry.VERTEX_FONT = SettingsRegistry.default_vertex_format()
         else:
@@ -211,7 +348,8 @@ class SettingsRegistry:
         doc.appendChild(elem)
 
         settings = QgsSettings()
-        settings.setValue('vertex_compare/vertex_font', doc.toString(), QgsSettings.Plugins)
+        settings.setValue(f'vertex_compare/{SettingsRegistry.VERTEX_FONT_KEY}', doc.toString(), QgsSettings.Plugins)
+        SETTINGS_REGISTRY.setting_changed.emit(SettingsRegistry.VERTEX_FONT_KEY)
 
     @staticmethod
     def default_number_format() -> QgsNumericFormat:
@@ -229,10 +367,10 @@ class SettingsRegistry:
         Returns the default number format to use for coordinates
         """
         if SettingsRegistry.NUMBER_FORMAT is not None:
-            return SettingsRegistry.NUMBER_FORMAT
+            return SettingsRegistry.NUMBER_FORMAT.clone()
 
         settings = QgsSettings()
-        format_doc = settings.value('vertex_compare/number_format', '', str, QgsSettings.Plugins)
+        format_doc = settings.value(f'vertex_compare/{SettingsRegistry.NUMBER_FORMAT_KEY}', '', str, QgsSettings.Plugins)
         if not format_doc:
             SettingsRegistry.NUMBER_FORMAT = SettingsRegistry.default_number_format()
         else:
@@ -256,7 +394,8 @@ class SettingsRegistry:
         doc.appendChild(elem)
 
         settings = QgsSettings()
-        settings.setValue('vertex_compare/number_format', doc.toString(), QgsSettings.Plugins)
+        settings.setValue(f'vertex_compare/{SettingsRegistry.NUMBER_FORMAT_KEY}', doc.toString(), QgsSettings.Plugins)
+        SETTINGS_REGISTRY.setting_changed.emit(SettingsRegistry.NUMBER_FORMAT_KEY)
 
 
 SETTINGS_REGISTRY = SettingsRegistry()
@@ -13,14 +13,22 @@ __copyright__ = 'Copyright 2021, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
+import threading
+import time
 from typing import Optional, Dict, List
 
 from qgis.PyQt.QtCore import (
     QPointF,
     QRectF
 )
+from qgis.PyQt.QtGui import (
+    QColor
+)
 from qgis.core import (
+    Qgis,
+    QgsCsException,
     QgsMarkerSymbolLayer,
+    QgsPointXY,
     QgsSymbolRenderContext,
     QgsTextFormat,
     QgsTextRenderer,
@@ -28,23 +36,58 @@ from qgis.core import (
     QgsUnitTypes
 )
 
+from vertex_compare.core.label_tile_cache import LabelTilePlan
+from vertex_compare.core.vertex_diff import VertexDiffer
+
 
 class TextRendererMarkerSymbolLayer(QgsMarkerSymbolLayer):
     """
-    A marker symbol layer which uses QgsTextRenderer to draw text
+    A marker symbol layer which uses QgsTextRenderer to draw text.
+
+    The state which changes during a render (such as the current vertex number) is stored
+    separately for each rendering thread, so the layer can be used by concurrent render jobs.
+
+    Rendering is abandoned when the render is canceled, or when the optional time budget
+    is exceeded (in which case the render is flagged as partial).
+
+    If a label tile plan is set for the render, vertices falling within fully visible tiles
+    are rendered into separate tile images (or skipped entirely, if the tile was retrieved
+    from the cache), and the tiles are drawn when the render finishes.
     """
 
-    def __init__(self, text_format: QgsTextFormat, target_vertex: Optional[int]):
+    # number of vertices to process between checks for cancellation
+    CANCELLATION_CHECK_INTERVAL = 256
+
+    # colors used for vertices which have been changed in the current edit session
+    EDIT_COLORS = {
+        VertexDiffer.INSERT: QColor(255, 0, 255),
+        VertexDiffer.MOVE: QColor(255, 140, 0),
+        VertexDiffer.DELETE: QColor(128, 128, 128),
+    }
+
+    def __init__(self,
+                 text_format: QgsTextFormat,
+                 target_vertex: Optional[int],
+                 time_budget: int = 0,
+                 stride: int = 1):
+        """
+        Constructor for TextRendererMarkerSymbolLayer.
+
+        :param time_budget: maximum time in milliseconds to spend rendering vertices, or 0 for no limit
+        :param stride: if greater than 1, only every stride-th vertex will be rendered. The stride
+            is only applied to interactive map canvas renders, see is_interactive_render()
+        """
         super().__init__()
         self.text_format = text_format
-        self.vertex_id = 1
-        self.current_feature_id = None
-        self.current_part_number = None
-        self.current_ring_number = None
         self.target_vertex = target_vertex
+        self.time_budget = time_budget
+        self.stride = stride
         self.marker_symbol = None
         self.uncommon_vertices = {}
         self.geometry_part_count = {}
+        self.edit_changes = {}
+        # per-render state, separate for each thread which is rendering using this layer
+        self.render_state = threading.local()
 
     def layerType(self) -> str:  # pylint: disable=missing-function-docstring
         return 'TextRenderer'
@@ -52,12 +95,24 @@ class TextRendererMarkerSymbolLayer(QgsMarkerSymbolLayer):
     def hasDataDefinedProperties(self):  # pylint: disable=missing-function-docstring
         return True
 
+    def set_stride(self, stride: int):
+        """
+        Sets the stride to use when rendering vertices, see the constructor
+        """
+        self.stride = stride
+
     def set_uncommon_vertices(self, vertices: Dict):
         """
         Sets the dictionary of uncommon vertices between two selected geometries
         """
         self.uncommon_vertices = vertices
 
+    def set_edit_changes(self, changes: Dict):
+        """
+        Sets the dictionary of feature id to EditChange for features changed in the current edit session
+        """
+        self.edit_changes = changes
+
     def set_geometry_part_map(self, part_map: Dict[int, List[int]]):
         """
         Sets a map of feature id to geometry part counts from the original geometries
@@ -71,38 +126,65 @@ class TextRendererMarkerSymbolLayer(QgsMarkerSymbolLayer):
     def subSymbol(self):  # pylint: disable=missing-function-docstring
         return self.marker_symbol
 
+    def _reset_vertex_state(self):
+        """
+        Resets the vertex counters for the current render
+        """
+        state = self.render_state
+        state.vertex_id = 1
+        state.current_feature_id = None
+        state.current_part_number = None
+        state.current_ring_number = None
+
     def startFeatureRender(self, feature, context):  # pylint: disable=missing-function-docstring
-        self.vertex_id = 1
-        self.current_feature_id = feature.id()
-        self.current_part_number = None
-        self.current_ring_number = None
-        if self.subSymbol():
-            self.subSymbol().startFeatureRender(feature, context)
+        self._reset_vertex_state()
+        self.render_state.current_feature_id = feature.id()
+        if self.render_state.marker_symbol:
+            self.render_state.marker_symbol.startFeatureRender(feature, context)
 
     def stopFeatureRender(self, feature, context):  # pylint: disable=missing-function-docstring
-        self.vertex_id = 1
-        self.current_feature_id = None
-        self.current_part_number = None
-        self.current_ring_number = None
-        if self.subSymbol():
-            self.subSymbol().stopFeatureRender(feature, context)
+        self._reset_vertex_state()
+        if self.render_state.marker_symbol:
+            self.render_state.marker_symbol.stopFeatureRender(feature, context)
+
+    @staticmethod
+    def is_interactive_render(context: QgsRenderContext) -> bool:
+        """
+        Returns True if a render is an interactive map view render, in which a progressive
+        labeling pass may label only a subset of vertices.
+
+        Layout, print and image export renders must always label every vertex.
+        """
+        if hasattr(context, 'rendererUsage'):
+            return context.rendererUsage() == Qgis.RendererUsage.View
+
+        # older QGIS versions don't report the renderer usage, but export renders are blocking
+        return not context.testFlag(QgsRenderContext.RenderBlocking) \
+            and not context.testFlag(QgsRenderContext.ForceVectorOutput)
 
     def startRender(self,  # pylint: disable=missing-function-docstring
                     context: QgsSymbolRenderContext):  # pylint: disable=unused-argument
-        self.vertex_id = 1
-        self.current_feature_id = None
-        self.current_part_number = None
-        self.current_ring_number = None
-        if self.subSymbol():
-            self.subSymbol().startRender(context.renderContext(), context.fields())
+        self._reset_vertex_state()
+        self.render_state.stride = self.stride if self.is_interactive_render(context.renderContext()) else 1
+        self.render_state.check_counter = 0
+        self.render_state.stopped = False
+        self.render_state.partial = False
+        self.render_state.deadline = time.perf_counter() + self.time_budget / 1000 if self.time_budget > 0 else None
+        self.render_state.tile_plan = None
+        # each render gets its own copy of the text format and marker symbol, so that
+        # colors can be changed mid-render without affecting other concurrent renders
+        self.render_state.text_format = QgsTextFormat(self.text_format)
+        self.render_state.render_color = self.text_format.color()
+        self.render_state.marker_symbol = self.subSymbol().clone() if self.subSymbol() else None
+        if self.render_state.marker_symbol:
+            self.render_state.marker_symbol.startRender(context.renderContext(), context.fields())
 
     def stopRender(self, context: QgsSymbolRenderContext):  # pylint: disable=missing-function-docstring,unused-argument
-        self.vertex_id = 1
-        self.current_feature_id = None
-        self.current_part_number = None
-        self.current_ring_number = None
-        if self.subSymbol():
-            self.subSymbol().stopRender(context.renderContext())
+        self._reset_vertex_state()
+        if self.render_state.marker_symbol:
+            self.render_state.marker_symbol.stopRender(context.renderContext())
+        self.render_state.marker_symbol = None
+        self.render_state.text_format = None
 
     def usedAttributes(self, context: QgsRenderContext):  # pylint: disable=missing-function-docstring
         return self.text_format.referencedFields(context)
@@ -112,61 +194,209 @@ class TextRendererMarkerSymbolLayer(QgsMarkerSymbolLayer):
         if self.subSymbol():
             self.subSymbol().setColor(color)
 
+    def is_render_stopped(self) -> bool:
+        """
+        Returns True if the current render has been abandoned, either because it
+        was canceled or the time budget was exceeded
+        """
+        return getattr(self.render_state, 'stopped', False)
+
+    def is_render_partial(self) -> bool:
+        """
+        Returns True if the current render was stopped before all vertices
+        were rendered, due to the time budget being exceeded
+        """
+        return getattr(self.render_state, 'partial', False)
+
+    def _check_stopped(self, context: QgsRenderContext) -> bool:
+        """
+        Cheaply checks whether the current render should be abandoned. The (relatively)
+        costly checks are only made once every CANCELLATION_CHECK_INTERVAL vertices.
+        """
+        state = self.render_state
+        if state.stopped:
+            return True
+
+        state.check_counter += 1
+        if state.check_counter < TextRendererMarkerSymbolLayer.CANCELLATION_CHECK_INTERVAL:
+            return False
+
+        state.check_counter = 0
+        if context.renderingStopped():
+            state.stopped = True
+        elif state.deadline is not None and time.perf_counter() > state.deadline:
+            state.stopped = True
+            state.partial = True
+
+        return state.stopped
+
+    def set_tile_plan(self, plan: Optional[LabelTilePlan]):
+        """
+        Sets the label tile plan to use for the current render only
+        """
+        self.render_state.tile_plan = plan
+
+    def finish_tile_plan(self, context: QgsRenderContext):
+        """
+        Draws the label tiles for the current render, if a tile plan is in use.
+
+        Newly rendered tiles are only added to the cache if the render was completed.
+        """
+        plan = getattr(self.render_state, 'tile_plan', None)
+        if plan is None:
+            return
+
+        self.render_state.tile_plan = None
+        complete = not self.is_render_stopped() and not context.renderingStopped()
+        plan.finish(context.painter(), complete)
+
+    def set_render_color(self, color: QColor):
+        """
+        Sets the color to use for the remainder of the current render only
+        """
+        self.render_state.render_color = color
+        self._apply_color(color)
+
+    def _apply_color(self, color: QColor):
+        """
+        Changes the color of the text format and marker symbol for the current render
+        """
+        self.render_state.text_format.setColor(color)
+        if self.render_state.marker_symbol:
+            self.render_state.marker_symbol.setColor(color)
+
     def renderPoint(self,  # pylint: disable=missing-function-docstring
                     point: QPointF,
                     context: QgsSymbolRenderContext):
         if not context.renderContext().painter():
             return
 
+        if self._check_stopped(context.renderContext()):
+            return
+
+        state = self.render_state
         feature_id = context.feature().id()
 
         part_num = context.renderContext().expressionContext().variable('geometry_part_num')
-        if part_num != self.current_part_number:
-            self.vertex_id = 1
-            self.current_part_number = part_num
+        if part_num != state.current_part_number:
+            state.vertex_id = 1
+            state.current_part_number = part_num
 
         ring_num = context.renderContext().expressionContext().variable('geometry_ring_num')
-        if ring_num and ring_num != self.current_ring_number:
+        if ring_num and ring_num != state.current_ring_number:
             # account for qgis not rendering the last point in closed rings
-            self.vertex_id += 1
-            self.current_ring_number = ring_num
+            state.vertex_id += 1
+            state.current_ring_number = ring_num
 
         if feature_id in self.geometry_part_count:
             part_counts = self.geometry_part_count[feature_id]
             offset_for_part = sum(part_counts[:part_num - 1])
         else:
             offset_for_part = 0
-        current_vertex_id = self.vertex_id + offset_for_part
+        current_vertex_id = state.vertex_id + offset_for_part
 
         if feature_id in self.uncommon_vertices and current_vertex_id not in self.uncommon_vertices[feature_id]:
-            self.vertex_id += 1
+            state.vertex_id += 1
             return
 
         if self.target_vertex is not None and self.target_vertex != current_vertex_id:
-            self.vertex_id += 1
+            state.vertex_id += 1
             return
 
-        map_point = context.renderContext().mapToPixel().toMapCoordinatesF(point.x(), point.y())
-        if not context.renderContext().mapExtent().contains(map_point):
+        if state.stride > 1 and (current_vertex_id - 1) % state.stride:
+            # a progressive render, and this vertex isn't part of the subset to draw
+            state.vertex_id += 1
+            return
+
+        render_context = context.renderContext()
+        map_point = render_context.mapToPixel().toMapCoordinatesF(point.x(), point.y())
+
+        destination_painter = render_context.painter()
+        tile_painter = None
+        if state.tile_plan is not None:
+            tile = state.tile_plan.tile_index(map_point.x(), map_point.y())
+            if state.tile_plan.is_cached(tile):
+                # already rendered by an earlier render
+                state.vertex_id += 1
+                return
+            if state.tile_plan.is_cacheable(tile):
+                tile_painter = state.tile_plan.painter_for_tile(tile, destination_painter)
+
+        if tile_painter is None and not render_context.mapExtent().contains(map_point):
             # don't render points out of view
-            self.vertex_id += 1
+            state.vertex_id += 1
             return
 
-        if self.subSymbol():
-            self.subSymbol().renderPoint(point, None, context.renderContext())
+        if tile_painter is not None:
+            render_context.setPainter(tile_painter)
+
+        edit_change = self.edit_changes[feature_id].vertices.get(current_vertex_id) \
+            if feature_id in self.edit_changes else None
+        if edit_change is not None:
+            self._apply_color(TextRendererMarkerSymbolLayer.EDIT_COLORS[edit_change])
+
+        self._draw_vertex(point, str(current_vertex_id), render_context)
+
+        if edit_change is not None:
+            self._apply_color(state.render_color)
+
+        if tile_painter is not None:
+            render_context.setPainter(destination_painter)
+
+        state.vertex_id += 1
+
+    def _draw_vertex(self, point: QPointF, label: str, render_context: QgsRenderContext):
+        """
+        Draws a vertex marker and label
+        """
+        state = self.render_state
+        if state.marker_symbol:
+            state.marker_symbol.renderPoint(point, None, render_context)
 
         # offset point a little
-        offset = context.renderContext().convertToPainterUnits(1, QgsUnitTypes.RenderMillimeters)
+        offset = render_context.convertToPainterUnits(1, QgsUnitTypes.RenderMillimeters)
         render_point = QPointF(point.x() + offset, point.y() - offset)
 
         QgsTextRenderer.drawText(render_point, 0, QgsTextRenderer.AlignLeft,
-                                 [str(current_vertex_id)], context.renderContext(), self.text_format)
-        self.vertex_id += 1
+                                 [label], render_context, state.text_format)
+
+    def render_deleted_vertices(self, feature_id: int, render_context: QgsRenderContext):
+        """
+        Draws the vertices which have been deleted from a feature in the current edit session,
+        at their committed positions and labeled with their committed vertex numbers
+        """
+        change = self.edit_changes.get(feature_id)
+        if change is None or not change.deleted or self.target_vertex is not None or self.is_render_stopped():
+            return
+
+        transform = render_context.coordinateTransform()
+        map_to_pixel = render_context.mapToPixel()
+        extent = render_context.mapExtent()
+
+        self._apply_color(TextRendererMarkerSymbolLayer.EDIT_COLORS[VertexDiffer.DELETE])
+        for vertex_number, x, y in change.deleted:
+            map_point = QgsPointXY(x, y)
+            if transform.isValid():
+                try:
+                    map_point = transform.transform(map_point)
+                except QgsCsException:
+                    continue
+            if not extent.contains(map_point):
+                continue
+
+            self._draw_vertex(map_to_pixel.transform(map_point).toQPointF(), str(vertex_number), render_context)
+        self._apply_color(self.render_state.render_color)
 
     def clone(self):  # pylint: disable=missing-function-docstring
-        res = TextRendererMarkerSymbolLayer(self.text_format, self.target_vertex)
+        res = TextRendererMarkerSymbolLayer(QgsTextFormat(self.text_format),
+                                            self.target_vertex,
+                                            self.time_budget,
+                                            self.stride)
         if self.subSymbol():
             res.setSubSymbol(self.subSymbol().clone())
+        res.set_uncommon_vertices(self.uncommon_vertices)
+        res.set_edit_changes(self.edit_changes)
+        res.set_geometry_part_map(self.geometry_part_count)
         return res
 
     def properties(self):  # pylint: disable=missing-function-docstring
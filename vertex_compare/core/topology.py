@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Vertex topology comparisons
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from array import array
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Set,
+    Tuple
+)
+
+from vertex_compare.core.vertex_index import (
+    PointGridIndex,
+    SegmentGridIndex
+)
+
+if TYPE_CHECKING:
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+# raw buffers of the x, y, part and ring arrays of a feature's vertices
+VertexBuffers = Tuple[bytes, bytes, bytes, bytes]
+
+# minimum distance from a boundary (relative to the magnitude of the boundary's coordinates) at which
+# vertices are considered to lie on the boundary, which absorbs the rounding errors in the distance
+# calculation for vertices exactly on a segment
+BOUNDARY_EPSILON = 1e-12
+
+
+class Inconsistency(NamedTuple):
+    """
+    A vertex which lies on the boundary of a neighboring feature, but which
+    has no matching vertex in the neighboring feature
+    """
+    fid: int
+    vertex_number: int
+    neighbor_fid: int
+    x: float
+    y: float
+
+
+def closing_vertices(vertices: 'VertexArray') -> Set[int]:
+    """
+    Returns the indices of vertices which close a ring, i.e. the last vertex of a ring
+    which duplicates the ring's first vertex
+    """
+    res = set()
+    ring_start = 0
+    count = len(vertices)
+    for i in range(1, count + 1):
+        if i < count and vertices.parts[i] == vertices.parts[ring_start] and vertices.rings[i] == vertices.rings[ring_start]:
+            continue
+
+        last = i - 1
+        if last > ring_start and vertices.x[last] == vertices.x[ring_start] and vertices.y[last] == vertices.y[ring_start]:
+            res.add(last)
+        ring_start = i
+    return res
+
+
+def uncommon_vertices(vertices1: 'VertexArray', vertices2: 'VertexArray') -> Tuple[List[int], List[int]]:
+    """
+    Returns the vertex numbers (starting at 1) of vertices from each array which are
+    not exactly coincident with any vertex from the other array
+    """
+    common = set(zip(vertices1.x, vertices1.y)).intersection(zip(vertices2.x, vertices2.y))
+
+    def _uncommon(vertices: 'VertexArray') -> List[int]:
+        return [vertex_number for vertex_number, point in enumerate(zip(vertices.x, vertices.y), start=1)
+                if point not in common]
+
+    return _uncommon(vertices1), _uncommon(vertices2)
+
+
+def uncommon_reference_vertices(vertices: 'VertexArray',
+                                references: Iterable['VertexArray'],
+                                tolerance: float = 0) -> List[int]:
+    """
+    Returns the vertex numbers (starting at 1) of vertices which are not coincident with
+    any vertex from a set of reference vertex arrays.
+
+    If tolerance is greater than 0 then vertices within the tolerance distance of a
+    reference vertex are considered coincident.
+    """
+    if tolerance <= 0:
+        points = set()
+        for reference in references:
+            points.update(zip(reference.x, reference.y))
+        return [vertex_number for vertex_number, point in enumerate(zip(vertices.x, vertices.y), start=1)
+                if point not in points]
+
+    indexes = [PointGridIndex(reference, tolerance) for reference in references if len(reference)]
+    return [vertex_number for vertex_number, (x, y) in enumerate(zip(vertices.x, vertices.y), start=1)
+            if not any(index.within(x, y, tolerance) for index in indexes)]
+
+
+def _vertices_on_boundary(source: 'VertexArray', target: 'VertexArray', tolerance: float) -> List[int]:
+    """
+    Returns the vertex numbers of vertices from source which lie on the boundary of
+    target, but which don't match a vertex from target
+    """
+    if not len(source) or not len(target):
+        return []
+
+    min_x = min(target.x)
+    max_x = max(target.x)
+    min_y = min(target.y)
+    max_y = max(target.y)
+    segment_tolerance = max(tolerance, BOUNDARY_EPSILON * max(abs(min_x), abs(max_x), abs(min_y), abs(max_y), 1))
+    min_x -= segment_tolerance
+    max_x += segment_tolerance
+    min_y -= segment_tolerance
+    max_y += segment_tolerance
+
+    segment_index = None
+    if tolerance > 0:
+        target_index = PointGridIndex(target, tolerance)
+
+        def _matches_vertex(x, y):
+            return bool(target_index.within(x, y, tolerance))
+    else:
+        target_points = set(zip(target.x, target.y))
+
+        def _matches_vertex(x, y):
+            return (x, y) in target_points
+
+    skip = closing_vertices(source)
+    res = []
+    for i, (x, y) in enumerate(zip(source.x, source.y)):
+        if x < min_x or x > max_x or y < min_y or y > max_y or i in skip:
+            continue
+        if _matches_vertex(x, y):
+            continue
+
+        if segment_index is None:
+            # only build the segment index when it's actually required
+            segment_index = SegmentGridIndex(target)
+        if segment_index.segments_within(x, y, segment_tolerance):
+            res.append(i + 1)
+
+    return res
+
+
+def boundary_inconsistencies(vertices1: 'VertexArray',
+                             vertices2: 'VertexArray',
+                             tolerance: float = 0) -> Tuple[List[int], List[int]]:
+    """
+    Compares the boundaries of two neighboring features, returning the vertex numbers (starting at 1)
+    of vertices from each feature which lie on the shared boundary but which have no matching
+    vertex in the other feature.
+
+    Vertices are considered to lie on the boundary or match a vertex if they are within
+    the specified tolerance. Duplicate vertices which close rings are never reported.
+
+    With a tolerance of 0, vertices must exactly match a vertex, but vertices within a tiny
+    distance (see BOUNDARY_EPSILON) of a boundary are still considered to lie on it, since
+    the distance to a segment can't be calculated exactly.
+    """
+    return (_vertices_on_boundary(vertices1, vertices2, tolerance),
+            _vertices_on_boundary(vertices2, vertices1, tolerance))
+
+
+def check_pairs(vertices: Dict[int, 'VertexArray'],
+                pairs: Iterable[Tuple[int, int]],
+                tolerance: float = 0) -> List[Inconsistency]:
+    """
+    Checks the boundaries of pairs of features for inconsistent vertices.
+
+    Results are sorted by feature id, vertex number and neighbor feature id.
+    """
+    res = []
+    for fid1, fid2 in pairs:
+        vertices1 = vertices[fid1]
+        vertices2 = vertices[fid2]
+        inconsistent1, inconsistent2 = boundary_inconsistencies(vertices1, vertices2, tolerance)
+        res.extend(Inconsistency(fid1, v, fid2, vertices1.x[v - 1], vertices1.y[v - 1]) for v in inconsistent1)
+        res.extend(Inconsistency(fid2, v, fid1, vertices2.x[v - 1], vertices2.y[v - 1]) for v in inconsistent2)
+
+    res.sort(key=lambda r: (r.fid, r.vertex_number, r.neighbor_fid))
+    return res
+
+
+class RawVertices:
+    """
+    Vertex coordinates reconstructed from raw buffers.
+
+    This provides the subset of the VertexArray interface required for comparisons,
+    without depending on QGIS.
+    """
+
+    def __init__(self, buffers: VertexBuffers):
+        self.x = array('d', buffers[0])
+        self.y = array('d', buffers[1])
+        self.parts = array('i', buffers[2])
+        self.rings = array('i', buffers[3])
+
+    def __len__(self):
+        return len(self.x)
+
+
+def vertex_buffers(vertices: 'VertexArray') -> VertexBuffers:
+    """
+    Returns the raw buffers for a vertex array, for passing to worker processes
+    """
+    return (memoryview(vertices.x).cast('B').tobytes(),
+            memoryview(vertices.y).cast('B').tobytes(),
+            memoryview(vertices.parts).cast('B').tobytes(),
+            memoryview(vertices.rings).cast('B').tobytes())
+
+
+def check_pairs_from_buffers(buffers: Dict[int, VertexBuffers],
+                             pairs: List[Tuple[int, int]],
+                             tolerance: float) -> List[Inconsistency]:
+    """
+    Checks the boundaries of pairs of features for inconsistent vertices, using vertices
+    from raw buffers.
+
+    This is the entry point for worker processes.
+    """
+    vertices = {fid: RawVertices(b) for fid, b in buffers.items()}
+    return check_pairs(vertices, pairs, tolerance)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Persistent topology result store
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import hashlib
+import os
+import sqlite3
+from array import array
+from contextlib import closing
+from typing import (
+    Dict,
+    List,
+    Optional
+)
+
+from qgis.core import (
+    QgsGeometry,
+    QgsProject
+)
+
+
+class TopologyStore:
+    """
+    A persistent store of topology comparison results, backed by a SQLite database.
+
+    Results are keyed by the layer source, the compared feature ids and the comparison
+    tolerance. The hashes of the compared geometries are stored alongside each result,
+    and results are only reused if the geometries are unchanged.
+
+    A new database connection is used for each operation, so stores can safely be used
+    from render threads.
+    """
+
+    SUFFIX = '.vertex_compare.sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def for_project(project: QgsProject) -> Optional['TopologyStore']:
+        """
+        Returns the store located alongside a project file, or None if the
+        project has not been saved
+        """
+        file_path = project.absoluteFilePath()
+        if not file_path:
+            return None
+
+        return TopologyStore(os.path.splitext(file_path)[0] + TopologyStore.SUFFIX)
+
+    @staticmethod
+    def geometry_hash(geometry: QgsGeometry) -> str:
+        """
+        Returns a hash of a geometry, used to detect changes to compared geometries
+        """
+        return hashlib.blake2b(bytes(geometry.asWkb()), digest_size=20).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection to the store, creating the database if required
+        """
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("""CREATE TABLE IF NOT EXISTS topology_results (
+                                layer_source TEXT NOT NULL,
+                                fid1 INTEGER NOT NULL,
+                                fid2 INTEGER NOT NULL,
+                                tolerance REAL NOT NULL,
+                                hash1 TEXT NOT NULL,
+                                hash2 TEXT NOT NULL,
+                                uncommon1 BLOB NOT NULL,
+                                uncommon2 BLOB NOT NULL,
+                                updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                PRIMARY KEY (layer_source, fid1, fid2, tolerance))""")
+        return connection
+
+    def lookup(self,
+               layer_source: str,
+               geometries: Dict[int, QgsGeometry],
+               tolerance: float = 0) -> Optional[Dict[int, List[int]]]:
+        """
+        Returns the stored uncommon vertices for a pair of features, or None if no result
+        is stored or the geometries have changed since the result was stored.
+        """
+        (fid1, geometry1), (fid2, geometry2) = sorted(geometries.items())
+        try:
+            with closing(self._connect()) as connection:
+                row = connection.execute("""SELECT hash1, hash2, uncommon1, uncommon2 FROM topology_results
+                                            WHERE layer_source=? AND fid1=? AND fid2=? AND tolerance=?""",
+                                         (layer_source, fid1, fid2, tolerance)).fetchone()
+        except sqlite3.Error:
+            return None
+
+        if row is None:
+            return None
+
+        hash1, hash2, uncommon1, uncommon2 = row
+        if hash1 != self.geometry_hash(geometry1) or hash2 != self.geometry_hash(geometry2):
+            return None
+
+        return {fid1: array('i', uncommon1).tolist(),
+                fid2: array('i', uncommon2).tolist()}
+
+    def store(self,
+              layer_source: str,
+              geometries: Dict[int, QgsGeometry],
+              uncommon_vertices: Dict[int, List[int]],
+              tolerance: float = 0) -> bool:
+        """
+        Stores the uncommon vertices for a pair of features, replacing any existing result.
+
+        Returns False if the result could not be stored.
+        """
+        (fid1, geometry1), (fid2, geometry2) = sorted(geometries.items())
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("""INSERT OR REPLACE INTO topology_results
+                                      (layer_source, fid1, fid2, tolerance, hash1, hash2, uncommon1, uncommon2)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                                   (layer_source, fid1, fid2, tolerance,
+                                    self.geometry_hash(geometry1), self.geometry_hash(geometry2),
+                                    array('i', uncommon_vertices[fid1]).tobytes(),
+                                    array('i', uncommon_vertices[fid2]).tobytes()))
+        except sqlite3.Error:
+            return False
+
+        return True
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Compact vertex storage
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import struct
+import sys
+from array import array
+from itertools import chain
+from typing import (
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+
+from qgis.core import (
+    QgsAbstractGeometry,
+    QgsCoordinateTransform,
+    QgsGeometry,
+    QgsLineString,
+    QgsPoint,
+    QgsVertexId
+)
+
+
+class VertexArray:
+    """
+    Compact, column-based storage of the decoded vertices of a geometry.
+
+    Coordinates are stored in flat arrays of doubles (or read-only buffers with the
+    same layout, such as memory-mapped files), instead of as individual QgsPoint objects,
+    so that features with millions of vertices can be held cheaply.
+
+    The part and ring numbers of each vertex are stored alongside the coordinates,
+    matching the vertex order of QgsAbstractGeometry.nextVertex().
+    """
+
+    # WKB geometry types which can be decoded directly
+    WKB_POINT = 1
+    WKB_LINESTRING = 2
+    WKB_POLYGON = 3
+    WKB_MULTIPOINT = 4
+    WKB_MULTILINESTRING = 5
+    WKB_MULTIPOLYGON = 6
+
+    def __init__(self,
+                 x: Sequence[float],
+                 y: Sequence[float],
+                 z: Optional[Sequence[float]] = None,
+                 m: Optional[Sequence[float]] = None,
+                 parts: Optional[Sequence[int]] = None,
+                 rings: Optional[Sequence[int]] = None):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.m = m
+        self.parts = parts if parts is not None else array('i', [0]) * len(x)
+        self.rings = rings if rings is not None else array('i', [0]) * len(x)
+
+    def __len__(self):
+        return len(self.x)
+
+    def has_z(self) -> bool:
+        """
+        Returns True if the vertices have z values
+        """
+        return self.z is not None
+
+    def has_m(self) -> bool:
+        """
+        Returns True if the vertices have m values
+        """
+        return self.m is not None
+
+    def point(self, index: int) -> QgsPoint:
+        """
+        Returns the vertex at the specified index as a QgsPoint
+        """
+        return QgsPoint(self.x[index],
+                        self.y[index],
+                        self.z[index] if self.z is not None else math.nan,
+                        self.m[index] if self.m is not None else math.nan)
+
+    def subset(self, ranges: List[Tuple[int, int]]) -> 'VertexArray':
+        """
+        Returns a copy of the vertices in a list of index ranges (excluding the end indices)
+        """
+        def _copy(values: Optional[Sequence], type_code: str) -> Optional[array]:
+            if values is None:
+                return None
+            return array(type_code, chain.from_iterable(values[start:end] for start, end in ranges))
+
+        return VertexArray(_copy(self.x, 'd'),
+                           _copy(self.y, 'd'),
+                           _copy(self.z, 'd'),
+                           _copy(self.m, 'd'),
+                           _copy(self.parts, 'i'),
+                           _copy(self.rings, 'i'))
+
+    def transformed(self, transform: QgsCoordinateTransform) -> 'VertexArray':
+        """
+        Returns a copy of the vertices transformed by a coordinate transform.
+
+        All coordinates are transformed in a single batched call, rather than vertex by vertex.
+
+        :raises QgsCsException: if the vertices could not be transformed
+        """
+        if not transform.isValid() or transform.isShortCircuited() or not len(self):
+            return self
+
+        line = QgsLineString(list(self.x), list(self.y), list(self.z) if self.z is not None else [])
+        line.transform(transform)
+        return VertexArray(array('d', line.xVector()),
+                           array('d', line.yVector()),
+                           array('d', line.zVector()) if self.z is not None else None,
+                           self.m,
+                           self.parts,
+                           self.rings)
+
+    @staticmethod
+    def from_geometry(geometry: QgsGeometry, wkb: Optional[bytes] = None) -> 'VertexArray':
+        """
+        Decodes the vertices from a geometry.
+
+        Linear geometries are decoded directly from their WKB representation, which avoids
+        creating Python objects for every vertex. Other geometries (e.g. curved geometries)
+        are decoded vertex by vertex.
+
+        If the geometry's WKB representation has already been created, it can be passed
+        as wkb to avoid serializing the geometry again.
+        """
+        if geometry is None or geometry.isNull():
+            return VertexArray(array('d'), array('d'))
+
+        res = VertexArray._from_wkb(wkb if wkb is not None else bytes(geometry.asWkb()))
+        if res is None:
+            res = VertexArray._from_abstract_geometry(geometry.constGet())
+        return res
+
+    @staticmethod
+    def _from_abstract_geometry(geometry: QgsAbstractGeometry) -> 'VertexArray':
+        """
+        Decodes the vertices from a geometry, vertex by vertex
+        """
+        x = array('d')
+        y = array('d')
+        z = array('d') if geometry.is3D() else None
+        m = array('d') if geometry.isMeasure() else None
+        parts = array('i')
+        rings = array('i')
+
+        vid = QgsVertexId()
+        while True:
+            ok, vertex = geometry.nextVertex(vid)
+            if not ok:
+                break
+
+            x.append(vertex.x())
+            y.append(vertex.y())
+            if z is not None:
+                z.append(vertex.z())
+            if m is not None:
+                m.append(vertex.m())
+            parts.append(vid.part)
+            rings.append(vid.ring)
+
+        return VertexArray(x, y, z, m, parts, rings)
+
+    @staticmethod
+    def _from_wkb(wkb: bytes) -> Optional['VertexArray']:  # pylint: disable=too-many-locals
+        """
+        Decodes the vertices from an ISO WKB representation of a linear geometry.
+
+        Returns None if the geometry type cannot be decoded directly.
+        """
+        if len(wkb) < 5:
+            return None
+
+        def _header(offset: int):
+            byte_order = '<' if wkb[offset] == 1 else '>'
+            wkb_type, = struct.unpack_from(byte_order + 'I', wkb, offset + 1)
+            return byte_order, wkb_type % 1000, wkb_type // 1000, offset + 5
+
+        _, root_type, dimension_flags, _ = _header(0)
+        if root_type not in (VertexArray.WKB_POINT,
+                             VertexArray.WKB_LINESTRING,
+                             VertexArray.WKB_POLYGON,
+                             VertexArray.WKB_MULTIPOINT,
+                             VertexArray.WKB_MULTILINESTRING,
+                             VertexArray.WKB_MULTIPOLYGON) or dimension_flags > 3:
+            return None
+
+        has_z = dimension_flags in (1, 3)
+        has_m = dimension_flags in (2, 3)
+        dimensions = 2 + (1 if has_z else 0) + (1 if has_m else 0)
+
+        coordinates = array('d')
+        parts = array('i')
+        rings = array('i')
+
+        def _read_points(byte_order: str, offset: int, count: int, part: int, ring: int) -> int:
+            size = count * dimensions * 8
+            block = array('d', wkb[offset:offset + size])
+            if (byte_order == '<') != (sys.byteorder == 'little'):
+                block.byteswap()
+            coordinates.extend(block)
+            parts.extend(array('i', [part]) * count)
+            rings.extend(array('i', [ring]) * count)
+            return offset + size
+
+        def _read_simple(offset: int, part: int) -> Optional[int]:
+            byte_order, geometry_type, _, offset = _header(offset)
+            if geometry_type == VertexArray.WKB_POINT:
+                x, = struct.unpack_from(byte_order + 'd', wkb, offset)
+                if math.isnan(x):
+                    # empty point
+                    return offset + dimensions * 8
+                return _read_points(byte_order, offset, 1, part, 0)
+            if geometry_type == VertexArray.WKB_LINESTRING:
+                count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+                return _read_points(byte_order, offset + 4, count, part, 0)
+            if geometry_type == VertexArray.WKB_POLYGON:
+                ring_count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+                offset += 4
+                for ring in range(ring_count):
+                    count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+                    offset = _read_points(byte_order, offset + 4, count, part, ring)
+                return offset
+            return None
+
+        if root_type in (VertexArray.WKB_POINT, VertexArray.WKB_LINESTRING, VertexArray.WKB_POLYGON):
+            if _read_simple(0, 0) is None:
+                return None
+        else:
+            byte_order, _, _, offset = _header(0)
+            part_count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+            offset += 4
+            for part in range(part_count):
+                offset = _read_simple(offset, part)
+                if offset is None:
+                    return None
+
+        x = coordinates[0::dimensions]
+        y = coordinates[1::dimensions]
+        z = coordinates[2::dimensions] if has_z else None
+        m = coordinates[dimensions - 1::dimensions] if has_m else None
+        return VertexArray(x, y, z, m, parts, rings)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""On-disk vertex cache
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import Optional
+
+from qgis.core import QgsApplication
+
+from vertex_compare.core.vertex_array import VertexArray
+
+
+class VertexDiskCache:
+    """
+    A size-bounded cache of decoded vertex arrays, stored on disk.
+
+    Each entry is stored in a separate file, keyed by the layer source, feature id and
+    a fingerprint of the feature's geometry, so that edited geometries never match stale
+    entries. Cached arrays are memory-mapped when read, so the vertices of huge features
+    are paged in from disk on demand instead of being held in memory.
+
+    When the cache exceeds its maximum size, the least recently used entries are removed.
+
+    Reading entries is cheap, but inserting them writes the whole array to disk, so
+    insert() should only be called from a background task (see VertexCacheTask).
+    """
+
+    MAGIC = b'VCVA'
+    VERSION = 1
+    # magic, version, flags, vertex count, padded to 32 bytes so that arrays are 8-byte aligned
+    HEADER = struct.Struct('<4sIIQ12x')
+    FLAG_Z = 1
+    FLAG_M = 2
+    SUFFIX = '.vca'
+
+    def __init__(self, path: str, max_size: int):
+        """
+        Constructor for VertexDiskCache.
+
+        :param path: directory to store cached arrays in
+        :param max_size: maximum total size of the cache, in bytes
+        """
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def default_path() -> str:
+        """
+        Returns the default directory for the cache, within the QGIS profile folder
+        """
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), 'cache', 'vertex_compare')
+
+    @staticmethod
+    def is_supported() -> bool:
+        """
+        Returns True if the cache can be used on this platform. Cached arrays
+        are always little-endian, so can only be mapped directly on little-endian systems.
+        """
+        return sys.byteorder == 'little'
+
+    @staticmethod
+    def key(source: str, fid: int, wkb: bytes) -> str:
+        """
+        Returns the cache key for a feature, given the WKB representation of its geometry.
+
+        The same WKB should be passed to VertexArray.from_geometry() when decoding the vertices
+        after a cache miss, so that the geometry is only serialized once.
+        """
+        key_hash = hashlib.blake2b(digest_size=20)
+        key_hash.update(source.encode('utf-8'))
+        key_hash.update(struct.pack('<q', fid))
+        key_hash.update(wkb)
+        return key_hash.hexdigest()
+
+    def _file_path(self, key: str) -> str:
+        """
+        Returns the file path for a cache entry
+        """
+        return os.path.join(self.path, key + VertexDiskCache.SUFFIX)
+
+    def get(self, key: str) -> Optional[VertexArray]:  # pylint: disable=too-many-locals
+        """
+        Retrieves a memory-mapped vertex array from the cache, or None if no matching
+        entry exists
+        """
+        path = self._file_path(key)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < VertexDiskCache.HEADER.size:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # mark as recently used
+            os.utime(path)
+        except OSError:
+            return None
+
+        magic, version, flags, count = VertexDiskCache.HEADER.unpack_from(mapped, 0)
+        has_z = bool(flags & VertexDiskCache.FLAG_Z)
+        has_m = bool(flags & VertexDiskCache.FLAG_M)
+        expected_size = VertexDiskCache.HEADER.size + count * 8 * (2 + int(has_z) + int(has_m)) + count * 4 * 2
+        if magic != VertexDiskCache.MAGIC or version != VertexDiskCache.VERSION or size != expected_size:
+            mapped.close()
+            return None
+
+        view = memoryview(mapped)
+        offset = VertexDiskCache.HEADER.size
+
+        def _take(item_size: int, fmt: str) -> memoryview:
+            nonlocal offset
+            res = view[offset:offset + count * item_size].cast(fmt)
+            offset += count * item_size
+            return res
+
+        x = _take(8, 'd')
+        y = _take(8, 'd')
+        z = _take(8, 'd') if has_z else None
+        m = _take(8, 'd') if has_m else None
+        parts = _take(4, 'i')
+        rings = _take(4, 'i')
+        return VertexArray(x, y, z, m, parts, rings)
+
+    def insert(self, key: str, vertices: VertexArray) -> bool:
+        """
+        Stores a vertex array in the cache, evicting the least recently used entries
+        if the cache size is exceeded.
+
+        Returns False if the array could not be stored.
+        """
+        flags = (VertexDiskCache.FLAG_Z if vertices.has_z() else 0) | \
+                (VertexDiskCache.FLAG_M if vertices.has_m() else 0)
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # write to a temporary file first, so that partially written entries are never read
+            handle, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as f:
+                f.write(VertexDiskCache.HEADER.pack(VertexDiskCache.MAGIC, VertexDiskCache.VERSION,
+                                                    flags, len(vertices)))
+                for values in (vertices.x, vertices.y, vertices.z, vertices.m, vertices.parts, vertices.rings):
+                    if values is not None:
+                        f.write(memoryview(values).cast('B'))
+            os.replace(temp_path, self._file_path(key))
+        except OSError:
+            return False
+
+        self.evict()
+        return True
+
+    def size(self) -> int:
+        """
+        Returns the total size of the cache, in bytes
+        """
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def _entries(self):
+        """
+        Returns a list of the paths of all cache entries
+        """
+        try:
+            return [entry.path for entry in os.scandir(self.path)
+                    if entry.is_file() and entry.name.endswith(VertexDiskCache.SUFFIX)]
+        except OSError:
+            return []
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache size is within the maximum size
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                # e.g. the entry is currently mapped on Windows
+                continue
+
+    def clear(self):
+        """
+        Removes all entries from the cache
+        """
+        for path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                continue
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Background vertex cache task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import QgsTask
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_cache import VertexDiskCache
+
+
+class VertexCacheTask(QgsTask):
+    """
+    A background task which stores a vertex array in the on-disk vertex cache.
+
+    The vertex array is not copied, so it must not be modified while the task runs.
+    """
+
+    def __init__(self, cache: VertexDiskCache, key: str, vertices: VertexArray):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Caching vertices'),
+                         QgsTask.CanCancel)
+        self.cache = cache
+        self.key = key
+        self.vertices = vertices
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        return self.cache.insert(self.key, self.vertices)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Vertex clipboard formats
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import re
+from itertools import chain
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+
+if TYPE_CHECKING:
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+# ranges of vertex indices (starting at 0), excluding the end index
+VertexRanges = List[Tuple[int, int]]
+
+# number of decimal places for GeoJSON coordinates (in degrees), giving a precision of around 1 cm
+GEOJSON_PRECISION = 7
+
+# NaN or infinite coordinates in GeoJSON text
+NON_FINITE_COORDINATE = re.compile(r'(?<=[\[,])-?(?:nan|inf)(?=[\],])')
+
+
+def merge_ranges(ranges: Iterable[Tuple[int, int]]) -> VertexRanges:
+    """
+    Sorts a list of ranges, merging overlapping and adjacent ranges
+    """
+    res = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if res and start <= res[-1][1]:
+            res[-1] = (res[-1][0], max(res[-1][1], end))
+        else:
+            res.append((start, end))
+    return res
+
+
+def _columns(vertices: 'VertexArray', ranges: VertexRanges) -> List[Iterator]:
+    """
+    Returns iterators over the vertex numbers and coordinates of the vertices in a set of
+    ranges, taking slices of the coordinate arrays for each range
+    """
+    def _slices(values: Sequence[float]) -> Iterator:
+        return chain.from_iterable(values[start:end] for start, end in ranges)
+
+    res = [chain.from_iterable(range(start + 1, end + 1) for start, end in ranges)]
+    for values in (vertices.x, vertices.y, vertices.z, vertices.m):
+        if values is not None:
+            res.append(_slices(values))
+    return res
+
+
+def _format_rows(row_format: str, columns: List[Iterator], count: int) -> str:
+    """
+    Formats rows of values from a list of columns.
+
+    All rows are formatted with a single format operation, which is much faster than
+    formatting each row or value separately.
+    """
+    if not count:
+        return ''
+    return (row_format * count) % tuple(chain.from_iterable(zip(*columns)))
+
+
+def _coordinate_format(precision: Optional[int]) -> str:
+    """
+    Returns the format for coordinate values, using the shortest representation which
+    round trips exactly if precision is None, or a fixed number of decimal places otherwise
+    """
+    return '%r' if precision is None else '%.{}f'.format(precision)
+
+
+def _count(ranges: VertexRanges) -> int:
+    """
+    Returns the number of vertices in a set of ranges
+    """
+    return sum(end - start for start, end in ranges)
+
+
+def _dimensions(vertices: 'VertexArray') -> Tuple[bool, bool]:
+    """
+    Returns whether a vertex array has z and m values
+    """
+    return vertices.z is not None, vertices.m is not None
+
+
+def vertices_to_csv(vertices: 'VertexArray', ranges: VertexRanges, separator: str = ',',
+                    precision: Optional[int] = None) -> str:
+    """
+    Returns the vertices in a set of ranges as CSV text, with a header row.
+
+    If precision is set then coordinates are written with that number of decimal places,
+    otherwise they are written exactly.
+    """
+    has_z, has_m = _dimensions(vertices)
+    header = ['vertex', 'x', 'y'] + (['z'] if has_z else []) + (['m'] if has_m else [])
+    row_format = separator.replace('%', '%%').join(
+        ['%d'] + [_coordinate_format(precision)] * (len(header) - 1)) + '\n'
+    return separator.join(header) + '\n' + _format_rows(row_format, _columns(vertices, ranges), _count(ranges))
+
+
+def _wkt_type(name: str, has_z: bool, has_m: bool) -> str:
+    """
+    Returns a WKT geometry type name with the z and m suffixes
+    """
+    suffix = ('Z' if has_z else '') + ('M' if has_m else '')
+    return name + (' ' + suffix if suffix else '')
+
+
+def vertices_to_wkt(vertices: 'VertexArray', ranges: VertexRanges, precision: Optional[int] = None) -> str:
+    """
+    Returns the vertices in a set of ranges as a WKT point or multipoint.
+
+    If precision is set then coordinates are written with that number of decimal places,
+    otherwise they are written exactly.
+    """
+    has_z, has_m = _dimensions(vertices)
+    coordinate_format = ' '.join([_coordinate_format(precision)] * (2 + has_z + has_m))
+    count = _count(ranges)
+    if count == 1:
+        return '{} ({})'.format(_wkt_type('Point', has_z, has_m),
+                                _format_rows(coordinate_format, _columns(vertices, ranges)[1:], count))
+    return '{} ({})'.format(_wkt_type('MultiPoint', has_z, has_m),
+                            _format_rows('(' + coordinate_format + '), ', _columns(vertices, ranges)[1:], count)[:-2])
+
+
+def vertices_to_geojson(vertices: 'VertexArray', ranges: VertexRanges, numbers: Sequence[int] = None,
+                        precision: Optional[int] = None) -> str:
+    """
+    Returns the vertices in a set of ranges as a GeoJSON feature collection of points,
+    with the vertex number of each point as a property.
+
+    GeoJSON coordinates should be in WGS84, so vertices should be transformed before calling
+    this function. M values are not supported by GeoJSON and are discarded. JSON has no
+    representation of NaN or infinite values, so these are written as null.
+
+    If precision is set then coordinates are written with that number of decimal places,
+    otherwise they are written exactly.
+    """
+    has_z, _ = _dimensions(vertices)
+    columns = _columns(vertices, ranges)
+    if numbers is not None:
+        columns[0] = iter(numbers)
+    columns = columns[:4 if has_z else 3]
+    feature_format = '{"type":"Feature","properties":{"vertex":%d},' \
+                     '"geometry":{"type":"Point","coordinates":[' + \
+                     ','.join([_coordinate_format(precision)] * (len(columns) - 1)) + ']}},'
+    features = _format_rows(feature_format, columns, _count(ranges))[:-1]
+
+    if 'nan' in features or 'inf' in features:
+        features = NON_FINITE_COORDINATE.sub('null', features)
+    return '{"type":"FeatureCollection","features":[' + features + ']}'
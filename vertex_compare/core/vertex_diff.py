@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""Sequence aligned vertex differences
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from array import array
+from bisect import bisect_left
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple
+)
+
+if TYPE_CHECKING:
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+
+class DiffRun(NamedTuple):
+    """
+    A run of consecutive vertices with the same difference operation.
+
+    Indices start at 0, and ranges exclude the end index. Inserted runs have an empty
+    range in the first vertex array, deleted runs have an empty range in the second
+    vertex array, and unchanged and moved runs have ranges of equal length in both.
+    """
+    operation: str
+    start1: int
+    end1: int
+    start2: int
+    end2: int
+
+
+class VertexDiff(NamedTuple):
+    """
+    The sequence aligned difference between two vertex arrays.
+
+    If approximate is True then the number of differences exceeded the maximum
+    edit count, so the alignment may not be the shortest possible one. Vertices which
+    occur exactly once in both arrays are still aligned with each other, but differing
+    vertices between them may have been aligned by position only.
+    """
+    runs: List[DiffRun]
+    approximate: bool
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of vertices for each difference operation
+        """
+        res = {op: 0 for op in VertexDiffer.OPERATIONS}
+        for run in self.runs:
+            res[run.operation] += max(run.end1 - run.start1, run.end2 - run.start2)
+        return res
+
+
+class VertexDiffer:
+    """
+    Calculates the sequence aligned difference between two vertex arrays, using
+    Myers' O(ND) difference algorithm.
+
+    Vertices are considered equal if they are within the tolerance distance of each
+    other. Runs of deleted vertices which are directly replaced by inserted vertices are
+    reported as moved vertices.
+
+    Common leading and trailing vertices are removed before aligning the remaining vertices,
+    so the cost depends mostly on the number of differences rather than the number of vertices.
+    If more than max_edits insertions and deletions would be required to align the vertices,
+    the remaining vertices are instead aligned around anchor vertices which occur exactly once
+    in both arrays (as in a patience diff), and the vertices between anchors are aligned
+    separately. Vertices are only aligned by position when no anchors can be found.
+    """
+
+    EQUAL = 'equal'
+    INSERT = 'insert'
+    DELETE = 'delete'
+    MOVE = 'move'
+
+    OPERATIONS = (EQUAL, INSERT, DELETE, MOVE)
+
+    DEFAULT_MAX_EDITS = 2000
+
+    # range of chunk sizes used when comparing runs of vertices
+    MIN_CHUNK = 16
+    MAX_CHUNK = 65536
+
+    # maximum depth of nested anchor alignments, beyond which vertices are aligned by position
+    MAX_ANCHOR_DEPTH = 16
+
+    def __init__(self,
+                 vertices1: 'VertexArray',
+                 vertices2: 'VertexArray',
+                 tolerance: float = 0,
+                 max_edits: int = DEFAULT_MAX_EDITS):
+        self.x1 = vertices1.x
+        self.y1 = vertices1.y
+        self.x2 = vertices2.x
+        self.y2 = vertices2.y
+        self.tolerance = tolerance
+        self.max_edits = max_edits
+
+    def equal(self, index1: int, index2: int) -> bool:
+        """
+        Returns True if a vertex from the first array equals a vertex from the second array
+        """
+        dx = self.x1[index1] - self.x2[index2]
+        dy = self.y1[index1] - self.y2[index2]
+        return dx * dx + dy * dy <= self.tolerance * self.tolerance
+
+    def _snake(self, x: int, y: int, end1: int, end2: int) -> int:
+        """
+        Follows a diagonal of equal vertices from (x, y), returning the final x
+        """
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        tolerance_squared = self.tolerance * self.tolerance
+        step = VertexDiffer.MIN_CHUNK
+        while x < end1 and y < end2:
+            length = min(step, end1 - x, end2 - y)
+            # identical coordinates are compared a whole chunk at a time, which is much
+            # faster than comparing individual vertices
+            if x1[x:x + length] == x2[y:y + length] and y1[x:x + length] == y2[y:y + length]:
+                x += length
+                y += length
+                step = min(step * 2, VertexDiffer.MAX_CHUNK)
+                continue
+
+            for _ in range(length):
+                if (x1[x] - x2[y]) ** 2 + (y1[x] - y2[y]) ** 2 > tolerance_squared:
+                    return x
+                x += 1
+                y += 1
+            step = VertexDiffer.MIN_CHUNK
+        return x
+
+    def _shortest_edit(self, start1: int, end1: int, start2: int, end2: int) -> Optional[List[array]]:
+        """
+        Runs the forward greedy pass of Myers' algorithm over a sub range of both
+        arrays, returning the furthest reaching x for each diagonal after each edit,
+        or None if more than max_edits edits are required
+        """
+        n = end1 - start1
+        m = end2 - start2
+        max_d = min(self.max_edits, n + m)
+        offset = max_d + 1
+        v = [0] * (2 * max_d + 3)
+        trace = []
+        for d in range(max_d + 1):
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                    x = v[offset + k + 1]
+                else:
+                    x = v[offset + k - 1] + 1
+                x = self._snake(start1 + x, start2 + x - k, end1, end2) - start1
+                v[offset + k] = x
+                if x >= n and x - k >= m:
+                    trace.append(array('q', v[offset - d:offset + d + 1]))
+                    return trace
+            trace.append(array('q', v[offset - d:offset + d + 1]))
+        return None
+
+    def _reverse_snake(self, x: int, y: int, start1: int, start2: int) -> int:
+        """
+        Follows a diagonal of equal vertices backwards from (x, y), returning the final x
+        """
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        tolerance_squared = self.tolerance * self.tolerance
+        step = VertexDiffer.MIN_CHUNK
+        while x > start1 and y > start2:
+            length = min(step, x - start1, y - start2)
+            if x1[x - length:x] == x2[y - length:y] and y1[x - length:x] == y2[y - length:y]:
+                x -= length
+                y -= length
+                step = min(step * 2, VertexDiffer.MAX_CHUNK)
+                continue
+
+            for _ in range(length):
+                if (x1[x - 1] - x2[y - 1]) ** 2 + (y1[x - 1] - y2[y - 1]) ** 2 > tolerance_squared:
+                    return x
+                x -= 1
+                y -= 1
+            step = VertexDiffer.MIN_CHUNK
+        return x
+
+    @staticmethod
+    def _backtrack(trace: List[array], start1: int, start2: int, n: int, m: int) -> List[Tuple[str, int, int, int]]:
+        """
+        Recovers the edit operations from the trace of the forward pass, as a list of
+        (operation, index1, index2, length) tuples in order
+        """
+        res = []
+        x = n
+        y = m
+        for d in range(len(trace) - 1, -1, -1):
+            if d > 0:
+                previous = trace[d - 1]
+                k = x - y
+                if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+                    previous_k = k + 1
+                else:
+                    previous_k = k - 1
+                previous_x = previous[previous_k + d - 1]
+                previous_y = previous_x - previous_k
+                # the end of the edit, which is followed by a diagonal of equal vertices
+                if x - previous_x > y - previous_y:
+                    edit_x = previous_x + 1
+                else:
+                    edit_x = previous_x
+                diagonal = x - edit_x
+            else:
+                previous_x = previous_y = 0
+                diagonal = x
+
+            if diagonal:
+                res.append((VertexDiffer.EQUAL, start1 + x - diagonal, start2 + y - diagonal, diagonal))
+            if d > 0:
+                if x - diagonal == previous_x:
+                    res.append((VertexDiffer.INSERT, start1 + previous_x, start2 + previous_y, 1))
+                else:
+                    res.append((VertexDiffer.DELETE, start1 + previous_x, start2 + previous_y, 1))
+            x = previous_x
+            y = previous_y
+
+        res.reverse()
+        return res
+
+    def _align_by_position(self, start1: int, end1: int, start2: int, end2: int) -> List[Tuple[str, int, int, int]]:
+        """
+        Aligns vertices by position only, used when the vertices differ too much
+        to be aligned exactly
+        """
+        res = []
+        common = min(end1 - start1, end2 - start2)
+        for i in range(common):
+            if self.equal(start1 + i, start2 + i):
+                res.append((VertexDiffer.EQUAL, start1 + i, start2 + i, 1))
+            else:
+                res.append((VertexDiffer.DELETE, start1 + i, start2 + i, 1))
+                res.append((VertexDiffer.INSERT, start1 + i + 1, start2 + i, 1))
+        if end1 - start1 > common:
+            res.append((VertexDiffer.DELETE, start1 + common, start2 + common, end1 - start1 - common))
+        if end2 - start2 > common:
+            res.append((VertexDiffer.INSERT, start1 + common, start2 + common, end2 - start2 - common))
+        return res
+
+    def _anchors(self, start1: int, end1: int, start2: int, end2: int) -> List[Tuple[int, int]]:
+        """
+        Returns the pairs of indices of vertices which occur exactly once in both sub ranges,
+        restricted to the longest sequence of pairs which are in the same order in both ranges
+        """
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+
+        # index of each unique vertex in the first range, or -1 for repeated vertices
+        unique1: Dict[Tuple[float, float], int] = {}
+        for i in range(start1, end1):
+            key = (x1[i], y1[i])
+            unique1[key] = -1 if key in unique1 else i
+
+        unique2: Dict[Tuple[float, float], int] = {}
+        for i in range(start2, end2):
+            key = (x2[i], y2[i])
+            if unique1.get(key, -1) < 0:
+                continue
+            unique2[key] = -1 if key in unique2 else i
+
+        pairs = sorted((unique1[key], index2) for key, index2 in unique2.items() if index2 >= 0)
+
+        # longest increasing subsequence of the second indices
+        tails: List[int] = []
+        tail_pairs: List[int] = []
+        previous = [-1] * len(pairs)
+        for pair_index, (_, index2) in enumerate(pairs):
+            position = bisect_left(tails, index2)
+            if position == len(tails):
+                tails.append(index2)
+                tail_pairs.append(pair_index)
+            else:
+                tails[position] = index2
+                tail_pairs[position] = pair_index
+            previous[pair_index] = tail_pairs[position - 1] if position else -1
+
+        res = []
+        pair_index = tail_pairs[-1] if tail_pairs else -1
+        while pair_index >= 0:
+            res.append(pairs[pair_index])
+            pair_index = previous[pair_index]
+        res.reverse()
+        return res
+
+    def _align(self, start1: int, end1: int, start2: int, end2: int,  # pylint: disable=too-many-arguments
+               depth: int) -> List[Tuple[str, int, int, int]]:
+        """
+        Aligns a sub range of both arrays, returning the edit operations in order
+        """
+        if start1 == end1:
+            return [(VertexDiffer.INSERT, start1, start2, end2 - start2)]
+        if start2 == end2:
+            return [(VertexDiffer.DELETE, start1, start2, end1 - start1)]
+
+        trace = self._shortest_edit(start1, end1, start2, end2)
+        if trace is not None:
+            return self._backtrack(trace, start1, start2, end1 - start1, end2 - start2)
+        return self._align_by_anchors(start1, end1, start2, end2, depth)
+
+    def _align_by_anchors(self, start1: int, end1: int,  # pylint: disable=too-many-arguments
+                          start2: int, end2: int, depth: int) -> List[Tuple[str, int, int, int]]:
+        """
+        Aligns vertices around unique anchor vertices, used when the vertices differ too
+        much to be aligned exactly. The vertices between anchors are aligned separately.
+        """
+        anchors = self._anchors(start1, end1, start2, end2) if depth < VertexDiffer.MAX_ANCHOR_DEPTH else []
+        if not anchors:
+            return self._align_by_position(start1, end1, start2, end2)
+
+        res = []
+        x = start1
+        y = start2
+        for anchor1, anchor2 in anchors + [(end1, end2)]:
+            if anchor1 > x or anchor2 > y:
+                res.extend(self._align(x, anchor1, y, anchor2, depth + 1))
+            if anchor1 < end1:
+                res.append((VertexDiffer.EQUAL, anchor1, anchor2, 1))
+            x = anchor1 + 1
+            y = anchor2 + 1
+        return res
+
+    @staticmethod
+    def _runs(operations: List[Tuple[str, int, int, int]]) -> List[DiffRun]:
+        """
+        Merges edit operations into runs, converting directly replaced vertices to moves
+        """
+        res = []
+
+        # pending deleted and inserted ranges since the last unchanged vertex
+        pending: Optional[List[int]] = None
+
+        def _flush():
+            delete_start, delete_end, insert_start, insert_end = pending
+            moved = min(delete_end - delete_start, insert_end - insert_start)
+            if moved:
+                res.append(DiffRun(VertexDiffer.MOVE, delete_start, delete_start + moved,
+                                   insert_start, insert_start + moved))
+            if delete_end - delete_start > moved:
+                res.append(DiffRun(VertexDiffer.DELETE, delete_start + moved, delete_end,
+                                   insert_end, insert_end))
+            elif insert_end - insert_start > moved:
+                res.append(DiffRun(VertexDiffer.INSERT, delete_end, delete_end,
+                                   insert_start + moved, insert_end))
+
+        for operation, x, y, length in operations:
+            if operation == VertexDiffer.EQUAL:
+                if pending is not None:
+                    _flush()
+                    pending = None
+                if res and res[-1].operation == VertexDiffer.EQUAL and res[-1].end1 == x and res[-1].end2 == y:
+                    res[-1] = DiffRun(VertexDiffer.EQUAL, res[-1].start1, x + length, res[-1].start2, y + length)
+                else:
+                    res.append(DiffRun(VertexDiffer.EQUAL, x, x + length, y, y + length))
+                continue
+
+            if pending is None:
+                pending = [x, x, y, y]
+            if operation == VertexDiffer.DELETE:
+                pending[1] = x + length
+            else:
+                pending[3] = y + length
+
+        if pending is not None:
+            _flush()
+        return res
+
+    def diff(self) -> VertexDiff:
+        """
+        Calculates the difference between the vertex arrays
+        """
+        count1 = len(self.x1)
+        count2 = len(self.x2)
+
+        # strip common leading and trailing vertices
+        start = self._snake(0, 0, count1, count2)
+        end1 = self._reverse_snake(count1, count2, start, start)
+        end2 = end1 + count2 - count1
+
+        operations = []
+        if start:
+            operations.append((VertexDiffer.EQUAL, 0, 0, start))
+
+        approximate = False
+        trace = self._shortest_edit(start, end1, start, end2)
+        if trace is not None:
+            operations.extend(self._backtrack(trace, start, start, end1 - start, end2 - start))
+        else:
+            approximate = True
+            operations.extend(self._align_by_anchors(start, end1, start, end2, 0))
+
+        if end1 < count1:
+            operations.append((VertexDiffer.EQUAL, end1, end2, count1 - end1))
+        return VertexDiff(VertexDiffer._runs(operations), approximate)
+
+
+def vertex_diff(vertices1: 'VertexArray',
+                vertices2: 'VertexArray',
+                tolerance: float = 0,
+                max_edits: int = VertexDiffer.DEFAULT_MAX_EDITS) -> VertexDiff:
+    """
+    Returns the sequence aligned difference between two vertex arrays.
+
+    See VertexDiffer for details.
+    """
+    return VertexDiffer(vertices1, vertices2, tolerance, max_edits).diff()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Background vertex diff task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import QgsTask
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import (
+    VertexDiff,
+    vertex_diff
+)
+
+
+class VertexDiffTask(QgsTask):
+    """
+    A background task which aligns two vertex arrays for side by side comparison.
+
+    The vertex arrays are not copied, so they must not be modified while the task runs.
+    """
+
+    def __init__(self, vertices1: VertexArray, vertices2: VertexArray):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Aligning vertices'),
+                         QgsTask.CanCancel)
+        self.vertices1 = vertices1
+        self.vertices2 = vertices2
+
+        self.diff: Optional[VertexDiff] = None
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        diff = vertex_diff(self.vertices1, self.vertices2)
+        if self.isCanceled():
+            return False
+
+        self.diff = diff
+        return True
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""Vertex table export
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import csv
+import math
+import os
+from itertools import (
+    chain,
+    islice,
+    repeat
+)
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QVariant
+)
+from qgis.core import (
+    QgsAbstractFeatureSource,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPoint,
+    QgsTask,
+    QgsVectorFileWriter,
+    QgsWkbTypes
+)
+
+from vertex_compare.core.topology import uncommon_vertices
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import VertexDiff
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# errors raised by the writers when an export fails
+WRITE_ERRORS = (OSError, pyarrow.ArrowException) if pyarrow is not None else (OSError,)
+
+
+class VertexExportFormat:
+    """
+    Vertex export formats
+    """
+    CSV = 'csv'
+    GEOPACKAGE = 'gpkg'
+    PARQUET = 'parquet'
+
+    @staticmethod
+    def available_formats() -> List[str]:
+        """
+        Returns the list of formats available for export. Parquet export requires pyarrow.
+        """
+        res = [VertexExportFormat.CSV, VertexExportFormat.GEOPACKAGE]
+        if pyarrow is not None:
+            res.append(VertexExportFormat.PARQUET)
+        return res
+
+
+# exported columns, in order
+COLUMNS = ('feature_id', 'vertex', 'part', 'ring', 'x', 'y', 'z', 'm', 'operation', 'topology')
+
+# topological compare flags
+TOPOLOGY_COMMON = 'common'
+TOPOLOGY_UNCOMMON = 'uncommon'
+
+
+def diff_operations(diff: VertexDiff, side: int) -> Iterator[str]:
+    """
+    Yields the diff operation for each vertex from one side of a vertex diff, in vertex order.
+
+    Side 0 yields operations for the first vertex array, and side 1 for the second.
+    """
+    if side == 0:
+        return chain.from_iterable(repeat(run.operation, run.end1 - run.start1) for run in diff.runs)
+    return chain.from_iterable(repeat(run.operation, run.end2 - run.start2) for run in diff.runs)
+
+
+class _CsvWriter:
+    """
+    Writes exported vertices to a CSV file
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, columns: Dict[str, list]):
+        """
+        Writes a chunk of vertices
+        """
+        self.writer.writerows(zip(*(columns[name] for name in COLUMNS)))
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self.file.close()
+
+
+class _GeoPackageWriter:
+    """
+    Writes exported vertices as point features to a GeoPackage
+    """
+
+    def __init__(self, path: str, crs: QgsCoordinateReferenceSystem, has_z: bool, has_m: bool):
+        self.fields = QgsFields()
+        self.fields.append(QgsField('feature_id', QVariant.LongLong))
+        self.fields.append(QgsField('vertex', QVariant.LongLong))
+        self.fields.append(QgsField('part', QVariant.Int))
+        self.fields.append(QgsField('ring', QVariant.Int))
+        self.fields.append(QgsField('x', QVariant.Double))
+        self.fields.append(QgsField('y', QVariant.Double))
+        self.fields.append(QgsField('z', QVariant.Double))
+        self.fields.append(QgsField('m', QVariant.Double))
+        self.fields.append(QgsField('operation', QVariant.String))
+        self.fields.append(QgsField('topology', QVariant.String))
+
+        self.wkb_type = QgsWkbTypes.Point
+        if has_z:
+            self.wkb_type = QgsWkbTypes.addZ(self.wkb_type)
+        if has_m:
+            self.wkb_type = QgsWkbTypes.addM(self.wkb_type)
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.layerName = 'vertices'
+        options.fileEncoding = 'UTF-8'
+        self.writer = QgsVectorFileWriter.create(path, self.fields, self.wkb_type, crs,
+                                                 QgsCoordinateTransformContext(), options)
+        if self.writer.hasError() != QgsVectorFileWriter.NoError:
+            raise OSError(self.writer.errorMessage())
+
+    def write(self, columns: Dict[str, list]):
+        """
+        Writes a chunk of vertices
+        """
+        features = []
+        for row in zip(*(columns[name] for name in COLUMNS)):
+            feature = QgsFeature(self.fields)
+            feature.setAttributes(list(row))
+            x, y, z, m = row[4:8]
+            feature.setGeometry(QgsGeometry(QgsPoint(x, y,
+                                                     z if z is not None else math.nan,
+                                                     m if m is not None else math.nan,
+                                                     self.wkb_type)))
+            features.append(feature)
+
+        if not self.writer.addFeatures(features):
+            raise OSError(self.writer.errorMessage())
+
+    def close(self):
+        """
+        Flushes and closes the file
+        """
+        self.writer.flushBuffer()
+        self.writer = None
+
+
+class _ParquetWriter:
+    """
+    Writes exported vertices to a Parquet file, one row group per chunk
+    """
+
+    def __init__(self, path: str):
+        self.schema = pyarrow.schema([('feature_id', pyarrow.int64()),
+                                      ('vertex', pyarrow.int64()),
+                                      ('part', pyarrow.int32()),
+                                      ('ring', pyarrow.int32()),
+                                      ('x', pyarrow.float64()),
+                                      ('y', pyarrow.float64()),
+                                      ('z', pyarrow.float64()),
+                                      ('m', pyarrow.float64()),
+                                      ('operation', pyarrow.string()),
+                                      ('topology', pyarrow.string())])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, columns: Dict[str, list]):
+        """
+        Writes a chunk of vertices
+        """
+        self.writer.write_table(pyarrow.Table.from_pydict({name: columns[name] for name in COLUMNS},
+                                                          schema=self.schema))
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self.writer.close()
+
+
+class VertexExportTask(QgsTask):
+    """
+    A background task which exports the vertices of a set of features.
+
+    Features are fetched from a feature source and decoded one at a time while exporting,
+    and vertices are written in fixed size chunks taken directly from each feature's vertex
+    array, so only a single feature and a single chunk of output rows are held in memory at once.
+    """
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 path: str,
+                 export_format: str,
+                 fids: List[int],
+                 crs: QgsCoordinateReferenceSystem,
+                 has_z: bool,
+                 has_m: bool,
+                 source: Optional[QgsAbstractFeatureSource] = None,
+                 vertices: Optional[Dict[int, VertexArray]] = None,
+                 operations: Optional[Dict[int, Tuple[VertexDiff, int]]] = None,
+                 topology_fids: Optional[Tuple[int, int]] = None):
+        """
+        Constructor for VertexExportTask.
+
+        :param fids: ids of the features to export
+        :param source: feature source to fetch the features from, e.g. a QgsVectorLayerFeatureSource
+            created on the main thread
+        :param vertices: optional already decoded vertices for features, which are exported
+            first without fetching the features from the source
+        :param operations: optional diffs for the compare flags of features, as a
+            dictionary of feature id to the diff and the feature's side of the diff
+        :param topology_fids: optional pair of features which are compared topologically. Their
+            vertices are flagged as common or uncommon, i.e. whether or not they match a vertex
+            from the other feature. Features not in vertices are fetched from the source.
+
+        If the export fails or is canceled, the partially written file is removed.
+        """
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Exporting vertices'), QgsTask.CanCancel)
+        self.path = path
+        self.export_format = export_format
+        self.fids = list(fids)
+        self.source = source
+        self.vertices = vertices or {}
+        self.crs = QgsCoordinateReferenceSystem(crs)
+        self.has_z = has_z
+        self.has_m = has_m
+        self.operations = operations or {}
+        self.topology_fids = topology_fids
+
+        self.exported_count = 0
+        self.error: Optional[str] = None
+
+    def _writer(self):
+        """
+        Creates the writer for the export format
+        """
+        if self.export_format == VertexExportFormat.GEOPACKAGE:
+            return _GeoPackageWriter(self.path, self.crs, self.has_z, self.has_m)
+        if self.export_format == VertexExportFormat.PARQUET:
+            return _ParquetWriter(self.path)
+        return _CsvWriter(self.path)
+
+    def uncommon_vertices(self) -> Dict[int, Set[int]]:
+        """
+        Returns the vertex numbers (starting at 1) of the uncommon vertices of the topologically
+        compared features, or an empty dictionary if no features are compared
+        """
+        if self.topology_fids is None:
+            return {}
+
+        vertices = {fid: self.vertices[fid] for fid in self.topology_fids if fid in self.vertices}
+        remaining = [fid for fid in self.topology_fids if fid not in vertices]
+        if remaining and self.source is not None:
+            request = QgsFeatureRequest().setFilterFids(remaining).setNoAttributes()
+            for feature in self.source.getFeatures(request):
+                vertices[feature.id()] = VertexArray.from_geometry(feature.geometry())
+
+        fid1, fid2 = self.topology_fids
+        if fid1 not in vertices or fid2 not in vertices:
+            return {}
+
+        uncommon1, uncommon2 = uncommon_vertices(vertices[fid1], vertices[fid2])
+        return {fid1: set(uncommon1), fid2: set(uncommon2)}
+
+    def features(self) -> Iterator[Tuple[int, VertexArray]]:
+        """
+        Yields the ids and vertices of the exported features, fetching and decoding the
+        features from the source one at a time
+        """
+        for fid in self.fids:
+            if fid in self.vertices:
+                yield fid, self.vertices[fid]
+
+        remaining = [fid for fid in self.fids if fid not in self.vertices]
+        if remaining and self.source is not None:
+            request = QgsFeatureRequest().setFilterFids(remaining).setNoAttributes()
+            for feature in self.source.getFeatures(request):
+                yield feature.id(), VertexArray.from_geometry(feature.geometry())
+
+    def chunks(self) -> Iterator[Dict[str, list]]:
+        """
+        Yields the exported vertices in chunks, as dictionaries of column name to values
+        """
+        uncommon = self.uncommon_vertices()
+        for index, (fid, vertices) in enumerate(self.features()):
+            count = len(vertices)
+            operations = None
+            if fid in self.operations:
+                diff, side = self.operations[fid]
+                operations = diff_operations(diff, side)
+            feature_uncommon = uncommon.get(fid)
+
+            for start in range(0, count, VertexExportTask.CHUNK_SIZE):
+                end = min(start + VertexExportTask.CHUNK_SIZE, count)
+                size = end - start
+                yield {
+                    'feature_id': [fid] * size,
+                    'vertex': list(range(start + 1, end + 1)),
+                    'part': list(vertices.parts[start:end]),
+                    'ring': list(vertices.rings[start:end]),
+                    'x': list(vertices.x[start:end]),
+                    'y': list(vertices.y[start:end]),
+                    'z': list(vertices.z[start:end]) if vertices.z is not None else [None] * size,
+                    'm': list(vertices.m[start:end]) if vertices.m is not None else [None] * size,
+                    'operation': list(islice(operations, size)) if operations is not None else [None] * size,
+                    'topology': [TOPOLOGY_UNCOMMON if vertex in feature_uncommon else TOPOLOGY_COMMON
+                                 for vertex in range(start + 1, end + 1)]
+                    if feature_uncommon is not None else [None] * size
+                }
+                self.setProgress(100 * (index + end / count) / len(self.fids))
+
+    def _export(self) -> bool:
+        """
+        Writes the exported vertices, returning False if the export was canceled
+        """
+        writer = self._writer()
+        try:
+            for chunk in self.chunks():
+                if self.isCanceled():
+                    return False
+
+                writer.write(chunk)
+                self.exported_count += len(chunk['vertex'])
+        finally:
+            writer.close()
+
+        return True
+
+    def _remove_output(self):
+        """
+        Removes the partially written output file
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        try:
+            completed = self._export()
+        except WRITE_ERRORS as e:
+            self.error = str(e)
+            completed = False
+
+        if not completed:
+            self._remove_output()
+        return completed
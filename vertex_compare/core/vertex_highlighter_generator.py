@@ -13,24 +13,40 @@ __copyright__ = 'Copyright 2021, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
-from typing import Optional
+from typing import (
+    Dict,
+    Optional
+)
 
 from qgis.core import (
     QgsFeatureRendererGenerator,
+    QgsProject,
     QgsSingleSymbolRenderer,
     QgsVectorLayer,
-    QgsNullSymbolRenderer,
-    QgsFeatureRequest,
-    QgsVectorLayerFeatureSource
+    QgsNullSymbolRenderer
 )
 
+from vertex_compare.core.edit_change_tracker import EditChange
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.label_tile_cache import LabelTileCache
+from vertex_compare.core.reference_layer import ReferenceLayer
+from vertex_compare.core.selection_snapshot import SelectionSnapshot
 from vertex_compare.core.settings_registry import SettingsRegistry
-from vertex_compare.core.vertex_highlighter_renderer import VertexHighlighterRenderer
+from vertex_compare.core.topology_store import TopologyStore
+from vertex_compare.core.vertex_highlighter_renderer import (
+    RendererConfiguration,
+    VertexHighlighterRenderer
+)
+from vertex_compare.core.vertex_snapshot import SnapshotChangeCache
 
 
 class VertexHighlighterRendererGenerator(QgsFeatureRendererGenerator):
     """
-    Generates a vertex highlighter renderer for layers
+    Generates a vertex highlighter renderer for layers.
+
+    When labeling all vertices of large selections, only a representative subset of
+    vertices is labeled, as determined by the refinement pass and the label vertex budget.
+    Each subsequent refinement pass labels 4x more vertices, until all vertices are labeled.
     """
 
     ID = 'vertex_highlighter'
@@ -39,11 +55,30 @@ class VertexHighlighterRendererGenerator(QgsFeatureRendererGenerator):
                  layer: QgsVectorLayer,
                  feature_id: Optional[int],
                  vertex_number: Optional[int],
-                 topological: bool):
+                 topological: bool,
+                 refinement_pass: int = 0,
+                 feature_cache: Optional[FeatureGeometryCache] = None,
+                 label_cache: Optional[LabelTileCache] = None,
+                 edit_changes: Optional[Dict[int, EditChange]] = None,
+                 snapshot_changes: Optional[SnapshotChangeCache] = None,
+                 reference_layer: Optional[ReferenceLayer] = None):
         """
         Creates a vertex highlighter for the specified layer type
 
         Optional a selected feature_id and vertex_number can be specified.
+
+        If feature_cache is set then feature geometries will be retrieved via the
+        (possibly shared) cache.
+
+        If label_cache is set then rendered labels will be cached and reused between renders.
+        The caller is responsible for clearing the cache whenever the selection or geometries change.
+
+        If edit_changes is set then vertices changed in the current edit session will be highlighted.
+        If snapshot_changes is set then vertices changed since its snapshot was captured will be
+        highlighted instead, for features contained in the snapshot.
+
+        If reference_layer is set then in topological mode the selected features are compared
+        against intersecting features from the reference layer, instead of against each other.
         """
         super().__init__()
         self.layer = layer
@@ -51,6 +86,25 @@ class VertexHighlighterRendererGenerator(QgsFeatureRendererGenerator):
         self.feature_id = feature_id
         self.vertex_number = vertex_number
         self.topological = topological
+        self.refinement_pass = refinement_pass
+        self.feature_cache = feature_cache
+        self.label_cache = label_cache
+        self.edit_changes = edit_changes
+        self.snapshot_changes = snapshot_changes
+        self.reference_layer = reference_layer
+        # the configuration of the most recently created vertex highlighter renderer
+        self.last_configuration: Optional[RendererConfiguration] = None
+
+    def needs_refinement(self) -> bool:
+        """
+        Returns True if the most recently created renderer only labeled a subset of vertices,
+        and a further refinement pass is required.
+
+        Returns False if no renderer has been rendered yet, e.g. for hidden layers.
+        """
+        if self.last_configuration is None or not self.last_configuration.is_prepared():
+            return False
+        return self.last_configuration.label_stride > 1
 
     def id(self):  # pylint: disable=missing-function-docstring
         return VertexHighlighterRendererGenerator.ID
@@ -60,8 +114,10 @@ class VertexHighlighterRendererGenerator(QgsFeatureRendererGenerator):
 
     def createRenderer(self) -> QgsSingleSymbolRenderer:  # pylint: disable=missing-function-docstring
         filtering = SettingsRegistry.label_filtering()
+        self.last_configuration = None
 
-        topological = self.topological and self.layer.selectedFeatureCount() == 2
+        reference_layer = self.reference_layer if self.topological else None
+        topological = self.topological and reference_layer is None and self.layer.selectedFeatureCount() == 2
 
         if filtering == SettingsRegistry.LABEL_NONE:
             return QgsNullSymbolRenderer()
@@ -75,17 +131,41 @@ class VertexHighlighterRendererGenerator(QgsFeatureRendererGenerator):
             selection = self.layer.selectedFeatureIds()
             vertex_number = None
 
+        # only the selected features are ever read, so there's no need to copy the entire layer source
+        # (and for layers in edit mode, the entire edit buffer). Geometries which aren't cached or
+        # edited are fetched from the provider when the renderer is prepared, in the render thread
         if topological:
-            request = QgsFeatureRequest().setFilterFids(self.layer.selectedFeatureIds()).setNoAttributes()
-            topological_geometries = {f.id(): f.geometry() for f in self.layer.getFeatures(request)}
+            topological_fids = self.layer.selectedFeatureIds()
+            snapshot = SelectionSnapshot.deferred(self.layer, set(selection).union(topological_fids),
+                                                  self.feature_cache)
+            topology_store = TopologyStore.for_project(QgsProject.instance()) \
+                if SettingsRegistry.store_topology() else None
         else:
-            topological_geometries = None
-
-        layer_source = QgsVectorLayerFeatureSource(self.layer)
-
-        return VertexHighlighterRenderer(source=layer_source,
-                                         layer_type=self.layer_type,
-                                         selection=selection,
-                                         vertex_number=vertex_number,
-                                         topological_geometries=topological_geometries,
-                                         )
+            snapshot = SelectionSnapshot.deferred(self.layer, selection, self.feature_cache)
+            topological_fids = None
+            topology_store = None
+
+        # intersecting reference features are looked up and fetched when the renderer is prepared
+        reference_candidates = reference_layer.candidates(self.layer.crs(), self.feature_cache) \
+            if reference_layer is not None else None
+
+        # the label stride depends on the number of selected vertices, so is calculated when the renderer is prepared
+        label_vertex_budget = SettingsRegistry.label_vertex_budget() if filtering == SettingsRegistry.LABEL_ALL else 0
+
+        configuration = RendererConfiguration(snapshot=snapshot,
+                                              selection=selection,
+                                              vertex_number=vertex_number,
+                                              topological_fids=topological_fids,
+                                              label_time_budget=SettingsRegistry.label_time_budget(),
+                                              label_vertex_budget=label_vertex_budget,
+                                              refinement_pass=self.refinement_pass,
+                                              label_cache=self.label_cache,
+                                              layer_source=self.layer.source(),
+                                              topology_store=topology_store,
+                                              edit_changes=self.edit_changes,
+                                              snapshot_changes=self.snapshot_changes,
+                                              reference_candidates=reference_candidates)
+        self.last_configuration = configuration
+
+        return VertexHighlighterRenderer(configuration=configuration,
+                                         layer_type=self.layer_type)
@@ -13,55 +13,274 @@ __copyright__ = 'Copyright 2021, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
-from typing import Optional
+from functools import partial
+from typing import (
+    Dict,
+    List,
+    Optional
+)
 
 from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    QTimer
+)
 from qgis.core import (
     QgsVectorLayer,
     QgsProject,
     QgsMapLayer
 )
+from qgis.gui import (
+    QgsMapCanvas
+)
 
-from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.core.edit_change_tracker import EditChangeTracker
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.label_tile_cache import LabelTileCache
+from vertex_compare.core.reference_layer import ReferenceLayer
+from vertex_compare.core.repaint_scheduler import RepaintScheduler
+from vertex_compare.core.settings_registry import (
+    SettingsRegistry,
+    SETTINGS_REGISTRY
+)
 from vertex_compare.core.vertex_highlighter_generator import VertexHighlighterRendererGenerator
+from vertex_compare.core.vertex_snapshot import (
+    SnapshotChangeCache,
+    VertexSnapshot
+)
+
+
+class HighlightedLayer:
+    """
+    Tracks the highlighting state for a single layer
+    """
+
+    def __init__(self, layer: QgsVectorLayer):
+        self.layer = layer
+        self.generator: Optional[VertexHighlighterRendererGenerator] = None
+        self.refinement_pass = 0
+
+        # rendered labels are reused when panning, until the labeled content changes
+        self.label_cache = LabelTileCache()
+        layer.selectionChanged.connect(self.invalidate_labels)
+        layer.geometryChanged.connect(self.invalidate_labels)
+        layer.featureAdded.connect(self.invalidate_labels)
+        layer.featureDeleted.connect(self.invalidate_labels)
+        layer.afterRollBack.connect(self.invalidate_labels)
+        layer.dataChanged.connect(self.invalidate_labels)
+        layer.crsChanged.connect(self.invalidate_labels)
+
+        # vertices changed in the current edit session
+        self.edit_tracker = EditChangeTracker(layer)
+
+    def detach(self):
+        """
+        Disconnects from the layer's signals
+        """
+        self.edit_tracker.detach()
+        if sip.isdeleted(self.layer):  # pylint: disable=no-member
+            return
+
+        self.layer.selectionChanged.disconnect(self.invalidate_labels)
+        self.layer.geometryChanged.disconnect(self.invalidate_labels)
+        self.layer.featureAdded.disconnect(self.invalidate_labels)
+        self.layer.featureDeleted.disconnect(self.invalidate_labels)
+        self.layer.afterRollBack.disconnect(self.invalidate_labels)
+        self.layer.dataChanged.disconnect(self.invalidate_labels)
+        self.layer.crsChanged.disconnect(self.invalidate_labels)
+
+    def invalidate_labels(self, *_):
+        """
+        Discards all cached label tiles for the layer
+        """
+        self.label_cache.clear()
 
 
 class VertexHighlighterManager:
     """
-    Manages highlighting of vertices for one single active layer only
+    Manages highlighting of vertices for one or more layers.
+
+    Each highlighted layer has its own renderer generator, but all layers share a single
+    repaint scheduler and feature geometry cache. The selected feature and vertex apply
+    to the active layer only.
+
+    Large selections are labeled progressively: the first render labels only a subset of
+    vertices, and further refinement passes are triggered once the map view is idle.
     """
 
-    def __init__(self):
+    # time in milliseconds the map must be idle before triggering the next refinement pass
+    REFINEMENT_DELAY = 250
+
+    def __init__(self, repaint_interval: int = 0, map_canvas: Optional[QgsMapCanvas] = None):
+        """
+        Constructor for VertexHighlighterManager.
+
+        :param repaint_interval: window in milliseconds in which multiple layer repaints
+            will be coalesced into a single render
+        :param map_canvas: optional map canvas. If set, refinement passes will be delayed until
+            the canvas has finished rendering.
+        """
         super().__init__()
 
+        self.layers: Dict[str, HighlightedLayer] = {}
+        # the active layer, to which the current feature and vertex apply
         self.layer: Optional[QgsVectorLayer] = None
         self.visible = False
         self.current_feature_id: Optional[int] = None
         self.current_vertex_number: Optional[int] = None
         self.topological = False
+        # changes since the vertex snapshot, shared between renders until the snapshot is replaced
+        self.snapshot_changes: Optional[SnapshotChangeCache] = None
+        self.reference_layer: Optional[ReferenceLayer] = None
+        self.repaint_scheduler = RepaintScheduler(repaint_interval)
+        self.feature_cache = FeatureGeometryCache()
+
+        self.refinement_timer = QTimer()
+        self.refinement_timer.setSingleShot(True)
+        self.refinement_timer.setInterval(VertexHighlighterManager.REFINEMENT_DELAY)
+        self.refinement_timer.timeout.connect(self._refine)
+
+        self.map_canvas = map_canvas
+        if self.map_canvas is not None:
+            self.map_canvas.mapCanvasRefreshed.connect(self._canvas_refreshed)
 
         QgsProject.instance().layerWillBeRemoved[QgsMapLayer].connect(self._layer_removed)
+        SETTINGS_REGISTRY.setting_changed.connect(self._setting_changed)
+        self._detached = False
 
     def __del__(self):
-        self._remove_current_generator()
+        for highlighted_layer in self.layers.values():
+            self._remove_generator(highlighted_layer)
+        self.repaint_scheduler.flush()
+
+    def detach(self):
+        """
+        Removes all highlighting and disconnects from the project, canvas and settings signals.
+
+        The manager should not be used after it has been detached.
+        """
+        if self._detached:
+            return
+
+        self._detached = True
+        self.refinement_timer.stop()
+        self.visible = False
+        self.set_layers([])
+        self.set_reference_layer(None)
+        self.repaint_scheduler.flush()
+
+        if self.map_canvas is not None and not sip.isdeleted(self.map_canvas):  # pylint: disable=no-member
+            self.map_canvas.mapCanvasRefreshed.disconnect(self._canvas_refreshed)
+        QgsProject.instance().layerWillBeRemoved[QgsMapLayer].disconnect(self._layer_removed)
+        SETTINGS_REGISTRY.setting_changed.disconnect(self._setting_changed)
 
     def set_layer(self, layer: Optional[QgsVectorLayer]):
         """
-        Sets the active layer
+        Sets a single layer to highlight, which also becomes the active layer
+        """
+        self.set_layers([layer] if layer is not None else [])
+
+    def set_layers(self, layers: List[QgsVectorLayer]):
+        """
+        Sets the layers to highlight.
+
+        The first layer becomes the active layer.
+        """
+        new_layers = {layer.id(): layer for layer in layers if layer is not None}
+
+        for layer_id in [layer_id for layer_id in self.layers if layer_id not in new_layers]:
+            self.remove_layer(self.layers[layer_id].layer)
+
+        for layer in new_layers.values():
+            self.add_layer(layer)
+
+        self.set_active_layer(layers[0] if layers else None)
+
+    def add_layer(self, layer: QgsVectorLayer):
+        """
+        Adds a layer to highlight
+        """
+        if layer.id() in self.layers:
+            return
+
+        highlighted_layer = HighlightedLayer(layer)
+        highlighted_layer.edit_tracker.changed.connect(partial(self._edit_changes_changed, layer.id()))
+        self.layers[layer.id()] = highlighted_layer
+        self.feature_cache.watch_layer(layer)
+        self._reset_generator(highlighted_layer)
+
+    def remove_layer(self, layer: QgsMapLayer):
+        """
+        Stops highlighting a layer
+        """
+        highlighted_layer = self.layers.pop(layer.id(), None)
+        if highlighted_layer is None:
+            return
+
+        self._remove_generator(highlighted_layer)
+        highlighted_layer.detach()
+        if self.reference_layer is None or self.reference_layer.layer != layer:
+            self.feature_cache.unwatch_layer(layer)
+        if layer == self.layer:
+            self.layer = None
+            self.current_feature_id = None
+            self.current_vertex_number = None
+
+    def highlighted_layers(self) -> List[QgsVectorLayer]:
+        """
+        Returns the list of layers being highlighted
+        """
+        return [highlighted_layer.layer for highlighted_layer in self.layers.values()]
+
+    def set_active_layer(self, layer: Optional[QgsVectorLayer]):
+        """
+        Sets the active layer, to which the selected feature and vertex apply.
+
+        The layer must already be highlighted.
         """
         if layer == self.layer:
             return
 
-        self._remove_current_generator()
+        if layer is not None and layer.id() not in self.layers:
+            return
+
+        previous = self.layers.get(self.layer.id()) if self.layer is not None else None
         self.layer = layer
-        self._reset_generator()
+        self.current_feature_id = None
+        self.current_vertex_number = None
+        if previous is not None:
+            self._reset_generator(previous)
+        if layer is not None:
+            self._reset_generator(self.layers[layer.id()])
 
     def _layer_removed(self, layer: QgsMapLayer):
         """
         Triggered when a map layer is about to be removed from the project
         """
-        if layer == self.layer:
-            self.set_layer(None)
+        if layer.id() in self.layers:
+            self.remove_layer(layer)
+            self.repaint_scheduler.cancel(layer)
+        if self.reference_layer is not None and self.reference_layer.layer == layer:
+            self.set_reference_layer(None)
+
+    def _setting_changed(self, key: str):
+        """
+        Triggered when a plugin setting is changed
+        """
+        if key in ('',
+                   SettingsRegistry.LABELS,
+                   SettingsRegistry.LABEL_TIME_BUDGET,
+                   SettingsRegistry.LABEL_VERTEX_BUDGET,
+                   SettingsRegistry.MARKER_SYMBOL,
+                   SettingsRegistry.VERTEX_FONT_KEY):
+            self.redraw()
+
+    def _edit_changes_changed(self, layer_id: str):
+        """
+        Triggered when the vertices changed in a layer's edit session are changed
+        """
+        highlighted_layer = self.layers.get(layer_id)
+        if highlighted_layer is not None:
+            self._reset_generator(highlighted_layer)
 
     def set_visible(self, visible: bool):
         """
@@ -71,58 +290,161 @@ class VertexHighlighterManager:
             return
 
         self.visible = visible
-        self._reset_generator()
+        self._reset_all_generators()
 
     def set_topological(self, topological: bool):
         """
         Sets whether the topological mode is active
         """
         self.topological = topological
-        self._remove_current_generator()
-        self._reset_generator()
+        self._reset_all_generators()
+
+    def set_reference_layer(self, layer: Optional[QgsVectorLayer]):
+        """
+        Sets a reference layer to compare features against in topological mode.
+
+        If set, selected features are compared against the intersecting features from the
+        reference layer, instead of against each other.
+        """
+        if self.reference_layer is not None:
+            if layer is not None and layer == self.reference_layer.layer:
+                return
+
+            previous = self.reference_layer
+            self.reference_layer = None
+            previous.changed.disconnect(self._reference_layer_changed)
+            previous.detach()
+            if not sip.isdeleted(previous.layer) and previous.layer.id() not in self.layers:  # pylint: disable=no-member
+                self.feature_cache.unwatch_layer(previous.layer)
+
+        if layer is not None:
+            self.reference_layer = ReferenceLayer(layer)
+            self.reference_layer.changed.connect(self._reference_layer_changed)
+            self.feature_cache.watch_layer(layer)
+
+        self._reset_all_generators()
+
+    def _reference_layer_changed(self):
+        """
+        Triggered when the features in the reference layer are changed
+        """
+        if self.topological:
+            self._reset_all_generators()
+
+    def set_vertex_snapshot(self, snapshot: Optional[VertexSnapshot]):
+        """
+        Sets a vertex snapshot to compare the highlighted features against.
+
+        Vertices which have changed since the snapshot was captured are highlighted in
+        the snapshot's layer only.
+        """
+        self.snapshot_changes = SnapshotChangeCache(snapshot) if snapshot is not None else None
+        self._reset_all_generators()
 
     def redraw(self):
         """
-        Forces a redraw of the current layer being highlighted
+        Forces a redraw of all layers being highlighted
         """
-        self._remove_current_generator()
-        self._reset_generator()
+        self._reset_all_generators()
 
     def set_selected_vertex(self, feature_id: Optional[int], vertex_number: Optional[int]):
         """
-        Triggered when the selected vertex is changed
+        Triggered when the selected vertex in the active layer is changed
         """
         if self.current_vertex_number == vertex_number and self.current_feature_id == feature_id:
             return
 
-        needs_redraw = SettingsRegistry.label_filtering() == SettingsRegistry.LABEL_SELECTED or \
-                       (
-                                   SettingsRegistry.label_filtering() == SettingsRegistry.LABEL_ALL and feature_id != self.current_feature_id)
+        label_filtering = SettingsRegistry.label_filtering()
+        needs_redraw = label_filtering == SettingsRegistry.LABEL_SELECTED or \
+            (label_filtering == SettingsRegistry.LABEL_ALL and feature_id != self.current_feature_id)
 
         self.current_feature_id = feature_id
         self.current_vertex_number = vertex_number
-        self._remove_current_generator()
-        self._reset_generator(not needs_redraw)
+        if self.layer is not None:
+            self._reset_generator(self.layers[self.layer.id()], not needs_redraw)
 
-    def _remove_current_generator(self):
+    def _reset_all_generators(self):
         """
-        Removes the generator from the current layer, if present
+        Resets the generators for all highlighted layers
         """
-        if self.layer is not None and not sip.isdeleted(self.layer):  # pylint: disable=no-member
-            self.layer.removeFeatureRendererGenerator(VertexHighlighterRendererGenerator.ID)
-            self.layer.triggerRepaint()
+        for highlighted_layer in self.layers.values():
+            self._reset_generator(highlighted_layer)
 
-    def _reset_generator(self, skip_redraw: bool = False):
+    def _remove_generator(self, highlighted_layer: HighlightedLayer, repaint: bool = True):
         """
-        Creates a new renderer generator for the correct layer
+        Removes the generator from a layer, if present.
+
+        If repaint is True then a repaint of the layer will be scheduled.
+        """
+        highlighted_layer.generator = None
+        layer = highlighted_layer.layer
+        if layer is not None and not sip.isdeleted(layer):  # pylint: disable=no-member
+            layer.removeFeatureRendererGenerator(VertexHighlighterRendererGenerator.ID)
+            if repaint:
+                self.repaint_scheduler.schedule(layer)
+
+    def _reset_generator(self, highlighted_layer: HighlightedLayer, skip_redraw: bool = False, refine: bool = False):
         """
+        Creates a new renderer generator for a layer, replacing any existing generator.
+
+        If refine is False then progressive labeling will restart from the first pass.
+        """
+        if not refine:
+            highlighted_layer.refinement_pass = 0
+        # the labeled content or style has changed, so previously rendered labels can't be reused
+        highlighted_layer.invalidate_labels()
+
         if not self.visible:
-            self._remove_current_generator()
-        elif self.layer is not None:
-            self.layer.addFeatureRendererGenerator(
-                VertexHighlighterRendererGenerator(layer=self.layer,
-                                                   feature_id=self.current_feature_id,
-                                                   vertex_number=self.current_vertex_number,
-                                                   topological=self.topological))
-            if not skip_redraw:
-                self.layer.triggerRepaint()
+            self._remove_generator(highlighted_layer)
+            return
+
+        layer = highlighted_layer.layer
+        is_active = layer == self.layer
+        snapshot_changes = self.snapshot_changes \
+            if self.snapshot_changes is not None and self.snapshot_changes.snapshot.layer_id == layer.id() else None
+
+        self._remove_generator(highlighted_layer, repaint=False)
+        highlighted_layer.generator = VertexHighlighterRendererGenerator(
+            layer=layer,
+            feature_id=self.current_feature_id if is_active else None,
+            vertex_number=self.current_vertex_number if is_active else None,
+            topological=self.topological,
+            refinement_pass=highlighted_layer.refinement_pass,
+            feature_cache=self.feature_cache,
+            label_cache=highlighted_layer.label_cache,
+            edit_changes=highlighted_layer.edit_tracker.changes,
+            snapshot_changes=snapshot_changes,
+            reference_layer=self.reference_layer
+            if self.reference_layer is not None and self.reference_layer.layer != layer else None)
+        layer.addFeatureRendererGenerator(highlighted_layer.generator)
+        if not skip_redraw:
+            self.repaint_scheduler.schedule(layer)
+
+        if self.map_canvas is None:
+            # no canvas to tell us when rendering is complete, so just wait
+            self.refinement_timer.start()
+
+    def _canvas_refreshed(self):
+        """
+        Triggered when the map canvas has finished rendering
+        """
+        for highlighted_layer in self.layers.values():
+            if highlighted_layer.generator is not None and highlighted_layer.generator.needs_refinement():
+                self.refinement_timer.start()
+                return
+
+    def _refine(self):
+        """
+        Triggers the next progressive labeling pass for any layers which require it
+        """
+        if self.map_canvas is not None and self.map_canvas.isDrawing():
+            # we'll try again when the canvas has finished rendering
+            return
+
+        for highlighted_layer in self.layers.values():
+            # layers which haven't been rendered yet are refined once the canvas has rendered them
+            if highlighted_layer.generator is None or not highlighted_layer.generator.needs_refinement():
+                continue
+
+            highlighted_layer.refinement_pass += 1
+            self._reset_generator(highlighted_layer, refine=True)
@@ -13,12 +13,18 @@ __copyright__ = 'Copyright 2021, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
+import threading
 from typing import Optional, Dict, List
 
+from qgis.PyQt.QtCore import (
+    QCoreApplication
+)
 from qgis.PyQt.QtGui import (
     QColor
 )
 from qgis.core import (
+    Qgis,
+    QgsMessageLog,
     QgsSingleSymbolRenderer,
     QgsFields,
     QgsRenderContext,
@@ -29,20 +35,232 @@ from qgis.core import (
     QgsWkbTypes,
     QgsLineSymbol,
     QgsFillSymbol,
-    QgsGeometry,
-    QgsPointXY,
-    QgsVertexId,
-    QgsFeatureSource,
-    QgsFeatureRequest
+    QgsGeometry
 )
 
+from vertex_compare.core.edit_change_tracker import EditChange
+from vertex_compare.core.label_tile_cache import (
+    LabelTileCache,
+    LabelTilePlan
+)
+from vertex_compare.core.reference_layer import ReferenceCandidates
+from vertex_compare.core.selection_snapshot import SelectionSnapshot
 from vertex_compare.core.settings_registry import SettingsRegistry
 from vertex_compare.core.text_renderer_marker_symbol_layer import TextRendererMarkerSymbolLayer
+from vertex_compare.core.topology import uncommon_vertices
+from vertex_compare.core.topology_store import TopologyStore
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_snapshot import SnapshotChangeCache
+
+
+class PartialRenderLog:
+    """
+    Reports renders which exceeded the label time budget to the message log.
+
+    Renders are repeated for every pan or zoom of the map, so a message is only logged once
+    for each combination of layer, time budget and selection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_key = None
+
+    def report(self, layer_source: str, time_budget: int, selection: frozenset) -> bool:
+        """
+        Logs a message for a partial render, unless one has already been logged for the
+        same layer, time budget and selection.
+
+        Returns True if a message was logged.
+        """
+        key = (layer_source, time_budget, selection)
+        with self._lock:
+            if key == self._last_key:
+                return False
+            self._last_key = key
+
+        QgsMessageLog.logMessage(
+            QCoreApplication.translate('VertexCompare',
+                                       'Vertex labeling exceeded the time limit of {} ms, not all vertices were labeled').format(
+                time_budget),
+            'Vertex Compare', Qgis.Info)
+        return True
+
+    def reset(self):
+        """
+        Forgets the previously logged partial render, so that the next one will be logged
+        """
+        with self._lock:
+            self._last_key = None
+
+
+PARTIAL_RENDER_LOG = PartialRenderLog()
+
+
+class RendererConfiguration:
+    """
+    Encapsulates the configuration of vertex highlighter renderers.
+
+    A configuration is never modified while rendering, so a single configuration can safely be
+    shared between renderers used by concurrent render jobs. Costly values derived from the
+    configuration (such as the selected geometries which are read from the layer's data provider,
+    and the topological relationships between geometries) are calculated only once, by whichever
+    render job requires them first.
+    """
+
+    def __init__(self,
+                 snapshot: SelectionSnapshot,
+                 selection: list,
+                 vertex_number: Optional[int] = None,
+                 topological_fids: Optional[List[int]] = None,
+                 label_time_budget: int = 0,
+                 label_vertex_budget: int = 0,
+                 refinement_pass: int = 0,
+                 label_cache: Optional[LabelTileCache] = None,
+                 layer_source: str = '',
+                 topology_store: Optional[TopologyStore] = None,
+                 edit_changes: Optional[Dict[int, EditChange]] = None,
+                 snapshot_changes: Optional[SnapshotChangeCache] = None,
+                 reference_candidates: Optional[ReferenceCandidates] = None):
+        self.snapshot = snapshot
+        self.selection = sorted(selection)
+        self.selection_ids = frozenset(selection)
+        # colors are assigned by position in the selection, so that a feature is always rendered
+        # in the same color regardless of the map extent (and cached label tiles remain valid)
+        self.selection_index = {fid: i for i, fid in enumerate(self.selection)}
+        self.vertex_number = vertex_number
+        self.topological_fids = topological_fids
+        self.label_time_budget = label_time_budget
+        self.label_vertex_budget = label_vertex_budget
+        self.refinement_pass = refinement_pass
+        self.label_cache = label_cache
+        self.layer_source = layer_source
+        self.topology_store = topology_store
+        self.edit_changes = edit_changes or {}
+        self.snapshot_changes = snapshot_changes
+        self.reference_candidates = reference_candidates
+
+        self.topological_geometries: Optional[Dict[int, QgsGeometry]] = None
+        self.label_stride = 1
+        self.geometry_part_map: Dict[int, List[int]] = {}
+        self.uncommon_vertices: Dict[int, List[int]] = {}
+
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+
+    @staticmethod
+    def calculate_label_stride(vertex_count: int, budget: int, refinement_pass: int) -> int:
+        """
+        Calculates the stride to use when labeling vertices, so that for the first pass
+        at most budget vertices will be labeled.
+
+        Strides are always powers of 2, so that the vertices labeled in each pass are
+        a subset of those labeled in later passes.
+        """
+        if budget <= 0 or vertex_count <= budget:
+            return 1
+
+        initial_stride = 1
+        while vertex_count > budget * initial_stride:
+            initial_stride *= 2
+
+        return max(1, initial_stride >> (2 * refinement_pass))
+
+    def is_prepared(self) -> bool:
+        """
+        Returns True if the values derived from the configuration have been calculated
+        """
+        return self._prepared
+
+    def prepare(self):
+        """
+        Calculates the values derived from the configuration, if they have not already
+        been calculated.
+
+        This may be costly, so should be called from a background thread only.
+        """
+        with self._prepare_lock:
+            if self._prepared:
+                return
+
+            self.snapshot.fetch()
+            if self.topological_fids is not None:
+                self.topological_geometries = self.snapshot.subset(self.topological_fids)
+
+            vertex_count = sum(g.constGet().nCoordinates() for g in self.snapshot.geometries.values() if not g.isNull())
+            self.label_stride = self.calculate_label_stride(vertex_count, self.label_vertex_budget,
+                                                            self.refinement_pass)
+
+            # we need a record of the number of vertices in each geometry part
+            geometry_part_map = {}
+            for fid, geometry in self.snapshot.subset(self.selection).items():
+                if geometry.isMultipart():
+                    geometry_part_map[fid] = []
+                    for part in geometry.constParts():
+                        geometry_part_map[fid].append(part.nCoordinates())
+
+            self.geometry_part_map = geometry_part_map
+            if self.topological_geometries and len(self.topological_geometries) == 2:
+                self.uncommon_vertices = self._stored_topology()
+                if self.uncommon_vertices is None:
+                    self.uncommon_vertices = self.calculate_topology()
+                    if self.topology_store is not None:
+                        self.topology_store.store(self.layer_source, self.topological_geometries,
+                                                  self.uncommon_vertices)
+            elif self.reference_candidates is not None:
+                self.uncommon_vertices = self.reference_candidates.uncommon_vertices(
+                    self.snapshot.subset(self.selection))
+
+            if self.snapshot_changes is not None:
+                self.edit_changes = self.calculate_snapshot_changes()
+
+            self._prepared = True
+
+    def calculate_snapshot_changes(self) -> Dict[int, EditChange]:
+        """
+        Calculates the changes to the selected features since the vertex snapshot was captured.
+
+        Changes since the snapshot replace the changes from the current edit session, for
+        features contained in the snapshot.
+        """
+        res = dict(self.edit_changes)
+        for fid, geometry in self.snapshot.subset(self.selection).items():
+            if fid not in self.snapshot_changes.snapshot:
+                continue
+
+            change = self.snapshot_changes.changes(fid, geometry)
+            if change is None:
+                res.pop(fid, None)
+            else:
+                res[fid] = change
+        return res
+
+    def _stored_topology(self) -> Optional[Dict[int, List[int]]]:
+        """
+        Returns the previously stored topological relationship between vertices, if available
+        and the geometries are unchanged
+        """
+        if self.topology_store is None:
+            return None
+
+        return self.topology_store.lookup(self.layer_source, self.topological_geometries)
+
+    def calculate_topology(self) -> Dict[int, List[int]]:
+        """
+        Calculates the topological relationship between vertices
+        """
+        f1, f2 = self.topological_geometries.keys()
+        uncommon1, uncommon2 = uncommon_vertices(VertexArray.from_geometry(self.topological_geometries[f1]),
+                                                 VertexArray.from_geometry(self.topological_geometries[f2]))
+        return {f1: uncommon1,
+                f2: uncommon2}
 
 
 class VertexHighlighterRenderer(QgsSingleSymbolRenderer):
     """
-    Custom layer renderer which highlights vertices in selected features only
+    Custom layer renderer which highlights vertices in selected features only.
+
+    All state which changes during a render is stored per-thread, and the renderer's
+    configuration is shared and read-only, so renderers can be used by concurrent render jobs.
     """
 
     COLORS = [
@@ -52,11 +270,8 @@ class VertexHighlighterRenderer(QgsSingleSymbolRenderer):
     ]
 
     def __init__(self,
-                 source: QgsFeatureSource,
-                 layer_type: QgsWkbTypes.GeometryType,
-                 selection: list,
-                 vertex_number=Optional[int],
-                 topological_geometries: Optional[Dict[int, QgsGeometry]] = None):
+                 configuration: RendererConfiguration,
+                 layer_type: QgsWkbTypes.GeometryType):
         if layer_type == QgsWkbTypes.LineGeometry:
             symbol = QgsLineSymbol()
         else:
@@ -74,7 +289,10 @@ class VertexHighlighterRenderer(QgsSingleSymbolRenderer):
         font_marker_symbol = QgsMarkerSymbol()
 
         text_format = SettingsRegistry.vertex_format()
-        font_marker = TextRendererMarkerSymbolLayer(text_format, vertex_number)
+        font_marker = TextRendererMarkerSymbolLayer(text_format,
+                                                    configuration.vertex_number,
+                                                    configuration.label_time_budget,
+                                                    configuration.label_stride)
         font_marker.setSubSymbol(vertex_marker_symbol)
 
         font_marker_symbol.changeSymbolLayer(0, font_marker)
@@ -86,69 +304,52 @@ class VertexHighlighterRenderer(QgsSingleSymbolRenderer):
 
         super().__init__(symbol)
 
-        self.selection = sorted(selection)
-        self.feature_index = 0
-        self.vertex_number = vertex_number
-        self.source = source
+        self.configuration = configuration
+        self.layer_type = layer_type
+        self.selection = configuration.selection
+        self.vertex_number = configuration.vertex_number
 
-        self.topological_geometries = topological_geometries
+    def clone(self) -> 'VertexHighlighterRenderer':  # pylint: disable=missing-function-docstring
+        res = VertexHighlighterRenderer(self.configuration, self.layer_type)
+        res.setSymbol(self.symbol().clone())
+        return res
 
-    def calculate_topology(self) -> Dict[int, List[int]]:
+    def vertex_symbol_layer(self) -> TextRendererMarkerSymbolLayer:
         """
-        Calculates the topological relationship between vertices
+        Returns the symbol layer responsible for rendering vertices
         """
-        f1, f2 = self.topological_geometries.keys()
-        g1 = self.topological_geometries[f1]
-        g2 = self.topological_geometries[f2]
-
-        g1_points = set(v.asPoint() for v in g1.coerceToType(QgsWkbTypes.Point))
-        g2_points = set(v.asPoint() for v in g2.coerceToType(QgsWkbTypes.Point))
-
-        common_vertices = g1_points.intersection(g2_points)
-
-        def _get_uncommon_vertices(_common_vertices, geometry: QgsGeometry):
-            res = []
-
-            const_geom = geometry.constGet()
-            vid = QgsVertexId()
-
-            vertex_no = 1
-            while True:
-                ok, vertex = const_geom.nextVertex(vid)
-                if ok:
-                    if not QgsPointXY(vertex) in _common_vertices:
-                        res.append(vertex_no)
-                    vertex_no += 1
-                else:
-                    break
-
-            return res
-
-        return {f1: _get_uncommon_vertices(common_vertices, g1),
-                f2: _get_uncommon_vertices(common_vertices, g2)}
+        return self.symbol()[0].subSymbol()[0]
 
     def filter(self, _=QgsFields()) -> str:  # pylint: disable=missing-function-docstring
         return f'$id in ({",".join([str(i) for i in self.selection])})'
 
     def startRender(self, context: QgsRenderContext, fields: QgsFields):  # pylint: disable=missing-function-docstring
         # we are in a background thread now - we can do more costly things!
+        self.configuration.prepare()
+
+        vertex_layer = self.vertex_symbol_layer()
+        vertex_layer.set_stride(self.configuration.label_stride)
+        vertex_layer.set_geometry_part_map(self.configuration.geometry_part_map)
+        vertex_layer.set_uncommon_vertices(self.configuration.uncommon_vertices)
+        vertex_layer.set_edit_changes(self.configuration.edit_changes)
 
-        # we need a record of the number of vertices in each geometry part
-        selected_features = self.source.getFeatures(QgsFeatureRequest().setFilterFids(self.selection).setNoAttributes())
-        geometry_part_map = {}
-        for f in selected_features:
-            if f.geometry().isMultipart():
-                geometry_part_map[f.id()] = []
-                for part in f.geometry().constParts():
-                    geometry_part_map[f.id()].append(part.nCoordinates())
+        super().startRender(context, fields)
 
-        self.symbol()[0].subSymbol()[0].set_geometry_part_map(geometry_part_map)
-        self.feature_index = 0
+        # labels from export renders are never cached, since they may differ from the labels of
+        # an in-progress progressive canvas render
+        if self.configuration.label_cache is not None and LabelTilePlan.can_use_cache(context) \
+                and TextRendererMarkerSymbolLayer.is_interactive_render(context):
+            vertex_layer.set_tile_plan(LabelTilePlan(self.configuration.label_cache, context))
 
-        if self.topological_geometries:
-            self.symbol()[0].subSymbol()[0].set_uncommon_vertices(self.calculate_topology())
+    def stopRender(self, context: QgsRenderContext):  # pylint: disable=missing-function-docstring
+        vertex_layer = self.vertex_symbol_layer()
+        partial = vertex_layer.is_render_partial()
+        vertex_layer.finish_tile_plan(context)
+        super().stopRender(context)
 
-        super().startRender(context, fields)
+        if partial:
+            PARTIAL_RENDER_LOG.report(self.configuration.layer_source, self.configuration.label_time_budget,
+                                      self.configuration.selection_ids)
 
     def renderFeature(self,  # pylint: disable=missing-function-docstring
                       feature,
@@ -162,12 +363,18 @@ class VertexHighlighterRenderer(QgsSingleSymbolRenderer):
         if not context.showSelection():
             return False
 
-        if feature.id() not in self.selection:
+        if feature.id() not in self.configuration.selection_ids:
+            return False
+
+        if context.renderingStopped() or self.vertex_symbol_layer().is_render_stopped():
             return False
 
-        color = VertexHighlighterRenderer.COLORS[self.feature_index % len(VertexHighlighterRenderer.COLORS)]
-        self.feature_index += 1
+        color = VertexHighlighterRenderer.COLORS[
+            self.configuration.selection_index[feature.id()] % len(VertexHighlighterRenderer.COLORS)]
 
-        self.symbol().setColor(color)
+        # don't use symbol().setColor here -- that would modify the shared symbol instead of the state for this render
+        self.vertex_symbol_layer().set_render_color(color)
 
-        return super().renderFeature(feature, context, layer, False, drawVertexMarker)
+        res = super().renderFeature(feature, context, layer, False, drawVertexMarker)
+        self.vertex_symbol_layer().render_deleted_vertices(feature.id(), context)
+        return res
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""Grid based vertex and segment indices
+
+This module does not depend on QGIS, so that it can be used by worker processes
+running outside of QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+from collections import defaultdict
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+if TYPE_CHECKING:
+    from vertex_compare.core.vertex_array import VertexArray  # pylint: disable=ungrouped-imports
+
+
+def segment_distance_squared(x: float, y: float,  # pylint: disable=too-many-arguments
+                             x1: float, y1: float,
+                             x2: float, y2: float) -> float:
+    """
+    Returns the squared distance from a point to a line segment
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return (x - x1) ** 2 + (y - y1) ** 2
+
+    t = ((x - x1) * dx + (y - y1) * dy) / length_squared
+    t = max(0.0, min(1.0, t))
+    px = x1 + t * dx
+    py = y1 + t * dy
+    return (x - px) ** 2 + (y - py) ** 2
+
+
+class PointGridIndex:
+    """
+    A uniform grid index of the vertices from a vertex array, for fast
+    nearest vertex and within distance queries
+    """
+
+    def __init__(self, vertices: 'VertexArray', cell_size: Optional[float] = None):
+        self.vertices = vertices
+        self.cell_size = cell_size if cell_size else PointGridIndex.default_cell_size(vertices)
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        cell_size = self.cell_size
+        for i, (x, y) in enumerate(zip(vertices.x, vertices.y)):
+            self.cells[(math.floor(x / cell_size), math.floor(y / cell_size))].append(i)
+
+        # range of occupied cells
+        self.cell_bounds = (min(cell[0] for cell in self.cells),
+                            min(cell[1] for cell in self.cells),
+                            max(cell[0] for cell in self.cells),
+                            max(cell[1] for cell in self.cells)) if self.cells else None
+
+    # target number of vertices in each occupied cell, for vertices lying along a line or boundary
+    VERTICES_PER_CELL = 16
+
+    @staticmethod
+    def default_cell_size(vertices: 'VertexArray') -> float:
+        """
+        Returns a cell size for a vertex array, giving a small number of vertices per occupied cell.
+
+        Vertices of lines and polygon boundaries lie along a curve rather than filling their
+        extent, so the cell size is based on the average distance between consecutive vertices.
+        The size is never larger than required to give one vertex per cell if the vertices
+        were evenly spread over their extent (e.g. for multipoints).
+        """
+        count = len(vertices)
+        if count < 2:
+            return 1.0
+
+        x = vertices.x
+        y = vertices.y
+        width = max(x) - min(x)
+        height = max(y) - min(y)
+        size = max(width, height) / math.sqrt(count)
+
+        spacing = PointGridIndex.VERTICES_PER_CELL * sum(
+            max(abs(x[i + 1] - x[i]), abs(y[i + 1] - y[i])) for i in range(count - 1)) / (count - 1)
+        if 0 < spacing < size:
+            size = spacing
+        return size if size > 0 else 1.0
+
+    def within(self, x: float, y: float, distance: float) -> List[int]:
+        """
+        Returns the indices of all vertices within the specified distance of a point
+        """
+        cell_size = self.cell_size
+        distance_squared = distance * distance
+        res = []
+        for cell_x in range(math.floor((x - distance) / cell_size), math.floor((x + distance) / cell_size) + 1):
+            for cell_y in range(math.floor((y - distance) / cell_size), math.floor((y + distance) / cell_size) + 1):
+                for i in self.cells.get((cell_x, cell_y), ()):
+                    if (self.vertices.x[i] - x) ** 2 + (self.vertices.y[i] - y) ** 2 <= distance_squared:
+                        res.append(i)
+        return res
+
+    @staticmethod
+    def _ring_cells(center_x: int, center_y: int, ring: int):
+        """
+        Yields the cells forming the square ring at the specified distance (in cells) from a center cell
+        """
+        if ring == 0:
+            yield center_x, center_y
+            return
+
+        for cell_x in range(center_x - ring, center_x + ring + 1):
+            yield cell_x, center_y - ring
+            yield cell_x, center_y + ring
+        for cell_y in range(center_y - ring + 1, center_y + ring):
+            yield center_x - ring, cell_y
+            yield center_x + ring, cell_y
+
+    def nearest(self, x: float, y: float, max_distance: Optional[float] = None) -> Optional[int]:
+        """
+        Returns the index of the vertex nearest to a point, or None if no vertex
+        is within max_distance of the point.
+
+        If several vertices are equally near, the lowest index is returned.
+        """
+        if not self.cells:
+            return None
+
+        cell_size = self.cell_size
+        center_x = math.floor(x / cell_size)
+        center_y = math.floor(y / cell_size)
+
+        # no need to search beyond the furthest occupied cell
+        min_x, min_y, max_x, max_y = self.cell_bounds
+        last_ring = max(abs(min_x - center_x), abs(max_x - center_x), abs(min_y - center_y), abs(max_y - center_y))
+        if max_distance is not None:
+            last_ring = min(last_ring, math.ceil(max_distance / cell_size) + 1)
+
+        best = None
+        best_distance_squared = math.inf
+        cells = self.cells
+        vertices_x = self.vertices.x
+        vertices_y = self.vertices.y
+        for ring in range(last_ring + 1):
+            if (2 * ring + 1) ** 2 > len(cells):
+                # the rings searched so far contain more cells than are occupied, so it's cheaper to
+                # check the occupied cells directly than to keep searching mostly empty rings
+                best, best_distance_squared = self._nearest_in_occupied_cells(x, y, ring, best,
+                                                                              best_distance_squared)
+                break
+
+            for cell in self._ring_cells(center_x, center_y, ring):
+                for i in cells.get(cell, ()):
+                    distance_squared = (vertices_x[i] - x) ** 2 + (vertices_y[i] - y) ** 2
+                    if distance_squared < best_distance_squared or \
+                            (distance_squared == best_distance_squared and i < best):
+                        best = i
+                        best_distance_squared = distance_squared
+
+            # any vertex outside the rings checked so far is at least ring * cell_size away
+            if best is not None and best_distance_squared <= (ring * cell_size) ** 2:
+                break
+
+        if best is None or (max_distance is not None and best_distance_squared > max_distance * max_distance):
+            return None
+        return best
+
+    def _nearest_in_occupied_cells(self, x: float, y: float, first_ring: int,
+                                   best: Optional[int], best_distance_squared: float) -> Tuple[Optional[int], float]:
+        """
+        Searches all occupied cells at or beyond first_ring for a vertex nearer to a point than
+        the best vertex found so far, returning the new best vertex and its squared distance
+        """
+        cell_size = self.cell_size
+        center_x = math.floor(x / cell_size)
+        center_y = math.floor(y / cell_size)
+        vertices_x = self.vertices.x
+        vertices_y = self.vertices.y
+        for (cell_x, cell_y), indices in self.cells.items():
+            ring = max(abs(cell_x - center_x), abs(cell_y - center_y))
+            if ring < first_ring:
+                continue
+            # any vertex in this cell is at least (ring - 1) * cell_size away
+            if best is not None and ((ring - 1) * cell_size) ** 2 > best_distance_squared:
+                continue
+
+            for i in indices:
+                distance_squared = (vertices_x[i] - x) ** 2 + (vertices_y[i] - y) ** 2
+                if distance_squared < best_distance_squared or \
+                        (distance_squared == best_distance_squared and i < best):
+                    best = i
+                    best_distance_squared = distance_squared
+        return best, best_distance_squared
+
+
+class SegmentGridIndex:
+    """
+    A uniform grid index of the segments from a vertex array, for fast point
+    to boundary distance queries.
+
+    Segments join consecutive vertices from the same part and ring.
+    """
+
+    def __init__(self, vertices: 'VertexArray', cell_size: Optional[float] = None):
+        self.vertices = vertices
+        self.segments: List[int] = [i for i in range(len(vertices) - 1)
+                                    if vertices.parts[i] == vertices.parts[i + 1] and
+                                    vertices.rings[i] == vertices.rings[i + 1]]
+        self.cell_size = cell_size if cell_size else self.default_cell_size()
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+        cell_size = self.cell_size
+        x = vertices.x
+        y = vertices.y
+        for i in self.segments:
+            for cell in self.segment_cells(x[i], y[i], x[i + 1], y[i + 1], cell_size):
+                self.cells[cell].append(i)
+
+    @staticmethod
+    def segment_cells(x1: float, y1: float,  # pylint: disable=too-many-locals
+                      x2: float, y2: float,
+                      cell_size: float) -> List[Tuple[int, int]]:
+        """
+        Returns the cells crossed by a line segment, in order from the start of the segment.
+
+        Only the cells the segment actually passes through are returned (using a grid
+        traversal), so long diagonal segments don't fill every cell in their bounding box.
+        """
+        cell_x = math.floor(x1 / cell_size)
+        cell_y = math.floor(y1 / cell_size)
+        end_x = math.floor(x2 / cell_size)
+        end_y = math.floor(y2 / cell_size)
+        res = [(cell_x, cell_y)]
+
+        dx = x2 - x1
+        dy = y2 - y1
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # the distance along the segment (as a fraction of its length) to the next cell
+        # boundary in each direction, and between successive boundaries
+        if dx != 0:
+            t_max_x = ((cell_x + (1 if dx > 0 else 0)) * cell_size - x1) / dx
+            t_delta_x = cell_size / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy != 0:
+            t_max_y = ((cell_y + (1 if dy > 0 else 0)) * cell_size - y1) / dy
+            t_delta_y = cell_size / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+
+        for _ in range(abs(end_x - cell_x) + abs(end_y - cell_y)):
+            if t_max_x < t_max_y:
+                cell_x += step_x
+                t_max_x += t_delta_x
+            else:
+                cell_y += step_y
+                t_max_y += t_delta_y
+            res.append((cell_x, cell_y))
+
+        if res[-1] != (end_x, end_y):
+            # guard against floating point error at cell boundaries
+            res.append((end_x, end_y))
+        return res
+
+    def default_cell_size(self) -> float:
+        """
+        Returns a cell size matching the average segment length
+        """
+        x = self.vertices.x
+        y = self.vertices.y
+        if not self.segments:
+            return 1.0
+
+        total = sum(max(abs(x[i + 1] - x[i]), abs(y[i + 1] - y[i])) for i in self.segments)
+        size = total / len(self.segments)
+        return size if size > 0 else 1.0
+
+    def segments_within(self, x: float, y: float, distance: float) -> List[int]:
+        """
+        Returns the indices of the first vertices of all segments within the specified distance of a point
+        """
+        cell_size = self.cell_size
+        distance_squared = distance * distance
+        vx = self.vertices.x
+        vy = self.vertices.y
+        res = set()
+        for cell_x in range(math.floor((x - distance) / cell_size), math.floor((x + distance) / cell_size) + 1):
+            for cell_y in range(math.floor((y - distance) / cell_size), math.floor((y + distance) / cell_size) + 1):
+                for i in self.cells.get((cell_x, cell_y), ()):
+                    if i not in res and \
+                            segment_distance_squared(x, y, vx[i], vy[i], vx[i + 1], vy[i + 1]) <= distance_squared:
+                        res.add(i)
+        return sorted(res)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Background vertex index task
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsRectangle,
+    QgsTask
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_index import PointGridIndex
+
+
+class PointGridIndexTask(QgsTask):
+    """
+    A background task which builds the grid index and extent of a vertex array.
+
+    The vertex array is not copied, so it must not be modified while the task runs.
+    """
+
+    def __init__(self, vertices: VertexArray):
+        super().__init__(QCoreApplication.translate('VertexCompare', 'Indexing vertices'),
+                         QgsTask.CanCancel)
+        self.vertices = vertices
+
+        self.index: Optional[PointGridIndex] = None
+        self.extent: Optional[QgsRectangle] = None
+
+    def run(self) -> bool:  # pylint: disable=missing-function-docstring
+        index = PointGridIndex(self.vertices)
+        if self.isCanceled():
+            return False
+
+        self.extent = QgsRectangle(min(self.vertices.x), min(self.vertices.y),
+                                   max(self.vertices.x), max(self.vertices.y))
+        self.index = index
+        return True
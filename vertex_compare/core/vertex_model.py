@@ -14,9 +14,7 @@ __copyright__ = 'Copyright 2021, North Road'
 __revision__ = '$Format:%H$'
 
 from typing import (
-    Optional,
-    List,
-    Union
+    Optional
 )
 
 from qgis.PyQt.QtCore import (
@@ -26,18 +24,28 @@ from qgis.PyQt.QtCore import (
     QModelIndex
 )
 from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
     QgsFeature,
-    QgsVertexId,
-    QgsPoint,
-    QgsNumericFormatContext
+    QgsNumericFormatContext,
+    QgsProject,
+    QgsVectorLayer
 )
 
 from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_cache import VertexDiskCache
+from vertex_compare.core.vertex_cache_task import VertexCacheTask
 
 
 class VertexModel(QAbstractTableModel):
     """
-    A model for showing vertex information
+    A model for showing vertex information.
+
+    Optionally, the model can also show the vertices transformed to a different CRS
+    in two extra columns, following the layer-native coordinate columns.
     """
 
     VERTEX_NUMBER_ROLE = Qt.UserRole + 1
@@ -49,54 +57,178 @@ class VertexModel(QAbstractTableModel):
     COLUMN_Z = 3
     COLUMN_M = 4
 
+    # features with fewer vertices than this are never cached on disk
+    DISK_CACHE_MIN_VERTICES = 100000
+
     def __init__(self, parent: QObject = None):
         super().__init__(parent)
         self.feature: Optional[QgsFeature] = None
-        self.vertices: List[Union[QgsVertexId, QgsPoint]] = []
+        self.vertices = VertexArray.from_geometry(None)
         self.has_z = False
         self.has_m = False
         self.number_format = SettingsRegistry.number_format()
 
-    def set_feature(self, feature: Optional[QgsFeature]):
+        self.crs = QgsCoordinateReferenceSystem()
+        self.destination_crs = QgsCoordinateReferenceSystem()
+        self.transform: Optional[QgsCoordinateTransform] = None
+        # vertices transformed to the destination CRS, calculated when first required
+        self._transformed: Optional[VertexArray] = None
+        self._transform_failed = False
+        # the most recent task storing vertices in the on-disk cache
+        self.cache_task: Optional[VertexCacheTask] = None
+
+    def set_feature(self, feature: Optional[QgsFeature], layer: Optional[QgsVectorLayer] = None):
         """
-        Sets the feature to show in the model
+        Sets the feature to show in the model.
+
+        If the layer is specified and the on-disk vertex cache is enabled, the vertices of
+        large features will be retrieved from (or stored in) the cache.
         """
         self.beginResetModel()
         self.feature = feature
 
-        self.vertices = []
+        self.vertices = VertexArray.from_geometry(None)
 
         self.has_z = self.feature.geometry().constGet().is3D() if self.feature is not None and self.feature.hasGeometry() else True
         self.has_m = self.feature.geometry().constGet().isMeasure() if self.feature is not None and self.feature.hasGeometry() else True
 
         if self.feature is not None and self.feature.hasGeometry():
-            geom = self.feature.geometry().constGet()
+            self.vertices = self._decode_vertices(self.feature, layer)
 
-            vid = QgsVertexId()
-            while True:
-                ok, vertex = geom.nextVertex(vid)
-                if ok:
-                    self.vertices.append((vid, vertex))
-                else:
-                    break
+        self._set_crs(layer.crs() if layer is not None else QgsCoordinateReferenceSystem())
+        self.endResetModel()
+
+    def set_vertices(self, vertices: Optional[VertexArray], crs: Optional[QgsCoordinateReferenceSystem] = None):
+        """
+        Sets the vertices to show in the model directly, e.g. from a vertex snapshot.
 
+        The model will not be associated with a feature.
+        """
+        self.beginResetModel()
+        self.feature = None
+        self.vertices = vertices if vertices is not None else VertexArray.from_geometry(None)
+        self.has_z = vertices is None or vertices.has_z()
+        self.has_m = vertices is None or vertices.has_m()
+        self._set_crs(crs if crs is not None else QgsCoordinateReferenceSystem())
         self.endResetModel()
 
+    def set_destination_crs(self, crs: Optional[QgsCoordinateReferenceSystem]):
+        """
+        Sets the CRS to show transformed vertex coordinates in. If crs is None or invalid,
+        no transformed coordinates will be shown.
+        """
+        crs = crs if crs is not None else QgsCoordinateReferenceSystem()
+        if crs == self.destination_crs:
+            return
+
+        self.beginResetModel()
+        self.destination_crs = QgsCoordinateReferenceSystem(crs)
+        self.transform = None
+        self._transformed = None
+        self._transform_failed = False
+        self.endResetModel()
+
+    def _set_crs(self, crs: QgsCoordinateReferenceSystem):
+        """
+        Sets the CRS of the model's vertices, discarding any previously transformed vertices
+        """
+        if crs != self.crs:
+            self.crs = QgsCoordinateReferenceSystem(crs)
+            self.transform = None
+        self._transformed = None
+        self._transform_failed = False
+
+    def has_transformed_columns(self) -> bool:
+        """
+        Returns True if the model shows transformed vertex coordinates
+        """
+        return self.destination_crs.isValid()
+
+    def transformed_vertices(self) -> Optional[VertexArray]:
+        """
+        Returns the vertices transformed to the destination CRS, or None if no destination
+        CRS is set or the vertices could not be transformed.
+
+        All vertices are transformed in a single batch when first required, and the result
+        is kept until the vertices or the destination CRS change.
+        """
+        if not self.has_transformed_columns() or self._transform_failed:
+            return None
+
+        if self._transformed is None:
+            if self.transform is None:
+                # the transform is kept and reused for every feature from the same CRS
+                self.transform = QgsCoordinateTransform(self.crs, self.destination_crs, QgsProject.instance())
+            try:
+                self._transformed = self.vertices.transformed(self.transform)
+            except QgsCsException:
+                self._transform_failed = True
+                return None
+
+        return self._transformed
+
+    def _transformed_column(self, column: int) -> Optional[int]:
+        """
+        Returns 0 or 1 if a column shows transformed x or y coordinates, or None
+        if the column shows layer-native values
+        """
+        if not self.has_transformed_columns():
+            return None
+
+        offset = column - (3 + (1 if self.has_z else 0) + (1 if self.has_m else 0))
+        return offset if offset in (0, 1) else None
+
+    @staticmethod
+    def _disk_cache() -> Optional[VertexDiskCache]:
+        """
+        Returns the on-disk vertex cache, or None if the cache is disabled
+        """
+        if not SettingsRegistry.vertex_cache_enabled() or not VertexDiskCache.is_supported():
+            return None
+
+        return VertexDiskCache(VertexDiskCache.default_path(), SettingsRegistry.vertex_cache_size() * 1024 * 1024)
+
+    def _decode_vertices(self, feature: QgsFeature, layer: Optional[QgsVectorLayer]) -> VertexArray:
+        """
+        Decodes the vertices of a feature, using the on-disk cache for large features
+        """
+        geometry = feature.geometry()
+        cache = None
+        if layer is not None and geometry.constGet().nCoordinates() >= VertexModel.DISK_CACHE_MIN_VERTICES:
+            cache = self._disk_cache()
+
+        if cache is None:
+            return VertexArray.from_geometry(geometry)
+
+        # the geometry is only serialized once, for both the cache key and decoding
+        wkb = bytes(geometry.asWkb())
+        key = VertexDiskCache.key(layer.source(), feature.id(), wkb)
+        vertices = cache.get(key)
+        if vertices is not None:
+            return vertices
+
+        vertices = VertexArray.from_geometry(geometry, wkb)
+        # don't fill the cache with intermediate versions of geometries which are being edited.
+        # Otherwise the vertices are written in the background, and memory-mapped from the
+        # cache when the feature is next shown
+        if not layer.isEditable():
+            self.cache_task = VertexCacheTask(cache, key, vertices)
+            QgsApplication.taskManager().addTask(self.cache_task)
+
+        return vertices
+
     def rowCount(self,  # pylint: disable=missing-function-docstring
                  parent: QModelIndex = QModelIndex()) -> int:
         if parent.isValid():
             return 0
 
-        if self.feature is None:
-            return 0
-
         return len(self.vertices)
 
     def columnCount(self,  # pylint: disable=missing-function-docstring
                     parent: QModelIndex = QModelIndex()) -> int:
         if parent.isValid():
             return 0
-        return 3 + (1 if self.has_z else 0) + (1 if self.has_m else 0)
+        return 3 + (1 if self.has_z else 0) + (1 if self.has_m else 0) + (2 if self.has_transformed_columns() else 0)
 
     def data(self,  # pylint: disable=missing-function-docstring, too-many-return-statements
              index: QModelIndex,
@@ -109,19 +241,27 @@ class VertexModel(QAbstractTableModel):
                 return index.row() + 1
 
             context = QgsNumericFormatContext()
+            transformed_column = self._transformed_column(index.column())
+            if transformed_column is not None:
+                transformed = self.transformed_vertices()
+                if transformed is None:
+                    return None
+                values = transformed.x if transformed_column == 0 else transformed.y
+                return self.number_format.formatDouble(values[index.row()], context)
+
             if index.column() == VertexModel.COLUMN_X:
-                return self.number_format.formatDouble(self.vertices[index.row()][1].x(), context)
+                return self.number_format.formatDouble(self.vertices.x[index.row()], context)
             if index.column() == VertexModel.COLUMN_Y:
-                return self.number_format.formatDouble(self.vertices[index.row()][1].y(), context)
+                return self.number_format.formatDouble(self.vertices.y[index.row()], context)
             if index.column() == VertexModel.COLUMN_Y + 1 and self.has_z:
-                return self.number_format.formatDouble(self.vertices[index.row()][1].z(), context)
+                return self.number_format.formatDouble(self.vertices.z[index.row()], context)
 
-            return self.number_format.formatDouble(self.vertices[index.row()][1].m(), context)
+            return self.number_format.formatDouble(self.vertices.m[index.row()], context)
 
         if role == VertexModel.VERTEX_NUMBER_ROLE:
             return index.row() + 1
         if role == VertexModel.VERTEX_POINT_ROLE:
-            return self.vertices[index.row()][1]
+            return self.vertices.point(index.row())
 
         return None
 
@@ -131,6 +271,13 @@ class VertexModel(QAbstractTableModel):
                    role: int):
         if orientation == Qt.Horizontal:
             if role in (Qt.DisplayRole, Qt.ToolTipRole):
+                transformed_column = self._transformed_column(section)
+                if transformed_column is not None:
+                    name = self.tr('X') if transformed_column == 0 else self.tr('Y')
+                    if role == Qt.ToolTipRole:
+                        return self.tr('{} ({})').format(name, self.destination_crs.userFriendlyIdentifier())
+                    return self.tr('{} ({})').format(name, self.destination_crs.authid() or self.tr('Custom'))
+
                 if section == VertexModel.COLUMN_ID:
                     return self.tr('Vertex')
                 if section == VertexModel.COLUMN_X:
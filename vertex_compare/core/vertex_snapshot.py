@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""Vertex snapshots
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from array import array
+from datetime import datetime
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union
+)
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    Qgis,
+    QgsGeometry,
+    QgsMessageLog,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.edit_change_tracker import EditChange
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.selection_snapshot import SelectionSnapshot
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import vertex_diff
+
+
+class _SnapshotRecord(NamedTuple):
+    """
+    The location of a single feature's packed vertices within a snapshot file
+    """
+    count: int
+    flags: int
+    offset: int
+    size: int
+
+
+class VertexSnapshot:
+    """
+    A snapshot of the vertices of a set of features, which can be saved to disk and later
+    compared against the current geometries of the features.
+
+    Snapshot files store each feature's vertices as packed little-endian coordinate
+    buffers. Compressed snapshots shuffle the bytes of each buffer (so that the similar
+    high-order bytes of neighbouring coordinates are grouped together) before compressing
+    them with zlib, which greatly improves the compression of coordinate data.
+
+    Loading a snapshot only reads the feature index. Vertices are decoded on demand when
+    a feature is first accessed, and the buffers of uncompressed snapshots are memory-mapped
+    rather than copied. Features whose buffers turn out to be corrupt are dropped from the
+    snapshot when first accessed.
+    """
+
+    MAGIC = b'VCSS'
+    VERSION = 1
+    # magic, version, flags, metadata length, feature count
+    HEADER = struct.Struct('<4sIIIQ')
+    # feature id, vertex count, flags, offset, size, padded to a multiple of 8 bytes
+    RECORD = struct.Struct('<qQI4xQQ')
+    FLAG_COMPRESSED = 1
+    FLAG_Z = 1
+    FLAG_M = 2
+    SUFFIX = '.vcsnap'
+
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self,
+                 vertices: Optional[Dict[int, VertexArray]] = None,
+                 layer_id: str = '',
+                 layer_name: str = '',
+                 crs: str = '',
+                 created: str = ''):
+        self.layer_id = layer_id
+        self.layer_name = layer_name
+        self.crs = crs
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+        self._vertices: Dict[int, VertexArray] = dict(vertices or {})
+        # packed vertices which have not been decoded yet, for loaded snapshots
+        self._records: Dict[int, _SnapshotRecord] = {}
+        self._data: Optional[Union[mmap.mmap, bytes]] = None
+        self._compressed = False
+
+    @staticmethod
+    def capture(layer: QgsVectorLayer,
+                fids: Iterable[int],
+                cache: Optional[FeatureGeometryCache] = None) -> 'VertexSnapshot':
+        """
+        Captures a snapshot of the current vertices of the specified features from a layer,
+        including any unsaved edits.
+
+        This must be called from the main thread.
+        """
+        geometries = SelectionSnapshot.from_layer(layer, fids, cache).geometries
+        return VertexSnapshot({fid: VertexArray.from_geometry(geometry) for fid, geometry in geometries.items()},
+                              layer_id=layer.id(),
+                              layer_name=layer.name(),
+                              crs=layer.crs().toWkt())
+
+    def fids(self) -> List[int]:
+        """
+        Returns the list of feature ids contained in the snapshot
+        """
+        return sorted(set(self._vertices.keys()).union(self._records.keys()))
+
+    def __len__(self):
+        return len(self.fids())
+
+    def __contains__(self, fid: int) -> bool:
+        return fid in self._vertices or fid in self._records
+
+    def vertices(self, fid: int) -> Optional[VertexArray]:
+        """
+        Returns the vertices for the specified feature, or None if the feature
+        is not contained in the snapshot
+        """
+        if fid not in self._vertices:
+            record = self._records.get(fid)
+            if record is None:
+                return None
+            vertices = self._decode(record)
+            if vertices is None:
+                self._records.pop(fid, None)
+                QgsMessageLog.logMessage(
+                    QCoreApplication.translate('VertexCompare',
+                                               'Snapshot of {} contains corrupt vertices for feature {}').format(
+                        self.layer_name, fid),
+                    'Vertex Compare', Qgis.Warning)
+                return None
+            self._vertices[fid] = vertices
+        return self._vertices[fid]
+
+    def changes(self,
+                fid: int,
+                current: VertexArray,
+                tolerance: float = 0) -> Optional[EditChange]:
+        """
+        Returns the changes between the snapshot vertices for a feature and its
+        current vertices, or None if the feature is unchanged or not contained in the snapshot
+        """
+        vertices = self.vertices(fid)
+        if vertices is None:
+            return None
+        return EditChange.from_diff(vertex_diff(vertices, current, tolerance), vertices)
+
+    @staticmethod
+    def _shuffle(data: bytes, item_size: int) -> bytes:
+        """
+        Groups the bytes of a buffer by their position within each item
+        """
+        return b''.join(data[i::item_size] for i in range(item_size))
+
+    @staticmethod
+    def _unshuffle(data: bytes, item_size: int) -> bytearray:
+        """
+        Reverses _shuffle
+        """
+        res = bytearray(len(data))
+        count = len(data) // item_size
+        for i in range(item_size):
+            res[i::item_size] = data[i * count:(i + 1) * count]
+        return res
+
+    @staticmethod
+    def _columns(vertices: VertexArray) -> List[array]:
+        """
+        Returns the stored columns of a vertex array, as little-endian arrays
+        """
+        res = []
+        for values, type_code in ((vertices.x, 'd'), (vertices.y, 'd'), (vertices.z, 'd'), (vertices.m, 'd'),
+                                  (vertices.parts, 'i'), (vertices.rings, 'i')):
+            if values is None:
+                continue
+            values = values if isinstance(values, array) else array(type_code, values)
+            if sys.byteorder != 'little':
+                values = array(type_code, values)
+                values.byteswap()
+            res.append(values)
+        return res
+
+    def _pack(self, vertices: VertexArray, compress: bool) -> bytes:
+        """
+        Packs a vertex array into a buffer for storage
+        """
+        columns = self._columns(vertices)
+        if not compress:
+            return b''.join(memoryview(values).cast('B') for values in columns)
+
+        compressor = zlib.compressobj(VertexSnapshot.COMPRESSION_LEVEL)
+        res = [compressor.compress(self._shuffle(values.tobytes(), values.itemsize)) for values in columns]
+        res.append(compressor.flush())
+        return b''.join(res)
+
+    @staticmethod
+    def _packed_size(record: _SnapshotRecord) -> int:
+        """
+        Returns the size of a feature's vertices once unpacked
+        """
+        coordinates = 2 + bool(record.flags & VertexSnapshot.FLAG_Z) + bool(record.flags & VertexSnapshot.FLAG_M)
+        return record.count * (8 * coordinates + 4 * 2)
+
+    def _decode(self, record: _SnapshotRecord) -> Optional[VertexArray]:
+        """
+        Decodes the vertices of a loaded feature, or returns None if the packed
+        vertices are corrupt
+        """
+        data = memoryview(self._data)[record.offset:record.offset + record.size]
+        if self._compressed:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                return None
+        if len(data) != self._packed_size(record):
+            return None
+
+        count = record.count
+        offset = 0
+
+        def _take(item_size: int, type_code: str):
+            nonlocal offset
+            block = data[offset:offset + count * item_size]
+            offset += count * item_size
+            if self._compressed:
+                return array(type_code, self._unshuffle(block, item_size))
+            if sys.byteorder == 'little':
+                # a zero-copy view of the memory-mapped file
+                return memoryview(block).cast(type_code)
+            res = array(type_code, bytes(block))
+            res.byteswap()
+            return res
+
+        x = _take(8, 'd')
+        y = _take(8, 'd')
+        z = _take(8, 'd') if record.flags & VertexSnapshot.FLAG_Z else None
+        m = _take(8, 'd') if record.flags & VertexSnapshot.FLAG_M else None
+        parts = _take(4, 'i')
+        rings = _take(4, 'i')
+        if self._compressed and sys.byteorder != 'little':
+            for values in (x, y, z, m, parts, rings):
+                if values is not None:
+                    values.byteswap()
+        return VertexArray(x, y, z, m, parts, rings)
+
+    def _metadata(self) -> bytes:
+        """
+        Returns the encoded snapshot metadata
+        """
+        return json.dumps({'layer_id': self.layer_id,
+                           'layer_name': self.layer_name,
+                           'crs': self.crs,
+                           'created': self.created}).encode('utf-8')
+
+    def save(self, path: str, compress: bool = True) -> bool:
+        """
+        Saves the snapshot to a file.
+
+        Features are packed and written one at a time, so only a single feature's packed
+        vertices are held in memory at once.
+
+        Returns False if the snapshot could not be saved.
+        """
+        fids = self.fids()
+        metadata = self._metadata()
+        metadata += b'\0' * (-len(metadata) % 8)
+
+        index_offset = VertexSnapshot.HEADER.size + len(metadata)
+        offset = index_offset + VertexSnapshot.RECORD.size * len(fids)
+        records = []
+        temp_path = None
+        try:
+            # write to a temporary file first, so that an existing snapshot is never partially overwritten
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+            with os.fdopen(handle, 'wb') as f:
+                f.seek(VertexSnapshot.HEADER.size)
+                f.write(metadata)
+                # the index is written once all features have been packed
+                f.seek(offset)
+
+                for fid in fids:
+                    vertices = self.vertices(fid)
+                    if vertices is None:
+                        # corrupt vertices from a loaded snapshot
+                        continue
+                    packed = self._pack(vertices, compress)
+                    # keep buffers 8-byte aligned, so that uncompressed buffers can be mapped directly
+                    packed_size = len(packed)
+                    f.write(packed)
+                    f.write(b'\0' * (-packed_size % 8))
+
+                    flags = (VertexSnapshot.FLAG_Z if vertices.has_z() else 0) | \
+                            (VertexSnapshot.FLAG_M if vertices.has_m() else 0)
+                    records.append(VertexSnapshot.RECORD.pack(fid, len(vertices), flags, offset, packed_size))
+                    offset += packed_size + (-packed_size % 8)
+
+                # the header is written last, since corrupt features may have been skipped
+                f.seek(0)
+                f.write(VertexSnapshot.HEADER.pack(VertexSnapshot.MAGIC, VertexSnapshot.VERSION,
+                                                   VertexSnapshot.FLAG_COMPRESSED if compress else 0,
+                                                   len(metadata), len(records)))
+                f.seek(index_offset)
+                f.write(b''.join(records))
+            os.replace(temp_path, path)
+        except OSError:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            return False
+
+        return True
+
+    @staticmethod
+    def load(path: str) -> Optional['VertexSnapshot']:
+        """
+        Loads a snapshot from a file, or returns None if the file is not a valid snapshot
+        """
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < VertexSnapshot.HEADER.size:
+                    return None
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        magic, version, flags, metadata_size, count = VertexSnapshot.HEADER.unpack_from(data, 0)
+        index_offset = VertexSnapshot.HEADER.size + metadata_size
+        if magic != VertexSnapshot.MAGIC or version != VertexSnapshot.VERSION \
+                or index_offset + count * VertexSnapshot.RECORD.size > size:
+            data.close()
+            return None
+
+        try:
+            metadata = json.loads(bytes(data[VertexSnapshot.HEADER.size:index_offset]).rstrip(b'\0').decode('utf-8'))
+        except ValueError:
+            data.close()
+            return None
+
+        res = VertexSnapshot(layer_id=metadata.get('layer_id', ''),
+                             layer_name=metadata.get('layer_name', ''),
+                             crs=metadata.get('crs', ''),
+                             created=metadata.get('created', ''))
+        res._data = data  # pylint: disable=protected-access
+        res._compressed = bool(flags & VertexSnapshot.FLAG_COMPRESSED)  # pylint: disable=protected-access
+
+        for fid, vertex_count, record_flags, offset, record_size in VertexSnapshot.RECORD.iter_unpack(
+                data[index_offset:index_offset + count * VertexSnapshot.RECORD.size]):
+            record = _SnapshotRecord(vertex_count, record_flags, offset, record_size)
+            if offset + record_size > size or \
+                    (not res._compressed and record_size != VertexSnapshot._packed_size(record)):  # pylint: disable=protected-access
+                data.close()
+                return None
+            res._records[fid] = record  # pylint: disable=protected-access
+
+        return res
+
+
+class SnapshotChangeCache:
+    """
+    Caches the changes between the vertices of a snapshot and the current geometries of
+    its features.
+
+    Changes are calculated on demand, and only once for each version of a feature's geometry
+    rather than every time the layer is rendered. The cache can be shared between concurrent
+    render jobs.
+    """
+
+    def __init__(self, snapshot: VertexSnapshot):
+        self.snapshot = snapshot
+        self._changes: Dict[int, Tuple[QgsGeometry, Optional[EditChange]]] = {}
+        self._lock = threading.Lock()
+
+    def changes(self, fid: int, geometry: QgsGeometry) -> Optional[EditChange]:
+        """
+        Returns the changes between the snapshot vertices for a feature and its current
+        geometry, or None if the feature is unchanged or not contained in the snapshot
+        """
+        if fid not in self.snapshot:
+            return None
+
+        with self._lock:
+            entry = self._changes.get(fid)
+            if entry is not None and entry[0].equals(geometry):
+                return entry[1]
+
+            # the lock is held while calculating, so that concurrent renders don't repeat the calculation
+            change = self.snapshot.changes(fid, VertexArray.from_geometry(geometry))
+            self._changes[fid] = (QgsGeometry(geometry), change)
+            return change
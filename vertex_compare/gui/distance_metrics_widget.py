@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Distance metrics widget
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from functools import partial
+from typing import (
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt import (
+    sip,
+    uic
+)
+from qgis.PyQt.QtWidgets import QWidget
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsNumericFormatContext
+)
+
+from vertex_compare.core.distance_metrics import DistanceResult
+from vertex_compare.core.distance_metrics_task import DistanceMetricsTask
+from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.gui.gui_utils import GuiUtils
+
+WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('distance_metrics.ui'))
+
+
+class DistanceMetricsWidget(QWidget, WIDGET):
+    """
+    Shows the distances between two features. Distances are calculated in the background, and
+    the widget is hidden when there are no features to compare
+    """
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__(parent)
+
+        self.setupUi(self)
+
+        self.number_format = SettingsRegistry.number_format()
+        self.task: Optional[DistanceMetricsTask] = None
+        # the pair of features the distances are shown for
+        self._key = None
+        # the distances currently shown, for reformatting when the number format changes
+        self._results: Optional[Tuple[Optional[DistanceResult], Optional[DistanceResult], int, int]] = None
+
+        self.hide()
+
+    def set_features(self, layer_id: Optional[str], feature: Optional[QgsFeature], other: Optional[QgsFeature]):
+        """
+        Shows the distances between two features from a layer, or hides the widget if
+        either feature is None
+        """
+        if layer_id is None or feature is None or other is None \
+                or not feature.hasGeometry() or not other.hasGeometry():
+            self._cancel_task()
+            self._key = None
+            self.hide()
+            return
+
+        key = (layer_id, frozenset((feature.id(), other.id())))
+        if key == self._key:
+            # already calculated (or calculating) the distances for this pair of features
+            return
+
+        self._cancel_task()
+        self._key = key
+        self._results = None
+        self.show()
+        self.label_hausdorff.setText(self.tr('Calculating…'))
+        self.label_frechet.setText(self.tr('Calculating…'))
+
+        self.task = DistanceMetricsTask(feature.id(), feature.geometry(), other.id(), other.geometry())
+        self.task.taskCompleted.connect(partial(self._distances_calculated, self.task))
+        self.task.taskTerminated.connect(partial(self._distances_terminated, self.task))
+        QgsApplication.taskManager().addTask(self.task)
+
+    def number_format_changed(self):
+        """
+        Called when the number format setting is changed
+        """
+        self.number_format = SettingsRegistry.number_format()
+        if self._results is not None:
+            self._show_distances(*self._results)
+
+    def _cancel_task(self):
+        """
+        Cancels the current distance calculation, if any
+        """
+        if self.task is not None and not sip.isdeleted(self.task):  # pylint: disable=no-member
+            self.task.cancel()
+        self.task = None
+
+    def _format_distance(self, result: Optional[DistanceResult], fid1: int, fid2: int, unavailable: str) -> str:
+        """
+        Formats a distance result for display
+        """
+        if result is None:
+            return unavailable
+
+        context = QgsNumericFormatContext()
+        return self.tr('{} (vertex {} of feature {}, vertex {} of feature {})').format(
+            self.number_format.formatDouble(result.distance, context),
+            result.index1 + 1, fid1, result.index2 + 1, fid2)
+
+    def _show_distances(self, hausdorff: Optional[DistanceResult], frechet: Optional[DistanceResult],
+                        fid1: int, fid2: int):
+        """
+        Shows the calculated distances between two features
+        """
+        self._results = (hausdorff, frechet, fid1, fid2)
+        self.label_hausdorff.setText(self._format_distance(hausdorff, fid1, fid2, self.tr('Not available')))
+        self.label_frechet.setText(self._format_distance(frechet, fid1, fid2, self.tr('Too many vertices to compare')))
+
+    def _distances_calculated(self, task: DistanceMetricsTask):
+        """
+        Triggered when a distance calculation task has completed
+        """
+        if task is not self.task:
+            # superseded by a later calculation
+            return
+
+        self.task = None
+        self._show_distances(task.hausdorff, task.frechet, task.fid1, task.fid2)
+
+    def _distances_terminated(self, task: DistanceMetricsTask):
+        """
+        Triggered when a distance calculation task was canceled or failed
+        """
+        if task is not self.task:
+            return
+
+        self.task = None
+        self._key = None
+        self.label_hausdorff.setText(self.tr('Not available'))
+        self.label_frechet.setText(self.tr('Not available'))
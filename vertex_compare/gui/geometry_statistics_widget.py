@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Geometry statistics widget
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from functools import partial
+from typing import Optional
+
+from qgis.PyQt import (
+    sip,
+    uic
+)
+from qgis.PyQt.QtWidgets import QWidget
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsNumericFormatContext,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+from vertex_compare.core.geometry_statistics import GeometryStatistics
+from vertex_compare.core.geometry_statistics_cache import GeometryStatisticsCache
+from vertex_compare.core.geometry_statistics_task import GeometryStatisticsTask
+from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.gui.gui_utils import GuiUtils
+
+WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('geometry_statistics.ui'))
+
+
+class GeometryStatisticsWidget(QWidget, WIDGET):
+    """
+    Shows the geometry statistics for a feature. Statistics are calculated in the background,
+    and cached per feature
+    """
+
+    # maximum number of part vertex counts to show in the summary
+    MAX_PART_COUNTS = 20
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__(parent)
+
+        self.setupUi(self)
+
+        self.number_format = SettingsRegistry.number_format()
+        self.layer: Optional[QgsVectorLayer] = None
+        self.cache = GeometryStatisticsCache(parent=self)
+        self.task: Optional[GeometryStatisticsTask] = None
+
+        # the statistics currently shown, for reformatting when the number format changes
+        self._statistics: Optional[GeometryStatistics] = None
+        self._geometry_type = QgsWkbTypes.UnknownGeometry
+
+        self._show_statistics(None)
+
+    def set_layer(self, layer: Optional[QgsVectorLayer]):
+        """
+        Sets the layer which features will be shown from
+        """
+        self.layer = layer
+        self.cache.set_layer(layer)
+
+    def set_feature(self, feature: Optional[QgsFeature]):
+        """
+        Shows the geometry statistics for a feature from the layer, calculating them in the background
+        if they are not already cached
+        """
+        if feature is not None:
+            self.label_geometry_type.setText(QgsWkbTypes.translatedDisplayString(feature.geometry().wkbType()))
+        else:
+            self.label_geometry_type.clear()
+
+        if feature is None or not feature.hasGeometry() or self.layer is None:
+            self._cancel_task()
+            self._show_statistics(None)
+            return
+
+        statistics = self.cache.statistics(self.layer.id(), feature.id())
+        if statistics is not None:
+            self._cancel_task()
+            self._show_statistics(statistics, feature.geometry().type())
+            return
+
+        if self.task is not None and self.task.layer_id == self.layer.id() and self.task.fid == feature.id():
+            # already calculating
+            return
+
+        self._cancel_task()
+        self._show_statistics(None, feature.geometry().type(), self.tr('Calculating…'))
+        self.task = GeometryStatisticsTask(self.layer.id(), feature.id(), feature.geometry(),
+                                           self.cache.generation(feature.id()))
+        self.task.taskCompleted.connect(partial(self._statistics_calculated, self.task))
+        self.task.taskTerminated.connect(partial(self._statistics_terminated, self.task))
+        QgsApplication.taskManager().addTask(self.task)
+
+    def number_format_changed(self):
+        """
+        Called when the number format setting is changed
+        """
+        self.number_format = SettingsRegistry.number_format()
+        if self._statistics is not None:
+            self._show_statistics(self._statistics, self._geometry_type)
+
+    def _cancel_task(self):
+        """
+        Cancels the current geometry statistics calculation, if any
+        """
+        if self.task is not None and not sip.isdeleted(self.task):  # pylint: disable=no-member
+            self.task.cancel()
+        self.task = None
+
+    def _statistics_calculated(self, task: GeometryStatisticsTask):
+        """
+        Triggered when a geometry statistics task has completed
+        """
+        # statistics for a feature which was edited while the task ran are shown (they match the
+        # feature being shown), but not cached
+        self.cache.insert(task.layer_id, task.fid, task.statistics, task.generation)
+        if task is not self.task:
+            # superseded by a later calculation
+            return
+
+        self.task = None
+        self._show_statistics(task.statistics, task.geometry.type())
+
+    def _statistics_terminated(self, task: GeometryStatisticsTask):
+        """
+        Triggered when a geometry statistics task was canceled or failed
+        """
+        if task is not self.task:
+            return
+
+        self.task = None
+        self._show_statistics(None, task.geometry.type(), self.tr('Not available'))
+
+    def _show_statistics(self,
+                         statistics: Optional[GeometryStatistics],
+                         geometry_type: QgsWkbTypes.GeometryType = QgsWkbTypes.UnknownGeometry,
+                         placeholder: str = ''):
+        """
+        Shows geometry statistics in the summary labels, or the placeholder text if statistics is None
+        """
+        self._statistics = statistics
+        self._geometry_type = geometry_type
+
+        is_polygon = geometry_type == QgsWkbTypes.PolygonGeometry
+        self.label_ring_count_title.setVisible(is_polygon)
+        self.label_ring_count.setVisible(is_polygon)
+        self.label_length_title.setText(self.tr('Perimeter') if is_polygon else self.tr('Length'))
+
+        labels = (self.label_part_count, self.label_vertex_count, self.label_ring_count, self.label_part_vertices,
+                  self.label_bounds, self.label_length, self.label_segments, self.label_duplicates)
+        if statistics is None:
+            for label in labels:
+                label.setText(placeholder)
+            return
+
+        context = QgsNumericFormatContext()
+
+        def _format(value: Optional[float]) -> str:
+            return self.number_format.formatDouble(value, context) if value is not None else ''
+
+        self.label_part_count.setText(str(statistics.part_count))
+        self.label_vertex_count.setText(str(statistics.vertex_count))
+        self.label_ring_count.setText(str(statistics.ring_count))
+
+        part_counts = ', '.join(str(count) for count in statistics.part_vertex_counts[:self.MAX_PART_COUNTS])
+        if len(statistics.part_vertex_counts) > self.MAX_PART_COUNTS:
+            part_counts += self.tr(', …')
+        self.label_part_vertices.setText(part_counts)
+
+        if statistics.bounds is not None:
+            self.label_bounds.setText(self.tr('{}, {} : {}, {}').format(*(_format(v) for v in statistics.bounds)))
+        else:
+            self.label_bounds.clear()
+
+        self.label_length.setText(_format(statistics.length))
+        if statistics.segment_count:
+            self.label_segments.setText(self.tr('{} minimum, {} mean, {} maximum').format(
+                _format(statistics.min_segment_length), _format(statistics.mean_segment_length()),
+                _format(statistics.max_segment_length)))
+        else:
+            self.label_segments.clear()
+        self.label_duplicates.setText(str(statistics.duplicate_vertex_count))
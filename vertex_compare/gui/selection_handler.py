@@ -13,10 +13,16 @@ __copyright__ = 'Copyright 2021, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
-from typing import Optional
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set
+)
 
 from qgis.PyQt.QtCore import (
     QObject,
+    QTimer,
     pyqtSignal
 )
 from qgis.PyQt import sip
@@ -28,38 +34,117 @@ from qgis.core import (
 
 class SelectionHandler(QObject):
     """
-    Handles managing changes to the selected features in a watched map layer.
+    Handles managing changes to the selected features in watched map layers.
+
+    Only explicitly watched layers are monitored, in order to avoid the performance
+    impact of watching ALL layers loaded into a project.
 
-    Ensures that only a single layer will be watched at a time in order to avoid the performance
-    impact of watching ALL layers loaded into a project
+    Bursts of selection changes (e.g. while a rubber band selection is being dragged) are
+    coalesced, and only the net change to the selection is reported via selection_delta_changed.
     """
 
+    # emitted with the complete selection whenever the primary watched layer changes
     selection_changed = pyqtSignal(QgsVectorLayer, list)
+    # emitted with the lists of added and removed feature ids after a burst of selection changes
+    selection_delta_changed = pyqtSignal(QgsVectorLayer, list, list)
 
-    def __init__(self, parent):
+    DEFAULT_INTERVAL = 100
+
+    def __init__(self, parent, interval: int = DEFAULT_INTERVAL):
+        """
+        Constructor for SelectionHandler.
+
+        :param interval: time in milliseconds which the selection must remain unchanged
+            before a change is reported
+        """
         super().__init__(parent)
 
+        # the primary watched layer
         self.layer: Optional[QgsVectorLayer] = None
+        self.layers: Dict[str, QgsVectorLayer] = {}
+
+        # ids of features whose selection state may have changed, by layer id
+        self.pending: Dict[str, Set[int]] = {}
 
-    def set_layer(self, layer: QgsVectorLayer):
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def set_layer(self, layer: Optional[QgsVectorLayer]):
         """
-        Sets the watched layer
+        Sets a single watched layer
         """
-        if self.layer == layer:
-            return
+        self.set_layers([layer] if layer is not None else [])
+
+    def set_layers(self, layers: List[QgsVectorLayer]):
+        """
+        Sets the list of watched layers. The first layer is considered the primary layer.
+        """
+        new_layers = {layer.id(): layer for layer in layers if layer is not None}
+
+        for layer_id, layer in self.layers.items():
+            if layer_id in new_layers:
+                continue
+
+            self.pending.pop(layer_id, None)
+            if not sip.isdeleted(layer):  # pylint: disable=no-member
+                layer.selectionChanged.disconnect(self._selection_changed)
 
-        if self.layer is not None and not sip.isdeleted(self.layer):  # pylint: disable=no-member
-            self.layer.selectionChanged.disconnect(self._selection_changed)
+        for layer_id, layer in new_layers.items():
+            if layer_id not in self.layers:
+                layer.selectionChanged.connect(self._selection_changed)
 
-        self.layer = layer
+        self.layers = new_layers
+
+        primary = layers[0] if layers else None
+        if primary == self.layer:
+            return
+
+        self.layer = primary
         if self.layer is not None:
-            self.layer.selectionChanged.connect(self._selection_changed)
             self.selection_changed.emit(self.layer, self.layer.selectedFeatureIds())
         else:
             self.selection_changed.emit(None, [])
 
-    def _selection_changed(self, selected, _, __):
+    def _clear_pending(self):
+        """
+        Discards any pending selection changes
+        """
+        self.timer.stop()
+        self.pending = {}
+
+    def _selection_changed(self, selected, deselected, _):
+        """
+        Called when a watched layer's selection is changed
+        """
+        layer = self.sender()
+        if layer is None or layer.id() not in self.layers:
+            return
+
+        # the reported ids are only candidates: selected may contain features which were
+        # already selected (e.g. when adding to the selection), so the net change is
+        # determined from the layer's actual selection when the burst is flushed
+        candidates = self.pending.setdefault(layer.id(), set())
+        candidates.update(deselected)
+        candidates.update(selected)
+
+        # restart the timer, so that we wait until the selection has settled
+        self.timer.start()
+
+    def flush(self):
         """
-        Called when the watched layer's selection is changed
+        Immediately reports any pending selection changes
         """
-        self.selection_changed.emit(self.layer, selected)
+        pending = self.pending
+        self._clear_pending()
+
+        for layer_id, candidates in pending.items():
+            layer = self.layers.get(layer_id)
+            if not candidates or layer is None or sip.isdeleted(layer):  # pylint: disable=no-member
+                continue
+
+            selected = set(layer.selectedFeatureIds())
+            added = candidates & selected
+            removed = candidates - selected
+            self.selection_delta_changed.emit(layer, sorted(added), sorted(removed))
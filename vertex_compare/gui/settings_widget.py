@@ -30,6 +30,7 @@ from qgis.gui import (
 )
 
 from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.core.vertex_cache import VertexDiskCache
 from vertex_compare.gui.gui_utils import GuiUtils
 
 WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('settings.ui'))
@@ -71,6 +72,12 @@ class SettingsWidget(QgsPanelWidget, WIDGET):
         self.check_center_on_selection.toggled.connect(self._center_on_selected_changed)
         self.check_flash_feature.toggled.connect(self._flash_feature_changed)
         self.check_flash_vertex.toggled.connect(self._flash_vertex_changed)
+        self.spin_label_time_budget.valueChanged.connect(self._label_time_budget_changed)
+        self.spin_label_vertex_budget.valueChanged.connect(self._label_vertex_budget_changed)
+        self.check_store_topology.toggled.connect(self._store_topology_changed)
+        self.check_vertex_cache.toggled.connect(self._vertex_cache_enabled_changed)
+        self.spin_vertex_cache_size.valueChanged.connect(self._vertex_cache_size_changed)
+        self.button_clear_vertex_cache.clicked.connect(self._clear_vertex_cache)
 
     def restore_settings(self):
         """
@@ -81,6 +88,16 @@ class SettingsWidget(QgsPanelWidget, WIDGET):
         self.check_center_on_selection.setChecked(SettingsRegistry.center_on_selected())
         self.check_flash_feature.setChecked(SettingsRegistry.flash_feature())
         self.check_flash_vertex.setChecked(SettingsRegistry.flash_vertex())
+        self.spin_label_time_budget.setClearValue(0)
+        self.spin_label_time_budget.setValue(SettingsRegistry.label_time_budget())
+        self.spin_label_vertex_budget.setClearValue(SettingsRegistry.DEFAULT_LABEL_VERTEX_BUDGET)
+        self.spin_label_vertex_budget.setValue(SettingsRegistry.label_vertex_budget())
+        self.check_store_topology.setChecked(SettingsRegistry.store_topology())
+        self.check_vertex_cache.setEnabled(VertexDiskCache.is_supported())
+        self.check_vertex_cache.setChecked(SettingsRegistry.vertex_cache_enabled())
+        self.spin_vertex_cache_size.setClearValue(SettingsRegistry.DEFAULT_VERTEX_CACHE_SIZE)
+        self.spin_vertex_cache_size.setValue(SettingsRegistry.vertex_cache_size())
+        self.spin_vertex_cache_size.setEnabled(self.check_vertex_cache.isChecked())
 
         self.point_symbol_button.setSymbol(SettingsRegistry.vertex_symbol())
         self.vertex_font_button.setTextFormat(SettingsRegistry.vertex_format())
@@ -103,6 +120,11 @@ class SettingsWidget(QgsPanelWidget, WIDGET):
         self.check_center_on_selection.setChecked(False)
         self.check_flash_feature.setChecked(False)
         self.check_flash_vertex.setChecked(True)
+        self.spin_label_time_budget.setValue(0)
+        self.spin_label_vertex_budget.setValue(SettingsRegistry.DEFAULT_LABEL_VERTEX_BUDGET)
+        self.check_store_topology.setChecked(False)
+        self.check_vertex_cache.setChecked(False)
+        self.spin_vertex_cache_size.setValue(SettingsRegistry.DEFAULT_VERTEX_CACHE_SIZE)
 
         self.vertex_symbol_changed.emit()
         self.vertex_text_format_changed.emit()
@@ -164,3 +186,40 @@ class SettingsWidget(QgsPanelWidget, WIDGET):
         Triggered when the flash vertex option is toggled
         """
         SettingsRegistry.set_flash_vertex(self.check_flash_vertex.isChecked())
+
+    def _label_time_budget_changed(self, budget: int):
+        """
+        Triggered when the label time limit is changed
+        """
+        SettingsRegistry.set_label_time_budget(budget)
+
+    def _label_vertex_budget_changed(self, budget: int):
+        """
+        Triggered when the initial label count is changed
+        """
+        SettingsRegistry.set_label_vertex_budget(budget)
+
+    def _store_topology_changed(self, store: bool):
+        """
+        Triggered when the store comparison results option is toggled
+        """
+        SettingsRegistry.set_store_topology(store)
+
+    def _vertex_cache_enabled_changed(self, enabled: bool):
+        """
+        Triggered when the on-disk vertex cache option is toggled
+        """
+        SettingsRegistry.set_vertex_cache_enabled(enabled)
+        self.spin_vertex_cache_size.setEnabled(enabled)
+
+    def _vertex_cache_size_changed(self, size: int):
+        """
+        Triggered when the vertex cache size is changed
+        """
+        SettingsRegistry.set_vertex_cache_size(size)
+
+    def _clear_vertex_cache(self):
+        """
+        Triggered when the user opts to clear the on-disk vertex cache
+        """
+        VertexDiskCache(VertexDiskCache.default_path(), 0).clear()
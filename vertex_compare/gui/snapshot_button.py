@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Vertex snapshot tool button
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from functools import partial
+from typing import (
+    List,
+    Optional
+)
+
+from qgis.PyQt.QtCore import pyqtSignal
+from qgis.PyQt.QtWidgets import (
+    QAction,
+    QFileDialog,
+    QMenu,
+    QMessageBox,
+    QToolButton,
+    QWidget
+)
+from qgis.core import (
+    QgsApplication,
+    QgsFileUtils,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.vertex_snapshot import VertexSnapshot
+
+
+class VertexSnapshotButton(QToolButton):
+    """
+    A tool button for capturing, saving and loading vertex snapshots, and toggling the
+    comparison of features with the current snapshot
+    """
+
+    # emitted with the snapshot to compare features against, or None when snapshot comparison is disabled
+    comparison_snapshot_changed = pyqtSignal(object)
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__(parent)
+
+        self.vertex_snapshot: Optional[VertexSnapshot] = None
+        # the selection which is captured in new snapshots
+        self.layer: Optional[QgsVectorLayer] = None
+        self.selection: List[int] = []
+
+        self.compare_action = QAction(self.tr('Compare with Snapshot'), self)
+        self.compare_action.setIcon(QgsApplication.getThemeIcon('/mActionNewBookmark.svg'))
+        self.compare_action.setCheckable(True)
+        self.compare_action.setEnabled(False)
+        self.compare_action.toggled.connect(self._comparison_toggled)
+
+        self.capture_action = QAction(self.tr('Capture Snapshot of Selection'), self)
+        self.capture_action.triggered.connect(self._capture_snapshot)
+        self.save_action = QAction(self.tr('Save Snapshot…'), self)
+        self.save_action.setIcon(QgsApplication.getThemeIcon('/mActionFileSave.svg'))
+        self.save_action.setEnabled(False)
+        self.save_action.triggered.connect(self._save_snapshot)
+        self.load_action = QAction(self.tr('Load Snapshot…'), self)
+        self.load_action.setIcon(QgsApplication.getThemeIcon('/mActionFileOpen.svg'))
+        self.load_action.triggered.connect(self._load_snapshot)
+        self.clear_action = QAction(self.tr('Clear Snapshot'), self)
+        self.clear_action.setEnabled(False)
+        self.clear_action.triggered.connect(partial(self.set_vertex_snapshot, None))
+
+        self.snapshot_menu = QMenu(self)
+        self.snapshot_menu.addAction(self.compare_action)
+        self.snapshot_menu.addSeparator()
+        self.snapshot_menu.addAction(self.capture_action)
+        self.snapshot_menu.addAction(self.save_action)
+        self.snapshot_menu.addAction(self.load_action)
+        self.snapshot_menu.addAction(self.clear_action)
+
+        self.setDefaultAction(self.compare_action)
+        self.setMenu(self.snapshot_menu)
+        self.setPopupMode(QToolButton.MenuButtonPopup)
+
+    def set_selection(self, layer: Optional[QgsVectorLayer], selection: List[int]):
+        """
+        Sets the selection to capture in new snapshots
+        """
+        self.layer = layer
+        self.selection = selection
+
+    def comparison_snapshot(self) -> Optional[VertexSnapshot]:
+        """
+        Returns the snapshot to compare features against, or None if snapshot comparison is not enabled
+        """
+        return self.vertex_snapshot if self.compare_action.isChecked() else None
+
+    def set_vertex_snapshot(self, snapshot: Optional[VertexSnapshot]):
+        """
+        Sets the vertex snapshot to compare features against
+        """
+        self.vertex_snapshot = snapshot
+        self.save_action.setEnabled(snapshot is not None)
+        self.clear_action.setEnabled(snapshot is not None)
+        self.compare_action.setEnabled(snapshot is not None)
+        if snapshot is not None:
+            self.compare_action.setToolTip(
+                self.tr('Compare with the snapshot of {} features from {}, captured {}').format(
+                    len(snapshot), snapshot.layer_name, snapshot.created))
+            if self.compare_action.isChecked():
+                self._comparison_toggled()
+            else:
+                self.compare_action.setChecked(True)
+        else:
+            self.compare_action.setToolTip(self.tr('Compare with Snapshot'))
+            self.compare_action.setChecked(False)
+
+    def _comparison_toggled(self):
+        """
+        Triggered when the snapshot comparison is turned on or off
+        """
+        self.comparison_snapshot_changed.emit(self.comparison_snapshot())
+
+    def _capture_snapshot(self):
+        """
+        Captures a snapshot of the vertices of the selected features
+        """
+        if self.layer is None or not self.selection:
+            QMessageBox.information(self, self.tr('Capture Snapshot'),
+                                    self.tr('Select the features to capture first.'))
+            return
+
+        self.set_vertex_snapshot(VertexSnapshot.capture(self.layer, self.selection))
+
+    def _save_snapshot(self):
+        """
+        Saves the current snapshot to a file
+        """
+        if self.vertex_snapshot is None:
+            return
+
+        file_filter = self.tr('Vertex Snapshots (*{})').format(VertexSnapshot.SUFFIX)
+        path, _ = QFileDialog.getSaveFileName(self, self.tr('Save Snapshot'), '', file_filter)
+        if not path:
+            return
+
+        path = QgsFileUtils.ensureFileNameHasExtension(path, [VertexSnapshot.SUFFIX[1:]])
+        if not self.vertex_snapshot.save(path):
+            QMessageBox.warning(self, self.tr('Save Snapshot'),
+                                self.tr('Could not save snapshot to {}').format(path))
+
+    def _load_snapshot(self):
+        """
+        Loads a snapshot from a file
+        """
+        file_filter = self.tr('Vertex Snapshots (*{})').format(VertexSnapshot.SUFFIX)
+        path, _ = QFileDialog.getOpenFileName(self, self.tr('Load Snapshot'), '', file_filter)
+        if not path:
+            return
+
+        snapshot = VertexSnapshot.load(path)
+        if snapshot is None:
+            QMessageBox.warning(self, self.tr('Load Snapshot'),
+                                self.tr('{} is not a valid vertex snapshot').format(path))
+            return
+
+        self.set_vertex_snapshot(snapshot)
@@ -13,25 +13,42 @@ __copyright__ = 'Copyright 2018, North Road'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
+from functools import partial
 from typing import (
     List,
     Optional
 )
 
-from qgis.PyQt import uic
+from qgis.PyQt import (
+    sip,
+    uic
+)
 from qgis.PyQt.QtCore import (
+    Qt,
     pyqtSignal,
+    QItemSelectionModel,
     QModelIndex
 )
+from qgis.PyQt.QtGui import QKeySequence
 from qgis.PyQt.QtWidgets import (
+    QApplication,
     QWidget,
     QVBoxLayout,
     QAction,
-    QAbstractItemView
+    QActionGroup,
+    QAbstractItemView,
+    QFileDialog,
+    QMenu,
+    QMessageBox,
+    QToolButton
 )
 from qgis.core import (
     QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsFileUtils,
     QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
     QgsCoordinateTransform,
     QgsProject,
     QgsCsException,
@@ -43,14 +60,36 @@ from qgis.gui import (
     QgsPanelWidget,
     QgsDockWidget,
     QgsPanelWidgetStack,
-    QgsMapCanvas
+    QgsMapCanvas,
+    QgsProjectionSelectionDialog
 )
 
+from vertex_compare.core.aligned_vertex_model import AlignedVertexModel
 from vertex_compare.core.feature_model import FeatureModel
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_clipboard import (
+    GEOJSON_PRECISION,
+    VertexRanges,
+    merge_ranges,
+    vertices_to_csv,
+    vertices_to_geojson,
+    vertices_to_wkt
+)
+from vertex_compare.core.vertex_diff import VertexDiff
+from vertex_compare.core.vertex_diff_task import VertexDiffTask
+from vertex_compare.core.vertex_export import (
+    VertexExportFormat,
+    VertexExportTask
+)
 from vertex_compare.core.vertex_model import VertexModel
+from vertex_compare.core.vertex_snapshot import VertexSnapshot
 from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.gui.distance_metrics_widget import DistanceMetricsWidget
+from vertex_compare.gui.geometry_statistics_widget import GeometryStatisticsWidget
 from vertex_compare.gui.gui_utils import GuiUtils
 from vertex_compare.gui.settings_widget import SettingsWidget
+from vertex_compare.gui.snapshot_button import VertexSnapshotButton
+from vertex_compare.gui.vertex_map_tool import NearestVertexMapTool
 
 WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('vertex_list.ui'))
 
@@ -63,24 +102,127 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
     vertex_symbol_changed = pyqtSignal()
     vertex_text_format_changed = pyqtSignal()
     selected_vertex_changed = pyqtSignal(int, object)
+    vertex_snapshot_changed = pyqtSignal(object)
 
-    def __init__(self, map_canvas: QgsMapCanvas, parent: QWidget = None):
+    def __init__(self, map_canvas: QgsMapCanvas, parent: QWidget = None):  # pylint: disable=too-many-statements
         super().__init__(parent)
 
         self.setupUi(self)
 
         self._block_feature_changes = False
+        self._block_vertex_selection = False
 
         self.map_canvas = map_canvas
 
         self.vertex_model = VertexModel()
-        self.table_view.setModel(self.vertex_model)
-        self.table_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.aligned_model = AlignedVertexModel(AlignedVertexModel.FIRST, self)
+        self.aligned_model.setSourceModel(self.vertex_model)
+        self.table_view.setModel(self.aligned_model)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+
+        # second table, showing the other selected feature aligned to the active feature
+        self.compare_vertex_model = VertexModel()
+        self.compare_aligned_model = AlignedVertexModel(AlignedVertexModel.SECOND, self)
+        self.compare_aligned_model.setSourceModel(self.compare_vertex_model)
+        self.compare_table_view.setModel(self.compare_aligned_model)
+        self.compare_table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.compare_table_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.compare_table_view.hide()
+
+        self.table_view.verticalScrollBar().valueChanged.connect(
+            self.compare_table_view.verticalScrollBar().setValue)
+        self.compare_table_view.verticalScrollBar().valueChanged.connect(
+            self.table_view.verticalScrollBar().setValue)
+
+        # copying selected vertices
+        self.copy_csv_action = QAction(self.tr('Copy as CSV'), self)
+        self.copy_csv_action.setShortcut(QKeySequence.Copy)
+        self.copy_csv_action.setShortcutContext(Qt.WidgetWithChildrenShortcut)
+        self.copy_csv_action.triggered.connect(partial(self._copy_vertices, 'csv'))
+        self.copy_wkt_action = QAction(self.tr('Copy as WKT'), self)
+        self.copy_wkt_action.triggered.connect(partial(self._copy_vertices, 'wkt'))
+        self.copy_geojson_action = QAction(self.tr('Copy as GeoJSON'), self)
+        self.copy_geojson_action.triggered.connect(partial(self._copy_vertices, 'geojson'))
+        self.table_view.setContextMenuPolicy(Qt.ActionsContextMenu)
+        self.table_view.addActions([self.copy_csv_action, self.copy_wkt_action, self.copy_geojson_action])
 
         self.feature_model = FeatureModel()
         self.feature_combo.setModel(self.feature_model)
         self.feature_combo.currentIndexChanged.connect(self._active_feature_changed)
 
+        self.compare_action = QAction(self.tr('Compare Side by Side'), self)
+        self.compare_action.setIcon(GuiUtils.get_icon('topology.svg'))
+        self.compare_action.setToolTip(self.tr('Compare the vertices of two selected features side by side'))
+        self.compare_action.setCheckable(True)
+        self.compare_action.setEnabled(False)
+        self.compare_action.toggled.connect(self._update_comparison)
+        self.toolbar.addAction(self.compare_action)
+
+        # the feature or snapshot currently shown in the comparison table
+        self._comparison_key = None
+        self._comparison_diff: Optional[VertexDiff] = None
+        # the tables are aligned in the background
+        self.diff_task: Optional[VertexDiffTask] = None
+        self.label_alignment.hide()
+
+        self.snapshot_button = VertexSnapshotButton()
+        self.snapshot_button.comparison_snapshot_changed.connect(self._comparison_snapshot_changed)
+        self.toolbar.addWidget(self.snapshot_button)
+
+        self.vertex_map_tool = NearestVertexMapTool(self.map_canvas)
+        self.vertex_map_tool.vertex_clicked.connect(self._map_vertex_clicked)
+        self.identify_vertex_action = QAction(self.tr('Identify Vertices'), self)
+        self.identify_vertex_action.setIcon(QgsApplication.getThemeIcon('/mActionIdentify.svg'))
+        self.identify_vertex_action.setToolTip(
+            self.tr('Show the nearest vertex of the chosen feature when hovering over the map, '
+                    'and select it in the table when clicked'))
+        self.identify_vertex_action.setCheckable(True)
+        self.identify_vertex_action.toggled.connect(self._identify_vertex_toggled)
+        self.vertex_map_tool.setAction(self.identify_vertex_action)
+        self.toolbar.addAction(self.identify_vertex_action)
+
+        # optional columns showing the vertices transformed to another CRS
+        self.transformed_crs = QgsCoordinateReferenceSystem()
+        self.no_transform_action = QAction(self.tr('Layer Coordinates Only'), self)
+        self.no_transform_action.setCheckable(True)
+        self.no_transform_action.setChecked(True)
+        self.no_transform_action.triggered.connect(self._update_transformed_columns)
+        self.project_crs_action = QAction(self.tr('Show Coordinates in Project CRS'), self)
+        self.project_crs_action.setCheckable(True)
+        self.project_crs_action.triggered.connect(self._update_transformed_columns)
+        self.other_crs_action = QAction(self.tr('Show Coordinates in Other CRS…'), self)
+        self.other_crs_action.setCheckable(True)
+        self.other_crs_action.triggered.connect(self._choose_transformed_crs)
+        self.transform_action_group = QActionGroup(self)
+        for action in (self.no_transform_action, self.project_crs_action, self.other_crs_action):
+            self.transform_action_group.addAction(action)
+
+        self.transform_menu = QMenu(self)
+        self.transform_menu.addActions(self.transform_action_group.actions())
+        self.transform_button = QToolButton()
+        self.transform_button.setIcon(QgsApplication.getThemeIcon('/mIconProjectionEnabled.svg'))
+        self.transform_button.setToolTip(self.tr('Show Transformed Coordinates'))
+        self.transform_button.setMenu(self.transform_menu)
+        self.transform_button.setPopupMode(QToolButton.InstantPopup)
+        self.toolbar.addWidget(self.transform_button)
+        QgsProject.instance().crsChanged.connect(self._update_transformed_columns)
+
+        self.export_tasks: List[VertexExportTask] = []
+        self.export_feature_action = QAction(self.tr('Export Chosen Feature…'), self)
+        self.export_feature_action.triggered.connect(partial(self._export_vertices, False))
+        self.export_selection_action = QAction(self.tr('Export All Selected Features…'), self)
+        self.export_selection_action.triggered.connect(partial(self._export_vertices, True))
+        self.export_menu = QMenu(self)
+        self.export_menu.addAction(self.export_feature_action)
+        self.export_menu.addAction(self.export_selection_action)
+        self.export_button = QToolButton()
+        self.export_button.setIcon(QgsApplication.getThemeIcon('/mActionFileSaveAs.svg'))
+        self.export_button.setToolTip(self.tr('Export Vertices'))
+        self.export_button.setMenu(self.export_menu)
+        self.export_button.setPopupMode(QToolButton.InstantPopup)
+        self.toolbar.addWidget(self.export_button)
+
         self.settings_action = QAction(self.tr('Settings'), self)
         self.settings_action.setIcon(QgsApplication.getThemeIcon('/propertyicons/settings.svg'))
         self.settings_action.triggered.connect(self._show_settings)
@@ -89,12 +231,28 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
         self.settings_panel = None
         self.layer: Optional[QgsVectorLayer] = None
         self.selection: List[int] = []
+        # whether pairs of selected features are compared topologically
+        self.topological = False
 
         self.button_zoom.clicked.connect(self._zoom_to_feature)
         self.table_view.selectionModel().selectionChanged.connect(self._vertex_selection_changed)
         self.table_view.doubleClicked.connect(self._table_double_click)
+        self.compare_table_view.selectionModel().selectionChanged.connect(self._compare_vertex_selection_changed)
+        self.compare_table_view.doubleClicked.connect(self._table_double_click)
         self.button_zoom.setEnabled(False)
 
+        self.statistics_widget = GeometryStatisticsWidget()
+        self.gridLayout.addWidget(self.statistics_widget, 5, 0, 1, 2)
+        self.distance_widget = DistanceMetricsWidget()
+        self.gridLayout.addWidget(self.distance_widget, 6, 0, 1, 2)
+
+    def set_topological(self, topological: bool):
+        """
+        Sets whether pairs of selected features are compared topologically, in which case
+        exported vertices are flagged as common or uncommon
+        """
+        self.topological = topological
+
     def set_selection(self, layer: Optional[QgsVectorLayer], selection: List[int]):
         """
         Sets the selection to show in the dock
@@ -106,6 +264,7 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
             prev_feature_id = None
 
         self.layer = layer
+        self.statistics_widget.set_layer(layer)
         if self.layer is not None:
             self.layer_label.setText(
                 self.tr('{} — {} features selected').format(layer.name(), layer.selectedFeatureCount()))
@@ -115,6 +274,7 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
         self._block_feature_changes = True
 
         self.selection = selection
+        self.snapshot_button.set_selection(layer, selection)
         self.feature_model.set_feature_ids(layer, selection)
 
         if prev_feature_id is not None:
@@ -130,6 +290,48 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
 
         self._active_feature_changed()
 
+    def update_selection(self, layer: Optional[QgsVectorLayer], added: List[int], removed: List[int]):
+        """
+        Incrementally updates the selection shown in the dock, given the lists of
+        added and removed feature ids.
+
+        The active feature is only reloaded if it was removed from the selection.
+        """
+        if layer is None or layer != self.layer:
+            self.set_selection(layer, layer.selectedFeatureIds() if layer is not None else [])
+            return
+
+        prev_feature_id = self.feature_model.data(self.feature_model.index(self.feature_combo.currentIndex(), 0),
+                                                  FeatureModel.FEATURE_ID_ROLE)
+
+        self.layer_label.setText(
+            self.tr('{} — {} features selected').format(layer.name(), layer.selectedFeatureCount()))
+
+        self._block_feature_changes = True
+
+        removed_set = set(removed)
+        self.selection = [fid for fid in self.selection if fid not in removed_set]
+        existing = set(self.selection)
+        self.selection.extend(fid for fid in added if fid not in existing)
+        self.snapshot_button.set_selection(layer, self.selection)
+
+        self.feature_model.remove_feature_ids(removed)
+        self.feature_model.add_feature_ids(layer, added)
+
+        prev_index = self.feature_model.index_from_id(prev_feature_id) if prev_feature_id is not None else QModelIndex()
+        if prev_index.isValid():
+            self.feature_combo.setCurrentIndex(prev_index.row())
+        else:
+            self.feature_combo.setCurrentIndex(0)
+
+        self._block_feature_changes = False
+
+        if not prev_index.isValid():
+            self._active_feature_changed()
+        else:
+            self._update_comparison()
+            self._update_distances()
+
     def _active_feature_changed(self):
         """
         Triggered when the active feature is changed
@@ -141,30 +343,24 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
         if selected_index.isValid():
             feature = self.feature_model.data(selected_index, FeatureModel.FEATURE_ROLE)
             changed = self.vertex_model.feature is None or feature is None or self.vertex_model.feature.id() != feature.id()
-            self.vertex_model.set_feature(feature)
-
-            if feature is not None:
-                self.label_part_count.setText(
-                    str(feature.geometry().constGet().numGeometries() if feature.geometry().isMultipart() else 1))
-                self.label_vertex_count.setText(str(feature.geometry().constGet().nCoordinates()))
-                self.label_geometry_type.setText(QgsWkbTypes.translatedDisplayString(feature.geometry().wkbType()))
-                self.button_zoom.setEnabled(True)
-            else:
-                self.label_geometry_type.clear()
-                self.label_part_count.clear()
-                self.label_vertex_count.clear()
-                self.button_zoom.setEnabled(False)
+            self.vertex_model.set_feature(feature, self.layer)
+            self.vertex_map_tool.set_vertices(self.vertex_model.vertices,
+                                              self.layer.crs() if self.layer is not None else None)
+
+            self.button_zoom.setEnabled(feature is not None)
+            self.statistics_widget.set_feature(feature)
 
             if changed and feature is not None and SettingsRegistry.flash_feature():
                 self.map_canvas.flashGeometries([feature.geometry()], self.layer.crs())
 
         else:
             self.vertex_model.set_feature(None)
-            self.label_geometry_type.clear()
-            self.label_part_count.clear()
-            self.label_vertex_count.clear()
+            self.vertex_map_tool.set_vertices(None)
+            self.statistics_widget.set_feature(None)
             self.button_zoom.setEnabled(False)
 
+        self._update_comparison()
+        self._update_distances()
         self._vertex_selection_changed()
 
     def _show_settings(self):
@@ -177,6 +373,10 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
         self.settings_panel.vertex_symbol_changed.connect(self.vertex_symbol_changed)
         self.settings_panel.vertex_text_format_changed.connect(self.vertex_text_format_changed)
         self.settings_panel.number_format_changed.connect(self.vertex_model.number_format_changed)
+        self.settings_panel.number_format_changed.connect(self.compare_vertex_model.number_format_changed)
+        self.settings_panel.number_format_changed.connect(self.vertex_map_tool.number_format_changed)
+        self.settings_panel.number_format_changed.connect(self.statistics_widget.number_format_changed)
+        self.settings_panel.number_format_changed.connect(self.distance_widget.number_format_changed)
         self.openPanel(self.settings_panel)
 
     def _update_settings(self):
@@ -204,27 +404,368 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
             except QgsCsException:
                 pass
 
+    def _identify_vertex_toggled(self, checked: bool):
+        """
+        Triggered when the identify vertices action is toggled
+        """
+        if checked:
+            self.map_canvas.setMapTool(self.vertex_map_tool)
+        elif self.map_canvas.mapTool() == self.vertex_map_tool:
+            self.map_canvas.unsetMapTool(self.vertex_map_tool)
+
+    def _map_vertex_clicked(self, vertex_index: int):
+        """
+        Triggered when a vertex is clicked using the identify vertices map tool
+        """
+        row = self.aligned_model.aligned_row(vertex_index)
+        self._select_row(self.table_view, row, 0)
+        index = self.aligned_model.index(row, 0)
+        if index.isValid():
+            self.table_view.scrollTo(index)
+
+    def _choose_transformed_crs(self):
+        """
+        Prompts for a CRS to show transformed coordinates in
+        """
+        dialog = QgsProjectionSelectionDialog(self)
+        dialog.setWindowTitle(self.tr('Show Coordinates in Other CRS'))
+        if self.transformed_crs.isValid():
+            dialog.setCrs(self.transformed_crs)
+        if dialog.exec_():
+            self.transformed_crs = dialog.crs()
+
+        if not self.transformed_crs.isValid():
+            self.no_transform_action.setChecked(True)
+        self._update_transformed_columns()
+
+    def _update_transformed_columns(self):
+        """
+        Updates the transformed coordinate columns shown in the vertex tables
+        """
+        if self.project_crs_action.isChecked():
+            crs = QgsProject.instance().crs()
+        elif self.other_crs_action.isChecked():
+            crs = self.transformed_crs
+        else:
+            crs = None
+
+        self.vertex_model.set_destination_crs(crs)
+        self.compare_vertex_model.set_destination_crs(crs)
+
+    def _export_vertices(self, all_selected: bool):
+        """
+        Exports the vertices of the chosen feature, or of all selected features
+        """
+        feature = self.vertex_model.feature
+        if self.layer is None or (not self.selection if all_selected else feature is None):
+            QMessageBox.information(self, self.tr('Export Vertices'), self.tr('Select the features to export first.'))
+            return
+
+        filters = {VertexExportFormat.CSV: self.tr('CSV Files (*.csv)'),
+                   VertexExportFormat.GEOPACKAGE: self.tr('GeoPackage (*.gpkg)'),
+                   VertexExportFormat.PARQUET: self.tr('Parquet Files (*.parquet)')}
+        formats = VertexExportFormat.available_formats()
+        path, selected_filter = QFileDialog.getSaveFileName(self, self.tr('Export Vertices'), '',
+                                                            ';;'.join(filters[f] for f in formats))
+        if not path:
+            return
+
+        export_format = next((f for f in formats if filters[f] == selected_filter), VertexExportFormat.CSV)
+        path = QgsFileUtils.ensureFileNameHasExtension(path, [export_format])
+
+        if all_selected:
+            # features are fetched from a copy of the layer's source in the background
+            fids = list(self.selection)
+            source = QgsVectorLayerFeatureSource(self.layer)
+            vertices = None
+        else:
+            # reuse the vertices which have already been decoded for the table
+            fids = [feature.id()]
+            source = None
+            vertices = {feature.id(): self.vertex_model.vertices}
+
+        # compare flags are taken from the comparison currently shown in the tables
+        operations = {}
+        if self._comparison_diff is not None and feature is not None:
+            operations[feature.id()] = (self._comparison_diff, self.aligned_model.side)
+            if self.compare_vertex_model.feature is not None:
+                operations[self.compare_vertex_model.feature.id()] = (self._comparison_diff,
+                                                                      self.compare_aligned_model.side)
+
+        # topological compare flags match the vertex highlighting of a compared pair of features
+        topology_fids = None
+        if self.topological and len(self.selection) == 2:
+            topology_fids = tuple(self.selection)
+            if source is None:
+                source = QgsVectorLayerFeatureSource(self.layer)
+
+        task = VertexExportTask(path, export_format, fids, self.layer.crs(),
+                                QgsWkbTypes.hasZ(self.layer.wkbType()), QgsWkbTypes.hasM(self.layer.wkbType()),
+                                source=source, vertices=vertices, operations=operations,
+                                topology_fids=topology_fids)
+        task.taskCompleted.connect(partial(self._export_finished, task))
+        task.taskTerminated.connect(partial(self._export_finished, task))
+        self.export_tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def _export_finished(self, task: VertexExportTask):
+        """
+        Triggered when a vertex export task has finished
+        """
+        if task in self.export_tasks:
+            self.export_tasks.remove(task)
+
+        if task.error:
+            QMessageBox.warning(self, self.tr('Export Vertices'),
+                                self.tr('Could not export vertices to {}: {}').format(task.path, task.error))
+
+    def _selected_vertex_ranges(self) -> VertexRanges:
+        """
+        Returns the ranges of selected vertices in the vertex table
+        """
+        ranges = []
+        for selection_range in self.table_view.selectionModel().selection():
+            ranges.extend(self.aligned_model.source_ranges(selection_range.top(), selection_range.bottom() + 1))
+        return merge_ranges(ranges)
+
+    def _copy_vertices(self, copy_format: str):
+        """
+        Copies the selected vertices to the clipboard, as CSV, WKT or GeoJSON
+        """
+        ranges = self._selected_vertex_ranges()
+        if not ranges:
+            return
+
+        vertices = self.vertex_model.vertices
+        if copy_format == 'wkt':
+            text = vertices_to_wkt(vertices, ranges)
+        elif copy_format == 'geojson':
+            # GeoJSON is always WGS84, so only the selected vertices are transformed
+            transform = QgsCoordinateTransform(self.vertex_model.crs, QgsCoordinateReferenceSystem('EPSG:4326'),
+                                               QgsProject.instance())
+            try:
+                selected = vertices.subset(ranges).transformed(transform)
+            except QgsCsException:
+                QMessageBox.warning(self, self.tr('Copy as GeoJSON'),
+                                    self.tr('The selected vertices could not be transformed to WGS84.'))
+                return
+            numbers = [n for start, end in ranges for n in range(start + 1, end + 1)]
+            text = vertices_to_geojson(selected, [(0, len(selected))], numbers, GEOJSON_PRECISION)
+        else:
+            text = vertices_to_csv(vertices, ranges)
+
+        QApplication.clipboard().setText(text)
+
+    def set_vertex_snapshot(self, snapshot: Optional[VertexSnapshot]):
+        """
+        Sets the vertex snapshot to compare features against
+        """
+        self.snapshot_button.set_vertex_snapshot(snapshot)
+
+    def _comparison_snapshot_changed(self, snapshot: Optional[VertexSnapshot]):
+        """
+        Triggered when the snapshot to compare features against is changed, or snapshot
+        comparison is turned on or off
+        """
+        self._comparison_key = None
+        self._update_comparison()
+        self.vertex_snapshot_changed.emit(snapshot)
+
+    def _snapshot_vertices(self) -> Optional[VertexArray]:
+        """
+        Returns the snapshot vertices to compare with the active feature, or None if snapshot
+        comparison is not enabled or the active feature is not contained in the snapshot
+        """
+        snapshot = self.snapshot_button.comparison_snapshot()
+        if snapshot is None or self.vertex_model.feature is None or self.layer is None \
+                or self.layer.id() != snapshot.layer_id:
+            return None
+
+        return snapshot.vertices(self.vertex_model.feature.id())
+
+    def _other_selected_feature(self) -> Optional[QgsFeature]:
+        """
+        Returns the other selected feature, if exactly two features are selected
+        """
+        if len(self.selection) != 2 or self.vertex_model.feature is None:
+            return None
+
+        other_ids = [fid for fid in self.selection if fid != self.vertex_model.feature.id()]
+        if len(other_ids) != 1:
+            return None
+
+        index = self.feature_model.index_from_id(other_ids[0])
+        if not index.isValid():
+            return None
+        return self.feature_model.data(index, FeatureModel.FEATURE_ROLE)
+
+    def _compare_feature(self) -> Optional[QgsFeature]:
+        """
+        Returns the feature to compare with the active feature, or None if side by side
+        comparison is not enabled or not possible
+        """
+        if not self.compare_action.isChecked():
+            return None
+        return self._other_selected_feature()
+
+    def _update_distances(self):
+        """
+        Shows the distances between the two selected features
+        """
+        self.distance_widget.set_features(self.layer.id() if self.layer is not None else None,
+                                          self.vertex_model.feature, self._other_selected_feature())
+
+    def _cancel_diff_task(self):
+        """
+        Cancels the current vertex alignment, if any
+        """
+        if self.diff_task is not None and not sip.isdeleted(self.diff_task):  # pylint: disable=no-member
+            self.diff_task.cancel()
+        self.diff_task = None
+
+    def _update_comparison(self):
+        """
+        Updates the side by side comparison of the active feature with the other
+        selected feature, aligning the tables in the background
+        """
+        self.compare_action.setEnabled(len(self.selection) == 2)
+
+        snapshot_vertices = self._snapshot_vertices()
+        feature = self._compare_feature() if snapshot_vertices is None else None
+        if snapshot_vertices is None and feature is None:
+            self._cancel_diff_task()
+            self.compare_table_view.hide()
+            self.label_alignment.hide()
+            self._comparison_key = None
+            self._comparison_diff = None
+            if len(self.compare_vertex_model.vertices):
+                self.compare_vertex_model.set_feature(None)
+            if self.aligned_model.runs is not None:
+                self.aligned_model.set_diff(None)
+            return
+
+        if snapshot_vertices is not None:
+            key = (id(self.snapshot_button.vertex_snapshot), self.vertex_model.feature.id())
+        else:
+            key = feature.id()
+        if key == self._comparison_key and (self.aligned_model.runs is not None or self.diff_task is not None):
+            # already showing (or aligning) this comparison
+            return
+        self._comparison_key = key
+        self._comparison_diff = None
+        self._cancel_diff_task()
+
+        if snapshot_vertices is not None:
+            # the snapshot is the earlier version of the feature, so vertices which only exist in
+            # the active feature have been added since the snapshot was captured
+            self.compare_vertex_model.set_vertices(snapshot_vertices, self.layer.crs())
+            self.aligned_model.side = AlignedVertexModel.SECOND
+            self.compare_aligned_model.side = AlignedVertexModel.FIRST
+            self.diff_task = VertexDiffTask(snapshot_vertices, self.vertex_model.vertices)
+        else:
+            self.compare_vertex_model.set_feature(feature, self.layer)
+            self.aligned_model.side = AlignedVertexModel.FIRST
+            self.compare_aligned_model.side = AlignedVertexModel.SECOND
+            self.diff_task = VertexDiffTask(self.vertex_model.vertices, self.compare_vertex_model.vertices)
+
+        # the tables are shown unaligned until the alignment is ready
+        self.aligned_model.set_diff(None)
+        self.compare_aligned_model.set_diff(None)
+        self.compare_table_view.show()
+        self.label_alignment.setText(self.tr('Aligning vertices…'))
+        self.label_alignment.show()
+
+        self.diff_task.taskCompleted.connect(partial(self._diff_calculated, self.diff_task))
+        self.diff_task.taskTerminated.connect(partial(self._diff_terminated, self.diff_task))
+        QgsApplication.taskManager().addTask(self.diff_task)
+
+    def _diff_calculated(self, task: VertexDiffTask):
+        """
+        Triggered when a vertex alignment task has completed
+        """
+        if task is not self.diff_task:
+            # superseded by a later comparison
+            return
+
+        self.diff_task = None
+        models = {self.aligned_model.side: self.vertex_model,
+                  self.compare_aligned_model.side: self.compare_vertex_model}
+        if models[AlignedVertexModel.FIRST].vertices is not task.vertices1 \
+                or models[AlignedVertexModel.SECOND].vertices is not task.vertices2:
+            # the vertices were reloaded while aligning
+            self._comparison_key = None
+            self._update_comparison()
+            return
+
+        self._comparison_diff = task.diff
+        self.aligned_model.set_diff(task.diff)
+        self.compare_aligned_model.set_diff(task.diff)
+        if task.diff.approximate:
+            self.label_alignment.setText(
+                self.tr('The features differ too much to align exactly, so the alignment is approximate'))
+            self.label_alignment.show()
+        else:
+            self.label_alignment.hide()
+
+    def _diff_terminated(self, task: VertexDiffTask):
+        """
+        Triggered when a vertex alignment task was canceled or failed
+        """
+        if task is not self.diff_task:
+            return
+
+        self.diff_task = None
+        self._comparison_key = None
+        self.label_alignment.setText(self.tr('Vertices could not be aligned'))
+
+    def _show_vertex(self, point):
+        """
+        Centers on or flashes a selected vertex, depending on the settings
+        """
+        map_point = self.map_canvas.mapSettings().layerToMapCoordinates(self.layer, point)
+
+        if SettingsRegistry.center_on_selected():
+            self.map_canvas.setCenter(QgsPointXY(map_point))
+            self.map_canvas.refresh()
+
+        if SettingsRegistry.flash_vertex():
+            geom = QgsGeometry(map_point)
+            self.map_canvas.flashGeometries([geom])
+
+    @staticmethod
+    def _select_row(view, row: int, column: int):
+        """
+        Selects a row in a table view
+        """
+        index = view.model().index(row, column)
+        if index.isValid():
+            view.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows)
+        else:
+            view.selectionModel().clearSelection()
+
     def _vertex_selection_changed(self):
         """
         Triggered when the selected vertex is changed
         """
-        selection = self.table_view.selectionModel().selectedIndexes()
+        if self._block_vertex_selection:
+            return
+
+        # with extended selections, the current row is the most recently selected vertex. Avoid
+        # selectedIndexes(), which creates an index for every selected cell
+        selection_model = self.table_view.selectionModel()
+        current = selection_model.currentIndex()
         vertex_number = None
-        if selection:
-            selected_index = self.vertex_model.index(self.table_view.selectionModel().selectedIndexes()[0].row(), 0)
+        if selection_model.hasSelection() and current.isValid() and selection_model.isRowSelected(current.row()):
+            selected_index = self.aligned_model.mapToSource(
+                self.aligned_model.index(current.row(), 0))
             if selected_index.isValid():
                 vertex_number = self.vertex_model.data(selected_index, VertexModel.VERTEX_NUMBER_ROLE)
+                self._show_vertex(self.vertex_model.data(selected_index, VertexModel.VERTEX_POINT_ROLE))
 
-                point = self.vertex_model.data(selected_index, VertexModel.VERTEX_POINT_ROLE)
-                map_point = self.map_canvas.mapSettings().layerToMapCoordinates(self.layer, point)
-
-                if SettingsRegistry.center_on_selected():
-                    self.map_canvas.setCenter(QgsPointXY(map_point))
-                    self.map_canvas.refresh()
-
-                if SettingsRegistry.flash_vertex():
-                    geom = QgsGeometry(map_point)
-                    self.map_canvas.flashGeometries([geom])
+            if self.compare_table_view.isVisible():
+                self._block_vertex_selection = True
+                self._select_row(self.compare_table_view, current.row(), current.column())
+                self._block_vertex_selection = False
 
         feature_id = None
         if self.vertex_model.feature is not None:
@@ -232,6 +773,32 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
 
         self.selected_vertex_changed.emit(feature_id, vertex_number)
 
+    def _compare_vertex_selection_changed(self):
+        """
+        Triggered when the selected vertex in the comparison table is changed
+        """
+        if self._block_vertex_selection or not self.compare_table_view.isVisible():
+            return
+
+        selection = self.compare_table_view.selectionModel().selectedIndexes()
+        if not selection:
+            return
+
+        self._block_vertex_selection = True
+        self._select_row(self.table_view, selection[0].row(), selection[0].column())
+        self._block_vertex_selection = False
+
+        vertex_number = None
+        selected_index = self.compare_aligned_model.mapToSource(
+            self.compare_aligned_model.index(selection[0].row(), 0))
+        if selected_index.isValid():
+            vertex_number = self.compare_vertex_model.data(selected_index, VertexModel.VERTEX_NUMBER_ROLE)
+            self._show_vertex(self.compare_vertex_model.data(selected_index, VertexModel.VERTEX_POINT_ROLE))
+
+        if self.compare_vertex_model.feature is not None:
+            # snapshot vertices have no corresponding feature to highlight
+            self.selected_vertex_changed.emit(self.compare_vertex_model.feature.id(), vertex_number)
+
     def _table_double_click(self, index: QModelIndex):
         """
         Triggered when the table is double-clicked
@@ -239,7 +806,10 @@ class VertexListWidget(QgsPanelWidget, WIDGET):
         if not index.isValid():
             return
 
-        point = self.vertex_model.data(index, VertexModel.VERTEX_POINT_ROLE)
+        point = index.data(VertexModel.VERTEX_POINT_ROLE)
+        if point is None:
+            # a gap in an aligned table
+            return
 
         map_point = self.map_canvas.mapSettings().layerToMapCoordinates(self.layer, point)
         self.map_canvas.setCenter(QgsPointXY(map_point))
@@ -254,6 +824,7 @@ class VertexDockWidget(QgsDockWidget):
     selected_vertex_changed = pyqtSignal(int, object)
     vertex_symbol_changed = pyqtSignal()
     vertex_text_format_changed = pyqtSignal()
+    vertex_snapshot_changed = pyqtSignal(object)
 
     def __init__(self, map_canvas: QgsMapCanvas, parent=None):
         super().__init__(parent)
@@ -280,9 +851,22 @@ class VertexDockWidget(QgsDockWidget):
         self.table_widget.selected_vertex_changed.connect(self.selected_vertex_changed)
         self.table_widget.vertex_symbol_changed.connect(self.vertex_symbol_changed)
         self.table_widget.vertex_text_format_changed.connect(self.vertex_text_format_changed)
+        self.table_widget.vertex_snapshot_changed.connect(self.vertex_snapshot_changed)
 
     def set_selection(self, layer: QgsVectorLayer, selection: List[int]):
         """
         Sets the selection to show in the dock
         """
         self.table_widget.set_selection(layer, selection)
+
+    def update_selection(self, layer: QgsVectorLayer, added: List[int], removed: List[int]):
+        """
+        Incrementally updates the selection shown in the dock
+        """
+        self.table_widget.update_selection(layer, added, removed)
+
+    def set_topological(self, topological: bool):
+        """
+        Sets whether pairs of selected features are compared topologically
+        """
+        self.table_widget.set_topological(topological)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Nearest vertex map tool
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from functools import partial
+from typing import Optional
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import (
+    Qt,
+    pyqtSignal
+)
+from qgis.PyQt.QtWidgets import QToolTip
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsNumericFormatContext,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle
+)
+from qgis.gui import (
+    QgsMapCanvas,
+    QgsMapMouseEvent,
+    QgsMapTool
+)
+
+from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_index import PointGridIndex
+from vertex_compare.core.vertex_index_task import PointGridIndexTask
+
+
+class NearestVertexMapTool(QgsMapTool):
+    """
+    A map tool which shows the number and coordinates of the active feature's vertex
+    nearest to the cursor, and selects the vertex when clicked.
+
+    The grid index of the feature's vertices is built once per feature, in a background task
+    started when the vertices are set, so hovering never walks the feature's geometry. No vertex
+    is found until the index is ready.
+    """
+
+    # emitted with the index (starting at 0) of the clicked vertex
+    vertex_clicked = pyqtSignal(int)
+
+    def __init__(self, canvas: QgsMapCanvas):
+        super().__init__(canvas)
+        self.setCursor(Qt.CrossCursor)
+
+        self.vertices = VertexArray.from_geometry(None)
+        self.crs = QgsCoordinateReferenceSystem()
+        self.index: Optional[PointGridIndex] = None
+        self.extent: Optional[QgsRectangle] = None
+        self.index_task: Optional[PointGridIndexTask] = None
+        self.transform: Optional[QgsCoordinateTransform] = None
+        self.number_format = SettingsRegistry.number_format()
+        self._hover_index: Optional[int] = None
+
+    def set_vertices(self, vertices: Optional[VertexArray], crs: Optional[QgsCoordinateReferenceSystem] = None):
+        """
+        Sets the vertices of the active feature, in the specified (layer) CRS
+        """
+        self.vertices = vertices if vertices is not None else VertexArray.from_geometry(None)
+        self.crs = QgsCoordinateReferenceSystem(crs) if crs is not None else QgsCoordinateReferenceSystem()
+        self.index = None
+        self.extent = None
+        self.transform = None
+        self._hide_tooltip()
+
+        self._cancel_index_task()
+        if len(self.vertices):
+            self.index_task = PointGridIndexTask(self.vertices)
+            self.index_task.taskCompleted.connect(partial(self._index_built, self.index_task))
+            self.index_task.taskTerminated.connect(partial(self._index_terminated, self.index_task))
+            QgsApplication.taskManager().addTask(self.index_task)
+
+    def _cancel_index_task(self):
+        """
+        Cancels the current index task, if any
+        """
+        if self.index_task is not None and not sip.isdeleted(self.index_task):  # pylint: disable=no-member
+            self.index_task.cancel()
+        self.index_task = None
+
+    def _index_built(self, task: PointGridIndexTask):
+        """
+        Triggered when a vertex index task has completed
+        """
+        if task is not self.index_task:
+            # superseded by the vertices of another feature
+            return
+
+        self.index_task = None
+        self.index = task.index
+        self.extent = task.extent
+
+    def _index_terminated(self, task: PointGridIndexTask):
+        """
+        Triggered when a vertex index task was canceled or failed
+        """
+        if task is not self.index_task:
+            return
+
+        self.index_task = None
+
+    def _layer_transform(self) -> QgsCoordinateTransform:
+        """
+        Returns the (cached) transform from the canvas CRS to the vertices' CRS
+        """
+        destination_crs = self.canvas().mapSettings().destinationCrs()
+        if self.transform is None or self.transform.sourceCrs() != destination_crs:
+            self.transform = QgsCoordinateTransform(destination_crs, self.crs, QgsProject.instance())
+        return self.transform
+
+    def vertex_at(self, point: QgsPointXY, tolerance: Optional[float] = None) -> Optional[int]:
+        """
+        Returns the index of the vertex nearest to a point in the vertices' CRS, or None
+        if no vertex is within tolerance of the point.
+
+        If tolerance is None then the nearest vertex is returned regardless of its distance.
+
+        Returns None while the index of the vertices is still being built.
+        """
+        if not len(self.vertices) or self.index is None:
+            return None
+
+        if tolerance is not None:
+            # cheap rejection of points far from every vertex, without searching the index
+            extent = QgsRectangle(self.extent)
+            extent.grow(tolerance)
+            if not extent.contains(point):
+                return None
+
+        return self.index.nearest(point.x(), point.y(), max_distance=tolerance)
+
+    def _vertex_at_event(self, event: QgsMapMouseEvent) -> Optional[int]:
+        """
+        Returns the index of the vertex nearest to a mouse event
+        """
+        if not len(self.vertices) or self.index is None:
+            return None
+
+        map_point = event.mapPoint()
+        radius = QgsMapTool.searchRadiusMU(self.canvas())
+        try:
+            # the search rectangle is transformed, so that the tolerance is correct for the vertices' CRS
+            rect = self._layer_transform().transformBoundingBox(
+                QgsRectangle(map_point.x() - radius, map_point.y() - radius,
+                             map_point.x() + radius, map_point.y() + radius))
+        except QgsCsException:
+            return None
+
+        return self.vertex_at(rect.center(), max(rect.width(), rect.height()) / 2)
+
+    def _hide_tooltip(self):
+        """
+        Hides the vertex tooltip
+        """
+        if self._hover_index is not None:
+            QToolTip.hideText()
+        self._hover_index = None
+
+    def tooltip_text(self, index: int) -> str:
+        """
+        Returns the tooltip text for a vertex
+        """
+        context = QgsNumericFormatContext()
+        coordinates = [self.vertices.x[index], self.vertices.y[index]]
+        if self.vertices.has_z():
+            coordinates.append(self.vertices.z[index])
+        if self.vertices.has_m():
+            coordinates.append(self.vertices.m[index])
+
+        return self.tr('Vertex {}\n{}').format(
+            index + 1, ', '.join(self.number_format.formatDouble(value, context) for value in coordinates))
+
+    def canvasMoveEvent(self, event: QgsMapMouseEvent):  # pylint: disable=missing-function-docstring
+        index = self._vertex_at_event(event)
+        if index is None:
+            self._hide_tooltip()
+            return
+
+        if index == self._hover_index:
+            return
+
+        self._hover_index = index
+        QToolTip.showText(self.canvas().mapToGlobal(event.pos()), self.tooltip_text(index), self.canvas())
+
+    def canvasReleaseEvent(self, event: QgsMapMouseEvent):  # pylint: disable=missing-function-docstring
+        if event.button() != Qt.LeftButton:
+            return
+
+        index = self._vertex_at_event(event)
+        if index is not None:
+            self.vertex_clicked.emit(index)
+
+    def deactivate(self):  # pylint: disable=missing-function-docstring
+        self._hide_tooltip()
+        super().deactivate()
+
+    def number_format_changed(self):
+        """
+        Called when the predefined number format is changed
+        """
+        self.number_format = SettingsRegistry.number_format()
+        self._hide_tooltip()
@@ -14,6 +14,7 @@ __copyright__ = 'Copyright 2021, North Road'
 __revision__ = '$Format:%H$'
 
 import os
+from functools import partial
 from typing import (
     List,
     Optional
@@ -30,12 +31,16 @@ from qgis.PyQt.QtGui import (
 )
 from qgis.PyQt.QtWidgets import (
     QToolBar,
-    QAction
+    QToolButton,
+    QAction,
+    QMenu
 )
 from qgis.core import (
     QgsApplication,
     QgsMapLayerProxyModel,
-    QgsVectorLayer
+    QgsProject,
+    QgsVectorLayer,
+    QgsWkbTypes
 )
 from qgis.gui import (
     QgisInterface,
@@ -46,6 +51,7 @@ from vertex_compare.core.vertex_highlighter_manager import VertexHighlighterMana
 from vertex_compare.gui.selection_handler import SelectionHandler
 from vertex_compare.gui.vertex_dock import VertexDockWidget
 from vertex_compare.gui.gui_utils import GuiUtils
+from vertex_compare.processing.provider import VertexCompareProvider
 
 VERSION = '0.0.1'
 
@@ -80,13 +86,21 @@ class VertexComparePlugin(QObject):
 
         self.toolbar = None
         self.layer_combo = None
+        self.reference_layer_combo = None
         self.actions = []
         self.dock = None
-        self.vertex_highlighter = VertexHighlighterManager()
+        # no interface is available when the plugin is loaded by qgis_process, in which case
+        # only the Processing provider is used
+        self.vertex_highlighter = VertexHighlighterManager(map_canvas=self.iface.mapCanvas()) \
+            if self.iface is not None else None
         self.selection_handler = SelectionHandler(self)
         self.show_vertices_action = None
         self.show_topology_action = None
         self.show_dock_action = None
+        self.additional_layers_button = None
+        self.additional_layers_menu = None
+        self.additional_layer_ids: List[str] = []
+        self.provider: Optional[VertexCompareProvider] = None
 
     @staticmethod
     def tr(message):
@@ -105,6 +119,8 @@ class VertexComparePlugin(QObject):
 
     def initProcessing(self):
         """Create the Processing provider"""
+        self.provider = VertexCompareProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
 
     def initGui(self):
         """Creates application GUI widgets"""
@@ -126,6 +142,16 @@ class VertexComparePlugin(QObject):
         self.layer_combo.layerChanged.connect(self._set_layer)
         self.toolbar.addWidget(self.layer_combo)
 
+        self.additional_layers_menu = QMenu()
+        self.additional_layers_menu.aboutToShow.connect(self._populate_additional_layers_menu)
+        self.additional_layers_button = QToolButton()
+        self.additional_layers_button.setToolTip(self.tr('Additional Layers'))
+        self.additional_layers_button.setIcon(QgsApplication.getThemeIcon('/mIconLayerTree.svg'))
+        self.additional_layers_button.setPopupMode(QToolButton.InstantPopup)
+        self.additional_layers_button.setMenu(self.additional_layers_menu)
+        self.additional_layers_button.setEnabled(False)
+        self.toolbar.addWidget(self.additional_layers_button)
+
         self.show_vertices_action = QAction(self.tr("Show Vertex Numbers"), self)
         self.show_vertices_action.setIcon(GuiUtils.get_icon('show_vertex_numbers.svg'))
         self.show_vertices_action.setCheckable(True)
@@ -141,6 +167,19 @@ class VertexComparePlugin(QObject):
         self.toolbar.addAction(self.show_topology_action)
         self.show_topology_action.toggled.connect(self.vertex_highlighter.set_topological)
 
+        self.reference_layer_combo = QgsMapLayerComboBox()
+        self.reference_layer_combo.setAllowEmptyLayer(True, self.tr('No Reference Layer'))
+        self.reference_layer_combo.setFilters(QgsMapLayerProxyModel.PolygonLayer | QgsMapLayerProxyModel.LineLayer)
+        self.reference_layer_combo.setToolTip(
+            self.tr('When comparing vertices, compare the selected features against intersecting features '
+                    'from this layer'))
+        self.reference_layer_combo.setMinimumWidth(QFontMetrics(self.reference_layer_combo.font()).width('x') * 30)
+        self.reference_layer_combo.setCurrentIndex(0)
+        self.reference_layer_combo.layerChanged.connect(self.vertex_highlighter.set_reference_layer)
+        self.toolbar.addWidget(self.reference_layer_combo)
+        self.show_topology_action.toggled.connect(self._update_dock_topological)
+        self.reference_layer_combo.layerChanged.connect(self._update_dock_topological)
+
         self.show_dock_action = QAction(self.tr('Show Vertices'), parent=self.toolbar)
         self.show_dock_action.setIcon(GuiUtils.get_icon('vertex_table.svg'))
         self.toolbar.addAction(self.show_dock_action)
@@ -148,10 +187,11 @@ class VertexComparePlugin(QObject):
         self.dock.setToggleVisibilityAction(self.show_dock_action)
 
         self.selection_handler.selection_changed.connect(self._selection_changed)
-        self.dock.label_filter_changed.connect(self.vertex_highlighter.redraw)
-        self.dock.vertex_symbol_changed.connect(self.vertex_highlighter.redraw)
-        self.dock.vertex_text_format_changed.connect(self.vertex_highlighter.redraw)
+        self.selection_handler.selection_delta_changed.connect(self._selection_delta_changed)
         self.dock.selected_vertex_changed.connect(self.vertex_highlighter.set_selected_vertex)
+        self.dock.vertex_snapshot_changed.connect(self.vertex_highlighter.set_vertex_snapshot)
+
+        QgsProject.instance().layersWillBeRemoved.connect(self._layers_removed)
 
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
@@ -163,15 +203,42 @@ class VertexComparePlugin(QObject):
             self.toolbar.deleteLater()
             self.toolbar = None
         if self.dock is not None:
+            self.iface.mapCanvas().unsetMapTool(self.dock.table_widget.vertex_map_tool)
             self.dock.deleteLater()
             self.dock = None
 
+        QgsProject.instance().layersWillBeRemoved.disconnect(self._layers_removed)
+
+        if self.vertex_highlighter is not None:
+            self.vertex_highlighter.detach()
+
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
+
+    def _watched_layers(self) -> List[QgsVectorLayer]:
+        """
+        Returns the list of layers to watch, with the primary layer first
+        """
+        primary = self.layer_combo.currentLayer()
+        if primary is None:
+            return []
+
+        layers = [primary]
+        for layer_id in self.additional_layer_ids:
+            layer = QgsProject.instance().mapLayer(layer_id)
+            if layer is not None and layer != primary:
+                layers.append(layer)
+        return layers
+
     def _set_layer(self, layer: Optional[QgsVectorLayer]):
         """
         Triggered when the selected layer is changed
         """
-        self.selection_handler.set_layer(layer)
-        self.vertex_highlighter.set_layer(layer)
+        layers = self._watched_layers()
+        self.selection_handler.set_layers(layers)
+        self.vertex_highlighter.set_layers(layers)
+        self.additional_layers_button.setEnabled(layer is not None)
         self.show_vertices_action.setEnabled(layer is not None)
         if not self.show_vertices_action.isEnabled():
             self.show_vertices_action.setChecked(False)
@@ -180,8 +247,74 @@ class VertexComparePlugin(QObject):
 
         self.dock.set_selection(layer, layer.selectedFeatureIds() if layer is not None else [])
 
+    def _populate_additional_layers_menu(self):
+        """
+        Populates the menu of additional layers to watch
+        """
+        self.additional_layers_menu.clear()
+
+        primary = self.layer_combo.currentLayer()
+        for layer in QgsProject.instance().layerTreeRoot().layerOrder():
+            if not isinstance(layer, QgsVectorLayer) or layer == primary:
+                continue
+            if layer.geometryType() not in (QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry):
+                continue
+
+            action = QAction(layer.name(), self.additional_layers_menu)
+            action.setCheckable(True)
+            action.setChecked(layer.id() in self.additional_layer_ids)
+            action.toggled.connect(partial(self._toggle_additional_layer, layer.id()))
+            self.additional_layers_menu.addAction(action)
+
+        if self.additional_layers_menu.isEmpty():
+            action = QAction(self.tr('No Other Layers Available'), self.additional_layers_menu)
+            action.setEnabled(False)
+            self.additional_layers_menu.addAction(action)
+
+    def _toggle_additional_layer(self, layer_id: str, checked: bool):
+        """
+        Triggered when an additional layer is checked or unchecked
+        """
+        if checked and layer_id not in self.additional_layer_ids:
+            self.additional_layer_ids.append(layer_id)
+        elif not checked and layer_id in self.additional_layer_ids:
+            self.additional_layer_ids.remove(layer_id)
+
+        layers = self._watched_layers()
+        self.selection_handler.set_layers(layers)
+        self.vertex_highlighter.set_layers(layers)
+
+    def _layers_removed(self, layer_ids: List[str]):
+        """
+        Triggered when layers are about to be removed from the project
+        """
+        self.additional_layer_ids = [layer_id for layer_id in self.additional_layer_ids if layer_id not in layer_ids]
+        self.selection_handler.set_layers([layer for layer in self._watched_layers() if layer.id() not in layer_ids])
+
+    def _update_dock_topological(self):
+        """
+        Updates whether the dock compares pairs of selected features topologically. Features are
+        compared against the reference layer instead if one is set.
+        """
+        topological = self.show_topology_action.isChecked() and self.reference_layer_combo.currentLayer() is None
+        self.dock.set_topological(topological)
+
     def _selection_changed(self, layer: Optional[QgsVectorLayer], selection: List[int]):
         """
-        Triggered when the watched layer's selection is changed
+        Triggered when the primary watched layer's selection is changed
         """
+        self.vertex_highlighter.set_active_layer(layer)
         self.dock.set_selection(layer, selection)
+
+    def _selection_delta_changed(self, layer: Optional[QgsVectorLayer], added: List[int], removed: List[int]):
+        """
+        Triggered when features are added to or removed from a watched layer's selection.
+
+        The dock (and active highlighted layer) always shows the layer chosen in the layer combo,
+        so changes to the selections of additional layers are only reflected in their highlighting.
+        """
+        if layer != self.layer_combo.currentLayer():
+            return
+
+        self.vertex_highlighter.set_active_layer(layer)
+        self.dock.update_selection(layer, added, removed)
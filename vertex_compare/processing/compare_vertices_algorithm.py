@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Compare feature vertices algorithm
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QVariant
+)
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsWkbTypes
+)
+
+from vertex_compare.core.comparison import (
+    FeatureComparison,
+    compare_sources
+)
+
+
+class CompareVerticesAlgorithm(QgsProcessingAlgorithm):
+    """
+    Compares the vertices of features from a layer with the matching features from
+    a reference layer
+    """
+
+    INPUT = 'INPUT'
+    REFERENCE = 'REFERENCE'
+    KEY_FIELD = 'KEY_FIELD'
+    OUTPUT = 'OUTPUT'
+    MATCHING_COUNT = 'MATCHING_COUNT'
+    DIFFERENT_COUNT = 'DIFFERENT_COUNT'
+    MISSING_COUNT = 'MISSING_COUNT'
+
+    STATUS_MATCHING = 'matching'
+    STATUS_DIFFERENT = 'different'
+    STATUS_MISSING = 'missing'
+
+    def name(self) -> str:  # pylint: disable=missing-function-docstring
+        return 'comparevertices'
+
+    def displayName(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Compare feature vertices')
+
+    def tags(self):  # pylint: disable=missing-function-docstring
+        return self.tr('vertices,compare,difference,reference,qa').split(',')
+
+    def shortHelpString(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Compares the vertices of each feature from the input layer with the vertices of the '
+                       'matching feature from a reference layer.\n\n'
+                       'Features are matched by feature ID, or by the value of the key field if set. The key '
+                       'field must exist in both layers.\n\n'
+                       'A table is output with one row for each input feature, listing the vertex numbers '
+                       'from each feature which are not coincident with any vertex from the other feature. '
+                       'The number of matching, different and missing features are also output, so that '
+                       'the algorithm can be used to check layers in batch jobs.')
+
+    def tr(self, string: str) -> str:  # pylint: disable=missing-function-docstring
+        return QCoreApplication.translate('VertexCompare', string)
+
+    def createInstance(self):  # pylint: disable=missing-function-docstring
+        return CompareVerticesAlgorithm()
+
+    def initAlgorithm(self, _=None):  # pylint: disable=missing-function-docstring
+        self.addParameter(QgsProcessingParameterFeatureSource(self.INPUT,
+                                                              self.tr('Input layer'),
+                                                              [QgsProcessing.TypeVectorAnyGeometry]))
+        self.addParameter(QgsProcessingParameterFeatureSource(self.REFERENCE,
+                                                              self.tr('Reference layer'),
+                                                              [QgsProcessing.TypeVectorAnyGeometry]))
+        self.addParameter(QgsProcessingParameterField(self.KEY_FIELD,
+                                                      self.tr('Key field'),
+                                                      parentLayerParameterName=self.INPUT,
+                                                      optional=True))
+        self.addParameter(QgsProcessingParameterFeatureSink(self.OUTPUT,
+                                                            self.tr('Vertex comparison'),
+                                                            QgsProcessing.TypeVector))
+        self.addOutput(QgsProcessingOutputNumber(self.MATCHING_COUNT, self.tr('Matching feature count')))
+        self.addOutput(QgsProcessingOutputNumber(self.DIFFERENT_COUNT, self.tr('Different feature count')))
+        self.addOutput(QgsProcessingOutputNumber(self.MISSING_COUNT, self.tr('Missing feature count')))
+
+    @staticmethod
+    def output_fields() -> QgsFields:
+        """
+        Returns the fields for the algorithm output
+        """
+        fields = QgsFields()
+        fields.append(QgsField('feature_id', QVariant.LongLong))
+        fields.append(QgsField('reference_id', QVariant.LongLong))
+        fields.append(QgsField('status', QVariant.String))
+        fields.append(QgsField('vertex_count', QVariant.Int))
+        fields.append(QgsField('reference_vertex_count', QVariant.Int))
+        fields.append(QgsField('uncommon_count', QVariant.Int))
+        fields.append(QgsField('reference_uncommon_count', QVariant.Int))
+        fields.append(QgsField('uncommon_vertices', QVariant.String))
+        fields.append(QgsField('reference_uncommon_vertices', QVariant.String))
+        return fields
+
+    @staticmethod
+    def status(comparison: FeatureComparison) -> str:
+        """
+        Returns the status string for a comparison
+        """
+        if comparison.fid1 is None or comparison.fid2 is None:
+            return CompareVerticesAlgorithm.STATUS_MISSING
+        if comparison.matches():
+            return CompareVerticesAlgorithm.STATUS_MATCHING
+        return CompareVerticesAlgorithm.STATUS_DIFFERENT
+
+    def processAlgorithm(self, parameters, context, feedback):  # pylint: disable=missing-function-docstring
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+
+        reference = self.parameterAsSource(parameters, self.REFERENCE, context)
+        if reference is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.REFERENCE))
+
+        key_field = self.parameterAsString(parameters, self.KEY_FIELD, context)
+        if key_field and reference.fields().lookupField(key_field) < 0:
+            raise QgsProcessingException(self.tr('Field "{}" does not exist in the reference layer').format(key_field))
+
+        fields = self.output_fields()
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT, context,
+                                               fields, QgsWkbTypes.NoGeometry)
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        counts = {self.STATUS_MATCHING: 0,
+                  self.STATUS_DIFFERENT: 0,
+                  self.STATUS_MISSING: 0}
+        for comparison in compare_sources(source, reference, key_field=key_field or None, feedback=feedback):
+            status = self.status(comparison)
+            counts[status] += 1
+
+            feature = QgsFeature(fields)
+            feature.setAttributes([comparison.fid1,
+                                   comparison.fid2,
+                                   status,
+                                   comparison.vertex_count1,
+                                   comparison.vertex_count2,
+                                   len(comparison.uncommon1),
+                                   len(comparison.uncommon2),
+                                   ','.join(str(v) for v in comparison.uncommon1),
+                                   ','.join(str(v) for v in comparison.uncommon2)])
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+
+        return {self.OUTPUT: dest_id,
+                self.MATCHING_COUNT: counts[self.STATUS_MATCHING],
+                self.DIFFERENT_COUNT: counts[self.STATUS_DIFFERENT],
+                self.MISSING_COUNT: counts[self.STATUS_MISSING]}
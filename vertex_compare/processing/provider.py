@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Vertex Compare processing provider
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import QgsProcessingProvider
+
+from vertex_compare.gui.gui_utils import GuiUtils
+from vertex_compare.processing.compare_vertices_algorithm import CompareVerticesAlgorithm
+from vertex_compare.processing.vertex_consistency_algorithm import VertexConsistencyAlgorithm
+
+
+class VertexCompareProvider(QgsProcessingProvider):
+    """
+    Processing provider for Vertex Compare algorithms
+    """
+
+    def loadAlgorithms(self):  # pylint: disable=missing-function-docstring
+        self.addAlgorithm(CompareVerticesAlgorithm())
+        self.addAlgorithm(VertexConsistencyAlgorithm())
+
+    def id(self) -> str:  # pylint: disable=missing-function-docstring
+        return 'vertex_compare'
+
+    def name(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Vertex Compare')
+
+    def longName(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Vertex Compare')
+
+    def icon(self) -> QIcon:  # pylint: disable=missing-function-docstring
+        return GuiUtils.get_icon('plugin.svg')
+
+    def svgIconPath(self) -> str:  # pylint: disable=missing-function-docstring
+        return GuiUtils.get_icon_svg('plugin.svg')
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Layer vertex consistency algorithm
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QVariant
+)
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterDistance,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsWkbTypes
+)
+
+from vertex_compare.core.layer_consistency import (
+    LayerConsistencyChecker,
+    python_executable
+)
+from vertex_compare.core.topology import Inconsistency
+
+
+class VertexConsistencyAlgorithm(QgsProcessingAlgorithm):
+    """
+    Finds vertices which lie on the shared boundary of two neighboring features, but
+    which are missing from one of the features
+    """
+
+    INPUT = 'INPUT'
+    TOLERANCE = 'TOLERANCE'
+    WORKERS = 'WORKERS'
+    OUTPUT = 'OUTPUT'
+
+    DEFAULT_TOLERANCE = 0.000001
+
+    def name(self) -> str:  # pylint: disable=missing-function-docstring
+        return 'vertexconsistency'
+
+    def displayName(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Check shared boundary vertices')
+
+    def tags(self):  # pylint: disable=missing-function-docstring
+        return self.tr('topology,vertices,boundary,consistency,coincident').split(',')
+
+    def shortHelpString(self) -> str:  # pylint: disable=missing-function-docstring
+        return self.tr('Finds vertices which lie on the boundary shared by two touching features, but which '
+                       'have no matching vertex in the neighboring feature.\n\n'
+                       'Each inconsistent vertex is output as a point, with the feature ID, vertex number '
+                       'and the feature ID of the neighboring feature.\n\n'
+                       'Vertices within the tolerance distance of a neighboring feature\'s boundary '
+                       'are considered to lie on the boundary, and vertices within the tolerance distance '
+                       'of a neighboring feature\'s vertex are considered to match that vertex.')
+
+    def tr(self, string: str) -> str:  # pylint: disable=missing-function-docstring
+        return QCoreApplication.translate('VertexCompare', string)
+
+    def createInstance(self):  # pylint: disable=missing-function-docstring
+        return VertexConsistencyAlgorithm()
+
+    def initAlgorithm(self, _=None):  # pylint: disable=missing-function-docstring
+        self.addParameter(QgsProcessingParameterFeatureSource(self.INPUT,
+                                                              self.tr('Input layer'),
+                                                              [QgsProcessing.TypeVectorLine,
+                                                               QgsProcessing.TypeVectorPolygon]))
+        tolerance = QgsProcessingParameterDistance(self.TOLERANCE,
+                                                   self.tr('Tolerance'),
+                                                   self.DEFAULT_TOLERANCE,
+                                                   self.INPUT,
+                                                   minValue=0)
+        self.addParameter(tolerance)
+        workers = QgsProcessingParameterNumber(self.WORKERS,
+                                               self.tr('Worker processes'),
+                                               QgsProcessingParameterNumber.Integer,
+                                               os.cpu_count() or 1,
+                                               minValue=1)
+        workers.setFlags(workers.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(workers)
+        self.addParameter(QgsProcessingParameterFeatureSink(self.OUTPUT,
+                                                            self.tr('Inconsistent vertices'),
+                                                            QgsProcessing.TypeVectorPoint))
+
+    @staticmethod
+    def output_fields() -> QgsFields:
+        """
+        Returns the fields for the algorithm output
+        """
+        fields = QgsFields()
+        fields.append(QgsField('feature_id', QVariant.LongLong))
+        fields.append(QgsField('vertex_number', QVariant.Int))
+        fields.append(QgsField('neighbor_id', QVariant.LongLong))
+        return fields
+
+    def processAlgorithm(self, parameters, context, feedback):  # pylint: disable=missing-function-docstring
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+
+        tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+
+        fields = self.output_fields()
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT, context,
+                                               fields, QgsWkbTypes.Point, source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        if workers > 1 and python_executable() is None:
+            feedback.pushInfo(self.tr('No Python interpreter found for worker processes, comparing features in a single process'))
+            workers = 1
+
+        checker = LayerConsistencyChecker(source, tolerance, workers=workers)
+
+        feedback.pushInfo(self.tr('Building spatial index'))
+        checker.build_index(feedback)
+        if feedback.isCanceled():
+            return {}
+
+        def _add_result(result: Inconsistency):
+            feature = QgsFeature(fields)
+            feature.setAttributes([result.fid, result.vertex_number, result.neighbor_fid])
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(result.x, result.y)))
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+
+        feedback.pushInfo(self.tr('Comparing neighboring features'))
+        checker.run(_add_result, feedback)
+
+        return {self.OUTPUT: dest_id}
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Aligned vertex model Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtCore import Qt
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry
+)
+
+from vertex_compare.core.aligned_vertex_model import AlignedVertexModel
+from vertex_compare.core.vertex_diff import (
+    VertexDiffer,
+    vertex_diff
+)
+from vertex_compare.core.vertex_model import VertexModel
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def vertex_model(wkt: str) -> VertexModel:
+    """
+    Returns a vertex model for a feature with the specified geometry
+    """
+    feature = QgsFeature()
+    feature.setGeometry(QgsGeometry.fromWkt(wkt))
+    model = VertexModel()
+    model.set_feature(feature)
+    return model
+
+
+class AlignedVertexModelTest(unittest.TestCase):
+    """Test AlignedVertexModel works."""
+
+    def testAlignment(self):
+        """
+        Test aligning vertices from two features
+        """
+        model1 = vertex_model('LineString (1 0, 2 0, 3 0, 4 0)')
+        model2 = vertex_model('LineString (1 0, 5 0, 2 0, 3.5 0)')
+
+        aligned1 = AlignedVertexModel(AlignedVertexModel.FIRST)
+        aligned1.setSourceModel(model1)
+        aligned2 = AlignedVertexModel(AlignedVertexModel.SECOND)
+        aligned2.setSourceModel(model2)
+
+        # unaligned
+        self.assertEqual(aligned1.rowCount(), 4)
+        self.assertEqual(aligned1.source_row(2), 2)
+        self.assertIsNone(aligned1.operation(2))
+        self.assertEqual(aligned1.source_ranges(1, 3), [(1, 3)])
+        self.assertEqual(aligned1.source_ranges(2, 10), [(2, 4)])
+
+        diff = vertex_diff(model1.vertices, model2.vertices)
+        aligned1.set_diff(diff)
+        aligned2.set_diff(diff)
+
+        self.assertEqual(aligned1.rowCount(), 5)
+        self.assertEqual(aligned2.rowCount(), 5)
+        self.assertEqual([aligned1.source_row(row) for row in range(5)], [0, None, 1, 2, 3])
+        self.assertEqual([aligned2.source_row(row) for row in range(5)], [0, 1, 2, 3, None])
+        self.assertEqual([aligned1.operation(row) for row in range(5)],
+                         [VertexDiffer.EQUAL, VertexDiffer.INSERT, VertexDiffer.EQUAL,
+                          VertexDiffer.MOVE, VertexDiffer.DELETE])
+        self.assertEqual([aligned1.aligned_row(row) for row in range(4)], [0, 2, 3, 4])
+        self.assertEqual([aligned2.aligned_row(row) for row in range(4)], [0, 1, 2, 3])
+
+        self.assertEqual(aligned1.data(aligned1.index(2, VertexModel.COLUMN_ID)), 2)
+        self.assertIsNone(aligned1.data(aligned1.index(1, VertexModel.COLUMN_ID)))
+        self.assertEqual(aligned2.data(aligned2.index(1, VertexModel.COLUMN_ID)), 2)
+        self.assertIsNone(aligned1.data(aligned1.index(0, 0), Qt.BackgroundRole))
+        self.assertEqual(aligned1.data(aligned1.index(1, 0), Qt.BackgroundRole), AlignedVertexModel.GAP_COLOR)
+        self.assertEqual(aligned2.data(aligned2.index(1, 0), Qt.BackgroundRole), AlignedVertexModel.INSERTED_COLOR)
+        self.assertEqual(aligned1.data(aligned1.index(3, 0), Qt.BackgroundRole), AlignedVertexModel.MOVED_COLOR)
+        self.assertEqual(aligned1.data(aligned1.index(4, 0), Qt.BackgroundRole), AlignedVertexModel.DELETED_COLOR)
+
+        self.assertEqual(aligned1.source_ranges(0, 5), [(0, 4)])
+        self.assertEqual(aligned1.source_ranges(1, 2), [])
+        self.assertEqual(aligned1.source_ranges(1, 4), [(1, 3)])
+        self.assertEqual(aligned2.source_ranges(3, 5), [(3, 4)])
+
+        # showing transformed coordinates only adds columns, so the alignment is kept
+        model1.set_destination_crs(QgsCoordinateReferenceSystem('EPSG:4326'))
+        self.assertIs(aligned1.runs, diff.runs)
+        self.assertEqual(aligned1.rowCount(), 5)
+        self.assertEqual(aligned1.columnCount(), model1.columnCount())
+
+        # changing the source vertices clears the alignment
+        model1.set_feature(None)
+        self.assertIsNone(aligned1.runs)
+        self.assertEqual(aligned1.rowCount(), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AlignedVertexModelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,93 @@
+# coding=utf-8
+"""Comparison API Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from vertex_compare.core.comparison import (
+    FeatureComparison,
+    compare_features,
+    compare_sources,
+    feature_vertices
+)
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class ComparisonTest(unittest.TestCase):
+    """Test the headless comparison API works."""
+
+    def testFeatureVertices(self):
+        """
+        Test retrieving feature vertices
+        """
+        layer = make_layer('LineString?field=key:integer',
+                           ['LineString (0 0, 1 1, 2 2)', 'LineString (0 0, 1 2)'],
+                           [[1], [2]])
+        vertices = feature_vertices(layer, [1, 2, 100])
+        self.assertEqual(sorted(vertices.keys()), [1, 2])
+        self.assertEqual(list(vertices[1].x), [0, 1, 2])
+        self.assertEqual(len(vertices[2]), 2)
+
+    def testCompareFeatures(self):
+        """
+        Test comparing two features
+        """
+        layer = make_layer('LineString?field=key:integer',
+                           ['LineString (0 0, 1 1, 2 2)', 'LineString (0 0, 1 2, 2 2)'],
+                           [[1], [2]])
+        self.assertEqual(compare_features(layer, 1, 2), FeatureComparison(1, 2, 3, 3, [2], [2]))
+        self.assertFalse(compare_features(layer, 1, 2).matches())
+        self.assertTrue(compare_features(layer, 1, 1).matches())
+        self.assertEqual(compare_features(layer, 1, 100), FeatureComparison(1, None, 3, 0, [1, 2, 3], []))
+
+        other = make_layer('LineString?field=key:integer', ['LineString (2 2, 1 1, 0 0)'], [[1]])
+        self.assertTrue(compare_features(layer, 1, 1, other).matches())
+
+    def testCompareSources(self):
+        """
+        Test comparing features against a reference layer
+        """
+        layer = make_layer('LineString?field=key:integer',
+                           ['LineString (0 0, 1 1, 2 2)', 'LineString (0 0, 1 2, 2 2)', 'LineString (5 5, 6 6)'],
+                           [[10], [20], [30]])
+        reference = make_layer('LineString?field=key:integer',
+                               ['LineString (0 0, 1 2, 2 2)', 'LineString (0 0, 1 1, 2 2)'],
+                               [[20], [10]])
+
+        # matched by feature id
+        self.assertEqual(list(compare_sources(layer, reference)),
+                         [FeatureComparison(1, 1, 3, 3, [], []),
+                          FeatureComparison(2, 2, 3, 3, [2], [2]),
+                          FeatureComparison(3, None, 2, 0, [1, 2], [])])
+
+        # matched by key field
+        self.assertEqual(list(compare_sources(layer, reference, key_field='key', batch_size=1)),
+                         [FeatureComparison(1, 2, 3, 3, [], []),
+                          FeatureComparison(2, 1, 3, 3, [], []),
+                          FeatureComparison(3, None, 2, 0, [1, 2], [])])
+
+        self.assertEqual(list(compare_sources(layer, reference, fids=[2])),
+                         [FeatureComparison(2, 2, 3, 3, [2], [2])])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ComparisonTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""Distance Metrics Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import unittest
+from array import array
+
+from qgis.core import QgsFeedback
+
+from vertex_compare.core.distance_metrics import (
+    DistanceResult,
+    directed_hausdorff_distance,
+    discrete_frechet_distance,
+    hausdorff_distance
+)
+from vertex_compare.core.vertex_array import VertexArray
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def points(*coordinates) -> VertexArray:
+    """
+    Returns a vertex array from a list of (x, y) tuples
+    """
+    return VertexArray(array('d', [c[0] for c in coordinates]), array('d', [c[1] for c in coordinates]))
+
+
+class DistanceMetricsTest(unittest.TestCase):
+    """Test distance metrics work."""
+
+    def testHausdorff(self):
+        """
+        Test Hausdorff distances
+        """
+        line1 = points((0, 0), (1, 0), (2, 0))
+        line2 = points((0, 1), (2, 1))
+        self.assertEqual(directed_hausdorff_distance(line1, line2), DistanceResult(math.sqrt(2), 1, 0))
+        self.assertEqual(directed_hausdorff_distance(line2, line1), DistanceResult(1, 0, 0))
+        self.assertEqual(hausdorff_distance(line1, line2), DistanceResult(math.sqrt(2), 1, 0))
+        self.assertEqual(hausdorff_distance(line2, line1), DistanceResult(math.sqrt(2), 0, 1))
+
+        self.assertEqual(hausdorff_distance(line1, line1).distance, 0)
+        self.assertIsNone(hausdorff_distance(line1, points()))
+
+    def testFrechet(self):
+        """
+        Test discrete Fréchet distances
+        """
+        line1 = points((0, 0), (1, 0), (2, 0), (3, 0))
+        self.assertEqual(discrete_frechet_distance(line1, line1), DistanceResult(0, 0, 0))
+        self.assertEqual(discrete_frechet_distance(line1, points((0, 1), (1, 1), (2, 1), (3, 1))).distance, 1)
+
+        # the Hausdorff distance ignores vertex order, but the Fréchet distance does not
+        reversed_line = points((3, 0), (2, 0), (1, 0), (0, 0))
+        self.assertEqual(hausdorff_distance(line1, reversed_line).distance, 0)
+        self.assertEqual(discrete_frechet_distance(line1, reversed_line), DistanceResult(3, 0, 0))
+
+        # different vertex counts
+        self.assertEqual(discrete_frechet_distance(line1, points((0, 0), (1, 2), (3, 0))),
+                         DistanceResult(2, 1, 1))
+        self.assertIsNone(discrete_frechet_distance(line1, points()))
+
+    def testFrechetMatchesDynamicProgramming(self):
+        """
+        Test that Fréchet distances match the classic dynamic programming solution
+        """
+
+        def _expected(vertices1, vertices2):
+            coupling = {}
+            for i in range(len(vertices1)):
+                for j in range(len(vertices2)):
+                    distance = math.hypot(vertices1.x[i] - vertices2.x[j], vertices1.y[i] - vertices2.y[j])
+                    previous = [coupling[cell] for cell in ((i - 1, j), (i - 1, j - 1), (i, j - 1))
+                                if cell in coupling]
+                    coupling[(i, j)] = max(min(previous), distance) if previous else distance
+            return coupling[(len(vertices1) - 1, len(vertices2) - 1)]
+
+        line1 = points(*[(i, (i * 7) % 5) for i in range(12)])
+        line2 = points(*[(i * 1.3, (i * 3) % 4) for i in range(9)])
+        result = discrete_frechet_distance(line1, line2)
+        self.assertAlmostEqual(result.distance, _expected(line1, line2))
+        self.assertAlmostEqual(math.hypot(line1.x[result.index1] - line2.x[result.index2],
+                                          line1.y[result.index1] - line2.y[result.index2]),
+                               result.distance)
+
+    def testCanceled(self):
+        """
+        Test canceling calculations
+        """
+        line = points(*[(i, 0) for i in range(5000)])
+        feedback = QgsFeedback()
+        feedback.cancel()
+        self.assertIsNone(hausdorff_distance(line, line, feedback))
+        self.assertIsNone(discrete_frechet_distance(line, line, feedback=feedback))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DistanceMetricsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
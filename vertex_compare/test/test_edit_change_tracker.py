@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Edit Change Tracker Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry
+)
+
+from vertex_compare.core.edit_change_tracker import EditChangeTracker
+from vertex_compare.core.vertex_diff import VertexDiffer
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class EditChangeTrackerTest(unittest.TestCase):
+    """Test edit change tracking works."""
+
+    def testNotEditing(self):
+        """
+        Test that no changes are reported outside of an edit session
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 1, 2 2, 3 3)'])
+        tracker = EditChangeTracker(layer)
+        self.assertEqual(tracker.changes, {})
+        tracker.detach()
+
+    def testChanges(self):
+        """
+        Test tracking moved, added and deleted vertices
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 1, 2 2, 3 3)'])
+        tracker = EditChangeTracker(layer)
+        spy = []
+        tracker.changed.connect(lambda: spy.append(1))
+
+        self.assertTrue(layer.startEditing())
+        self.assertEqual(tracker.changes, {})
+
+        # move a vertex
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 5, 2 2, 3 3)')))
+        tracker.flush()
+        self.assertEqual(tracker.changes[1].vertices, {2: VertexDiffer.MOVE})
+        self.assertEqual(tracker.changes[1].deleted, [])
+        self.assertEqual(len(spy), 1)
+
+        # add a vertex and delete another
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 1, 1.5 1.5, 2 2)')))
+        tracker.flush()
+        self.assertEqual(tracker.changes[1].vertices, {3: VertexDiffer.INSERT})
+        self.assertEqual(tracker.changes[1].deleted, [(4, 3.0, 3.0)])
+
+        # restoring the committed geometry clears the change
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 1, 2 2, 3 3)')))
+        tracker.flush()
+        self.assertEqual(tracker.changes, {})
+
+        # added features have all vertices added
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromWkt('LineString (5 5, 6 6)'))
+        self.assertTrue(layer.addFeature(feature))
+        self.assertEqual(tracker.changes[feature.id()].vertices, {1: VertexDiffer.INSERT, 2: VertexDiffer.INSERT})
+
+        layer.rollBack()
+        self.assertEqual(tracker.changes, {})
+        tracker.detach()
+
+    def testCoalesce(self):
+        """
+        Test that geometry changes are compared together, once the tracker's interval has passed
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 1, 2 2, 3 3)'])
+        tracker = EditChangeTracker(layer)
+        spy = []
+        tracker.changed.connect(lambda: spy.append(1))
+        self.assertTrue(layer.startEditing())
+
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 5, 2 2, 3 3)')))
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 6, 2 2, 3 3)')))
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 6, 2 7, 3 3)')))
+        self.assertTrue(tracker.has_pending())
+        self.assertTrue(tracker.timer.isActive())
+        self.assertEqual(tracker.changes, {})
+        self.assertEqual(spy, [])
+
+        tracker.flush()
+        self.assertFalse(tracker.has_pending())
+        self.assertEqual(tracker.changes[1].vertices, {2: VertexDiffer.MOVE, 3: VertexDiffer.MOVE})
+        self.assertEqual(len(spy), 1)
+
+        # flushing again does nothing
+        tracker.flush()
+        self.assertEqual(len(spy), 1)
+
+        # pending changes are discarded when the edits are rolled back
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 1)')))
+        layer.rollBack()
+        self.assertFalse(tracker.has_pending())
+        self.assertEqual(tracker.changes, {})
+        tracker.detach()
+
+    def testEditSessionInProgress(self):
+        """
+        Test that changes made before the tracker was created are picked up
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 1, 2 2, 3 3)'])
+        layer.startEditing()
+        layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (0 0, 1 1, 2 2)'))
+
+        tracker = EditChangeTracker(layer)
+        self.assertEqual(tracker.changes[1].vertices, {})
+        self.assertEqual(tracker.changes[1].deleted, [(4, 3.0, 3.0)])
+
+        layer.commitChanges()
+        self.assertEqual(tracker.changes, {})
+        tracker.detach()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(EditChangeTrackerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
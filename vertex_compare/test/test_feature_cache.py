@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Feature geometry cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.selection_snapshot import SelectionSnapshot
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class FeatureGeometryCacheTest(unittest.TestCase):
+    """Test FeatureGeometryCache works."""
+
+    def create_layer(self) -> QgsVectorLayer:
+        """
+        Creates a test layer
+        """
+        layer = QgsVectorLayer('LineString', 'test', 'memory')
+        features = []
+        for i in range(3):
+            f = QgsFeature()
+            f.setGeometry(QgsGeometry.fromWkt(f'LineString({i} 0, {i} 1, {i} 2)'))
+            features.append(f)
+        layer.dataProvider().addFeatures(features)
+        return layer
+
+    def testEviction(self):
+        """
+        Test that the cache is bounded by vertex count
+        """
+        layer = self.create_layer()
+        cache = FeatureGeometryCache(max_vertices=6)
+
+        # layer not watched, so nothing should be cached
+        cache.insert(layer.id(), 1, QgsGeometry.fromWkt('LineString(0 0, 1 1, 2 2)'))
+        self.assertIsNone(cache.geometry(layer.id(), 1))
+
+        cache.watch_layer(layer)
+        cache.insert(layer.id(), 1, QgsGeometry.fromWkt('LineString(0 0, 1 1, 2 2)'))
+        cache.insert(layer.id(), 2, QgsGeometry.fromWkt('LineString(0 0, 1 1, 2 2)'))
+        self.assertEqual(cache.vertex_count, 6)
+        # touch 1, so that 2 is the least recently used
+        self.assertIsNotNone(cache.geometry(layer.id(), 1))
+        cache.insert(layer.id(), 3, QgsGeometry.fromWkt('LineString(0 0, 1 1, 2 2)'))
+        self.assertEqual(cache.vertex_count, 6)
+        self.assertIsNotNone(cache.geometry(layer.id(), 1))
+        self.assertIsNone(cache.geometry(layer.id(), 2))
+        self.assertIsNotNone(cache.geometry(layer.id(), 3))
+
+        cache.unwatch_layer(layer)
+        self.assertEqual(cache.vertex_count, 0)
+
+    def testInvalidateOnEdit(self):
+        """
+        Test that cached geometries are discarded when features are edited
+        """
+        layer = self.create_layer()
+        cache = FeatureGeometryCache()
+        cache.watch_layer(layer)
+
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 2], cache)
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (0 0, 0 1, 0 2)')
+        self.assertIsNotNone(cache.geometry(layer.id(), 1))
+
+        layer.startEditing()
+        layer.changeGeometry(1, QgsGeometry.fromWkt('LineString(5 5, 6 6)'))
+        self.assertIsNone(cache.geometry(layer.id(), 1))
+        self.assertIsNotNone(cache.geometry(layer.id(), 2))
+
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 2], cache)
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (5 5, 6 6)')
+
+        layer.rollBack()
+        self.assertIsNone(cache.geometry(layer.id(), 2))
+
+    def testGeneration(self):
+        """
+        Test that geometries fetched before a layer was edited are not cached
+        """
+        layer = self.create_layer()
+        cache = FeatureGeometryCache()
+        cache.watch_layer(layer)
+        geometry = QgsGeometry.fromWkt('LineString(0 0, 0 1, 0 2)')
+
+        generation = cache.generation(layer.id())
+        layer.startEditing()
+        layer.changeGeometry(2, QgsGeometry.fromWkt('LineString(5 5, 6 6)'))
+        cache.insert(layer.id(), 1, geometry, generation)
+        self.assertIsNone(cache.geometry(layer.id(), 1))
+
+        generation = cache.generation(layer.id())
+        cache.insert(layer.id(), 1, geometry, generation)
+        self.assertIsNotNone(cache.geometry(layer.id(), 1))
+
+        layer.rollBack()
+        cache.insert(layer.id(), 1, geometry, generation)
+        self.assertIsNone(cache.geometry(layer.id(), 1))
+
+        generation = cache.generation(layer.id())
+        cache.clear()
+        cache.insert(layer.id(), 1, geometry, generation)
+        self.assertIsNone(cache.geometry(layer.id(), 1))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FeatureGeometryCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Feature model Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtTest import QSignalSpy
+
+from vertex_compare.core.feature_model import FeatureModel
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+def model_ids(model: FeatureModel):
+    """
+    Returns the feature ids shown in a model, in row order
+    """
+    return [model.data(model.index(row, 0), FeatureModel.FEATURE_ID_ROLE) for row in range(model.rowCount())]
+
+
+class FeatureModelTest(unittest.TestCase):
+    """Test FeatureModel works."""
+
+    def testAddRemoveFeatureIds(self):
+        """
+        Test incrementally adding and removing features
+        """
+        layer = make_layer('LineString', [f'LineString (0 {i}, 1 {i})' for i in range(6)])
+        model = FeatureModel()
+        model.set_feature_ids(layer, [1, 2])
+        self.assertEqual(model_ids(model), [1, 2])
+
+        inserted_spy = QSignalSpy(model.rowsInserted)
+        model.add_feature_ids(layer, [2, 3, 4])
+        # existing features are not added again
+        self.assertEqual(model_ids(model), [1, 2, 3, 4])
+        self.assertEqual(model.fids, [1, 2, 3, 4])
+        self.assertEqual(len(inserted_spy), 1)
+        self.assertEqual(inserted_spy[0][1], 2)
+        self.assertEqual(inserted_spy[0][2], 3)
+
+        # nothing new
+        model.add_feature_ids(layer, [1, 4])
+        self.assertEqual(len(inserted_spy), 1)
+        # missing features are skipped
+        model.add_feature_ids(layer, [100])
+        self.assertEqual(model_ids(model), [1, 2, 3, 4])
+
+        removed_spy = QSignalSpy(model.rowsRemoved)
+        model.add_feature_ids(layer, [5])
+        model.remove_feature_ids([1, 3, 4, 100])
+        self.assertEqual(model_ids(model), [2, 5])
+        self.assertEqual(model.fids, [2, 5])
+        # one block of rows for 3-4, another for 1
+        self.assertEqual(len(removed_spy), 2)
+        self.assertEqual((removed_spy[0][1], removed_spy[0][2]), (2, 3))
+        self.assertEqual((removed_spy[1][1], removed_spy[1][2]), (0, 0))
+
+        model.remove_feature_ids([])
+        self.assertEqual(len(removed_spy), 2)
+
+        self.assertEqual(model.index_from_id(5).row(), 1)
+        self.assertFalse(model.index_from_id(1).isValid())
+        self.assertEqual(model.data(model.index(1, 0), FeatureModel.FEATURE_ROLE).id(), 5)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FeatureModelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
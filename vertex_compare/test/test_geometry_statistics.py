@@ -0,0 +1,185 @@
+# coding=utf-8
+"""Geometry statistics Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+from array import array
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeedback,
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.geometry_statistics import (
+    CANCELLATION_CHECK_INTERVAL,
+    geometry_statistics
+)
+from vertex_compare.core.geometry_statistics_cache import GeometryStatisticsCache
+from vertex_compare.core.vertex_array import VertexArray
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def statistics(wkt: str):
+    """
+    Returns the statistics for a WKT geometry
+    """
+    return geometry_statistics(VertexArray.from_geometry(QgsGeometry.fromWkt(wkt)))
+
+
+class GeometryStatisticsTest(unittest.TestCase):
+    """Test geometry statistics."""
+
+    def testLine(self):
+        """
+        Test statistics for lines
+        """
+        res = statistics('MultiLineString ((0 0, 3 4, 3 4, 3 5), (10 10, 10 12))')
+        self.assertEqual(res.vertex_count, 6)
+        self.assertEqual(res.part_count, 2)
+        self.assertEqual(res.ring_count, 2)
+        self.assertEqual(res.part_vertex_counts, [4, 2])
+        self.assertEqual(res.bounds, (0, 0, 10, 12))
+        self.assertEqual(res.length, 8)
+        self.assertEqual(res.segment_count, 4)
+        self.assertEqual(res.min_segment_length, 0)
+        self.assertEqual(res.max_segment_length, 5)
+        self.assertEqual(res.mean_segment_length(), 2)
+        self.assertEqual(res.duplicate_vertex_count, 1)
+
+    def testPolygon(self):
+        """
+        Test statistics for polygons
+        """
+        res = statistics('MultiPolygon (((0 0, 10 0, 10 10, 0 10, 0 0), (2 2, 3 2, 3 3, 2 2)), '
+                         '((20 0, 21 0, 21 1, 20 0)))')
+        self.assertEqual(res.vertex_count, 13)
+        self.assertEqual(res.part_count, 2)
+        self.assertEqual(res.ring_count, 3)
+        self.assertEqual(res.part_vertex_counts, [9, 4])
+        self.assertEqual(res.bounds, (0, 0, 21, 10))
+        self.assertAlmostEqual(res.length, 40 + 2 * (2 + 2 ** 0.5))
+        self.assertEqual(res.segment_count, 10)
+        self.assertEqual(res.min_segment_length, 1)
+        self.assertEqual(res.max_segment_length, 10)
+        self.assertEqual(res.duplicate_vertex_count, 0)
+
+    def testEmpty(self):
+        """
+        Test statistics for empty geometries
+        """
+        res = geometry_statistics(VertexArray.from_geometry(None))
+        self.assertEqual(res.vertex_count, 0)
+        self.assertIsNone(res.bounds)
+        self.assertIsNone(res.mean_segment_length())
+
+        res = statistics('Point (1 2)')
+        self.assertEqual(res.vertex_count, 1)
+        self.assertEqual(res.bounds, (1, 2, 1, 2))
+        self.assertEqual(res.segment_count, 0)
+        self.assertIsNone(res.min_segment_length)
+
+    def testLargeRings(self):
+        """
+        Test statistics for rings spanning several blocks of vertices
+        """
+        count = CANCELLATION_CHECK_INTERVAL * 2 + 3
+        x = array('d', range(count)) + array('d', range(count))
+        y = array('d', [0]) * count + array('d', [5]) * count
+        rings = array('i', [0]) * count + array('i', [1]) * count
+        res = geometry_statistics(VertexArray(x, y, rings=rings))
+        self.assertEqual(res.vertex_count, count * 2)
+        self.assertEqual(res.part_count, 1)
+        self.assertEqual(res.ring_count, 2)
+        self.assertEqual(res.part_vertex_counts, [count * 2])
+        self.assertEqual(res.bounds, (0, 0, count - 1, 5))
+        self.assertEqual(res.length, 2 * (count - 1))
+        self.assertEqual(res.segment_count, 2 * (count - 1))
+        self.assertEqual(res.min_segment_length, 1)
+        self.assertEqual(res.max_segment_length, 1)
+        self.assertEqual(res.duplicate_vertex_count, 0)
+
+    def testCanceled(self):
+        """
+        Test canceling the calculation
+        """
+        feedback = QgsFeedback()
+        feedback.cancel()
+        self.assertIsNone(geometry_statistics(
+            VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (0 0, 1 1)')), feedback))
+
+    def testCache(self):
+        """
+        Test caching statistics
+        """
+        layer = QgsVectorLayer('LineString?field=name:string', 'test', 'memory')
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromWkt('LineString (0 0, 1 1)'))
+        self.assertTrue(layer.dataProvider().addFeature(feature))
+        fid = next(layer.getFeatures()).id()
+
+        cache = GeometryStatisticsCache()
+        res = statistics('LineString (0 0, 1 1)')
+        # only the current layer's statistics are cached
+        cache.insert(layer.id(), fid, res)
+        self.assertIsNone(cache.statistics(layer.id(), fid))
+
+        cache.set_layer(layer)
+        cache.insert(layer.id(), fid, res)
+        self.assertEqual(cache.statistics(layer.id(), fid), res)
+
+        # edits discard cached statistics
+        layer.startEditing()
+        self.assertTrue(layer.changeGeometry(fid, QgsGeometry.fromWkt('LineString (0 0, 2 2)')))
+        self.assertIsNone(cache.statistics(layer.id(), fid))
+
+        # statistics calculated before an edit are not cached
+        generation = cache.generation(fid)
+        self.assertTrue(layer.changeGeometry(fid, QgsGeometry.fromWkt('LineString (0 0, 3 3)')))
+        cache.insert(layer.id(), fid, res, generation)
+        self.assertIsNone(cache.statistics(layer.id(), fid))
+        cache.insert(layer.id(), fid, res, cache.generation(fid))
+        self.assertEqual(cache.statistics(layer.id(), fid), res)
+
+        # attribute edits keep cached statistics
+        self.assertTrue(layer.changeAttributeValue(fid, 0, 'a'))
+        self.assertEqual(cache.statistics(layer.id(), fid), res)
+
+        layer.rollBack()
+        self.assertIsNone(cache.statistics(layer.id(), fid))
+
+        cache.insert(layer.id(), fid, res)
+        cache.set_layer(None)
+        self.assertIsNone(cache.statistics(layer.id(), fid))
+
+        # least recently used statistics are discarded
+        cache = GeometryStatisticsCache(max_entries=2)
+        cache.set_layer(layer)
+        cache.insert(layer.id(), 1, res)
+        cache.insert(layer.id(), 2, res)
+        self.assertEqual(cache.statistics(layer.id(), 1), res)
+        cache.insert(layer.id(), 3, res)
+        self.assertIsNone(cache.statistics(layer.id(), 2))
+        self.assertEqual(cache.statistics(layer.id(), 1), res)
+        self.assertEqual(cache.statistics(layer.id(), 3), res)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GeometryStatisticsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
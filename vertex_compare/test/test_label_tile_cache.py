@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Label tile cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtGui import QImage
+
+from vertex_compare.core.label_tile_cache import LabelTileCache
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class LabelTileCacheTest(unittest.TestCase):
+    """Test LabelTileCache works."""
+
+    def testInsert(self):
+        """
+        Test inserting and retrieving tiles
+        """
+        cache = LabelTileCache()
+        self.assertEqual(cache.tile(('a', 0, 0)), (False, None))
+
+        image = QImage(10, 10, QImage.Format_ARGB32)
+        cache.insert(cache.generation, ('a', 0, 0), image)
+        cache.insert(cache.generation, ('a', 0, 1), None)
+        self.assertEqual(cache.tile(('a', 0, 0)), (True, image))
+        # empty tiles are cached too
+        self.assertEqual(cache.tile(('a', 0, 1)), (True, None))
+        self.assertEqual(cache.image_count, 1)
+
+    def testClear(self):
+        """
+        Test that tiles from renders started before the cache was cleared are discarded
+        """
+        cache = LabelTileCache()
+        generation = cache.generation
+        cache.insert(generation, ('a', 0, 0), None)
+        cache.clear()
+        self.assertEqual(cache.tile(('a', 0, 0)), (False, None))
+
+        cache.insert(generation, ('a', 0, 0), None)
+        self.assertEqual(cache.tile(('a', 0, 0)), (False, None))
+
+    def testEviction(self):
+        """
+        Test that the least recently used tiles are evicted
+        """
+        cache = LabelTileCache(max_tiles=2)
+        images = [QImage(10, 10, QImage.Format_ARGB32) for _ in range(3)]
+        cache.insert(cache.generation, ('a', 0, 0), images[0])
+        cache.insert(cache.generation, ('a', 0, 1), images[1])
+        cache.tile(('a', 0, 0))
+        cache.insert(cache.generation, ('a', 0, 2), images[2])
+
+        self.assertEqual(cache.image_count, 2)
+        self.assertTrue(cache.tile(('a', 0, 0))[0])
+        self.assertFalse(cache.tile(('a', 0, 1))[0])
+        self.assertTrue(cache.tile(('a', 0, 2))[0])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(LabelTileCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Reference Layer Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsGeometry,
+    QgsProject
+)
+
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.reference_layer import ReferenceLayer
+from vertex_compare.core.vertex_array import VertexArray
+from .utilities import (
+    get_qgis_app,
+    make_layer,
+    process_events_until
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class ReferenceLayerTest(unittest.TestCase):
+    """Test comparisons against reference layers work."""
+
+    def testTransformed(self):
+        """
+        Test transforming vertex arrays
+        """
+        vertices = VertexArray.from_geometry(QgsGeometry.fromWkt('MultiLineString ((0 0, 1 1),(10 10, 11 11))'))
+        transform = QgsCoordinateTransform(QgsCoordinateReferenceSystem('EPSG:4326'),
+                                           QgsCoordinateReferenceSystem('EPSG:3857'),
+                                           QgsProject.instance())
+        transformed = vertices.transformed(transform)
+        self.assertEqual(len(transformed), 4)
+        self.assertEqual(list(transformed.parts), [0, 0, 1, 1])
+        self.assertAlmostEqual(transformed.x[1], 111319.49, 1)
+        self.assertAlmostEqual(transformed.y[1], 111325.14, 1)
+
+        # no transform required
+        self.assertIs(vertices.transformed(QgsCoordinateTransform()), vertices)
+
+    def testCandidates(self):
+        """
+        Test finding candidate reference features and uncommon vertices
+        """
+        reference = make_layer('Polygon?crs=EPSG:3857', ['Polygon ((0 0, 2 0, 2 2, 0 2, 0 0))',
+                                                         'Polygon ((10 10, 12 10, 12 12, 10 10))'])
+        layer = make_layer('Polygon?crs=EPSG:3857', ['Polygon ((2 0, 4 0, 4 2, 2 2, 2 1, 2 0))',
+                                                     'Polygon ((20 20, 22 20, 22 22, 20 20))'])
+        geometries = {f.id(): f.geometry() for f in layer.getFeatures()}
+
+        reference_layer = ReferenceLayer(reference)
+        self.assertIsNone(reference_layer.index)
+        # the index is built in the background
+        self.assertIsNone(reference_layer.candidates(layer.crs()))
+        self.assertTrue(process_events_until(lambda: reference_layer.index is not None))
+        candidates = reference_layer.candidates(layer.crs())
+        self.assertEqual(candidates.matches(geometries), {1: [1], 2: []})
+        self.assertEqual(list(candidates.index.geometries([1]).keys()), [1])
+        self.assertEqual(candidates.tolerance, 0)
+
+        self.assertEqual(candidates.uncommon_vertices(geometries), {1: [2, 3, 5], 2: [1, 2, 3, 4]})
+        # transformed reference vertices are reused by later candidates
+        self.assertIs(reference_layer.candidates(layer.crs()).vertex_cache, candidates.vertex_cache)
+
+        # the index and vertices are rebuilt after the reference layer changes
+        reference.startEditing()
+        reference.changeGeometry(1, QgsGeometry.fromWkt('Polygon ((0 0, 2 0, 2 1, 2 2, 0 2, 0 0))'))
+        self.assertIsNone(reference_layer.index)
+        self.assertIsNone(reference_layer.candidates(layer.crs()))
+        self.assertTrue(process_events_until(lambda: reference_layer.index is not None))
+        changed = reference_layer.candidates(layer.crs())
+        self.assertIsNot(changed.vertex_cache, candidates.vertex_cache)
+        self.assertEqual(changed.uncommon_vertices(geometries), {1: [2, 3], 2: [1, 2, 3, 4]})
+        # earlier candidates keep comparing against the features their index was built from
+        self.assertEqual(candidates.uncommon_vertices(geometries), {1: [2, 3, 5], 2: [1, 2, 3, 4]})
+        reference.rollBack()
+        reference_layer.detach()
+
+    def testReprojected(self):
+        """
+        Test comparing against a reference layer in a different CRS
+        """
+        reference = make_layer('Polygon?crs=EPSG:4326', ['Polygon ((0 0, 2 0, 2 2, 0 2, 0 0))'])
+        transform = QgsCoordinateTransform(reference.crs(), QgsCoordinateReferenceSystem('EPSG:3857'),
+                                           QgsProject.instance())
+        neighbor = QgsGeometry.fromWkt('Polygon ((2 0, 4 0, 4 2, 2 2, 2 0))')
+        neighbor.transform(transform)
+        layer = make_layer('Polygon?crs=EPSG:3857', [neighbor.asWkt(17)])
+        geometries = {f.id(): f.geometry() for f in layer.getFeatures()}
+
+        reference_layer = ReferenceLayer(reference)
+        reference_layer.spatial_index()
+        self.assertTrue(process_events_until(lambda: reference_layer.index is not None))
+        cache = FeatureGeometryCache()
+        cache.watch_layer(reference)
+        candidates = reference_layer.candidates(layer.crs(), cache)
+        self.assertEqual(candidates.matches(geometries), {1: [1]})
+        self.assertGreater(candidates.tolerance, 0)
+        self.assertEqual(candidates.uncommon_vertices(geometries), {1: [2, 3]})
+        # fetched reference geometries are cached
+        self.assertIsNotNone(cache.geometry(reference.id(), 1))
+
+        # transforms are cached
+        self.assertIs(reference_layer.transform(layer.crs()), reference_layer.transform(layer.crs()))
+        cache.unwatch_layer(reference)
+        reference_layer.detach()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ReferenceLayerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Repaint scheduler Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtTest import QSignalSpy
+from qgis.core import QgsVectorLayer
+
+from vertex_compare.core.repaint_scheduler import RepaintScheduler
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class RepaintSchedulerTest(unittest.TestCase):
+    """Test RepaintScheduler works."""
+
+    def testCoalesce(self):
+        """
+        Tests that multiple repaint requests result in a single repaint
+        """
+        layer = QgsVectorLayer('LineString', 'test', 'memory')
+        self.assertTrue(layer.isValid())
+        spy = QSignalSpy(layer.repaintRequested)
+
+        scheduler = RepaintScheduler()
+        scheduler.schedule(layer)
+        scheduler.schedule(layer)
+        scheduler.schedule(layer)
+        self.assertTrue(scheduler.has_pending())
+        self.assertEqual(len(spy), 0)
+
+        self.assertTrue(spy.wait(1000))
+        self.assertEqual(len(spy), 1)
+        self.assertFalse(scheduler.has_pending())
+
+    def testFlushAndCancel(self):
+        """
+        Tests flushing and cancelling pending repaints
+        """
+        layer = QgsVectorLayer('LineString', 'test', 'memory')
+        layer2 = QgsVectorLayer('LineString', 'test2', 'memory')
+        spy = QSignalSpy(layer.repaintRequested)
+        spy2 = QSignalSpy(layer2.repaintRequested)
+
+        scheduler = RepaintScheduler(100)
+        self.assertEqual(scheduler.interval(), 100)
+        scheduler.schedule(layer)
+        scheduler.schedule(layer2)
+        scheduler.cancel(layer2)
+        scheduler.flush()
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(len(spy2), 0)
+        self.assertFalse(scheduler.has_pending())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RepaintSchedulerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
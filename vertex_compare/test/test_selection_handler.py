@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Selection handler Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtTest import QSignalSpy
+from qgis.core import QgsVectorLayer
+
+from vertex_compare.gui.selection_handler import SelectionHandler
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class SelectionHandlerTest(unittest.TestCase):
+    """Test SelectionHandler works."""
+
+    @staticmethod
+    def make_layer() -> QgsVectorLayer:
+        """
+        Creates a memory layer with five line features
+        """
+        return make_layer('LineString', [f'LineString (0 {i}, 1 {i})' for i in range(5)])
+
+    def testSetLayer(self):
+        """
+        Test that the complete selection is reported when the watched layer changes
+        """
+        layer = self.make_layer()
+        layer.selectByIds([1, 2])
+
+        handler = SelectionHandler(None)
+        spy = QSignalSpy(handler.selection_changed)
+        handler.set_layer(layer)
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(spy[0][0], layer)
+        self.assertCountEqual(spy[0][1], [1, 2])
+
+        # setting the same layer again is a no-op
+        handler.set_layer(layer)
+        self.assertEqual(len(spy), 1)
+
+        handler.set_layer(None)
+        self.assertEqual(len(spy), 2)
+        self.assertEqual(spy[1][1], [])
+
+    def testCoalesce(self):
+        """
+        Test that a burst of selection changes is reported as a single net change
+        """
+        layer = self.make_layer()
+        handler = SelectionHandler(None, 50)
+        handler.set_layer(layer)
+        spy = QSignalSpy(handler.selection_delta_changed)
+
+        layer.selectByIds([1, 2])
+        layer.selectByIds([2, 3])
+        layer.selectByIds([3, 4])
+        self.assertEqual(len(spy), 0)
+
+        self.assertTrue(spy.wait(1000))
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(spy[0][1], [3, 4])
+        self.assertEqual(spy[0][2], [1, 2])
+
+    def testReselectThenDeselect(self):
+        """
+        Test that re-selecting an already selected feature and then deselecting it
+        within a single burst reports the feature as removed
+        """
+        layer = self.make_layer()
+        layer.selectByIds([1, 2])
+
+        handler = SelectionHandler(None)
+        handler.set_layer(layer)
+        spy = QSignalSpy(handler.selection_delta_changed)
+
+        # the selected ids reported for an add-to-selection include already selected features
+        layer.selectByIds([1, 3], QgsVectorLayer.AddToSelection)
+        layer.deselect(1)
+        handler.flush()
+
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(spy[0][1], [3])
+        self.assertEqual(spy[0][2], [1])
+
+    def testNoNetChange(self):
+        """
+        Test that a feature selected and deselected within a burst is never reported as added
+        """
+        layer = self.make_layer()
+        handler = SelectionHandler(None)
+        handler.set_layer(layer)
+        spy = QSignalSpy(handler.selection_delta_changed)
+
+        layer.select(1)
+        layer.deselect(1)
+        handler.flush()
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(spy[0][1], [])
+
+        # nothing pending
+        handler.flush()
+        self.assertEqual(len(spy), 1)
+
+    def testUnwatchedLayer(self):
+        """
+        Test that changes in layers which are no longer watched are discarded
+        """
+        layer = self.make_layer()
+        handler = SelectionHandler(None)
+        handler.set_layer(layer)
+        spy = QSignalSpy(handler.selection_delta_changed)
+
+        layer.selectByIds([1])
+        handler.set_layer(None)
+        layer.selectByIds([2])
+        handler.flush()
+        self.assertEqual(len(spy), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SelectionHandlerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
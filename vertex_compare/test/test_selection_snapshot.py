@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Selection snapshot Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry
+)
+
+from vertex_compare.core.feature_cache import FeatureGeometryCache
+from vertex_compare.core.selection_snapshot import SelectionSnapshot
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class SelectionSnapshotTest(unittest.TestCase):
+    """Test SelectionSnapshot works."""
+
+    def testFromProvider(self):
+        """
+        Test creating a snapshot of unedited features
+        """
+        layer = make_layer('LineString', [f'LineString ({i} 0, {i} 1)' for i in range(4)])
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 3, 100])
+        self.assertCountEqual(snapshot.fids(), [1, 3])
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.geometry(3).asWkt(), 'LineString (2 0, 2 1)')
+        self.assertIsNone(snapshot.geometry(2))
+        self.assertEqual(list(snapshot.subset([1, 2]).keys()), [1])
+
+    def testEditBuffer(self):
+        """
+        Test that snapshots reflect the layer's edit buffer
+        """
+        layer = make_layer('LineString', [f'LineString ({i} 0, {i} 1)' for i in range(4)])
+        self.assertTrue(layer.startEditing())
+
+        # changed geometry
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (10 0, 10 1, 10 2)')))
+        # deleted feature
+        self.assertTrue(layer.deleteFeature(2))
+        # added feature
+        added = QgsFeature(layer.fields())
+        added.setGeometry(QgsGeometry.fromWkt('LineString (20 0, 20 1)'))
+        self.assertTrue(layer.addFeature(added))
+        added_fid = added.id()
+        self.assertLess(added_fid, 0)
+
+        # 100 does not exist in the provider or the edit buffer
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 2, 3, added_fid, 100])
+        self.assertCountEqual(snapshot.fids(), [1, 3, added_fid])
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (10 0, 10 1, 10 2)')
+        # unedited feature comes from the provider
+        self.assertEqual(snapshot.geometry(3).asWkt(), 'LineString (2 0, 2 1)')
+        self.assertEqual(snapshot.geometry(added_fid).asWkt(), 'LineString (20 0, 20 1)')
+        self.assertIsNone(snapshot.geometry(2))
+
+        # snapshots are not affected by later edits
+        self.assertTrue(layer.changeGeometry(added_fid, QgsGeometry.fromWkt('LineString (30 0, 30 1)')))
+        self.assertTrue(layer.changeGeometry(1, QgsGeometry.fromWkt('LineString (40 0, 40 1)')))
+        self.assertEqual(snapshot.geometry(added_fid).asWkt(), 'LineString (20 0, 20 1)')
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (10 0, 10 1, 10 2)')
+
+        # changing the geometry of an added feature updates the added feature, not the changed geometries
+        snapshot = SelectionSnapshot.from_layer(layer, [1, added_fid])
+        self.assertEqual(snapshot.geometry(added_fid).asWkt(), 'LineString (30 0, 30 1)')
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (40 0, 40 1)')
+
+        layer.rollBack()
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 2, added_fid])
+        self.assertCountEqual(snapshot.fids(), [1, 2])
+        self.assertEqual(snapshot.geometry(1).asWkt(), 'LineString (0 0, 0 1)')
+
+    def testCache(self):
+        """
+        Test that snapshots use and populate a geometry cache
+        """
+        layer = make_layer('LineString', [f'LineString ({i} 0, {i} 1)' for i in range(2)])
+        cache = FeatureGeometryCache()
+        cache.watch_layer(layer)
+
+        SelectionSnapshot.from_layer(layer, [1], cache)
+        self.assertEqual(cache.geometry(layer.id(), 1).asWkt(), 'LineString (0 0, 0 1)')
+
+        # cached geometries are used in preference to fetching from the layer
+        cache.insert(layer.id(), 2, QgsGeometry.fromWkt('LineString (5 5, 6 6)'))
+        snapshot = SelectionSnapshot.from_layer(layer, [1, 2], cache)
+        self.assertEqual(snapshot.geometry(2).asWkt(), 'LineString (5 5, 6 6)')
+
+    def testDeferred(self):
+        """
+        Test snapshots which defer fetching geometries from the provider
+        """
+        layer = make_layer('LineString', [f'LineString ({i} 0, {i} 1)' for i in range(3)])
+        cache = FeatureGeometryCache()
+        cache.watch_layer(layer)
+        cache.insert(layer.id(), 1, QgsGeometry.fromWkt('LineString (5 5, 6 6)'))
+        layer.startEditing()
+        self.assertTrue(layer.changeGeometry(2, QgsGeometry.fromWkt('LineString (7 7, 8 8)')))
+
+        # cached and edited geometries are taken immediately, the rest only when fetched
+        snapshot = SelectionSnapshot.deferred(layer, [1, 2, 3], cache)
+        self.assertEqual(set(snapshot.fids()), {1, 2})
+        self.assertEqual(snapshot.geometry(2).asWkt(), 'LineString (7 7, 8 8)')
+        self.assertIsNone(cache.geometry(layer.id(), 3))
+
+        snapshot.fetch()
+        self.assertEqual(set(snapshot.fids()), {1, 2, 3})
+        self.assertEqual(snapshot.geometry(3).asWkt(), 'LineString (2 0, 2 1)')
+        self.assertEqual(cache.geometry(layer.id(), 3).asWkt(), 'LineString (2 0, 2 1)')
+
+        # geometries fetched after the cached geometry was invalidated are not cached
+        snapshot = SelectionSnapshot.deferred(layer, [3], cache)
+        cache.invalidate(layer.id(), 3)
+        snapshot.fetch()
+        self.assertEqual(snapshot.geometry(3).asWkt(), 'LineString (2 0, 2 1)')
+        self.assertIsNone(cache.geometry(layer.id(), 3))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SelectionSnapshotTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
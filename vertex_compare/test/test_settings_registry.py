@@ -0,0 +1,98 @@
+# coding=utf-8
+"""Settings registry Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtTest import QSignalSpy
+from qgis.core import QgsSettings
+
+from vertex_compare.core.settings_registry import (
+    SettingsRegistry,
+    SETTINGS_REGISTRY
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class SettingsRegistryTest(unittest.TestCase):
+    """Test SettingsRegistry works."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Redirects settings to a test specific location, so that the user's settings are untouched
+        """
+        cls.organization_name = QCoreApplication.organizationName()
+        cls.organization_domain = QCoreApplication.organizationDomain()
+        cls.application_name = QCoreApplication.applicationName()
+        QCoreApplication.setOrganizationName('QGIS_Test')
+        QCoreApplication.setOrganizationDomain('VertexCompareTest.com')
+        QCoreApplication.setApplicationName('VertexCompareSettingsRegistryTest')
+        QgsSettings().clear()
+        SettingsRegistry.reload()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Discards the test settings and restores the original settings location
+        """
+        QgsSettings().clear()
+        QCoreApplication.setOrganizationName(cls.organization_name)
+        QCoreApplication.setOrganizationDomain(cls.organization_domain)
+        QCoreApplication.setApplicationName(cls.application_name)
+        SettingsRegistry.reload()
+
+    def testCachedValues(self):
+        """
+        Tests that values are cached and change notifications are sent
+        """
+        spy = QSignalSpy(SETTINGS_REGISTRY.setting_changed)
+
+        SettingsRegistry.set_label_filtering(SettingsRegistry.LABEL_SELECTED)
+        self.assertEqual(SettingsRegistry.label_filtering(), SettingsRegistry.LABEL_SELECTED)
+        self.assertEqual(len(spy), 1)
+        self.assertEqual(spy[-1][0], SettingsRegistry.LABELS)
+
+        # setting the same value again should not notify
+        SettingsRegistry.set_label_filtering(SettingsRegistry.LABEL_SELECTED)
+        self.assertEqual(len(spy), 1)
+
+        # changes made directly to QgsSettings are only picked up after a reload
+        QgsSettings().setValue('vertex_compare/labels', SettingsRegistry.LABEL_NONE, QgsSettings.Plugins)
+        self.assertEqual(SettingsRegistry.label_filtering(), SettingsRegistry.LABEL_SELECTED)
+        SettingsRegistry.reload()
+        self.assertEqual(len(spy), 2)
+        self.assertEqual(SettingsRegistry.label_filtering(), SettingsRegistry.LABEL_NONE)
+
+    def testClones(self):
+        """
+        Tests that cached objects are returned as copies
+        """
+        text_format = SettingsRegistry.vertex_format()
+        text_format.setSize(77)
+        self.assertNotEqual(SettingsRegistry.vertex_format().size(), 77)
+
+        symbol = SettingsRegistry.vertex_symbol()
+        symbol.setSize(77)
+        self.assertNotEqual(SettingsRegistry.vertex_symbol().size(), 77)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SettingsRegistryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Topology Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.layer_consistency import LayerConsistencyChecker
+from vertex_compare.core.topology import (
+    Inconsistency,
+    boundary_inconsistencies,
+    check_pairs,
+    check_pairs_from_buffers,
+    uncommon_reference_vertices,
+    uncommon_vertices,
+    vertex_buffers
+)
+from vertex_compare.core.vertex_array import VertexArray
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+SQUARE = 'Polygon ((0 0, 2 0, 2 2, 0 2, 0 0))'
+NEIGHBOR = 'Polygon ((2 0, 4 0, 4 2, 2 2, 2 1, 2 0))'
+DISTANT = 'Polygon ((10 10, 12 10, 12 12, 10 10))'
+
+
+def vertices(wkt: str) -> VertexArray:
+    """
+    Returns a vertex array from WKT
+    """
+    return VertexArray.from_geometry(QgsGeometry.fromWkt(wkt))
+
+
+class TopologyTest(unittest.TestCase):
+    """Test topology comparisons work."""
+
+    def testUncommonVertices(self):
+        """
+        Test finding uncommon vertices
+        """
+        self.assertEqual(uncommon_vertices(vertices(SQUARE), vertices(NEIGHBOR)),
+                         ([1, 4, 5], [2, 3, 5]))
+
+    def testUncommonReferenceVertices(self):
+        """
+        Test finding vertices which are not coincident with reference vertices
+        """
+        self.assertEqual(uncommon_reference_vertices(vertices(SQUARE), []), [1, 2, 3, 4, 5])
+        self.assertEqual(uncommon_reference_vertices(vertices(NEIGHBOR), [vertices(SQUARE), vertices(DISTANT)]),
+                         [2, 3, 5])
+        self.assertEqual(uncommon_reference_vertices(vertices(NEIGHBOR),
+                                                     [vertices('LineString (2.001 0, 4 0.001)')]),
+                         [1, 2, 3, 4, 5, 6])
+        self.assertEqual(uncommon_reference_vertices(vertices(NEIGHBOR),
+                                                     [vertices('LineString (2.001 0, 4 0.001)')], 0.01),
+                         [3, 4, 5])
+
+    def testBoundaryInconsistencies(self):
+        """
+        Test finding vertices missing from neighboring features
+        """
+        self.assertEqual(boundary_inconsistencies(vertices(SQUARE), vertices(NEIGHBOR)), ([], [5]))
+        self.assertEqual(boundary_inconsistencies(vertices(NEIGHBOR), vertices(SQUARE)), ([5], []))
+        self.assertEqual(boundary_inconsistencies(vertices(SQUARE), vertices(DISTANT)), ([], []))
+
+        # vertex is slightly off the boundary
+        offset = 'Polygon ((2 0, 4 0, 4 2, 2 2, 2.001 1, 2 0))'
+        self.assertEqual(boundary_inconsistencies(vertices(SQUARE), vertices(offset)), ([], []))
+        self.assertEqual(boundary_inconsistencies(vertices(SQUARE), vertices(offset), 0.01), ([], [5]))
+
+        # vertices exactly on a boundary are found at tolerance 0, despite rounding errors in the segment distance
+        collinear = 'Polygon ((0 0, 2 0, 2.06 0.34, 2.3 1.7, 0 1.7, 0 0))'
+        sloped = 'Polygon ((2 0, 2.3 1.7, 4 1.7, 4 0, 2 0))'
+        self.assertEqual(boundary_inconsistencies(vertices(collinear), vertices(sloped)), ([3], []))
+        far = 'Polygon ((200000 0, 200002 0, 200002.06 0.34, 200002.3 1.7, 200000 1.7, 200000 0))'
+        far_sloped = 'Polygon ((200002 0, 200002.3 1.7, 200004 1.7, 200004 0, 200002 0))'
+        self.assertEqual(boundary_inconsistencies(vertices(far), vertices(far_sloped)), ([3], []))
+
+        # vertices within tolerance match
+        shifted = 'Polygon ((0 0, 2 0, 2 1.001, 2 2, 0 2, 0 0))'
+        self.assertEqual(boundary_inconsistencies(vertices(shifted), vertices(NEIGHBOR), 0.01), ([], []))
+
+    def testLayerChecker(self):
+        """
+        Test checking an entire layer
+        """
+        layer = QgsVectorLayer('Polygon', 'test', 'memory')
+        features = []
+        for wkt in (SQUARE, NEIGHBOR, DISTANT):
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromWkt(wkt))
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+
+        for chunk_size in (1, 100):
+            results = []
+            checker = LayerConsistencyChecker(layer, chunk_size=chunk_size)
+            checker.run(results.append)
+            self.assertEqual(results, [Inconsistency(2, 5, 1, 2.0, 1.0)])
+
+        # results from worker processes must match single process results
+        for chunk_size in (1, 100):
+            results = []
+            checker = LayerConsistencyChecker(layer, chunk_size=chunk_size, workers=2)
+            checker.run(results.append)
+            self.assertEqual(results, [Inconsistency(2, 5, 1, 2.0, 1.0)])
+
+    def testCheckPairsFromBuffers(self):
+        """
+        Test checking pairs using raw vertex buffers
+        """
+        geometries = {1: vertices(SQUARE), 2: vertices(NEIGHBOR), 3: vertices(DISTANT)}
+        pairs = [(1, 2), (1, 3), (2, 3)]
+        buffers = {fid: vertex_buffers(v) for fid, v in geometries.items()}
+        for tolerance in (0, 0.01):
+            self.assertEqual(check_pairs_from_buffers(buffers, pairs, tolerance),
+                             check_pairs(geometries, pairs, tolerance))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TopologyTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""Topology store Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+
+from qgis.core import QgsGeometry
+
+from vertex_compare.core.topology_store import TopologyStore
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class TopologyStoreTest(unittest.TestCase):
+    """Test TopologyStore works."""
+
+    def testStore(self):
+        """
+        Test storing and retrieving topology results
+        """
+        with tempfile.TemporaryDirectory() as path:
+            store = TopologyStore(os.path.join(path, 'test.sqlite'))
+            geometries = {5: QgsGeometry.fromWkt('LineString (0 0, 1 1, 2 2)'),
+                          3: QgsGeometry.fromWkt('LineString (0 0, 1 2, 2 2)')}
+
+            self.assertIsNone(store.lookup('source', geometries))
+            self.assertTrue(store.store('source', geometries, {5: [2], 3: [2]}))
+            self.assertEqual(store.lookup('source', geometries), {5: [2], 3: [2]})
+
+            # different source or tolerance
+            self.assertIsNone(store.lookup('other', geometries))
+            self.assertIsNone(store.lookup('source', geometries, 0.5))
+
+            # changed geometry
+            geometries[3] = QgsGeometry.fromWkt('LineString (0 0, 1 3, 2 2)')
+            self.assertIsNone(store.lookup('source', geometries))
+
+            # results are persistent
+            geometries[3] = QgsGeometry.fromWkt('LineString (0 0, 1 2, 2 2)')
+            store = TopologyStore(os.path.join(path, 'test.sqlite'))
+            self.assertEqual(store.lookup('source', geometries), {5: [2], 3: [2]})
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TopologyStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
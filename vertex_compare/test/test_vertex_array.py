@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Vertex array Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsGeometry,
+    QgsVertexId
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexArrayTest(unittest.TestCase):
+    """Test VertexArray works."""
+
+    def assertMatchesGeometry(self, vertices: VertexArray, geometry: QgsGeometry):
+        """
+        Asserts that a vertex array matches the vertices from a geometry
+        """
+        expected = []
+        vid = QgsVertexId()
+        while True:
+            ok, vertex = geometry.constGet().nextVertex(vid)
+            if not ok:
+                break
+            expected.append((vid.part, vid.ring, vertex.asWkt()))
+
+        self.assertEqual([(vertices.parts[i], vertices.rings[i], vertices.point(i).asWkt())
+                          for i in range(len(vertices))], expected)
+
+    def testFromGeometry(self):
+        """
+        Test decoding vertices from geometries
+        """
+        for wkt in ('Point (1 2)',
+                    'PointZM (1 2 3 4)',
+                    'LineString (1 2, 3 4, 5 6)',
+                    'LineStringM (1 2 3, 4 5 6)',
+                    'Polygon ((0 0, 10 0, 10 10, 0 0), (1 1, 2 1, 2 2, 1 1))',
+                    'MultiPoint ((1 2), (3 4))',
+                    'MultiLineStringZ ((1 2 3, 4 5 6), (7 8 9, 10 11 12))',
+                    'MultiPolygon (((0 0, 10 0, 10 10, 0 0)), ((20 20, 30 20, 30 30, 20 20), (21 21, 22 21, 22 22, 21 21)))',
+                    'CircularString (0 0, 1 1, 2 0)'):
+            geometry = QgsGeometry.fromWkt(wkt)
+            vertices = VertexArray.from_geometry(geometry)
+            self.assertEqual(vertices.has_z(), geometry.constGet().is3D())
+            self.assertEqual(vertices.has_m(), geometry.constGet().isMeasure())
+            self.assertMatchesGeometry(vertices, geometry)
+
+        self.assertEqual(len(VertexArray.from_geometry(QgsGeometry())), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexArrayTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
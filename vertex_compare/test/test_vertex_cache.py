@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Vertex cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+
+from qgis.core import (
+    QgsGeometry,
+    QgsVertexId
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_cache import VertexDiskCache
+from vertex_compare.core.vertex_cache_task import VertexCacheTask
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexDiskCacheTest(unittest.TestCase):
+    """Test VertexDiskCache works."""
+
+    def assertMatchesGeometry(self, vertices: VertexArray, geometry: QgsGeometry):
+        """
+        Asserts that a vertex array matches the vertices from a geometry
+        """
+        expected = []
+        vid = QgsVertexId()
+        while True:
+            ok, vertex = geometry.constGet().nextVertex(vid)
+            if not ok:
+                break
+            expected.append((vid.part, vid.ring, vertex.asWkt()))
+
+        self.assertEqual([(vertices.parts[i], vertices.rings[i], vertices.point(i).asWkt())
+                          for i in range(len(vertices))], expected)
+
+    def testDiskCache(self):
+        """
+        Test storing vertex arrays in the disk cache
+        """
+        with tempfile.TemporaryDirectory() as path:
+            cache = VertexDiskCache(path, 1024 * 1024)
+            geometry = QgsGeometry.fromWkt('MultiLineStringZM ((1 2 3 4, 5 6 7 8), (9 10 11 12, 13 14 15 16))')
+
+            wkb = bytes(geometry.asWkb())
+            key = VertexDiskCache.key('source', 1, wkb)
+            self.assertNotEqual(key, VertexDiskCache.key('source', 2, wkb))
+            self.assertNotEqual(key, VertexDiskCache.key('other', 1, wkb))
+            self.assertNotEqual(key, VertexDiskCache.key('source', 1, bytes(QgsGeometry.fromWkt('Point (1 2)').asWkb())))
+
+            self.assertIsNone(cache.get(key))
+            self.assertTrue(cache.insert(key, VertexArray.from_geometry(geometry, wkb)))
+
+            vertices = cache.get(key)
+            self.assertMatchesGeometry(vertices, geometry)
+            del vertices
+
+            cache.clear()
+            self.assertIsNone(cache.get(key))
+
+    def testTask(self):
+        """
+        Test storing vertex arrays in the disk cache from a background task
+        """
+        with tempfile.TemporaryDirectory() as path:
+            cache = VertexDiskCache(path, 1024 * 1024)
+            geometry = QgsGeometry.fromWkt('Polygon ((0 0, 10 0, 10 10, 0 0), (1 1, 2 1, 2 2, 1 1))')
+
+            task = VertexCacheTask(cache, 'key', VertexArray.from_geometry(geometry))
+            self.assertTrue(task.run())
+
+            vertices = cache.get('key')
+            self.assertMatchesGeometry(vertices, geometry)
+            del vertices
+
+    def testEviction(self):
+        """
+        Test that the least recently used entries are evicted from the disk cache
+        """
+        with tempfile.TemporaryDirectory() as path:
+            geometry = QgsGeometry.fromWkt('LineString (1 2, 3 4, 5 6)')
+            vertices = VertexArray.from_geometry(geometry)
+
+            cache = VertexDiskCache(path, 1024 * 1024)
+            cache.insert('a', vertices)
+            entry_size = cache.size()
+
+            cache.max_size = entry_size * 2
+            cache.insert('b', vertices)
+            os.utime(os.path.join(path, 'a' + VertexDiskCache.SUFFIX), (0, 0))
+            cache.insert('c', vertices)
+
+            self.assertEqual(cache.size(), entry_size * 2)
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('c'))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexDiskCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,112 @@
+# coding=utf-8
+"""Vertex clipboard Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import json
+import math
+import unittest
+from array import array
+
+from qgis.core import QgsGeometry
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_clipboard import (
+    merge_ranges,
+    vertices_to_csv,
+    vertices_to_geojson,
+    vertices_to_wkt
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def vertices(wkt: str) -> VertexArray:
+    """
+    Returns the vertex array for a WKT geometry
+    """
+    return VertexArray.from_geometry(QgsGeometry.fromWkt(wkt))
+
+
+class VertexClipboardTest(unittest.TestCase):
+    """Test vertex clipboard formats."""
+
+    def testMergeRanges(self):
+        """
+        Test merging vertex ranges
+        """
+        self.assertEqual(merge_ranges([]), [])
+        self.assertEqual(merge_ranges([(5, 7), (0, 2), (1, 3), (4, 4)]), [(0, 3), (5, 7)])
+        self.assertEqual(merge_ranges([(0, 2), (2, 4)]), [(0, 4)])
+
+    def testCsv(self):
+        """
+        Test copying as CSV
+        """
+        line = vertices('LineString (1 2, 3 4, 5 6.5, 7 8)')
+        self.assertEqual(vertices_to_csv(line, [(0, 1), (2, 4)]),
+                         'vertex,x,y\n1,1.0,2.0\n3,5.0,6.5\n4,7.0,8.0\n')
+        self.assertEqual(vertices_to_csv(vertices('LineStringZM (1 2 3 4, 5 6 7 8)'), [(1, 2)], '\t'),
+                         'vertex\tx\ty\tz\tm\n2\t5.0\t6.0\t7.0\t8.0\n')
+        self.assertEqual(vertices_to_csv(line, []), 'vertex,x,y\n')
+        self.assertEqual(vertices_to_csv(vertices('LineString (1.23456 2, 3 4)'), [(0, 2)], precision=2),
+                         'vertex,x,y\n1,1.23,2.00\n2,3.00,4.00\n')
+
+    def testWkt(self):
+        """
+        Test copying as WKT
+        """
+        line = vertices('LineString (1 2, 3 4, 5 6.5, 7 8)')
+        self.assertEqual(vertices_to_wkt(line, [(1, 2)]), 'Point (3.0 4.0)')
+        self.assertEqual(vertices_to_wkt(line, [(0, 1), (2, 3)]), 'MultiPoint ((1.0 2.0), (5.0 6.5))')
+        self.assertEqual(vertices_to_wkt(vertices('LineStringZ (1 2 3, 5 6 7)'), [(0, 2)]),
+                         'MultiPoint Z ((1.0 2.0 3.0), (5.0 6.0 7.0))')
+        self.assertEqual(QgsGeometry.fromWkt(vertices_to_wkt(line, [(0, 4)])).asWkt(),
+                         'MultiPoint ((1 2),(3 4),(5 6.5),(7 8))')
+        self.assertEqual(vertices_to_wkt(line, [(1, 3)], precision=1), 'MultiPoint ((3.0 4.0), (5.0 6.5))')
+
+    def testGeoJson(self):
+        """
+        Test copying as GeoJSON
+        """
+        line = vertices('LineStringZ (1 2 3, 5 6 7, 8 9 10)')
+        res = json.loads(vertices_to_geojson(line, [(1, 3)]))
+        self.assertEqual(res['type'], 'FeatureCollection')
+        self.assertEqual([f['properties']['vertex'] for f in res['features']], [2, 3])
+        self.assertEqual([f['geometry']['coordinates'] for f in res['features']], [[5, 6, 7], [8, 9, 10]])
+
+        # explicit vertex numbers, for a subset of vertices
+        subset = line.subset([(0, 1), (2, 3)])
+        self.assertEqual(list(subset.x), [1, 8])
+        self.assertEqual(list(subset.z), [3, 10])
+        res = json.loads(vertices_to_geojson(subset, [(0, 2)], [1, 3]))
+        self.assertEqual([f['properties']['vertex'] for f in res['features']], [1, 3])
+        self.assertEqual([f['geometry']['coordinates'] for f in res['features']], [[1, 2, 3], [8, 9, 10]])
+
+        # fixed precision
+        res = vertices_to_geojson(vertices('Point (1.123456789 2)'), [(0, 1)], precision=3)
+        self.assertIn('"coordinates":[1.123,2.000]', res)
+        self.assertEqual(json.loads(res)['features'][0]['geometry']['coordinates'], [1.123, 2])
+
+        # NaN values are not valid JSON, and must be written as null
+        res = json.loads(vertices_to_geojson(VertexArray(array('d', [1, 5]), array('d', [2, 6]),
+                                                         array('d', [math.nan, 7])), [(0, 2)]))
+        self.assertEqual([f['geometry']['coordinates'] for f in res['features']], [[1, 2, None], [5, 6, 7]])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexClipboardTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,138 @@
+# coding=utf-8
+"""Vertex diff Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+from array import array
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import (
+    DiffRun,
+    VertexDiffer,
+    vertex_diff
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def line(*x) -> VertexArray:
+    """
+    Returns a vertex array with the specified x coordinates
+    """
+    return VertexArray(array('d', x), array('d', [0] * len(x)))
+
+
+class VertexDiffTest(unittest.TestCase):
+    """Test vertex diffs work."""
+
+    def testIdentical(self):
+        """
+        Test diffs of identical vertices
+        """
+        diff = vertex_diff(line(1, 2, 3), line(1, 2, 3))
+        self.assertEqual(diff.runs, [DiffRun(VertexDiffer.EQUAL, 0, 3, 0, 3)])
+        self.assertFalse(diff.approximate)
+        self.assertEqual(vertex_diff(line(), line()).runs, [])
+
+    def testOperations(self):
+        """
+        Test inserted, deleted and moved vertices
+        """
+        self.assertEqual(vertex_diff(line(1, 2, 3), line(1, 2, 5, 3)).runs,
+                         [DiffRun(VertexDiffer.EQUAL, 0, 2, 0, 2),
+                          DiffRun(VertexDiffer.INSERT, 2, 2, 2, 3),
+                          DiffRun(VertexDiffer.EQUAL, 2, 3, 3, 4)])
+        self.assertEqual(vertex_diff(line(1, 2, 3, 4), line(1, 4)).runs,
+                         [DiffRun(VertexDiffer.EQUAL, 0, 1, 0, 1),
+                          DiffRun(VertexDiffer.DELETE, 1, 3, 1, 1),
+                          DiffRun(VertexDiffer.EQUAL, 3, 4, 1, 2)])
+        diff = vertex_diff(line(1, 2, 3, 4, 5), line(1, 2.1, 3.1, 5))
+        self.assertEqual(diff.runs,
+                         [DiffRun(VertexDiffer.EQUAL, 0, 1, 0, 1),
+                          DiffRun(VertexDiffer.MOVE, 1, 3, 1, 3),
+                          DiffRun(VertexDiffer.DELETE, 3, 4, 3, 3),
+                          DiffRun(VertexDiffer.EQUAL, 4, 5, 3, 4)])
+        self.assertEqual(diff.counts(), {VertexDiffer.EQUAL: 2,
+                                         VertexDiffer.INSERT: 0,
+                                         VertexDiffer.DELETE: 1,
+                                         VertexDiffer.MOVE: 2})
+
+    def testTolerance(self):
+        """
+        Test diffs with a tolerance
+        """
+        self.assertEqual(vertex_diff(line(1, 2, 3), line(1, 2.001, 3)).counts()[VertexDiffer.MOVE], 1)
+        self.assertEqual(vertex_diff(line(1, 2, 3), line(1, 2.001, 3), 0.01).runs,
+                         [DiffRun(VertexDiffer.EQUAL, 0, 3, 0, 3)])
+
+    def testMaxEdits(self):
+        """
+        Test that vertices are aligned around unique vertices when there are too many differences
+        """
+        diff = vertex_diff(line(1, 2, 3, 4, 5), line(6, 2, 7, 4), max_edits=2)
+        self.assertTrue(diff.approximate)
+        self.assertEqual(diff.runs,
+                         [DiffRun(VertexDiffer.MOVE, 0, 1, 0, 1),
+                          DiffRun(VertexDiffer.EQUAL, 1, 2, 1, 2),
+                          DiffRun(VertexDiffer.MOVE, 2, 3, 2, 3),
+                          DiffRun(VertexDiffer.EQUAL, 3, 4, 3, 4),
+                          DiffRun(VertexDiffer.DELETE, 4, 5, 4, 4)])
+
+        # every 10th vertex kept -- the kept vertices must still be aligned exactly
+        diff = vertex_diff(line(*range(10000)), line(*range(0, 10000, 10)), max_edits=100)
+        self.assertTrue(diff.approximate)
+        self.assertEqual(diff.counts(), {VertexDiffer.EQUAL: 1000,
+                                         VertexDiffer.INSERT: 0,
+                                         VertexDiffer.DELETE: 9000,
+                                         VertexDiffer.MOVE: 0})
+        self.assertEqual(diff.runs[:3],
+                         [DiffRun(VertexDiffer.EQUAL, 0, 1, 0, 1),
+                          DiffRun(VertexDiffer.DELETE, 1, 10, 1, 1),
+                          DiffRun(VertexDiffer.EQUAL, 10, 11, 1, 2)])
+
+        # repeated vertices can't be used as anchors
+        diff = vertex_diff(line(1, 1, 2, 3, 1, 1), line(9, 3, 2, 1, 9), max_edits=1)
+        self.assertTrue(diff.approximate)
+        self.assertEqual(diff.runs,
+                         [DiffRun(VertexDiffer.MOVE, 0, 1, 0, 1),
+                          DiffRun(VertexDiffer.DELETE, 1, 3, 1, 1),
+                          DiffRun(VertexDiffer.EQUAL, 3, 4, 1, 2),
+                          DiffRun(VertexDiffer.MOVE, 4, 5, 2, 3),
+                          DiffRun(VertexDiffer.EQUAL, 5, 6, 3, 4),
+                          DiffRun(VertexDiffer.INSERT, 6, 6, 4, 5)])
+
+    def testLarge(self):
+        """
+        Test diffs of large vertex arrays with few differences
+        """
+        count = 200000
+        vertices1 = line(*range(count))
+        x = list(range(count))
+        del x[1000:1010]
+        x.insert(50000, -1)
+        vertices2 = line(*x)
+        self.assertEqual(vertex_diff(vertices1, vertices2).runs,
+                         [DiffRun(VertexDiffer.EQUAL, 0, 1000, 0, 1000),
+                          DiffRun(VertexDiffer.DELETE, 1000, 1010, 1000, 1000),
+                          DiffRun(VertexDiffer.EQUAL, 1010, 50010, 1000, 50000),
+                          DiffRun(VertexDiffer.INSERT, 50010, 50010, 50000, 50001),
+                          DiffRun(VertexDiffer.EQUAL, 50010, count, 50001, count - 9)])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexDiffTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
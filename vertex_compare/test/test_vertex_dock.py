@@ -0,0 +1,143 @@
+# coding=utf-8
+"""Vertex dock Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import QgsCoordinateReferenceSystem
+
+from vertex_compare.core.feature_model import FeatureModel
+from vertex_compare.core.vertex_snapshot import VertexSnapshot
+from vertex_compare.gui.vertex_dock import VertexListWidget
+from .utilities import (
+    get_qgis_app,
+    make_layer,
+    process_events_until
+)
+
+QGIS_APP, CANVAS, _, _ = get_qgis_app()
+
+
+class VertexListWidgetTest(unittest.TestCase):
+    """Test VertexListWidget works."""
+
+    def testUpdateSelection(self):
+        """
+        Test incrementally updating the selection shown in the widget
+        """
+        layer = make_layer('LineString', [f'LineString (0 {i}, 1 {i}, 2 {i})' for i in range(5)])
+        widget = VertexListWidget(CANVAS)
+        widget.set_selection(layer, [1, 2])
+        self.assertEqual(widget.selection, [1, 2])
+        self.assertEqual(widget.vertex_model.feature.id(), 1)
+
+        # the chosen feature is kept while it remains selected
+        widget.feature_combo.setCurrentIndex(widget.feature_model.index_from_id(2).row())
+        self.assertEqual(widget.vertex_model.feature.id(), 2)
+        widget.update_selection(layer, [3, 2], [1])
+        self.assertEqual(widget.selection, [2, 3])
+        self.assertEqual(widget.feature_model.rowCount(), 2)
+        self.assertEqual(widget.vertex_model.feature.id(), 2)
+        self.assertEqual(widget.feature_combo.currentData(FeatureModel.FEATURE_ID_ROLE), 2)
+
+        # removing the chosen feature switches to the first remaining feature
+        widget.update_selection(layer, [], [2, 4])
+        self.assertEqual(widget.selection, [3])
+        self.assertEqual(widget.feature_model.rowCount(), 1)
+        self.assertEqual(widget.vertex_model.feature.id(), 3)
+
+        widget.update_selection(layer, [], [3])
+        self.assertEqual(widget.selection, [])
+        self.assertIsNone(widget.vertex_model.feature)
+
+        # a different layer resets the complete selection
+        other = make_layer('LineString', ['LineString (0 0, 1 1)'])
+        other.selectByIds([1])
+        widget.update_selection(other, [1], [])
+        self.assertEqual(widget.layer, other)
+        self.assertEqual(widget.selection, [1])
+
+    def testComparison(self):
+        """
+        Test aligning the selected features side by side
+        """
+        layer = make_layer('LineString?crs=EPSG:3857', ['LineString (0 0, 1 0, 2 0)', 'LineString (0 0, 2 0)'])
+        widget = VertexListWidget(CANVAS)
+        widget.set_selection(layer, [1, 2])
+        widget.compare_action.setChecked(True)
+
+        # the tables are aligned in the background
+        self.assertIsNotNone(widget.diff_task)
+        self.assertTrue(process_events_until(lambda: widget.diff_task is None))
+        self.assertIsNotNone(widget.aligned_model.runs)
+        self.assertFalse(widget._comparison_diff.approximate)  # pylint: disable=protected-access
+        self.assertEqual(widget.compare_aligned_model.rowCount(), 3)
+
+        # showing transformed coordinates keeps the alignment
+        runs = widget.aligned_model.runs
+        widget.vertex_model.set_destination_crs(QgsCoordinateReferenceSystem('EPSG:4326'))
+        self.assertIs(widget.aligned_model.runs, runs)
+        widget._update_comparison()  # pylint: disable=protected-access
+        self.assertIsNone(widget.diff_task)
+
+        widget.compare_action.setChecked(False)
+        self.assertIsNone(widget.aligned_model.runs)
+        self.assertFalse(widget.compare_table_view.isVisibleTo(widget))
+
+    def testSnapshotComparison(self):
+        """
+        Test comparing the chosen feature with a snapshot
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 0, 2 0)'])
+        widget = VertexListWidget(CANVAS)
+        widget.set_selection(layer, [1])
+        snapshots = []
+        widget.vertex_snapshot_changed.connect(snapshots.append)
+
+        snapshot = VertexSnapshot.capture(layer, [1])
+        widget.set_vertex_snapshot(snapshot)
+        self.assertTrue(widget.snapshot_button.compare_action.isChecked())
+        self.assertEqual(snapshots, [snapshot])
+        self.assertTrue(widget.compare_table_view.isVisibleTo(widget))
+
+        widget.set_vertex_snapshot(None)
+        self.assertFalse(widget.snapshot_button.compare_action.isChecked())
+        self.assertEqual(snapshots, [snapshot, None])
+        self.assertFalse(widget.compare_table_view.isVisibleTo(widget))
+
+    def testStatisticsAndDistances(self):
+        """
+        Test the statistics and distances shown for the selected features
+        """
+        layer = make_layer('LineString', ['LineString (0 0, 1 0, 2 0)', 'LineString (0 1, 2 1)'])
+        widget = VertexListWidget(CANVAS)
+        widget.set_selection(layer, [1])
+        self.assertTrue(process_events_until(lambda: widget.statistics_widget.task is None))
+        self.assertEqual(widget.statistics_widget.label_vertex_count.text(), '3')
+        self.assertFalse(widget.distance_widget.isVisibleTo(widget))
+
+        widget.update_selection(layer, [2], [])
+        self.assertTrue(widget.distance_widget.isVisibleTo(widget))
+        self.assertTrue(process_events_until(lambda: widget.distance_widget.task is None))
+        self.assertTrue(widget.distance_widget.label_hausdorff.text().startswith('1'))
+
+        widget.update_selection(layer, [], [2])
+        self.assertFalse(widget.distance_widget.isVisibleTo(widget))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexListWidgetTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
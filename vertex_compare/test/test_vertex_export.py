@@ -0,0 +1,174 @@
+# coding=utf-8
+"""Vertex export Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import (
+    VertexDiffer,
+    vertex_diff
+)
+from vertex_compare.core.vertex_export import (
+    VertexExportFormat,
+    VertexExportTask,
+    diff_operations,
+    pyarrow
+)
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexExportTest(unittest.TestCase):
+    """Test vertex export works."""
+
+    def testDiffOperations(self):
+        """
+        Test per-vertex diff operations
+        """
+        vertices1 = VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 2 0, 3 0, 4 0)'))
+        vertices2 = VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 5 0, 2 0, 3.5 0)'))
+        diff = vertex_diff(vertices1, vertices2)
+        self.assertEqual(list(diff_operations(diff, 0)),
+                         [VertexDiffer.EQUAL, VertexDiffer.EQUAL, VertexDiffer.MOVE, VertexDiffer.DELETE])
+        self.assertEqual(list(diff_operations(diff, 1)),
+                         [VertexDiffer.EQUAL, VertexDiffer.INSERT, VertexDiffer.EQUAL, VertexDiffer.MOVE])
+
+    def testCsv(self):
+        """
+        Test exporting to CSV, in several chunks
+        """
+        vertices1 = VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 2 0, 3 0, 4 0)'))
+        vertices2 = VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 5 0, 2 0, 3.5 0)'))
+        diff = vertex_diff(vertices1, vertices2)
+        layer = make_layer('Polygon?crs=EPSG:3857', ['Polygon ((5 5, 6 5, 6 6, 5 5))',
+                                                     'Polygon ((0 0, 1 0, 1 1, 0 0))'])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'vertices.csv')
+            # feature 1 is exported from its decoded vertices, and feature 2 fetched from the source
+            task = VertexExportTask(path, VertexExportFormat.CSV, [1, 2],
+                                    QgsCoordinateReferenceSystem('EPSG:3857'), False, False,
+                                    source=QgsVectorLayerFeatureSource(layer),
+                                    vertices={1: vertices1},
+                                    operations={1: (diff, 0)})
+            with mock.patch.object(VertexExportTask, 'CHUNK_SIZE', 3):
+                self.assertTrue(task.run())
+            self.assertEqual(task.exported_count, 8)
+
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], ['feature_id', 'vertex', 'part', 'ring', 'x', 'y', 'z', 'm', 'operation', 'topology'])
+        self.assertEqual(rows[1:], [['1', '1', '0', '0', '1.0', '0.0', '', '', 'equal', ''],
+                                    ['1', '2', '0', '0', '2.0', '0.0', '', '', 'equal', ''],
+                                    ['1', '3', '0', '0', '3.0', '0.0', '', '', 'move', ''],
+                                    ['1', '4', '0', '0', '4.0', '0.0', '', '', 'delete', ''],
+                                    ['2', '1', '0', '0', '0.0', '0.0', '', '', '', ''],
+                                    ['2', '2', '0', '0', '1.0', '0.0', '', '', '', ''],
+                                    ['2', '3', '0', '0', '1.0', '1.0', '', '', '', ''],
+                                    ['2', '4', '0', '0', '0.0', '0.0', '', '', '', '']])
+
+    def testTopology(self):
+        """
+        Test exporting topological compare flags
+        """
+        layer = make_layer('Polygon?crs=EPSG:3857', ['Polygon ((0 0, 1 0, 1 1, 0 0))',
+                                                     'Polygon ((1 0, 2 0, 1 1, 1 0))'])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'vertices.csv')
+            # only feature 1 is exported, but is compared against feature 2 from the source
+            task = VertexExportTask(path, VertexExportFormat.CSV, [1],
+                                    QgsCoordinateReferenceSystem('EPSG:3857'), False, False,
+                                    source=QgsVectorLayerFeatureSource(layer),
+                                    vertices={1: VertexArray.from_geometry(
+                                        QgsGeometry.fromWkt('Polygon ((0 0, 1 0, 1 1, 0 0))'))},
+                                    topology_fids=(1, 2))
+            self.assertTrue(task.run())
+
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual([row[-1] for row in rows[1:]], ['uncommon', 'common', 'common', 'uncommon'])
+
+    def testGeoPackage(self):
+        """
+        Test exporting to GeoPackage
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'vertices.gpkg')
+            task = VertexExportTask(path, VertexExportFormat.GEOPACKAGE, [5],
+                                    QgsCoordinateReferenceSystem('EPSG:3857'), True, False,
+                                    vertices={5: VertexArray.from_geometry(
+                                        QgsGeometry.fromWkt('LineStringZ (1 2 3, 4 5 6)'))})
+            self.assertTrue(task.run())
+
+            layer = QgsVectorLayer(path, 'vertices')
+            self.assertTrue(layer.isValid())
+            self.assertEqual(layer.crs().authid(), 'EPSG:3857')
+            features = list(layer.getFeatures())
+            self.assertEqual([f['vertex'] for f in features], [1, 2])
+            self.assertEqual([f['feature_id'] for f in features], [5, 5])
+            self.assertEqual([f.geometry().asWkt() for f in features], ['PointZ (1 2 3)', 'PointZ (4 5 6)'])
+            del layer
+
+    def testCanceled(self):
+        """
+        Test canceling an export
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            task = VertexExportTask(os.path.join(temp_dir, 'vertices.csv'), VertexExportFormat.CSV, [1],
+                                    QgsCoordinateReferenceSystem(), False, False,
+                                    vertices={1: VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 2 0)'))})
+            task.cancel()
+            self.assertFalse(task.run())
+            # the partially written file is removed
+            self.assertFalse(os.path.exists(task.path))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not available')
+    def testParquetError(self):
+        """
+        Test that Parquet writer errors are reported
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            task = VertexExportTask(os.path.join(temp_dir, 'vertices.parquet'), VertexExportFormat.PARQUET, [1],
+                                    QgsCoordinateReferenceSystem(), False, False,
+                                    vertices={1: VertexArray.from_geometry(QgsGeometry.fromWkt('LineString (1 0, 2 0)'))})
+            with mock.patch('pyarrow.parquet.ParquetWriter.write_table', side_effect=pyarrow.ArrowInvalid('invalid')):
+                self.assertFalse(task.run())
+            self.assertEqual(task.error, 'invalid')
+            self.assertFalse(os.path.exists(task.path))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexExportTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,305 @@
+# coding=utf-8
+"""Vertex highlighter renderer Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import time
+import unittest
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QSize
+)
+from qgis.PyQt.QtTest import QSignalSpy
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsVectorLayer,
+    QgsMapSettings,
+    QgsMapRendererParallelJob,
+    QgsMapRendererSequentialJob,
+    QgsRenderContext,
+    QgsSettings,
+    QgsSymbolRenderContext,
+    QgsTextFormat,
+    QgsUnitTypes
+)
+
+from vertex_compare.core.settings_registry import SettingsRegistry
+from vertex_compare.core.text_renderer_marker_symbol_layer import TextRendererMarkerSymbolLayer
+from vertex_compare.core.vertex_highlighter_generator import VertexHighlighterRendererGenerator
+from vertex_compare.core.vertex_highlighter_renderer import (
+    PartialRenderLog,
+    RendererConfiguration
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class SharedConfigurationGenerator(VertexHighlighterRendererGenerator):
+    """
+    A generator which returns clones of a single renderer, so that every render job
+    shares the same renderer configuration
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.renderer = None
+
+    def createRenderer(self):  # pylint: disable=missing-function-docstring
+        if self.renderer is None:
+            self.renderer = super().createRenderer()
+        return self.renderer.clone()
+
+
+class VertexHighlighterRendererTest(unittest.TestCase):
+    """Test VertexHighlighterRenderer works."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Redirects settings to a test specific location, so that the user's settings are untouched
+        """
+        cls.organization_name = QCoreApplication.organizationName()
+        cls.organization_domain = QCoreApplication.organizationDomain()
+        cls.application_name = QCoreApplication.applicationName()
+        QCoreApplication.setOrganizationName('QGIS_Test')
+        QCoreApplication.setOrganizationDomain('VertexCompareTest.com')
+        QCoreApplication.setApplicationName('VertexCompareRendererTest')
+        QgsSettings().clear()
+        SettingsRegistry.reload()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Discards the test settings and restores the original settings location
+        """
+        QgsSettings().clear()
+        QCoreApplication.setOrganizationName(cls.organization_name)
+        QCoreApplication.setOrganizationDomain(cls.organization_domain)
+        QCoreApplication.setApplicationName(cls.application_name)
+        SettingsRegistry.reload()
+
+    def testConcurrentRendering(self):
+        """
+        Stress test rendering the same layer in many concurrent render jobs, which all
+        share a single generator and renderer configuration
+        """
+        SettingsRegistry.set_label_filtering(SettingsRegistry.LABEL_ALL)
+
+        layer = QgsVectorLayer(os.path.join(TEST_DATA_PATH, 'lines.shp'), 'lines', 'ogr')
+        self.assertTrue(layer.isValid())
+        layer.selectAll()
+
+        layer.addFeatureRendererGenerator(VertexHighlighterRendererGenerator(layer=layer,
+                                                                             feature_id=None,
+                                                                             vertex_number=None,
+                                                                             topological=False))
+
+        settings = QgsMapSettings()
+        settings.setLayers([layer])
+        settings.setDestinationCrs(layer.crs())
+        settings.setExtent(layer.extent())
+        settings.setOutputSize(QSize(400, 400))
+        settings.setFlag(QgsMapSettings.DrawSelection, True)
+
+        reference_job = QgsMapRendererSequentialJob(settings)
+        reference_job.start()
+        reference_job.waitForFinished()
+        reference_image = reference_job.renderedImage()
+
+        layer.removeFeatureRendererGenerator(VertexHighlighterRendererGenerator.ID)
+        generator = SharedConfigurationGenerator(layer=layer,
+                                                 feature_id=None,
+                                                 vertex_number=None,
+                                                 topological=False)
+        layer.addFeatureRendererGenerator(generator)
+
+        # the shared configuration is first prepared by whichever concurrent job requires it first
+        configuration = None
+        for _ in range(5):
+            jobs = [QgsMapRendererParallelJob(settings) for _ in range(8)]
+            for job in jobs:
+                job.start()
+            for job in jobs:
+                job.waitForFinished()
+
+            for job in jobs:
+                self.assertEqual(job.renderedImage(), reference_image)
+
+            if configuration is None:
+                configuration = generator.renderer.configuration
+            self.assertIs(generator.renderer.configuration, configuration)
+            self.assertTrue(configuration.is_prepared())
+
+    def testClone(self):
+        """
+        Test cloning renderers
+        """
+        layer = QgsVectorLayer(os.path.join(TEST_DATA_PATH, 'lines.shp'), 'lines', 'ogr')
+        layer.selectAll()
+        SettingsRegistry.set_label_filtering(SettingsRegistry.LABEL_ALL)
+        generator = VertexHighlighterRendererGenerator(layer=layer,
+                                                       feature_id=None,
+                                                       vertex_number=None,
+                                                       topological=False)
+        renderer = generator.createRenderer()
+        clone = renderer.clone()
+        self.assertIs(clone.configuration, renderer.configuration)
+        self.assertEqual(clone.filter(), renderer.filter())
+        self.assertEqual(clone.vertex_symbol_layer().layerType(), 'TextRenderer')
+
+    def testNeedsRefinement(self):
+        """
+        Test that only rendered layers with partially labeled vertices need refinement
+        """
+        layer = QgsVectorLayer(os.path.join(TEST_DATA_PATH, 'lines.shp'), 'lines', 'ogr')
+        layer.selectAll()
+        SettingsRegistry.set_label_filtering(SettingsRegistry.LABEL_ALL)
+        generator = VertexHighlighterRendererGenerator(layer=layer,
+                                                       feature_id=None,
+                                                       vertex_number=None,
+                                                       topological=False)
+        self.assertFalse(generator.needs_refinement())
+        renderer = generator.createRenderer()
+        # never rendered
+        self.assertFalse(generator.needs_refinement())
+
+        renderer.configuration.label_vertex_budget = 1
+        renderer.configuration.prepare()
+        self.assertTrue(generator.needs_refinement())
+
+    def testLabelStride(self):
+        """
+        Test calculation of progressive labeling strides
+        """
+        self.assertEqual(RendererConfiguration.calculate_label_stride(100, 0, 0), 1)
+        self.assertEqual(RendererConfiguration.calculate_label_stride(100, 1000, 0), 1)
+        self.assertEqual([RendererConfiguration.calculate_label_stride(1000000, 20000, p) for p in range(5)],
+                         [64, 16, 4, 1, 1])
+
+    @staticmethod
+    def start_render(symbol_layer: TextRendererMarkerSymbolLayer, render_context: QgsRenderContext):
+        """
+        Starts a render using a text renderer symbol layer
+        """
+        symbol_layer.startRender(QgsSymbolRenderContext(render_context, QgsUnitTypes.RenderMillimeters))
+
+    def testCancellation(self):
+        """
+        Test that renders are stopped when canceled
+        """
+        render_context = QgsRenderContext()
+        symbol_layer = TextRendererMarkerSymbolLayer(QgsTextFormat(), None)
+        self.start_render(symbol_layer, render_context)
+
+        for _ in range(TextRendererMarkerSymbolLayer.CANCELLATION_CHECK_INTERVAL * 4):
+            self.assertFalse(symbol_layer._check_stopped(render_context))  # pylint: disable=protected-access
+        self.assertFalse(symbol_layer.is_render_stopped())
+
+        render_context.setRenderingStopped(True)
+        # cancellation is only checked periodically
+        checks = 0
+        while not symbol_layer._check_stopped(render_context):  # pylint: disable=protected-access
+            checks += 1
+        self.assertLess(checks, TextRendererMarkerSymbolLayer.CANCELLATION_CHECK_INTERVAL)
+        self.assertTrue(symbol_layer.is_render_stopped())
+        # a canceled render is not a partial render
+        self.assertFalse(symbol_layer.is_render_partial())
+
+        # stopped renders stay stopped, and the next render starts afresh
+        render_context.setRenderingStopped(False)
+        self.assertTrue(symbol_layer._check_stopped(render_context))  # pylint: disable=protected-access
+        self.start_render(symbol_layer, render_context)
+        self.assertFalse(symbol_layer.is_render_stopped())
+
+    def testTimeBudget(self):
+        """
+        Test that renders are stopped and flagged as partial when the time budget is exceeded
+        """
+        render_context = QgsRenderContext()
+        symbol_layer = TextRendererMarkerSymbolLayer(QgsTextFormat(), None, time_budget=1)
+        self.start_render(symbol_layer, render_context)
+        time.sleep(0.01)
+
+        checks = 0
+        while not symbol_layer._check_stopped(render_context):  # pylint: disable=protected-access
+            checks += 1
+        self.assertLess(checks, TextRendererMarkerSymbolLayer.CANCELLATION_CHECK_INTERVAL)
+        self.assertTrue(symbol_layer.is_render_stopped())
+        self.assertTrue(symbol_layer.is_render_partial())
+
+        # clones keep the time budget
+        self.assertEqual(symbol_layer.clone().time_budget, 1)
+
+        # no budget
+        symbol_layer = TextRendererMarkerSymbolLayer(QgsTextFormat(), None, time_budget=0)
+        self.start_render(symbol_layer, render_context)
+        time.sleep(0.01)
+        for _ in range(TextRendererMarkerSymbolLayer.CANCELLATION_CHECK_INTERVAL * 4):
+            self.assertFalse(symbol_layer._check_stopped(render_context))  # pylint: disable=protected-access
+        self.assertFalse(symbol_layer.is_render_partial())
+
+    def testStrideOnlyForInteractiveRenders(self):
+        """
+        Test that progressive labeling strides are only applied to map view renders
+        """
+        symbol_layer = TextRendererMarkerSymbolLayer(QgsTextFormat(), None, stride=4)
+
+        settings = QgsMapSettings()
+        if hasattr(settings, 'setRendererUsage'):
+            settings.setRendererUsage(Qgis.RendererUsage.View)
+            self.start_render(symbol_layer, QgsRenderContext.fromMapSettings(settings))
+            self.assertEqual(symbol_layer.render_state.stride, 4)
+
+            settings.setRendererUsage(Qgis.RendererUsage.Export)
+            render_context = QgsRenderContext.fromMapSettings(settings)
+            self.assertFalse(TextRendererMarkerSymbolLayer.is_interactive_render(render_context))
+            self.start_render(symbol_layer, render_context)
+            self.assertEqual(symbol_layer.render_state.stride, 1)
+        else:
+            self.start_render(symbol_layer, QgsRenderContext.fromMapSettings(settings))
+            self.assertEqual(symbol_layer.render_state.stride, 4)
+
+        settings.setFlag(QgsMapSettings.RenderBlocking, True)
+        if hasattr(settings, 'setRendererUsage'):
+            settings.setRendererUsage(Qgis.RendererUsage.Export)
+        self.start_render(symbol_layer, QgsRenderContext.fromMapSettings(settings))
+        self.assertEqual(symbol_layer.render_state.stride, 1)
+
+    def testPartialRenderLog(self):
+        """
+        Test that partial renders are only logged once for each time budget and selection
+        """
+        spy = QSignalSpy(QgsApplication.messageLog().messageReceived)
+        log = PartialRenderLog()
+        self.assertTrue(log.report('source', 100, frozenset([1, 2])))
+        self.assertFalse(log.report('source', 100, frozenset([1, 2])))
+        self.assertFalse(log.report('source', 100, frozenset([2, 1])))
+        self.assertTrue(log.report('source', 200, frozenset([1, 2])))
+        self.assertTrue(log.report('source', 200, frozenset([1])))
+        self.assertTrue(log.report('other', 200, frozenset([1])))
+        log.reset()
+        self.assertTrue(log.report('other', 200, frozenset([1])))
+        self.assertEqual(len(spy), 5)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexHighlighterRendererTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Vertex index Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import unittest
+from array import array
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_index import (
+    PointGridIndex,
+    SegmentGridIndex
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexIndexTest(unittest.TestCase):
+    """Test vertex indices work."""
+
+    def testNearest(self):
+        """
+        Test nearest vertex queries
+        """
+        vertices = VertexArray(array('d', [0, 10, 10, 3, 100]), array('d', [0, 0, 10, 4, 100]))
+        index = PointGridIndex(vertices)
+        self.assertEqual(index.nearest(1, 1), 0)
+        self.assertEqual(index.nearest(9, 1), 1)
+        self.assertEqual(index.nearest(3, 3.9), 3)
+        self.assertEqual(index.nearest(1000, 1000), 4)
+        self.assertEqual(index.nearest(-50, -50), 0)
+        self.assertIsNone(index.nearest(50, 50, 5))
+
+        # brute force comparison
+        for x in range(-20, 120, 7):
+            for y in range(-20, 120, 7):
+                expected = min(range(len(vertices)),
+                               key=lambda i, x=x, y=y: ((vertices.x[i] - x) ** 2 + (vertices.y[i] - y) ** 2, i))
+                self.assertEqual(index.nearest(x, y), expected)
+
+        self.assertEqual(sorted(index.within(5, 2, 6)), [0, 1, 3])
+
+    def testCellSize(self):
+        """
+        Test default cell sizes
+        """
+        # vertices along a boundary are spaced much closer than their extent suggests
+        count = 10000
+        circle = VertexArray(array('d', [100 * math.cos(2 * math.pi * i / count) for i in range(count)]),
+                             array('d', [100 * math.sin(2 * math.pi * i / count) for i in range(count)]))
+        index = PointGridIndex(circle)
+        self.assertLess(index.cell_size, 200 / math.sqrt(count))
+        self.assertLessEqual(max(len(cell) for cell in index.cells.values()), 2 * PointGridIndex.VERTICES_PER_CELL)
+
+        # queries far from every vertex
+        self.assertEqual(index.nearest(-50, 0), count // 2)
+        self.assertEqual(index.nearest(-1000, 0), count // 2)
+        self.assertEqual(index.nearest(1000, 0), 0)
+        self.assertIsNone(index.nearest(-50, 0, 40))
+
+        # scattered vertices are limited to around one vertex per cell
+        scattered = VertexArray(array('d', [0, 100, 0, 100]), array('d', [0, 100, 100, 0]))
+        self.assertEqual(PointGridIndex.default_cell_size(scattered), 50)
+
+    def testSegments(self):
+        """
+        Test segment distance queries
+        """
+        vertices = VertexArray(array('d', [0, 10, 10, 20, 30]), array('d', [0, 0, 10, 0, 0]),
+                               parts=array('i', [0, 0, 0, 1, 1]), rings=array('i', [0, 0, 0, 0, 0]))
+        index = SegmentGridIndex(vertices)
+        self.assertEqual(index.segments, [0, 1, 3])
+        self.assertEqual(index.segments_within(5, 1, 1), [0])
+        self.assertEqual(index.segments_within(10, 0, 0), [0, 1])
+        # no segment between separate parts
+        self.assertEqual(index.segments_within(15, 5, 1), [])
+        self.assertEqual(index.segments_within(25, 0, 0), [3])
+
+    def testSegmentCells(self):
+        """
+        Test that segments are only registered in the cells they cross
+        """
+        self.assertEqual(SegmentGridIndex.segment_cells(0.5, 0.5, 2.5, 0.5, 1), [(0, 0), (1, 0), (2, 0)])
+        self.assertEqual(SegmentGridIndex.segment_cells(0.5, 2.5, 0.5, 0.5, 1), [(0, 2), (0, 1), (0, 0)])
+        self.assertEqual(SegmentGridIndex.segment_cells(1, 1, 1, 1, 1), [(1, 1)])
+
+        # a long diagonal crosses a number of cells proportional to its length, not its bounding box
+        cells = SegmentGridIndex.segment_cells(0.5, 0.5, 999.5, 999.5, 1)
+        self.assertEqual(len(cells), 1999)
+        self.assertEqual(cells[0], (0, 0))
+        self.assertEqual(cells[-1], (999, 999))
+
+        vertices = VertexArray(array('d', [0, 1000, 1000]), array('d', [0, 1000, 0]))
+        index = SegmentGridIndex(vertices, cell_size=1)
+        self.assertEqual(sum(len(segments) for segments in index.cells.values()), 2001 + 1001)
+        self.assertEqual(index.segments_within(500, 500.5, 1), [0])
+        self.assertEqual(index.segments_within(900, 100, 1), [])
+        self.assertEqual(index.segments_within(999.5, 100, 1), [1])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
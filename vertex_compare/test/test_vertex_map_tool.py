@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Nearest vertex map tool Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.core import (
+    QgsBasicNumericFormat,
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
+    QgsPointXY
+)
+from qgis.gui import QgsMapCanvas
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.gui.vertex_map_tool import NearestVertexMapTool
+from .utilities import (
+    get_qgis_app,
+    process_events_until
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class NearestVertexMapToolTest(unittest.TestCase):
+    """Test nearest vertex map tool works."""
+
+    def testVertexAt(self):
+        """
+        Test finding the nearest vertex to a point
+        """
+        canvas = QgsMapCanvas()
+        tool = NearestVertexMapTool(canvas)
+        self.assertIsNone(tool.vertex_at(QgsPointXY(1, 2)))
+
+        tool.set_vertices(VertexArray.from_geometry(QgsGeometry.fromWkt('LineString(0 0, 10 0, 10 10, 0 10)')),
+                          QgsCoordinateReferenceSystem('EPSG:3857'))
+        # no vertices are found until the index has been built in the background
+        self.assertIsNone(tool.index)
+        self.assertIsNone(tool.vertex_at(QgsPointXY(1, 2)))
+        self.assertTrue(process_events_until(lambda: tool.index is not None))
+        index = tool.index
+        self.assertIsNone(tool.index_task)
+        self.assertEqual(tool.vertex_at(QgsPointXY(1, 2)), 0)
+        self.assertEqual(tool.vertex_at(QgsPointXY(9, 1)), 1)
+        self.assertEqual(tool.vertex_at(QgsPointXY(8, 7)), 2)
+        self.assertIs(tool.index, index)
+
+        # with a tolerance, only vertices within the tolerance distance are found
+        self.assertEqual(tool.vertex_at(QgsPointXY(12, 7)), 2)
+        self.assertIsNone(tool.vertex_at(QgsPointXY(12, 7), 3))
+        self.assertEqual(tool.vertex_at(QgsPointXY(12, 7), 4), 2)
+        # inside the extent of the vertices, but far from every vertex
+        self.assertEqual(tool.vertex_at(QgsPointXY(5, 5)), 0)
+        self.assertIsNone(tool.vertex_at(QgsPointXY(5, 5), 1))
+        self.assertEqual(tool.vertex_at(QgsPointXY(4, 4), 6), 0)
+
+        # the index of superseded vertices is discarded
+        tool.set_vertices(VertexArray.from_geometry(QgsGeometry.fromWkt('LineString(100 100, 110 100)')))
+        first_task = tool.index_task
+        tool.set_vertices(VertexArray.from_geometry(QgsGeometry.fromWkt('LineString(0 0, 10 0)')))
+        self.assertIsNot(tool.index_task, first_task)
+        self.assertTrue(process_events_until(lambda: tool.index is not None))
+        self.assertIs(tool.index.vertices, tool.vertices)
+        self.assertEqual(tool.vertex_at(QgsPointXY(9, 1)), 1)
+
+        tool.set_vertices(None)
+        self.assertIsNone(tool.index)
+        self.assertIsNone(tool.index_task)
+        self.assertIsNone(tool.vertex_at(QgsPointXY(1, 2)))
+
+    def testTooltip(self):
+        """
+        Test tooltip text
+        """
+        canvas = QgsMapCanvas()
+        tool = NearestVertexMapTool(canvas)
+        tool.number_format = QgsBasicNumericFormat()
+        tool.number_format.setNumberDecimalPlaces(1)
+        tool.number_format.setShowTrailingZeros(True)
+
+        tool.set_vertices(VertexArray.from_geometry(QgsGeometry.fromWkt('LineString(0 0, 10 0.5)')))
+        self.assertEqual(tool.tooltip_text(1), 'Vertex 2\n10.0, 0.5')
+
+        tool.set_vertices(VertexArray.from_geometry(QgsGeometry.fromWkt('LineStringZ(0 0 3, 10 0.5 4)')))
+        self.assertEqual(tool.tooltip_text(0), 'Vertex 1\n0.0, 0.0, 3.0')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(NearestVertexMapToolTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
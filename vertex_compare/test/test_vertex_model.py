@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Vertex model Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtCore import Qt
+from qgis.core import (
+    QgsBasicNumericFormat,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.vertex_model import VertexModel
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexModelTest(unittest.TestCase):
+    """Test VertexModel works."""
+
+    def testTransformedColumns(self):
+        """
+        Test showing vertices transformed to another CRS
+        """
+        layer = QgsVectorLayer('LineString?crs=EPSG:4326', 'test', 'memory')
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromWkt('LineString (0 0, 1 1, 2 0)'))
+
+        model = VertexModel()
+        model.number_format = QgsBasicNumericFormat()
+        model.number_format.setNumberDecimalPlaces(1)
+        model.number_format.setShowThousandsSeparator(False)
+        model.set_feature(feature, layer)
+        self.assertFalse(model.has_transformed_columns())
+        self.assertEqual(model.columnCount(), 3)
+        self.assertIsNone(model.transformed_vertices())
+
+        model.set_destination_crs(QgsCoordinateReferenceSystem('EPSG:3857'))
+        self.assertTrue(model.has_transformed_columns())
+        self.assertEqual(model.columnCount(), 5)
+        self.assertEqual(model.headerData(3, Qt.Horizontal, Qt.DisplayRole), 'X (EPSG:3857)')
+        self.assertEqual(model.headerData(4, Qt.Horizontal, Qt.DisplayRole), 'Y (EPSG:3857)')
+        self.assertEqual(model.data(model.index(1, 1)), '1.0')
+        self.assertEqual(model.data(model.index(1, 3)), '111319.5')
+        self.assertEqual(model.data(model.index(1, 4)), '111325.1')
+        self.assertEqual(model.data(model.index(2, 3)), '222639.0')
+
+        # transformed vertices are cached until the feature changes
+        transformed = model.transformed_vertices()
+        self.assertIs(model.transformed_vertices(), transformed)
+        transform = model.transform
+
+        feature.setGeometry(QgsGeometry.fromWkt('LineString (2 0, 3 0)'))
+        model.set_feature(feature, layer)
+        self.assertIsNot(model.transformed_vertices(), transformed)
+        # but the transform is reused
+        self.assertIs(model.transform, transform)
+        self.assertEqual(model.data(model.index(0, 3)), '222639.0')
+
+        model.set_destination_crs(None)
+        self.assertEqual(model.columnCount(), 3)
+        self.assertIsNone(model.transform)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexModelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
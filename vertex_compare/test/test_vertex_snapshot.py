@@ -0,0 +1,204 @@
+# coding=utf-8
+"""Vertex Snapshot Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2021 by Nyall Dawson'
+__date__ = '22/02/2021'
+__copyright__ = 'Copyright 2021, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+
+from qgis.core import (
+    QgsGeometry,
+    QgsVectorLayer
+)
+
+from vertex_compare.core.vertex_array import VertexArray
+from vertex_compare.core.vertex_diff import VertexDiffer
+from vertex_compare.core.vertex_snapshot import (
+    SnapshotChangeCache,
+    VertexSnapshot
+)
+from .utilities import (
+    get_qgis_app,
+    make_layer
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class VertexSnapshotTest(unittest.TestCase):
+    """Test vertex snapshots work."""
+
+    @staticmethod
+    def make_layer() -> QgsVectorLayer:
+        """
+        Creates a memory layer with some test features
+        """
+        return make_layer('LineStringZ?crs=EPSG:3857',
+                          ['LineStringZ (0 0 1, 1 1 2, 2 2 3)',
+                           'MultiLineStringZ ((10 10 0, 11 11 0),(12 12 5, 13 13 6, 14 14 7))'])
+
+    def assertVerticesEqual(self, vertices: VertexArray, expected: VertexArray):  # pylint: disable=invalid-name
+        """
+        Checks that two vertex arrays are equal
+        """
+        self.assertEqual(list(vertices.x), list(expected.x))
+        self.assertEqual(list(vertices.y), list(expected.y))
+        self.assertEqual(vertices.has_z(), expected.has_z())
+        if expected.has_z():
+            self.assertEqual(list(vertices.z), list(expected.z))
+        self.assertEqual(vertices.has_m(), expected.has_m())
+        self.assertEqual(list(vertices.parts), list(expected.parts))
+        self.assertEqual(list(vertices.rings), list(expected.rings))
+
+    def testCapture(self):
+        """
+        Test capturing a snapshot
+        """
+        layer = self.make_layer()
+        snapshot = VertexSnapshot.capture(layer, [1, 2])
+        self.assertEqual(snapshot.layer_id, layer.id())
+        self.assertEqual(snapshot.layer_name, 'test')
+        self.assertEqual(snapshot.fids(), [1, 2])
+        self.assertIn(2, snapshot)
+        self.assertNotIn(3, snapshot)
+        self.assertIsNone(snapshot.vertices(3))
+        self.assertEqual(list(snapshot.vertices(1).z), [1, 2, 3])
+        self.assertEqual(list(snapshot.vertices(2).parts), [0, 0, 1, 1, 1])
+
+    def testSaveLoad(self):
+        """
+        Test saving and loading snapshots, with and without compression
+        """
+        layer = self.make_layer()
+        snapshot = VertexSnapshot.capture(layer, [1, 2])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for compress in (True, False):
+                path = os.path.join(temp_dir, f'snapshot_{compress}{VertexSnapshot.SUFFIX}')
+                self.assertTrue(snapshot.save(path, compress=compress))
+
+                loaded = VertexSnapshot.load(path)
+                self.assertIsNotNone(loaded)
+                self.assertEqual(loaded.layer_id, layer.id())
+                self.assertEqual(loaded.crs, snapshot.crs)
+                self.assertEqual(loaded.created, snapshot.created)
+                self.assertEqual(loaded.fids(), [1, 2])
+                for fid in (1, 2):
+                    self.assertVerticesEqual(loaded.vertices(fid), snapshot.vertices(fid))
+
+                # a loaded snapshot can be saved again
+                resaved_path = os.path.join(temp_dir, 'resaved' + VertexSnapshot.SUFFIX)
+                self.assertTrue(loaded.save(resaved_path, compress=not compress))
+                self.assertVerticesEqual(VertexSnapshot.load(resaved_path).vertices(2), snapshot.vertices(2))
+                del loaded
+
+            invalid_path = os.path.join(temp_dir, 'invalid' + VertexSnapshot.SUFFIX)
+            with open(invalid_path, 'wb') as f:
+                f.write(b'not a snapshot')
+            self.assertIsNone(VertexSnapshot.load(invalid_path))
+            self.assertIsNone(VertexSnapshot.load(os.path.join(temp_dir, 'missing' + VertexSnapshot.SUFFIX)))
+
+            # a failed save must not leave the temporary file behind
+            os.mkdir(os.path.join(temp_dir, 'target'))
+            before = sorted(os.listdir(temp_dir))
+            self.assertFalse(snapshot.save(os.path.join(temp_dir, 'target')))
+            self.assertEqual(sorted(os.listdir(temp_dir)), before)
+
+    def testCorrupt(self):
+        """
+        Test loading snapshots with corrupt vertices
+        """
+        layer = self.make_layer()
+        snapshot = VertexSnapshot.capture(layer, [1, 2])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'corrupt' + VertexSnapshot.SUFFIX)
+            self.assertTrue(snapshot.save(path))
+            # garble the end of the last feature's compressed vertices
+            with open(path, 'r+b') as f:
+                f.seek(-16, os.SEEK_END)
+                f.write(b'\xff' * 16)
+
+            loaded = VertexSnapshot.load(path)
+            self.assertEqual(loaded.fids(), [1, 2])
+            self.assertVerticesEqual(loaded.vertices(1), snapshot.vertices(1))
+            # corrupt features are dropped instead of raising
+            self.assertIsNone(loaded.vertices(2))
+            self.assertEqual(loaded.fids(), [1])
+            self.assertIsNone(loaded.changes(2, snapshot.vertices(2)))
+
+            resaved_path = os.path.join(temp_dir, 'resaved' + VertexSnapshot.SUFFIX)
+            self.assertTrue(loaded.save(resaved_path))
+            self.assertEqual(VertexSnapshot.load(resaved_path).fids(), [1])
+            del loaded
+
+    def testCompression(self):
+        """
+        Test that compressed snapshots are smaller
+        """
+        x = [500000 + i * 0.5 for i in range(10000)]
+        y = [6000000 + i * 0.25 for i in range(10000)]
+        snapshot = VertexSnapshot({1: VertexArray(x, y)})
+        with tempfile.TemporaryDirectory() as temp_dir:
+            compressed_path = os.path.join(temp_dir, 'compressed' + VertexSnapshot.SUFFIX)
+            uncompressed_path = os.path.join(temp_dir, 'uncompressed' + VertexSnapshot.SUFFIX)
+            self.assertTrue(snapshot.save(compressed_path))
+            self.assertTrue(snapshot.save(uncompressed_path, compress=False))
+            self.assertLess(os.path.getsize(compressed_path), os.path.getsize(uncompressed_path) / 2)
+            self.assertEqual(list(VertexSnapshot.load(compressed_path).vertices(1).x), x)
+
+    def testChanges(self):
+        """
+        Test comparing current vertices against a snapshot
+        """
+        layer = self.make_layer()
+        snapshot = VertexSnapshot.capture(layer, [1])
+
+        self.assertIsNone(snapshot.changes(1, VertexArray.from_geometry(layer.getFeature(1).geometry())))
+        self.assertIsNone(snapshot.changes(2, VertexArray.from_geometry(layer.getFeature(2).geometry())))
+
+        changed = VertexArray.from_geometry(QgsGeometry.fromWkt('LineStringZ (0 0 1, 1 5 2, 2 2 3, 3 3 3)'))
+        change = snapshot.changes(1, changed)
+        self.assertEqual(change.vertices, {2: VertexDiffer.MOVE, 4: VertexDiffer.INSERT})
+        self.assertEqual(change.deleted, [])
+
+        changed = VertexArray.from_geometry(QgsGeometry.fromWkt('LineStringZ (0 0 1, 2 2 3)'))
+        change = snapshot.changes(1, changed)
+        self.assertEqual(change.vertices, {})
+        self.assertEqual(change.deleted, [(2, 1.0, 1.0)])
+
+    def testChangeCache(self):
+        """
+        Test caching changes against a snapshot
+        """
+        layer = self.make_layer()
+        cache = SnapshotChangeCache(VertexSnapshot.capture(layer, [1]))
+
+        self.assertIsNone(cache.changes(1, layer.getFeature(1).geometry()))
+        self.assertIsNone(cache.changes(2, layer.getFeature(2).geometry()))
+
+        geometry = QgsGeometry.fromWkt('LineStringZ (0 0 1, 1 5 2, 2 2 3, 3 3 3)')
+        change = cache.changes(1, geometry)
+        self.assertEqual(change.vertices, {2: VertexDiffer.MOVE, 4: VertexDiffer.INSERT})
+        # an equal geometry reuses the calculated changes
+        self.assertIs(cache.changes(1, QgsGeometry(geometry)), change)
+
+        change = cache.changes(1, QgsGeometry.fromWkt('LineStringZ (0 0 1, 2 2 3)'))
+        self.assertEqual(change.vertices, {})
+        self.assertEqual(change.deleted, [(2, 1.0, 1.0)])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VertexSnapshotTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
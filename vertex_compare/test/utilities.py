@@ -5,8 +5,14 @@ import sys
 import logging
 import os
 import atexit
-
-from qgis.core import QgsApplication
+import time
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsGeometry,
+    QgsVectorLayer
+)
 from qgis.utils import iface
 from qgis.gui import QgsMapCanvas
 from qgis.PyQt.QtCore import QSize
@@ -102,3 +108,39 @@ def get_qgis_app(cleanup=True):
         IFACE = QgisInterface(CANVAS)
 
     return QGISAPP, CANVAS, IFACE, PARENT
+
+
+def make_layer(uri: str, wkts, attributes=None) -> QgsVectorLayer:
+    """
+    Creates a memory layer containing a feature for each WKT string.
+
+    :param uri: memory provider layer definition, e.g. 'LineString?crs=EPSG:4326&field=key:integer'
+    :param wkts: list of WKT strings for the feature geometries
+    :param attributes: optional list of attribute lists, one for each feature
+    """
+    layer = QgsVectorLayer(uri, 'test', 'memory')
+    features = []
+    for i, wkt in enumerate(wkts):
+        feature = QgsFeature(layer.fields())
+        if attributes is not None:
+            feature.setAttributes(attributes[i])
+        feature.setGeometry(QgsGeometry.fromWkt(wkt))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def process_events_until(condition, timeout: float = 10) -> bool:
+    """
+    Processes events until a condition is met, e.g. to wait for a background task to complete.
+
+    :param condition: callable which returns True once the wait is over
+    :param timeout: maximum time to wait, in seconds
+    :returns: False if the timeout expired before the condition was met
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        QgsApplication.processEvents()
+    return True